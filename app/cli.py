@@ -1,5 +1,5 @@
 # ABOUTME: Flask CLI commands for scheduled tasks (cron-compatible)
-# ABOUTME: Provides send-expiry-reminders command for document expiry notifications
+# ABOUTME: Provides expiry reminders and maintenance commands such as roll-call counter rebuilds
 
 import click
 from flask.cli import with_appcontext
@@ -22,3 +22,212 @@ def register_commands(app):
         click.echo('Checking for expiring documents...')
         sent_count = send_expiry_reminders()
         click.echo(f'Done. Sent {sent_count} reminder email(s).')
+
+    @app.cli.command('rebuild-roll-call-counts')
+    @with_appcontext
+    def rebuild_roll_call_counts_cmd():
+        """Recompute training session attendance counters from attendance records.
+
+        Usage: flask rebuild-roll-call-counts
+        Run once after upgrading, or whenever the counters are suspected stale.
+        """
+        from app.utils.attendance import rebuild_roll_call_counts
+
+        updated = rebuild_roll_call_counts()
+        click.echo(f'Done. Rebuilt counters for {updated} training session(s).')
+
+    @app.cli.command('rebuild-match-stats')
+    @with_appcontext
+    def rebuild_match_stats_cmd():
+        """Recompute athlete season statistics and team season records from matches.
+
+        Usage: flask rebuild-match-stats
+        Run once after upgrading, or whenever the statistics are suspected stale.
+        """
+        from app.utils.match_stats import rebuild_athlete_season_stats, rebuild_team_season_records
+
+        athlete_rows = rebuild_athlete_season_stats()
+        team_rows = rebuild_team_season_records()
+        click.echo(f'Done. Rebuilt statistics for {athlete_rows} athlete season(s) '
+                   f'and {team_rows} team season(s).')
+
+    @app.cli.command('collapse-recurring-sessions')
+    @click.option('--user-id', type=int, default=None, help='User recorded as creator of the rules (default: first admin).')
+    @with_appcontext
+    def collapse_recurring_sessions_cmd(user_id):
+        """Convert weekly series stored one row per week into recurrence rules.
+
+        Usage: flask collapse-recurring-sessions
+        Sessions with attendance are kept as overrides of their occurrence.
+        """
+        from app.models import User
+        from app.utils.scheduling import collapse_legacy_series
+
+        if user_id is None:
+            admin = User.query.filter_by(role='admin').order_by(User.id).first()
+            if admin is None:
+                raise click.ClickException('No admin user found; pass --user-id.')
+            user_id = admin.id
+
+        rules, deleted, kept = collapse_legacy_series(user_id)
+        click.echo(f'Done. Created {rules} rule(s), removed {deleted} session row(s), kept {kept} override(s).')
+
+    @app.cli.command('schedule-maintenance')
+    @click.option('--days', type=int, default=0, help='Also include items due within this many days (default: due today or earlier).')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Ignore items due before this date (YYYY-MM-DD).')
+    @with_appcontext
+    def schedule_maintenance_cmd(days, since):
+        """Move available equipment due for maintenance to the maintenance status.
+
+        Usage: flask schedule-maintenance [--days 7]
+        Designed to run daily via cron; assigned items are moved once returned.
+        """
+        from datetime import date, timedelta
+        from app.utils.equipment import schedule_maintenance
+
+        until = date.today() + timedelta(days=days)
+        moved = schedule_maintenance(until, start=since.date() if since else None)
+        click.echo(f'Done. Moved {moved} item(s) due by {until.isoformat()} to maintenance.')
+
+    @app.cli.command('sweep-overdue-equipment')
+    @click.option('--resend-days', type=int, default=7, help='Days before a family is reminded again about the same items.')
+    @with_appcontext
+    def sweep_overdue_equipment_cmd(resend_days):
+        """Email each family one reminder listing all of its overdue equipment.
+
+        Usage: flask sweep-overdue-equipment
+        Designed to be run via cron, e.g.:
+            0 9 * * * cd /app && flask sweep-overdue-equipment
+        """
+        from app.utils.email import send_overdue_equipment_reminders
+
+        sent_count, reminded = send_overdue_equipment_reminders(resend_after_days=resend_days)
+        click.echo(f'Done. Sent {sent_count} reminder email(s) covering {reminded} assignment(s).')
+
+    @app.cli.command('dedup-uploads')
+    @with_appcontext
+    def dedup_uploads_cmd():
+        """Move legacy one-file-per-document uploads into the content-addressed blob store.
+
+        Usage: flask dedup-uploads
+        Run once after upgrading; identical files are stored once and the copies removed.
+        """
+        from app.utils.uploads import dedup_legacy_uploads
+
+        migrated, duplicates, saved, missing = dedup_legacy_uploads()
+        click.echo(f'Done. Migrated {migrated} document(s), removed {duplicates} duplicate file(s) '
+                   f'({saved} bytes), {missing} file(s) missing.')
+
+    @app.cli.command('purge-stale-uploads')
+    @with_appcontext
+    def purge_stale_uploads_cmd():
+        """Discard chunked uploads idle for more than UPLOAD_SESSION_HOURS.
+
+        Usage: flask purge-stale-uploads
+        Designed to be run daily via cron.
+        """
+        from app.utils.uploads import expire_upload_sessions
+
+        removed = expire_upload_sessions(app.config['UPLOAD_SESSION_HOURS'])
+        click.echo(f'Done. Removed {removed} stale upload(s).')
+
+    @app.cli.command('import-documents')
+    @click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+    @click.argument('manifest', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--user-id', type=int, default=None, help='User recorded as uploader (default: first admin).')
+    @with_appcontext
+    def import_documents_cmd(archive, manifest, user_id):
+        """Import documents from a ZIP archive described by a CSV manifest.
+
+        Usage: flask import-documents certificates.zip manifest.csv
+        Manifest columns: file, fiscal_code, document_type, and optionally
+        expiry_date (YYYY-MM-DD or DD/MM/YYYY), title, notes, entity_type.
+        """
+        from app.models import User
+        from app.utils.document_import import import_documents
+
+        if user_id is None:
+            admin = User.query.filter_by(role='admin').order_by(User.id).first()
+            if admin is None:
+                raise click.ClickException('No admin user found; pass --user-id.')
+            user_id = admin.id
+
+        with open(manifest, encoding='utf-8-sig', newline='') as f:
+            try:
+                imported, errors = import_documents(archive, f, user_id)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+        for error in errors:
+            click.echo(f"Row {error['row']} ({error['file']}): {error['error']}", err=True)
+        click.echo(f'Done. Imported {imported} document(s), {len(errors)} row(s) with errors.')
+
+    @app.cli.command('reconcile-uploads')
+    @click.option('--quarantine', is_flag=True, help='Move orphan files under UPLOAD_FOLDER/quarantine/.')
+    @click.option('--grace-hours', type=int, default=24, help='Ignore files younger than this (uploads in flight).')
+    @click.option('--purge-deleted-days', type=int, default=None,
+                  help='First purge documents soft-deleted more than this many days ago.')
+    @with_appcontext
+    def reconcile_uploads_cmd(quarantine, grace_hours, purge_deleted_days):
+        """Report files nothing refers to and documents whose file is missing.
+
+        Usage: flask reconcile-uploads [--quarantine] [--purge-deleted-days 90]
+        Designed to be run weekly via cron; without --quarantine nothing is moved.
+        """
+        from app.utils.reconcile import reconcile_uploads
+
+        try:
+            report = reconcile_uploads(quarantine=quarantine, grace_hours=grace_hours,
+                                       purge_deleted_days=purge_deleted_days)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for relative, size in report['orphans']:
+            click.echo(f'Orphan: {relative} ({size} bytes)')
+        for path, document_ids in report['missing']:
+            documents = ', '.join(str(i) for i in document_ids) or 'none'
+            click.echo(f'Missing: {path} (documents: {documents})', err=True)
+        orphan_bytes = sum(size for _, size in report['orphans'])
+        click.echo(f"Done. {len(report['orphans'])} orphan file(s) ({orphan_bytes} bytes), "
+                   f"{report['quarantined']} quarantined, {len(report['missing'])} missing file(s), "
+                   f"{report['purged']} soft-deleted document(s) purged.")
+
+    @app.cli.command('normalize-images')
+    @with_appcontext
+    def normalize_images_cmd():
+        """Normalize image documents stored before uploads were normalized on ingest.
+
+        Usage: flask normalize-images
+        Prints the storage saved for each document.
+        """
+        from app import db
+        from app.models import Document, UploadBlob
+        from app.utils.ingest import NORMALIZE_MIME_TYPES, normalize_blob
+
+        blob_ids = [row.id for row in db.session.query(UploadBlob.id).filter(
+            UploadBlob.mime_type.in_(NORMALIZE_MIME_TYPES)
+        ).order_by(UploadBlob.id)]
+        saved = normalized = 0
+        for blob_id in blob_ids:
+            document_ids = [row.id for row in db.session.query(Document.id).filter_by(blob_id=blob_id)]
+            blob = normalize_blob(blob_id)
+            if blob is None or blob.id == blob_id:
+                continue
+            normalized += 1
+            for document in Document.query.filter(Document.id.in_(document_ids)).order_by(Document.id):
+                click.echo(f'Document {document.id} ({document.file_name}): '
+                           f'{document.original_size} -> {document.file_size} bytes')
+                saved += document.storage_saved() or 0
+        click.echo(f'Done. Normalized {normalized} of {len(blob_ids)} image blob(s), saving {saved} bytes.')
+
+    @app.cli.command('extract-document-text')
+    @with_appcontext
+    def extract_document_text_cmd():
+        """Extract searchable text from PDF uploads that have none yet.
+
+        Usage: flask extract-document-text
+        Incremental: only blobs without text are read, so it is cheap to run from cron.
+        """
+        from app.utils.text_search import extract_pending_texts
+
+        extracted, failed = extract_pending_texts()
+        click.echo(f'Done. Extracted text from {extracted} file(s), {failed} unreadable.')
@@ -36,9 +36,8 @@ class AttendanceForm(FlaskForm):
 class BulkAttendanceForm(FlaskForm):
     """Form for recording attendance for multiple athletes at once"""
 
-    training_session_id = SelectField(_l('Training Session'),
-                                      coerce=lambda x: int(x) if x and str(x).strip() else None,
-                                      validators=[Optional()])
+    # Values are session ids or 'r<rule id>:<date>' for not yet materialized occurrences
+    training_session_id = SelectField(_l('Training Session'), validators=[Optional()])
     date = DateField(_l('Date'), validators=[DataRequired()], default=date.today)
     session_type = SelectField(
         _l('Session Type'),
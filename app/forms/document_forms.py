@@ -49,6 +49,26 @@ class DocumentUploadForm(FlaskForm):
     submit = SubmitField(_l('Upload Document'))
 
 
+class DocumentImportForm(FlaskForm):
+    """Form for importing many documents from a ZIP archive and a CSV manifest."""
+
+    archive = FileField(
+        _l('ZIP Archive'),
+        validators=[
+            FileRequired(_l('Please select a file.')),
+            FileAllowed(['zip'], _l('Only ZIP archives are allowed.'))
+        ]
+    )
+    manifest = FileField(
+        _l('CSV Manifest'),
+        validators=[
+            FileRequired(_l('Please select a file.')),
+            FileAllowed(['csv'], _l('Only CSV files are allowed.'))
+        ]
+    )
+    submit = SubmitField(_l('Import Documents'))
+
+
 class DocumentSearchForm(FlaskForm):
     """Form for filtering the document list."""
 
@@ -84,4 +104,13 @@ class DocumentSearchForm(FlaskForm):
         ],
         validators=[Optional()]
     )
+    sort = SelectField(
+        _l('Sort By'),
+        choices=[
+            ('newest', _l('Newest')),
+            ('owner', _l('Owner')),
+            ('expiry', _l('Expiry Date')),
+        ],
+        validators=[Optional()]
+    )
     submit = SubmitField(_l('Filter'))
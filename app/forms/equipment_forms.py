@@ -1,5 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, TextAreaField, DateField, DecimalField, IntegerField, SubmitField
+from wtforms import (StringField, SelectField, TextAreaField, DateField, DecimalField, IntegerField,
+                     HiddenField, SubmitField)
 from wtforms.validators import DataRequired, Optional, Length, NumberRange
 from flask_babel import lazy_gettext as _l
 
@@ -51,6 +52,7 @@ class EquipmentForm(FlaskForm):
     maintenance_notes = TextAreaField(_l('Maintenance Notes'), validators=[Optional()])
     last_maintenance_date = DateField(_l('Last Maintenance'), validators=[Optional()])
     next_maintenance_date = DateField(_l('Next Maintenance'), validators=[Optional()])
+    version_id = HiddenField()
     submit = SubmitField(_l('Save Equipment'))
 
 
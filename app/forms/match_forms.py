@@ -4,7 +4,7 @@
 from flask_wtf import FlaskForm
 from wtforms import (StringField, TextAreaField, SelectField, DateField,
                      TimeField, BooleanField, IntegerField, SubmitField)
-from wtforms.validators import DataRequired, Optional, Length, NumberRange
+from wtforms.validators import DataRequired, InputRequired, Optional, Length, NumberRange
 from flask_babel import lazy_gettext as _l
 
 
@@ -33,8 +33,8 @@ class MatchForm(FlaskForm):
 class MatchResultForm(FlaskForm):
     """Form for entering/editing match results"""
 
-    score_home = IntegerField(_l('Home Score'), validators=[DataRequired(), NumberRange(min=0)])
-    score_away = IntegerField(_l('Away Score'), validators=[DataRequired(), NumberRange(min=0)])
+    score_home = IntegerField(_l('Home Score'), validators=[InputRequired(), NumberRange(min=0)])
+    score_away = IntegerField(_l('Away Score'), validators=[InputRequired(), NumberRange(min=0)])
     result = SelectField(_l('Result'), choices=[
         ('win', _l('Win')),
         ('loss', _l('Loss')),
@@ -1,12 +1,12 @@
-# ABOUTME: Forms for training session management (create, edit, cancel, generate recurring)
+# ABOUTME: Forms for training session management (create, edit, cancel, generate recurring, move)
 # ABOUTME: Supports session scheduling with team, coach, and season selection
 
 from flask_wtf import FlaskForm
 from wtforms import (
     StringField, DateField, TimeField, SelectField,
-    TextAreaField, SubmitField
+    TextAreaField, SubmitField, BooleanField
 )
-from wtforms.validators import DataRequired, Optional, Length, ValidationError
+from wtforms.validators import DataRequired, InputRequired, Optional, Length, ValidationError
 from flask_babel import lazy_gettext as _l
 
 
@@ -62,7 +62,7 @@ class RecurringSessionForm(FlaskForm):
             (5, _l('Saturday')),
             (6, _l('Sunday'))
         ],
-        validators=[DataRequired()]
+        validators=[InputRequired()]  # Monday is 0, which DataRequired rejects
     )
     start_date = DateField(_l('Start Date'), validators=[DataRequired()])
     end_date = DateField(_l('End Date'), validators=[DataRequired()])
@@ -92,6 +92,8 @@ class RecurringSessionForm(FlaskForm):
         validators=[Optional()]
     )
     notes = TextAreaField(_l('Notes'), validators=[Optional()])
+    skip_conflicts = BooleanField(_l('Skip dates that conflict with other sessions or matches'), default=True)
+    preview = SubmitField(_l('Preview'))
     submit = SubmitField(_l('Generate Sessions'))
 
     def validate_end_date(self, field):
@@ -108,3 +110,29 @@ class CancelSessionForm(FlaskForm):
 
     cancellation_reason = TextAreaField(_l('Cancellation Reason'), validators=[Optional()])
     submit = SubmitField(_l('Cancel Session'))
+
+
+class MoveOccurrenceForm(FlaskForm):
+    """Form for moving one occurrence of a recurring series"""
+
+    new_date = DateField(_l('New Date'), validators=[DataRequired()])
+    new_start_time = TimeField(_l('Start Time'), validators=[Optional()])
+    new_end_time = TimeField(_l('End Time'), validators=[Optional()])
+    submit = SubmitField(_l('Move Session'))
+
+    def __init__(self, rule_start_time=None, rule_end_time=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A time left blank keeps the rule's, so that is what the other one is checked against
+        self.rule_start_time = rule_start_time
+        self.rule_end_time = rule_end_time
+
+    def validate(self, extra_validators=None):
+        # Not a validate_new_end_time hook: Optional() skips it when the end is blank
+        if not super().validate(extra_validators):
+            return False
+        start = self.new_start_time.data or self.rule_start_time
+        end = self.new_end_time.data or self.rule_end_time
+        if start and end and end <= start:
+            self.new_end_time.errors.append(_l('End time must be after start time.'))
+            return False
+        return True
@@ -7,10 +7,14 @@ from .equipment import Equipment as Equipment, EquipmentAssignment as EquipmentA
 from .team import Team as Team, TeamStaffAssignment as TeamStaffAssignment
 from .season import Season as Season
 from .training_session import TrainingSession as TrainingSession
+from .recurrence import RecurrenceRule as RecurrenceRule, RecurrenceException as RecurrenceException
 from .match import Match as Match, MatchLineup as MatchLineup
-from .document import Document as Document
+from .season_stats import AthleteSeasonStats as AthleteSeasonStats, TeamSeasonRecord as TeamSeasonRecord
+from .document import (Document as Document, DocumentText as DocumentText, UploadBlob as UploadBlob,
+                       UploadSession as UploadSession)
 from .emergency_contact import EmergencyContact as EmergencyContact
 from .announcement import Announcement as Announcement
 from .insurance import Insurance as Insurance
+from .calendar import CalendarGeneration as CalendarGeneration
 
-__all__ = ['User', 'Athlete', 'Guardian', 'Staff', 'Attendance', 'Equipment', 'EquipmentAssignment', 'Team', 'TeamStaffAssignment', 'Season', 'TrainingSession', 'Match', 'MatchLineup', 'Document', 'EmergencyContact', 'Announcement', 'Insurance']
+__all__ = ['User', 'Athlete', 'Guardian', 'Staff', 'Attendance', 'Equipment', 'EquipmentAssignment', 'Team', 'TeamStaffAssignment', 'Season', 'TrainingSession', 'RecurrenceRule', 'RecurrenceException', 'Match', 'MatchLineup', 'AthleteSeasonStats', 'TeamSeasonRecord', 'Document', 'DocumentText', 'UploadBlob', 'UploadSession', 'EmergencyContact', 'Announcement', 'Insurance', 'CalendarGeneration']
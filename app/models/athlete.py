@@ -40,6 +40,9 @@ class Athlete(db.Model):
     # Team assignment
     team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=True, index=True)
 
+    # Part of the athlete's calendar feed link; rotating it revokes the links handed out
+    feed_key = db.Column(db.String(32))
+
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
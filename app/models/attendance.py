@@ -26,6 +26,9 @@ class Attendance(db.Model):
     status = db.Column(db.String(20), nullable=False)  # present, absent, excused, late
     notes = db.Column(db.Text)
 
+    # When the mark was taken (device clock for offline check-ins); last writer wins
+    marked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -39,6 +42,7 @@ class Attendance(db.Model):
     __table_args__ = (
         db.Index('idx_attendance_athlete_date', 'athlete_id', 'date'),
         db.Index('idx_attendance_date_session', 'date', 'session_type'),
+        db.Index('idx_attendance_training_session', 'training_session_id'),
     )
 
     def __repr__(self):
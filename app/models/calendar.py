@@ -0,0 +1,21 @@
+# ABOUTME: Per-month change counters behind the calendar month cache
+# ABOUTME: Every worker bumps them on calendar writes, so cached months from any worker can be validated
+
+from app import db
+
+
+class CalendarGeneration(db.Model):
+    """Change counter of one calendar month, shared by all workers.
+
+    Cached months remember the generations they were built at and are
+    dropped once either moves. ``month`` is ``year * 100 + month``; month 0
+    counts changes that may touch any month (rule edits, bulk updates).
+    """
+
+    __tablename__ = 'calendar_generations'
+
+    month = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CalendarGeneration {self.month} {self.generation}>'
@@ -1,14 +1,20 @@
 # ABOUTME: Document model for tracking uploaded files (certificates, IDs, insurance, etc.)
-# ABOUTME: Polymorphic design with entity_type/entity_id for athlete and staff documents
+# ABOUTME: Owner is entity_type/entity_id, mirrored in athlete_id/staff_id FKs; bytes live in content-addressed UploadBlobs
 
+import json
 from datetime import datetime, date
 from flask_babel import gettext as _
+from sqlalchemy import DDL, event, func
+from sqlalchemy.orm import contains_eager
 from app import db
 
 
 class Document(db.Model):
     __tablename__ = 'documents'
 
+    DOCUMENT_TYPES = ('medical_certificate', 'id_document', 'background_check', 'insurance',
+                      'consent_form', 'other')
+
     id = db.Column(db.Integer, primary_key=True)
 
     # Document info
@@ -20,11 +26,16 @@ class Document(db.Model):
     file_path = db.Column(db.String(500), nullable=False)
     file_name = db.Column(db.String(200), nullable=False)
     file_size = db.Column(db.Integer)  # bytes
+    original_size = db.Column(db.Integer)  # bytes as uploaded, when the image was normalized
     mime_type = db.Column(db.String(100))
+    blob_id = db.Column(db.Integer, db.ForeignKey('upload_blobs.id'), index=True)
 
     # Polymorphic owner
     entity_type = db.Column(db.String(20), nullable=False, index=True)  # 'athlete' or 'staff'
     entity_id = db.Column(db.Integer, nullable=False, index=True)
+    # Typed copies of the owner for SQL joins, set from entity_type/entity_id on flush
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athletes.id'), index=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), index=True)
 
     # Expiry tracking
     expiry_date = db.Column(db.Date)
@@ -45,6 +56,43 @@ class Document(db.Model):
 
     # Relationships
     creator = db.relationship('User', backref=db.backref('documents_created', lazy='dynamic'))
+    blob = db.relationship('UploadBlob', backref=db.backref('documents', lazy='dynamic'))
+    athlete = db.relationship('Athlete', backref=db.backref('documents', lazy='dynamic'))
+    staff = db.relationship('Staff', backref=db.backref('documents', lazy='dynamic'))
+
+    @property
+    def owner(self):
+        """The athlete or staff member the document belongs to, if it still exists."""
+        return self.athlete if self.entity_type == 'athlete' else self.staff
+
+    def get_owner_name(self):
+        return self.owner.get_full_name() if self.owner is not None else _('Unknown')
+
+    @classmethod
+    def with_owners(cls, query):
+        """Outer-join the owning athlete and staff member into a Document query.
+
+        Both relationships are filled from the joined row, so listing owner
+        names costs no extra queries; owner_name() and owner_order() can be
+        used to filter and sort the result.
+        """
+        return query.outerjoin(cls.athlete).outerjoin(cls.staff).options(
+            contains_eager(cls.athlete), contains_eager(cls.staff)
+        )
+
+    @staticmethod
+    def owner_name():
+        """'First Last' of the owner, for queries passed through with_owners()."""
+        from app.models import Athlete, Staff
+        return func.coalesce(Athlete.first_name + ' ' + Athlete.last_name,
+                             Staff.first_name + ' ' + Staff.last_name)
+
+    @staticmethod
+    def owner_order():
+        """ORDER BY owner last name then first name, for queries passed through with_owners()."""
+        from app.models import Athlete, Staff
+        return (func.coalesce(Athlete.last_name, Staff.last_name),
+                func.coalesce(Athlete.first_name, Staff.first_name))
 
     def get_document_type_display(self):
         type_map = {
@@ -57,6 +105,12 @@ class Document(db.Model):
         }
         return type_map.get(self.document_type, self.document_type)
 
+    def storage_saved(self):
+        """Bytes saved by normalizing the upload, or None when it was stored as uploaded."""
+        if self.original_size is None or self.file_size is None:
+            return None
+        return self.original_size - self.file_size
+
     def is_expired(self):
         if not self.expiry_date:
             return False
@@ -69,3 +123,129 @@ class Document(db.Model):
 
     def __repr__(self):
         return f'<Document {self.title} ({self.entity_type}:{self.entity_id})>'
+
+
+@event.listens_for(Document, 'before_insert')
+@event.listens_for(Document, 'before_update')
+def _sync_owner_keys(mapper, connection, document):
+    document.athlete_id = document.entity_id if document.entity_type == 'athlete' else None
+    document.staff_id = document.entity_id if document.entity_type == 'staff' else None
+
+
+class UploadBlob(db.Model):
+    """Uploaded file content stored once per SHA-256 digest.
+
+    Files live under UPLOAD_FOLDER at ``storage_key`` (``ab/cd/<sha256>``).
+    ``ref_count`` is the number of active documents using the blob: it is
+    decremented on soft delete, and the file is removed only when the last
+    document referencing it is purged.
+    """
+
+    __tablename__ = 'upload_blobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, unique=True)
+    storage_key = db.Column(db.String(200), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    mime_type = db.Column(db.String(100))
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+
+    # Metadata
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UploadBlob {self.sha256[:12]} refs={self.ref_count}>'
+
+
+class UploadSession(db.Model):
+    """An in-progress chunked upload.
+
+    With local storage chunks are appended in order to
+    ``UPLOAD_FOLDER/tmp/<id>.part``; with S3 each chunk is a part of the
+    multipart upload ``multipart_id``. ``next_chunk`` is the first chunk
+    not yet acknowledged, so an interrupted client resumes from there. The
+    row is removed when the upload is finalized into a Document or expires.
+    """
+
+    __tablename__ = 'upload_sessions'
+
+    id = db.Column(db.String(32), primary_key=True)  # Random hex, used in URLs
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    file_name = db.Column(db.String(200), nullable=False)
+    mime_type = db.Column(db.String(100))
+    total_size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    next_chunk = db.Column(db.Integer, default=0, nullable=False)
+    received_bytes = db.Column(db.BigInteger, default=0, nullable=False)
+
+    # S3 multipart upload staging the chunks and the ETags of its parts (JSON list, in order)
+    multipart_id = db.Column(db.String(255))
+    part_etags = db.Column(db.Text)
+
+    # Metadata
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    def chunk_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def expected_chunk_size(self, index):
+        """Exact byte length chunk ``index`` must have."""
+        if index < self.chunk_count() - 1:
+            return self.chunk_size
+        return self.total_size - self.chunk_size * (self.chunk_count() - 1)
+
+    def etags(self):
+        return json.loads(self.part_etags or '[]')
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.next_chunk}/{self.chunk_count()}>'
+
+
+class DocumentText(db.Model):
+    """Text extracted from a blob, searched with FTS5 (SQLite) or FULLTEXT (MySQL).
+
+    One row per blob, written once: blob content never changes, so a
+    document whose file is replaced points at a new blob without text.
+    Blobs with no extractable text get an empty row so they are not
+    retried.
+    """
+
+    __tablename__ = 'document_text'
+
+    # Characters kept per blob
+    MAX_CHARS = 60000
+
+    id = db.Column(db.Integer, primary_key=True)
+    blob_id = db.Column(db.Integer, db.ForeignKey('upload_blobs.id', ondelete='CASCADE'), nullable=False, unique=True)
+    content = db.Column(db.Text, nullable=False, default='')
+    pages = db.Column(db.Integer)
+    extracted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    blob = db.relationship('UploadBlob', backref=db.backref('text', uselist=False, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<DocumentText blob={self.blob_id} {len(self.content or "")} chars>'
+
+
+# The full-text indexes cannot be declared portably, so they are created
+# with the table: an external-content FTS5 table kept in sync by triggers
+# on SQLite, a FULLTEXT index on MySQL.
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS document_text_fts USING fts5("
+    "content, content='document_text', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS document_text_ai AFTER INSERT ON document_text BEGIN "
+    "INSERT INTO document_text_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS document_text_ad AFTER DELETE ON document_text BEGIN "
+    "INSERT INTO document_text_fts(document_text_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS document_text_au AFTER UPDATE ON document_text BEGIN "
+    "INSERT INTO document_text_fts(document_text_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO document_text_fts(rowid, content) VALUES (new.id, new.content); END",
+):
+    event.listen(DocumentText.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(DocumentText.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS document_text_fts').execute_if(dialect='sqlite'))
+event.listen(DocumentText.__table__, 'after_create', DDL(
+    'ALTER TABLE document_text ADD FULLTEXT INDEX ft_document_text_content (content)'
+).execute_if(dialect='mysql'))
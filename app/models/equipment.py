@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from flask_babel import gettext as _
+from flask_babel import lazy_gettext as _l
 from app import db
 
 
@@ -40,45 +40,57 @@ class Equipment(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
 
+    # Optimistic locking: every UPDATE checks and bumps the version, so a
+    # concurrent change makes the losing flush raise StaleDataError
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': version_id}
+
+    # Indexes
+    __table_args__ = (
+        db.Index('idx_equipment_next_maintenance', 'next_maintenance_date'),
+    )
+
     # Relationships
     creator = db.relationship('User', backref=db.backref('equipment_created', lazy='dynamic'))
     assignments = db.relationship('EquipmentAssignment', backref='equipment', lazy='dynamic',
                                    cascade='all, delete-orphan')
 
+    # Localized labels of the choice columns
+    CATEGORY_LABELS = {
+        'ball': _l('Ball'),
+        'jersey': _l('Jersey'),
+        'protective': _l('Protective Gear'),
+        'training_aid': _l('Training Aid'),
+        'other': _l('Other')
+    }
+    CONDITION_LABELS = {
+        'new': _l('New'),
+        'good': _l('Good'),
+        'fair': _l('Fair'),
+        'poor': _l('Poor'),
+        'damaged': _l('Damaged')
+    }
+    STATUS_LABELS = {
+        'available': _l('Available'),
+        'assigned': _l('Assigned'),
+        'maintenance': _l('In Maintenance'),
+        'retired': _l('Retired')
+    }
+
     def __repr__(self):
         return f'<Equipment {self.name} ({self.code})>'
 
     def get_category_display(self):
         """Return localized category display"""
-        category_map = {
-            'ball': _('Ball'),
-            'jersey': _('Jersey'),
-            'protective': _('Protective Gear'),
-            'training_aid': _('Training Aid'),
-            'other': _('Other')
-        }
-        return category_map.get(self.category, self.category)
+        return str(self.CATEGORY_LABELS.get(self.category, self.category))
 
     def get_condition_display(self):
         """Return localized condition display"""
-        condition_map = {
-            'new': _('New'),
-            'good': _('Good'),
-            'fair': _('Fair'),
-            'poor': _('Poor'),
-            'damaged': _('Damaged')
-        }
-        return condition_map.get(self.condition, self.condition)
+        return str(self.CONDITION_LABELS.get(self.condition, self.condition))
 
     def get_status_display(self):
         """Return localized status display"""
-        status_map = {
-            'available': _('Available'),
-            'assigned': _('Assigned'),
-            'maintenance': _('In Maintenance'),
-            'retired': _('Retired')
-        }
-        return status_map.get(self.status, self.status)
+        return str(self.STATUS_LABELS.get(self.status, self.status))
 
     def needs_maintenance(self):
         """Check if equipment needs maintenance"""
@@ -121,10 +133,13 @@ class EquipmentAssignment(db.Model):
     # Status
     is_returned = db.Column(db.Boolean, default=False, nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
+    overdue_reminder_sent_at = db.Column(db.DateTime)  # Last overdue reminder to the family
 
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': version_id}
 
     # Relationships
     athlete = db.relationship('Athlete', backref=db.backref('equipment_assignments', lazy='dynamic'))
@@ -137,6 +152,7 @@ class EquipmentAssignment(db.Model):
     __table_args__ = (
         db.Index('idx_assignment_athlete', 'athlete_id', 'is_returned'),
         db.Index('idx_assignment_equipment', 'equipment_id', 'is_returned'),
+        db.Index('idx_assignment_overdue', 'is_returned', 'expected_return_date'),
     )
 
     def __repr__(self):
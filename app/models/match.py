@@ -47,6 +47,7 @@ class Match(db.Model):
     __table_args__ = (
         db.Index('idx_match_date_team', 'date', 'team_id'),
         db.Index('idx_match_season', 'season_id'),
+        db.Index('idx_match_team_season_date', 'team_id', 'season_id', 'date'),
     )
 
     # Relationships
@@ -0,0 +1,108 @@
+# ABOUTME: Recurrence rule and exception models for weekly training series
+# ABOUTME: Occurrences are expanded at read time; only overridden ones become TrainingSession rows
+
+from datetime import datetime, timedelta
+from flask_babel import gettext as _
+from app import db
+
+
+class RecurrenceRule(db.Model):
+    """Weekly training pattern for a team between two dates"""
+
+    __tablename__ = 'recurrence_rules'
+
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Session template
+    title = db.Column(db.String(200), nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    location = db.Column(db.String(200))
+    session_type = db.Column(db.String(50), nullable=False)  # training, friendly, tournament, event
+    notes = db.Column(db.Text)
+
+    # Pattern
+    weekday = db.Column(db.Integer, nullable=False)  # 0=Monday, 1=Tuesday, ..., 6=Sunday
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+
+    # Foreign keys
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    season_id = db.Column(db.Integer, db.ForeignKey('seasons.id'))
+    coach_id = db.Column(db.Integer, db.ForeignKey('staff.id'))
+
+    # Metadata
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+
+    # Indexes for window lookups
+    __table_args__ = (
+        db.Index('idx_recurrence_rule_team_dates', 'team_id', 'start_date', 'end_date'),
+    )
+
+    # Relationships
+    team = db.relationship('Team', backref=db.backref('recurrence_rules', lazy='dynamic'))
+    season = db.relationship('Season', backref=db.backref('recurrence_rules', lazy='dynamic'))
+    coach = db.relationship('Staff', backref=db.backref('recurrence_rules_coached', lazy='dynamic'))
+    creator = db.relationship('User', backref=db.backref('recurrence_rules_created', lazy='dynamic'))
+    exceptions = db.relationship('RecurrenceException', backref='rule', lazy='dynamic',
+                                 cascade='all, delete-orphan')
+    overrides = db.relationship('TrainingSession', backref='recurrence_rule', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<RecurrenceRule {self.title} weekday={self.weekday}>'
+
+    def get_weekday_display(self):
+        """Return localized day-of-week name"""
+        names = [_('Monday'), _('Tuesday'), _('Wednesday'), _('Thursday'),
+                 _('Friday'), _('Saturday'), _('Sunday')]
+        return names[self.weekday]
+
+    def occurrence_dates(self, start, end):
+        """Dates of the pattern falling within [start, end]."""
+        first = max(start, self.start_date)
+        last = min(end, self.end_date)
+        current = first + timedelta(days=(self.weekday - first.weekday()) % 7)
+        dates = []
+        while current <= last:
+            dates.append(current)
+            current += timedelta(days=7)
+        return dates
+
+    def has_occurrence_on(self, day):
+        return self.start_date <= day <= self.end_date and day.weekday() == self.weekday
+
+
+class RecurrenceException(db.Model):
+    """A cancelled or moved occurrence of a recurrence rule"""
+
+    __tablename__ = 'recurrence_exceptions'
+
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+
+    rule_id = db.Column(db.Integer, db.ForeignKey('recurrence_rules.id'), nullable=False)
+    occurrence_date = db.Column(db.Date, nullable=False)  # the date the rule would produce
+    kind = db.Column(db.String(20), nullable=False)  # cancelled, moved
+
+    # For moved occurrences; times default to the rule's
+    new_date = db.Column(db.Date, index=True)
+    new_start_time = db.Column(db.Time)
+    new_end_time = db.Column(db.Time)
+
+    reason = db.Column(db.Text)
+
+    # Metadata
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('rule_id', 'occurrence_date', name='uq_recurrence_exception_occurrence'),
+    )
+
+    def __repr__(self):
+        return f'<RecurrenceException rule={self.rule_id} {self.occurrence_date} {self.kind}>'
@@ -0,0 +1,101 @@
+# ABOUTME: Precomputed per-season match aggregates, maintained incrementally on writes
+# ABOUTME: AthleteSeasonStats (per athlete) and TeamSeasonRecord (per team) results summaries
+
+from datetime import datetime
+from app import db
+
+
+class AthleteSeasonStats(db.Model):
+    """Match statistics of one athlete in one season.
+
+    Only completed, active matches that belong to a season are counted.
+    Rows are adjusted with in-place SQL increments when lineups, results or
+    matches change, and can be rebuilt with ``flask rebuild-match-stats``.
+    """
+
+    __tablename__ = 'athlete_season_stats'
+
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Foreign keys
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athletes.id'), nullable=False)
+    season_id = db.Column(db.Integer, db.ForeignKey('seasons.id'), nullable=False)
+
+    # Counters
+    appearances = db.Column(db.Integer, default=0, nullable=False)
+    starts = db.Column(db.Integer, default=0, nullable=False)
+    captaincies = db.Column(db.Integer, default=0, nullable=False)
+    wins = db.Column(db.Integer, default=0, nullable=False)
+    draws = db.Column(db.Integer, default=0, nullable=False)
+    losses = db.Column(db.Integer, default=0, nullable=False)
+
+    # Metadata
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Constraints and indexes
+    __table_args__ = (
+        db.UniqueConstraint('athlete_id', 'season_id', name='uq_athlete_season_stats'),
+        db.Index('idx_athlete_stats_season', 'season_id', 'appearances'),
+    )
+
+    # Relationships
+    athlete = db.relationship('Athlete', backref=db.backref('season_stats', lazy='dynamic'))
+    season = db.relationship('Season', backref=db.backref('athlete_stats', lazy='dynamic'))
+
+    def __repr__(self):
+        return f'<AthleteSeasonStats athlete={self.athlete_id} season={self.season_id}>'
+
+    def win_rate(self):
+        """Percentage of decided appearances that were won"""
+        played = self.wins + self.draws + self.losses
+        return round(self.wins * 100 / played) if played else 0
+
+
+class TeamSeasonRecord(db.Model):
+    """Results summary of one team in one season.
+
+    Counters are adjusted incrementally when a result is recorded, corrected
+    or removed; ``form`` holds the latest results, oldest first, as letters
+    (W/D/L). Rebuild with ``flask rebuild-match-stats``.
+    """
+
+    __tablename__ = 'team_season_records'
+
+    # Number of recent results kept in the form string
+    FORM_LENGTH = 5
+
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Foreign keys
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    season_id = db.Column(db.Integer, db.ForeignKey('seasons.id'), nullable=False)
+
+    # Counters
+    played = db.Column(db.Integer, default=0, nullable=False)
+    wins = db.Column(db.Integer, default=0, nullable=False)
+    draws = db.Column(db.Integer, default=0, nullable=False)
+    losses = db.Column(db.Integer, default=0, nullable=False)
+    points_for = db.Column(db.Integer, default=0, nullable=False)
+    points_against = db.Column(db.Integer, default=0, nullable=False)
+    form = db.Column(db.String(10), default='', nullable=False)
+
+    # Metadata
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Constraints and indexes
+    __table_args__ = (
+        db.UniqueConstraint('team_id', 'season_id', name='uq_team_season_record'),
+        db.Index('idx_team_record_season', 'season_id'),
+    )
+
+    # Relationships
+    team = db.relationship('Team', backref=db.backref('season_records', lazy='dynamic'))
+    season = db.relationship('Season', backref=db.backref('team_records', lazy='dynamic'))
+
+    def __repr__(self):
+        return f'<TeamSeasonRecord team={self.team_id} season={self.season_id}>'
+
+    def points_difference(self):
+        return self.points_for - self.points_against
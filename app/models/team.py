@@ -23,6 +23,9 @@ class Team(db.Model):
     # Season FK (relationship defined on Season model via backref='season_ref')
     season_id = db.Column(db.Integer, db.ForeignKey('seasons.id'))
 
+    # Part of every calendar feed link; rotating it revokes the links handed out
+    feed_key = db.Column(db.String(32))
+
     # Metadata
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -1,5 +1,5 @@
 # ABOUTME: Training session model for scheduling team practices and events
-# ABOUTME: Supports recurring sessions, cancellation, and links to attendance
+# ABOUTME: Supports recurring sessions, cancellation, and links to attendance with roll-call counts
 
 from datetime import datetime, date
 from flask_babel import gettext as _
@@ -31,11 +31,22 @@ class TrainingSession(db.Model):
     is_recurring = db.Column(db.Boolean, default=False)
     recurrence_day = db.Column(db.Integer)  # 0=Monday, 1=Tuesday, ..., 6=Sunday
     recurrence_end_date = db.Column(db.Date)
+    series_id = db.Column(db.String(32), index=True)  # legacy: sessions generated together as rows
+
+    # Set when this row overrides an occurrence of a RecurrenceRule
+    recurrence_rule_id = db.Column(db.Integer, db.ForeignKey('recurrence_rules.id'))
+    occurrence_date = db.Column(db.Date)  # date the rule produced, even if the session moved
 
     # Cancellation
     cancelled = db.Column(db.Boolean, default=False)
     cancellation_reason = db.Column(db.Text)
 
+    # Roll-call counters, maintained in the check-in transaction (see app.utils.attendance)
+    present_count = db.Column(db.Integer, default=0, nullable=False)
+    absent_count = db.Column(db.Integer, default=0, nullable=False)
+    late_count = db.Column(db.Integer, default=0, nullable=False)
+    excused_count = db.Column(db.Integer, default=0, nullable=False)
+
     # Notes
     notes = db.Column(db.Text)
 
@@ -49,8 +60,12 @@ class TrainingSession(db.Model):
     __table_args__ = (
         db.Index('idx_training_date_team', 'date', 'team_id'),
         db.Index('idx_training_season', 'season_id'),
+        db.Index('idx_training_rule_occurrence', 'recurrence_rule_id', 'occurrence_date', unique=True),
     )
 
+    # Stored rows; virtual occurrences of a RecurrenceRule set this to True
+    is_virtual = False
+
     # Relationships
     team = db.relationship('Team', backref=db.backref('training_sessions', lazy='dynamic'))
     coach = db.relationship('Staff', backref=db.backref('training_sessions_coached', lazy='dynamic'))
@@ -73,6 +88,15 @@ class TrainingSession(db.Model):
         """Check if the session date is in the past"""
         return self.date < date.today()
 
+    def roll_call_total(self):
+        """Number of athletes with an attendance mark for this session"""
+        return ((self.present_count or 0) + (self.absent_count or 0)
+                + (self.late_count or 0) + (self.excused_count or 0))
+
+    def turnout(self):
+        """Athletes who showed up (present or late)"""
+        return (self.present_count or 0) + (self.late_count or 0)
+
     def duration_minutes(self):
         """Calculate session duration in minutes"""
         start_dt = datetime.combine(self.date, self.start_time)
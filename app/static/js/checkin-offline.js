@@ -0,0 +1,166 @@
+// ABOUTME: Offline-capable attendance check-in: queues marks locally and syncs them in batches
+// ABOUTME: Registers the check-in service worker and flushes the queue to /attendance/api/sync
+
+(function() {
+    'use strict';
+
+    var QUEUE_KEY = 'fortidesk.checkin.queue';
+    var STATUSES = ['present', 'absent', 'excused', 'late'];
+
+    var form = document.getElementById('checkin-form');
+    if (!form) {
+        return;
+    }
+    var statusBox = document.getElementById('checkin-offline-status');
+    var syncing = false;
+
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register(form.dataset.swUrl).catch(function() {
+            // Offline mode is an enhancement; the plain form still works
+        });
+    }
+
+    function loadQueue() {
+        try {
+            return JSON.parse(localStorage.getItem(QUEUE_KEY)) || [];
+        } catch (e) {
+            return [];
+        }
+    }
+
+    function saveQueue(queue) {
+        localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+    }
+
+    function showStatus(message, level) {
+        statusBox.textContent = message;
+        statusBox.className = 'alert alert-' + level;
+    }
+
+    function refreshStatus() {
+        var pending = loadQueue().length;
+        if (!navigator.onLine) {
+            showStatus(statusBox.dataset.msgOffline + ' ' + statusBox.dataset.msgPending + ' ' + pending, 'warning');
+        } else if (pending) {
+            showStatus(statusBox.dataset.msgPending + ' ' + pending, 'info');
+        } else {
+            statusBox.className = 'alert d-none';
+        }
+    }
+
+    // Remember when each athlete was marked, so the server can resolve conflicts
+    form.addEventListener('change', function(event) {
+        var row = event.target.closest('tr[data-athlete-id]');
+        if (row) {
+            row.dataset.markedAt = new Date().toISOString();
+        }
+    });
+
+    function collectSession() {
+        var submittedAt = new Date().toISOString();
+        var marks = [];
+        form.querySelectorAll('tr[data-athlete-id]').forEach(function(row) {
+            var status = null;
+            STATUSES.forEach(function(name) {
+                var box = row.querySelector('input[name="' + name + '"]');
+                if (box && box.checked) {
+                    status = name;
+                }
+            });
+            if (status) {
+                marks.push({
+                    athlete_id: parseInt(row.dataset.athleteId, 10),
+                    status: status,
+                    marked_at: row.dataset.markedAt || submittedAt
+                });
+            }
+        });
+        // Raw choice value: a session id or an "r<rule_id>:<date>" occurrence the server materializes
+        var trainingSessionId = form.querySelector('[name="training_session_id"]').value;
+        return {
+            date: form.querySelector('[name="date"]').value,
+            session_type: form.querySelector('[name="session_type"]').value,
+            training_session_id: trainingSessionId || null,
+            notes: form.querySelector('[name="notes"]').value,
+            marks: marks
+        };
+    }
+
+    function fetchToken() {
+        return fetch(form.dataset.rosterUrl, {credentials: 'same-origin', cache: 'no-store'})
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error('roster ' + response.status);
+                }
+                return response.json();
+            })
+            .then(function(data) {
+                return data.csrf_token;
+            });
+    }
+
+    function flush() {
+        var queue = loadQueue();
+        if (syncing || !queue.length || !navigator.onLine) {
+            return Promise.resolve(false);
+        }
+        syncing = true;
+        return fetchToken()
+            .then(function(token) {
+                return fetch(form.dataset.syncUrl, {
+                    method: 'POST',
+                    credentials: 'same-origin',
+                    headers: {'Content-Type': 'application/json', 'X-CSRFToken': token},
+                    body: JSON.stringify({sessions: queue})
+                });
+            })
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error('sync ' + response.status);
+                }
+                // Only drop what was sent; marks queued meanwhile stay for the next flush
+                saveQueue(loadQueue().slice(queue.length));
+                return true;
+            })
+            .catch(function() {
+                return false;
+            })
+            .then(function(sent) {
+                syncing = false;
+                refreshStatus();
+                return sent;
+            });
+    }
+
+    form.addEventListener('submit', function(event) {
+        event.preventDefault();
+        var session = collectSession();
+        if (!session.date || !session.marks.length) {
+            return;
+        }
+        var queue = loadQueue();
+        queue.push(session);
+        saveQueue(queue);
+
+        flush().then(function(sent) {
+            if (sent) {
+                window.location.href = form.dataset.doneUrl;
+            } else {
+                form.reset();
+                refreshStatus();
+            }
+        });
+    });
+
+    window.addEventListener('online', function() {
+        flush().then(function(sent) {
+            if (sent) {
+                showStatus(statusBox.dataset.msgSynced, 'success');
+            }
+        });
+    });
+    window.addEventListener('offline', refreshStatus);
+
+    refreshStatus();
+    flush();
+})();
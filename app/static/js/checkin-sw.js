@@ -0,0 +1,77 @@
+// ABOUTME: Service worker for offline attendance check-in, served from /attendance/sw.js
+// ABOUTME: Caches the check-in page, roster API and static assets with network-first fallback
+
+var CACHE_NAME = 'fortidesk-checkin-v1';
+var PRECACHE_URLS = [
+    '/attendance/check-in',
+    '/attendance/api/roster',
+    '/static/css/style.css',
+    '/static/js/app.js',
+    '/static/js/checkin-offline.js'
+];
+
+self.addEventListener('install', function(event) {
+    event.waitUntil(
+        caches.open(CACHE_NAME).then(function(cache) {
+            // Precache what we can; a failed entry must not abort installation
+            return Promise.all(PRECACHE_URLS.map(function(url) {
+                return cache.add(new Request(url, {credentials: 'same-origin'})).catch(function() {});
+            }));
+        }).then(function() {
+            return self.skipWaiting();
+        })
+    );
+});
+
+self.addEventListener('activate', function(event) {
+    event.waitUntil(
+        caches.keys().then(function(names) {
+            return Promise.all(names.filter(function(name) {
+                return name.indexOf('fortidesk-checkin-') === 0 && name !== CACHE_NAME;
+            }).map(function(name) {
+                return caches.delete(name);
+            }));
+        }).then(function() {
+            return self.clients.claim();
+        })
+    );
+});
+
+function isCacheable(request, url) {
+    if (request.method !== 'GET') {
+        return false;
+    }
+    if (url.origin !== self.location.origin) {
+        // Bootstrap / HTMX from the CDN
+        return true;
+    }
+    return url.pathname === '/attendance/check-in' ||
+        url.pathname === '/attendance/api/roster' ||
+        url.pathname.indexOf('/static/') === 0;
+}
+
+self.addEventListener('fetch', function(event) {
+    var request = event.request;
+    var url = new URL(request.url);
+    if (!isCacheable(request, url)) {
+        return;
+    }
+
+    // Network first so coaches see fresh rosters; fall back to the cache at the pitch
+    event.respondWith(
+        fetch(request).then(function(response) {
+            // Don't cache the login page served after a session expiry redirect
+            if (response.ok && !response.redirected) {
+                var copy = response.clone();
+                caches.open(CACHE_NAME).then(function(cache) {
+                    cache.put(request, copy);
+                });
+            }
+            return response;
+        }).catch(function() {
+            return caches.match(request).then(function(cached) {
+                return cached || caches.match(request, {ignoreSearch: true});
+            });
+        })
+    );
+});
@@ -0,0 +1,129 @@
+// ABOUTME: Chunked, resumable document upload: init, numbered chunk PUTs, then finalize
+// ABOUTME: Upload ids are kept in localStorage so a reloaded page resumes where it stopped
+
+(function() {
+    'use strict';
+
+    var MAX_RETRIES = 5;
+
+    var form = document.getElementById('document-upload-form');
+    if (!form || !window.fetch || !window.Blob || !Blob.prototype.slice) {
+        return;
+    }
+    var baseUrl = form.dataset.uploadsUrl;
+    var fileInput = form.querySelector('input[type="file"]');
+    var progress = document.getElementById('upload-progress');
+    var progressBar = progress.querySelector('.progress-bar');
+    var status = document.getElementById('upload-status');
+
+    function csrfToken() {
+        var field = form.querySelector('input[name="csrf_token"]');
+        return field ? field.value : '';
+    }
+
+    function storageKey(file) {
+        return 'fortidesk-upload:' + file.name + ':' + file.size + ':' + file.lastModified;
+    }
+
+    function request(method, url, body, headers) {
+        headers = headers || {};
+        headers['X-CSRFToken'] = csrfToken();
+        return fetch(url, {method: method, credentials: 'same-origin', headers: headers, body: body})
+            .then(function(response) {
+                return response.json().catch(function() { return {}; }).then(function(data) {
+                    return {status: response.status, data: data};
+                });
+            });
+    }
+
+    function showProgress(state) {
+        var percent = Math.round(100 * state.next_chunk / state.chunk_count);
+        progress.classList.remove('d-none');
+        progressBar.style.width = percent + '%';
+        progressBar.textContent = percent + '%';
+    }
+
+    function wait(ms) {
+        return new Promise(function(resolve) { setTimeout(resolve, ms); });
+    }
+
+    function start(file) {
+        var saved = localStorage.getItem(storageKey(file));
+        var resume = saved
+            ? request('GET', baseUrl + '/' + saved).then(function(r) { return r.status === 200 ? r.data : null; })
+            : Promise.resolve(null);
+        return resume.then(function(state) {
+            if (state) {
+                return state;
+            }
+            return request('POST', baseUrl, JSON.stringify({
+                file_name: file.name, total_size: file.size, mime_type: file.type
+            }), {'Content-Type': 'application/json'}).then(function(r) {
+                if (r.status !== 201) {
+                    throw new Error(r.data.error || form.dataset.msgError);
+                }
+                localStorage.setItem(storageKey(file), r.data.upload_id);
+                return r.data;
+            });
+        });
+    }
+
+    function sendChunks(file, state, attempt) {
+        showProgress(state);
+        if (state.next_chunk >= state.chunk_count) {
+            return Promise.resolve(state);
+        }
+        var offset = state.next_chunk * state.chunk_size;
+        var chunk = file.slice(offset, offset + state.chunk_size);
+        var url = baseUrl + '/' + state.upload_id + '/chunks/' + state.next_chunk;
+        return request('PUT', url, chunk, {'Content-Type': 'application/octet-stream'})
+            .then(function(r) {
+                if (r.status === 200 || r.status === 409) {
+                    return sendChunks(file, r.data, 0);
+                }
+                throw new Error(r.data.error || form.dataset.msgError);
+            })
+            .catch(function(error) {
+                if (attempt >= MAX_RETRIES) {
+                    throw error;
+                }
+                // Network drop: ask the server where to resume, then retry
+                return wait(1000 * Math.pow(2, attempt))
+                    .then(function() { return request('GET', baseUrl + '/' + state.upload_id); })
+                    .then(function(r) { return sendChunks(file, r.status === 200 ? r.data : state, attempt + 1); });
+            });
+    }
+
+    function finalize(file, state) {
+        var data = new FormData(form);
+        data.delete(fileInput.name);
+        return request('POST', baseUrl + '/' + state.upload_id + '/finalize', data).then(function(r) {
+            if (r.status !== 201) {
+                throw new Error(r.data.error || form.dataset.msgError);
+            }
+            localStorage.removeItem(storageKey(file));
+            window.location = r.data.url;
+        });
+    }
+
+    form.addEventListener('submit', function(event) {
+        var file = fileInput.files[0];
+        if (!file) {
+            return;
+        }
+        event.preventDefault();
+        var submit = form.querySelector('[type="submit"]');
+        submit.disabled = true;
+        status.textContent = form.dataset.msgUploading;
+        status.className = 'text-muted';
+
+        start(file)
+            .then(function(state) { return sendChunks(file, state, 0); })
+            .then(function(state) { return finalize(file, state); })
+            .catch(function(error) {
+                submit.disabled = false;
+                status.textContent = error.message + ' ' + form.dataset.msgResume;
+                status.className = 'text-danger';
+            });
+    });
+})();
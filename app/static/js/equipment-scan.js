@@ -0,0 +1,157 @@
+// ABOUTME: Scan-driven equipment handout/return: collects codes locally and posts them in batches
+// ABOUTME: One request per chunk of codes to /equipment/api/batch-assign or batch-return
+
+(function() {
+    'use strict';
+
+    var CHUNK_SIZE = 100;
+
+    var box = document.getElementById('scan-form');
+    if (!box) {
+        return;
+    }
+    var mode = box.dataset.mode;
+    var chunkSize = Math.min(CHUNK_SIZE, parseInt(box.dataset.maxBatch, 10) || CHUNK_SIZE);
+    var input = document.getElementById('scan-input');
+    var list = document.getElementById('scan-list');
+    var count = document.getElementById('scan-count');
+    var result = document.getElementById('scan-result');
+    var codes = [];
+
+    function csrfToken() {
+        var headers = JSON.parse(document.body.getAttribute('hx-headers') || '{}');
+        return headers['X-CSRFToken'] || '';
+    }
+
+    function render() {
+        list.innerHTML = '';
+        codes.forEach(function(code) {
+            var item = document.createElement('li');
+            item.className = 'list-inline-item badge bg-secondary mb-1';
+            item.textContent = code;
+            list.appendChild(item);
+        });
+        count.textContent = codes.length;
+    }
+
+    function showResult(message, level) {
+        result.textContent = message;
+        result.className = 'alert alert-' + level;
+    }
+
+    input.addEventListener('keydown', function(event) {
+        if (event.key !== 'Enter') {
+            return;
+        }
+        event.preventDefault();
+        var code = input.value.trim();
+        if (code && codes.indexOf(code) === -1) {
+            codes.push(code);
+            render();
+        }
+        input.value = '';
+    });
+
+    document.getElementById('scan-clear').addEventListener('click', function() {
+        codes = [];
+        render();
+        input.focus();
+    });
+
+    // Athlete picker: filtered server-side by team and name
+    var athleteSelect = document.getElementById('scan-athlete');
+    var athleteSearch = document.getElementById('scan-athlete-search');
+    var teamSelect = document.getElementById('scan-team');
+    var searchTimer = null;
+
+    function loadAthletes() {
+        var params = new URLSearchParams({q: athleteSearch.value, team_id: teamSelect.value});
+        fetch(box.dataset.athletesUrl + '?' + params, {credentials: 'same-origin'})
+            .then(function(response) { return response.json(); })
+            .then(function(data) {
+                athleteSelect.innerHTML = '';
+                (data.athletes || []).forEach(function(athlete) {
+                    var option = document.createElement('option');
+                    option.value = athlete.id;
+                    option.textContent = athlete.name;
+                    athleteSelect.appendChild(option);
+                });
+            });
+    }
+
+    if (athleteSelect) {
+        teamSelect.addEventListener('change', loadAthletes);
+        athleteSearch.addEventListener('input', function() {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(loadAthletes, 250);
+        });
+        loadAthletes();
+    }
+
+    function payloadFor(chunk) {
+        var payload = {codes: chunk};
+        var day = document.getElementById('scan-date').value;
+        if (mode === 'return') {
+            payload.return_date = day;
+            payload.condition = document.getElementById('scan-condition').value;
+        } else {
+            payload.athlete_id = parseInt(athleteSelect.value, 10);
+            payload.assigned_date = day;
+            payload.expected_return_date = document.getElementById('scan-expected').value;
+        }
+        return payload;
+    }
+
+    function post(chunk) {
+        return fetch(box.dataset.submitUrl, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+            body: JSON.stringify(payloadFor(chunk))
+        }).then(function(response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        });
+    }
+
+    document.getElementById('scan-submit').addEventListener('click', function() {
+        if (!codes.length) {
+            return;
+        }
+        if (mode === 'assign' && !athleteSelect.value) {
+            showResult(box.dataset.msgNoAthlete, 'warning');
+            return;
+        }
+        var chunks = [];
+        for (var i = 0; i < codes.length; i += chunkSize) {
+            chunks.push(codes.slice(i, i + chunkSize));
+        }
+        var done = [];
+        var failed = [];
+        chunks.reduce(function(previous, chunk) {
+            return previous.then(function() {
+                return post(chunk).then(function(data) {
+                    done = done.concat(data.assigned || data.returned || []);
+                    failed = failed.concat(data.errors || []);
+                });
+            });
+        }, Promise.resolve()).then(function() {
+            // Keep only the codes that still need attention
+            codes = failed.map(function(error) { return error.code; });
+            render();
+            var message = box.dataset.msgDone + ' ' + done.length;
+            if (failed.length) {
+                message += '. ' + box.dataset.msgFailed + ' ' + failed.map(function(error) {
+                    return error.code + ' (' + error.error + ')';
+                }).join(', ');
+            }
+            showResult(message, failed.length ? 'warning' : 'success');
+        }).catch(function() {
+            codes = codes.filter(function(code) { return done.indexOf(code) === -1; });
+            render();
+            showResult(box.dataset.msgError, 'danger');
+        });
+    });
+})();
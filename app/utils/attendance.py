@@ -0,0 +1,360 @@
+# ABOUTME: Attendance helpers: batched check-in marks (last-writer-wins) and the season matrix
+# ABOUTME: AttendanceMatrix packs athletes x sessions status codes into one bytearray
+
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import case, func, update
+
+from app import db
+from app.models import Attendance, Athlete, TrainingSession
+
+ATTENDANCE_STATUSES = ('present', 'absent', 'excused', 'late')
+SESSION_TYPES = ('training', 'match', 'event')
+
+
+def parse_marked_at(value):
+    """Parse an ISO-8601 client timestamp into a naive UTC datetime.
+
+    Timestamps in the future (device clock ahead of the server) are clamped
+    to now, so a skewed phone cannot win every conflict forever.
+    Returns None if the value is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(parsed, datetime.utcnow())
+
+
+def _mark_key(athlete_id, mark_date, session_type, training_session_id):
+    return (athlete_id, mark_date, session_type, training_session_id)
+
+
+def _row_clock(record):
+    """Timestamp a stored record competes with in last-writer-wins."""
+    return record.marked_at or record.updated_at or record.created_at
+
+
+def apply_attendance_marks(marks, user_id):
+    """Create or update attendance records for a batch of marks.
+
+    Each mark is a dict with ``athlete_id``, ``date``, ``session_type``,
+    ``status`` and optional ``training_session_id``, ``notes`` and
+    ``marked_at``. A mark targets the record identified by
+    (athlete, date, session type, training session); when one already exists
+    the mark only wins if it is newer than the stored ``marked_at``.
+
+    All existing records, athletes and training sessions are fetched with one
+    query each and changes are added to the current session, together with
+    the roll-call counter updates of the linked training sessions; the caller
+    commits.
+
+    Returns a list of outcome dicts (``created``, ``updated``, ``stale`` or
+    ``rejected``), one per input mark and in the same order.
+    """
+    now = datetime.utcnow()
+    outcomes = [None] * len(marks)
+
+    athlete_ids = {m['athlete_id'] for m in marks}
+    dates = {m['date'] for m in marks}
+    session_ids = {m['training_session_id'] for m in marks if m.get('training_session_id')}
+
+    valid_athletes = set()
+    valid_sessions = set()
+    existing = {}
+    deltas = defaultdict(lambda: defaultdict(int))
+    if session_ids:
+        valid_sessions = {
+            row.id for row in db.session.query(TrainingSession.id).filter(
+                TrainingSession.id.in_(session_ids),
+                TrainingSession.is_active.is_(True)
+            )
+        }
+    if athlete_ids:
+        valid_athletes = {
+            row.id for row in db.session.query(Athlete.id).filter(
+                Athlete.id.in_(athlete_ids),
+                Athlete.is_active.is_(True)
+            )
+        }
+        records = Attendance.query.filter(
+            Attendance.athlete_id.in_(athlete_ids),
+            Attendance.date.in_(dates),
+            Attendance.is_active.is_(True)
+        ).order_by(Attendance.id).all()
+        for record in records:
+            key = _mark_key(record.athlete_id, record.date,
+                            record.session_type, record.training_session_id)
+            existing[key] = record
+
+    # Apply oldest first so later marks for the same key win within a batch
+    order = sorted(range(len(marks)), key=lambda i: marks[i].get('marked_at') or now)
+    for i in order:
+        mark = marks[i]
+        athlete_id = mark['athlete_id']
+        outcome = {'athlete_id': athlete_id, 'status': mark['status']}
+        outcomes[i] = outcome
+
+        if athlete_id not in valid_athletes:
+            outcome.update(outcome='rejected', error='unknown athlete')
+            continue
+        if mark['status'] not in ATTENDANCE_STATUSES:
+            outcome.update(outcome='rejected', error='invalid status')
+            continue
+        if mark['session_type'] not in SESSION_TYPES:
+            outcome.update(outcome='rejected', error='invalid session type')
+            continue
+        training_session_id = mark.get('training_session_id')
+        if training_session_id and training_session_id not in valid_sessions:
+            outcome.update(outcome='rejected', error='unknown training session')
+            continue
+
+        marked_at = mark.get('marked_at') or now
+        key = _mark_key(athlete_id, mark['date'], mark['session_type'], training_session_id)
+        record = existing.get(key)
+
+        if record is None:
+            record = Attendance(
+                athlete_id=athlete_id,
+                date=mark['date'],
+                session_type=mark['session_type'],
+                training_session_id=training_session_id,
+                status=mark['status'],
+                notes=mark.get('notes'),
+                marked_at=marked_at,
+                created_by=user_id
+            )
+            db.session.add(record)
+            existing[key] = record
+            outcome['outcome'] = 'created'
+            roll_call_delta(deltas, training_session_id, None, mark['status'])
+        elif _row_clock(record) is None or marked_at > _row_clock(record):
+            roll_call_delta(deltas, training_session_id, record.status, mark['status'])
+            record.status = mark['status']
+            if mark.get('notes') is not None:
+                record.notes = mark['notes']
+            record.marked_at = marked_at
+            record.updated_at = now
+            outcome['outcome'] = 'updated'
+        else:
+            outcome['outcome'] = 'stale'
+
+    apply_roll_call_deltas(deltas)
+    return outcomes
+
+
+def roll_call_delta(deltas, training_session_id, old_status, new_status):
+    """Record a status change of one attendance record in a deltas mapping.
+
+    ``old_status`` is None for a new record and ``new_status`` None for a
+    removed one. Records not linked to a training session are ignored.
+    """
+    if not training_session_id or old_status == new_status:
+        return
+    if old_status in ATTENDANCE_STATUSES:
+        deltas[training_session_id][old_status] -= 1
+    if new_status in ATTENDANCE_STATUSES:
+        deltas[training_session_id][new_status] += 1
+
+
+def apply_roll_call_deltas(deltas):
+    """Add counter deltas to TrainingSession with in-place SQL increments.
+
+    ``col = col + n`` keeps concurrent check-ins for the same session from
+    overwriting each other's counts. Only the sessions' calendar months are
+    marked as changed.
+    """
+    if not deltas:
+        return
+    months = {(day.year, day.month) for day, in db.session.query(TrainingSession.date).filter(
+        TrainingSession.id.in_(list(deltas))
+    )}
+    for training_session_id, changes in deltas.items():
+        values = {
+            f'{status}_count': getattr(TrainingSession, f'{status}_count') + delta
+            for status, delta in changes.items() if delta
+        }
+        if values:
+            db.session.execute(
+                update(TrainingSession)
+                .where(TrainingSession.id == training_session_id)
+                .values(**values)
+                .execution_options(synchronize_session=False, calendar_months=months)
+            )
+
+
+def adjust_roll_call(training_session_id, old_status, new_status):
+    """Update a session's counters for one record edit or deletion."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    roll_call_delta(deltas, training_session_id, old_status, new_status)
+    apply_roll_call_deltas(deltas)
+
+
+def rebuild_roll_call_counts():
+    """Recompute every session's counters from attendance with one grouped query.
+
+    Returns the number of training sessions updated.
+    """
+    counts = db.session.query(
+        Attendance.training_session_id,
+        *[func.sum(case((Attendance.status == status, 1), else_=0)) for status in ATTENDANCE_STATUSES]
+    ).filter(
+        Attendance.training_session_id.isnot(None),
+        Attendance.is_active.is_(True)
+    ).group_by(Attendance.training_session_id).all()
+
+    db.session.execute(
+        update(TrainingSession).values(
+            present_count=0, absent_count=0, late_count=0, excused_count=0
+        ).execution_options(synchronize_session=False)
+    )
+    if counts:
+        db.session.execute(update(TrainingSession), [
+            {'id': row[0], **{f'{status}_count': int(row[i + 1] or 0)
+                              for i, status in enumerate(ATTENDANCE_STATUSES)}}
+            for row in counts
+        ])
+    db.session.commit()
+    return len(counts)
+
+
+# One byte per cell: '.' = no record, otherwise the status initial
+STATUS_CODES = {'present': b'P', 'late': b'L', 'excused': b'E', 'absent': b'A'}
+EMPTY_CODE = b'.'
+
+# Present and late count as attended for percentages and streaks
+_ATTENDED = bytes.maketrans(b'PLEA', b'1100')
+
+
+class AttendanceMatrix:
+    """Athletes x sessions grid of status codes backed by a single bytearray.
+
+    Row ``r`` occupies ``grid[r * width:(r + 1) * width]``; column ``c`` is the
+    strided slice ``grid[c::width]``. Aggregates use bytes.count / translate /
+    split over whole rows and columns, so the per-cell work stays in C.
+    """
+
+    __slots__ = ('athletes', 'sessions', 'width', 'grid')
+
+    def __init__(self, athletes, sessions):
+        self.athletes = athletes  # [(athlete_id, name)]
+        self.sessions = sessions  # [(date, session_type, training_session_id)]
+        self.width = len(sessions)
+        self.grid = bytearray(EMPTY_CODE * (len(athletes) * self.width))
+
+    @classmethod
+    def for_team(cls, team_id, start, end, session_type=None):
+        """Build the matrix for a team's active roster over a date range."""
+        roster = db.session.query(
+            Athlete.id, Athlete.first_name, Athlete.last_name
+        ).filter(
+            Athlete.team_id == team_id,
+            Athlete.is_active.is_(True)
+        ).order_by(Athlete.last_name, Athlete.first_name).all()
+
+        query = db.session.query(
+            Attendance.athlete_id, Attendance.date, Attendance.session_type,
+            Attendance.training_session_id, Attendance.status
+        ).join(Athlete, Attendance.athlete_id == Athlete.id).filter(
+            Athlete.team_id == team_id,
+            Attendance.is_active.is_(True),
+            Attendance.date >= start,
+            Attendance.date <= end
+        )
+        if session_type:
+            query = query.filter(Attendance.session_type == session_type)
+        rows = query.all()
+
+        session_keys = sorted(
+            {(r.date, r.session_type, r.training_session_id) for r in rows},
+            key=lambda k: (k[0], k[1], k[2] or 0)
+        )
+        matrix = cls([(a.id, f'{a.first_name} {a.last_name}') for a in roster], session_keys)
+
+        row_index = {a.id: i for i, a in enumerate(roster)}
+        col_index = {key: i for i, key in enumerate(session_keys)}
+        width = matrix.width
+        grid = matrix.grid
+        for r in rows:
+            i = row_index.get(r.athlete_id)
+            code = STATUS_CODES.get(r.status)
+            if i is None or code is None:
+                continue
+            grid[i * width + col_index[(r.date, r.session_type, r.training_session_id)]] = code[0]
+        return matrix
+
+    def row(self, i):
+        return bytes(self.grid[i * self.width:(i + 1) * self.width])
+
+    def column(self, j):
+        return bytes(self.grid[j::self.width])
+
+    def row_strings(self):
+        return [self.row(i).decode('ascii') for i in range(len(self.athletes))]
+
+    @staticmethod
+    def _presence_pct(cells):
+        recorded = len(cells) - cells.count(EMPTY_CODE)
+        if not recorded:
+            return None
+        attended = cells.count(b'P') + cells.count(b'L')
+        return round(attended / recorded * 100, 1)
+
+    def row_stats(self):
+        """Per athlete: presence %, longest and current attended streak, trend.
+
+        Sessions without a record are skipped rather than breaking a streak.
+        Trend is the presence % of the later half of recorded sessions minus
+        the earlier half, in percentage points (None with fewer than 4).
+        """
+        stats = []
+        for i in range(len(self.athletes)):
+            cells = self.row(i)
+            marks = cells.replace(EMPTY_CODE, b'').translate(_ATTENDED)
+            runs = marks.split(b'0')
+            trend = None
+            if len(marks) >= 4:
+                half = len(marks) // 2
+                earlier, later = marks[:half], marks[half:]
+                trend = round(
+                    (later.count(b'1') / len(later) - earlier.count(b'1') / len(earlier)) * 100, 1
+                )
+            stats.append({
+                'presence_pct': self._presence_pct(cells),
+                'longest_streak': max(len(run) for run in runs),
+                'current_streak': len(runs[-1]),
+                'trend': trend,
+            })
+        return stats
+
+    def column_stats(self):
+        """Per session: counts by status and presence %."""
+        stats = []
+        for j in range(self.width):
+            cells = self.column(j)
+            stats.append({
+                'present': cells.count(b'P'),
+                'late': cells.count(b'L'),
+                'excused': cells.count(b'E'),
+                'absent': cells.count(b'A'),
+                'presence_pct': self._presence_pct(cells),
+            })
+        return stats
+
+    def to_compact(self):
+        """Compact JSON-ready structure: parallel arrays instead of objects per cell."""
+        return {
+            'codes': {code.decode(): status for status, code in STATUS_CODES.items()},
+            'athletes': [[athlete_id, name] for athlete_id, name in self.athletes],
+            'sessions': [[d.isoformat(), st, ts_id] for d, st, ts_id in self.sessions],
+            'grid': self.row_strings(),
+            'rows': [[s['presence_pct'], s['longest_streak'], s['current_streak'], s['trend']]
+                     for s in self.row_stats()],
+            'columns': [[s['present'], s['late'], s['excused'], s['absent'], s['presence_pct']]
+                        for s in self.column_stats()],
+        }
@@ -0,0 +1,50 @@
+# ABOUTME: Small thread-safe in-process TTL cache for computed page data
+# ABOUTME: Used for calendar month events; each worker process keeps its own copy
+
+import threading
+import time
+
+
+class TTLCache:
+    """Dict-like cache whose entries expire after a per-entry time-to-live.
+
+    When full, the entry closest to expiry is evicted. A ttl of 0 (or
+    less) disables storing, which turns the cache into a pass-through.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.max_entries:
+                del self._data[min(self._data, key=lambda k: self._data[k][0])]
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key satisfies predicate."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
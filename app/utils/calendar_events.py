@@ -0,0 +1,340 @@
+# ABOUTME: Builds calendar month events from sessions, rule occurrences and matches, with caching
+# ABOUTME: Cached months are checked against per-month DB generations bumped on write, so every worker sees every write
+
+import threading
+from calendar import monthrange
+from datetime import date, datetime
+
+from flask import current_app, url_for
+from flask_babel import force_locale, gettext as _
+from sqlalchemy import event, func, inspect, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import CalendarGeneration, Match, RecurrenceException, RecurrenceRule, Team, TrainingSession
+from app.utils.cache import TTLCache
+from app.utils.recurrence import expand_occurrences
+from app.utils.tasks import run_in_background
+
+month_cache = TTLCache()
+# Keys being warmed by background threads
+_prefetching = set()
+_prefetching_lock = threading.Lock()
+
+_ID = 987654321
+_DAY = '1999-12-31'
+
+
+def event_url_templates():
+    """Format strings for event links, so url_for runs once per request, not per event."""
+    return {
+        'training': url_for('training.view', id=_ID).replace(str(_ID), '{id}'),
+        'occurrence': url_for('training.occurrence', rule_id=_ID, occurrence_date=_DAY)
+        .replace(str(_ID), '{rule_id}').replace(_DAY, '{date}'),
+        'match': url_for('matches.view', id=_ID).replace(str(_ID), '{id}'),
+    }
+
+
+def range_rows(start, end, team_id):
+    """Sessions, occurrences and matches dated within [start, end].
+
+    Sessions and matches are read as column projections joined to the team
+    name, so no model instances or lazy loads are involved.
+    """
+    ts_query = db.session.query(
+        TrainingSession.id, TrainingSession.title, TrainingSession.date, TrainingSession.start_time,
+        TrainingSession.end_time, TrainingSession.location, TrainingSession.team_id,
+        TrainingSession.cancelled, TrainingSession.present_count, TrainingSession.late_count,
+        TrainingSession.absent_count, TrainingSession.excused_count, TrainingSession.cancellation_reason,
+        TrainingSession.updated_at, Team.name.label('team_name')
+    ).outerjoin(Team, Team.id == TrainingSession.team_id).filter(
+        TrainingSession.date >= start,
+        TrainingSession.date <= end,
+        TrainingSession.is_active.is_(True)
+    )
+    m_query = db.session.query(
+        Match.id, Match.opponent, Match.date, Match.kick_off_time, Match.location, Match.team_id,
+        Match.status, Match.is_home, Match.updated_at, Team.name.label('team_name')
+    ).outerjoin(Team, Team.id == Match.team_id).filter(
+        Match.date >= start,
+        Match.date <= end,
+        Match.is_active.is_(True)
+    )
+    rule_filters = []
+    if team_id:
+        ts_query = ts_query.filter(TrainingSession.team_id == team_id)
+        m_query = m_query.filter(Match.team_id == team_id)
+        rule_filters.append(RecurrenceRule.team_id == team_id)
+    occurrences = expand_occurrences(start, end, *rule_filters, include_cancelled=True)
+    return ts_query.all(), occurrences, m_query.all()
+
+
+def build_month_events(year, month, team_id, urls):
+    """Events of one month as ``{day_number: [event, ...]}`` sorted by time."""
+    first_date = date(year, month, 1)
+    last_date = date(year, month, monthrange(year, month)[1])
+    sessions, occurrences, matches = range_rows(first_date, last_date, team_id)
+
+    events = {}
+    for ts in sessions:
+        turnout = (ts.present_count or 0) + (ts.late_count or 0)
+        roll_call = turnout + (ts.absent_count or 0) + (ts.excused_count or 0)
+        events.setdefault(ts.date.day, []).append({
+            'type': 'training',
+            'title': ts.title,
+            'time': ts.start_time.strftime('%H:%M') if ts.start_time else '',
+            'url': urls['training'].format(id=ts.id),
+            'cancelled': bool(ts.cancelled),
+            'team': ts.team_name or '',
+            'turnout': turnout if roll_call else None,
+            'roll_call': roll_call
+        })
+    for o in occurrences:
+        events.setdefault(o.date.day, []).append({
+            'type': 'training',
+            'title': o.title,
+            'time': o.start_time.strftime('%H:%M'),
+            'url': urls['occurrence'].format(rule_id=o.recurrence_rule_id, date=o.occurrence_date.isoformat()),
+            'cancelled': o.cancelled,
+            'team': o.team.name if o.team else '',
+            'turnout': None,
+            'roll_call': 0
+        })
+    for m in matches:
+        events.setdefault(m.date.day, []).append({
+            'type': 'match',
+            'title': _('vs %(opponent)s', opponent=m.opponent),
+            'time': m.kick_off_time.strftime('%H:%M') if m.kick_off_time else '',
+            'url': urls['match'].format(id=m.id),
+            'cancelled': m.status == 'cancelled',
+            'team': m.team_name or '',
+            'is_home': m.is_home
+        })
+    for day_events in events.values():
+        day_events.sort(key=lambda e: e['time'])
+    return events
+
+
+def _iso(day, at):
+    return datetime.combine(day, at).isoformat(timespec='minutes') if at else day.isoformat()
+
+
+def build_range_events(start, end, team_id, urls):
+    """Compact event records for [start, end], ordered by start."""
+    sessions, occurrences, matches = range_rows(start, end, team_id)
+    records = []
+    for ts in sessions:
+        records.append({
+            'id': f'ts-{ts.id}',
+            'type': 'training',
+            'title': ts.title,
+            'start': _iso(ts.date, ts.start_time),
+            'end': _iso(ts.date, ts.end_time),
+            'location': ts.location,
+            'team_id': ts.team_id,
+            'team': ts.team_name,
+            'cancelled': bool(ts.cancelled),
+            'url': urls['training'].format(id=ts.id),
+        })
+    for o in occurrences:
+        records.append({
+            'id': f'r{o.recurrence_rule_id}-{o.occurrence_date.isoformat()}',
+            'type': 'training',
+            'title': o.title,
+            'start': _iso(o.date, o.start_time),
+            'end': _iso(o.date, o.end_time),
+            'location': o.location,
+            'team_id': o.team_id,
+            'team': o.team.name if o.team else None,
+            'cancelled': o.cancelled,
+            'url': urls['occurrence'].format(rule_id=o.recurrence_rule_id, date=o.occurrence_date.isoformat()),
+        })
+    for m in matches:
+        records.append({
+            'id': f'm-{m.id}',
+            'type': 'match',
+            'title': _('vs %(opponent)s', opponent=m.opponent),
+            'start': _iso(m.date, m.kick_off_time),
+            'end': None,
+            'location': m.location,
+            'team_id': m.team_id,
+            'team': m.team_name,
+            'cancelled': m.status == 'cancelled',
+            'is_home': m.is_home,
+            'url': urls['match'].format(id=m.id),
+        })
+    records.sort(key=lambda r: r['start'])
+    return records
+
+
+def range_stamp(start, end, team_id):
+    """Cheap change marker for [start, end]: newest update time and row counts.
+
+    Counts include soft-deleted rows so that deletions and restores change the
+    stamp too. Returns ``(last_modified, fingerprint)``; last_modified may be
+    None for an empty range.
+    """
+    def stamp(model, changed_col, *criteria):
+        return db.session.query(func.max(changed_col), func.count(model.id)).filter(*criteria).one()
+
+    ts_criteria = [TrainingSession.date >= start, TrainingSession.date <= end]
+    m_criteria = [Match.date >= start, Match.date <= end]
+    rule_criteria = [RecurrenceRule.start_date <= end, RecurrenceRule.end_date >= start]
+    if team_id:
+        ts_criteria.append(TrainingSession.team_id == team_id)
+        m_criteria.append(Match.team_id == team_id)
+        rule_criteria.append(RecurrenceRule.team_id == team_id)
+    exception_criteria = [
+        RecurrenceException.rule_id.in_(db.select(RecurrenceRule.id).where(*rule_criteria)),
+        or_(RecurrenceException.occurrence_date.between(start, end),
+            RecurrenceException.new_date.between(start, end)),
+    ]
+    parts = [
+        stamp(TrainingSession, TrainingSession.updated_at, *ts_criteria),
+        stamp(Match, Match.updated_at, *m_criteria),
+        stamp(RecurrenceRule, RecurrenceRule.updated_at, *rule_criteria),
+        stamp(RecurrenceException, RecurrenceException.updated_at, *exception_criteria),
+        stamp(Team, Team.updated_at),
+    ]
+    times = [changed for changed, _count in parts if changed is not None]
+    last_modified = max(times) if times else None
+    fingerprint = '|'.join(f'{changed}:{count}' for changed, count in parts)
+    return last_modified, fingerprint
+
+
+def month_generation(year, month):
+    """(generation of every month, generation of this month) with one primary-key query."""
+    key = year * 100 + month
+    rows = dict(db.session.execute(
+        select(CalendarGeneration.month, CalendarGeneration.generation)
+        .where(CalendarGeneration.month.in_((0, key)))
+    ).all())
+    return rows.get(0, 0), rows.get(key, 0)
+
+
+def get_month_events(year, month, team_id, locale, urls):
+    """Cached build_month_events; the key includes the locale of translated titles.
+
+    Each entry remembers the month's generation and is served only while it
+    is unchanged. The cache is per process; the generations, bumped in the
+    writer's transaction, carry writes committed by other workers.
+    """
+    key = (year, month, team_id, locale)
+    generation = month_generation(year, month)
+    cached = month_cache.get(key)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    events = build_month_events(year, month, team_id, urls)
+    month_cache.set(key, (generation, events), current_app.config.get('CALENDAR_CACHE_TTL', 300))
+    return events
+
+
+def warm_months(months, team_id, locale, urls):
+    """Compute and cache the given (year, month) pairs that are not cached yet."""
+    with force_locale(locale):
+        for year, month in months:
+            key = (year, month, team_id, locale)
+            try:
+                if key not in month_cache:
+                    get_month_events(year, month, team_id, locale, urls)
+            finally:
+                with _prefetching_lock:
+                    _prefetching.discard(key)
+
+
+def prefetch_months(months, team_id, locale, urls):
+    """Warm neighbouring months in the background so prev/next hits the cache."""
+    if not current_app.config.get('CALENDAR_PREFETCH', True):
+        return None
+    missing = []
+    with _prefetching_lock:
+        for year, month in months:
+            key = (year, month, team_id, locale)
+            if key not in month_cache and key not in _prefetching:
+                _prefetching.add(key)
+                missing.append((year, month))
+    if not missing:
+        return None
+    return run_in_background(warm_months, missing, team_id, locale, urls)
+
+
+# ---- Invalidation ---------------------------------------------------------
+
+_ALL = 'all'
+
+
+def _months_of(obj):
+    """Months an object occupies before and after the pending change."""
+    state = inspect(obj)
+    history = state.attrs.date.history
+    if history.added and not history.deleted and state.has_identity:
+        # Date reassigned while expired: the old month is unknown
+        return {_ALL}
+    months = set()
+    for value in (*history.added, *history.unchanged, *history.deleted):
+        if value is not None:
+            months.add((value.year, value.month))
+    return months
+
+
+def _bump_generations(connection, months):
+    """Advance the stored generation of each month (``_ALL``: of every month) in the current transaction."""
+    table = CalendarGeneration.__table__
+    for month in months:
+        key = 0 if month == _ALL else month[0] * 100 + month[1]
+        bump = table.update().where(table.c.month == key).values(generation=table.c.generation + 1)
+        if connection.execute(bump).rowcount:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert().values(month=key, generation=1))
+        except IntegrityError:
+            # Another worker created the row first
+            connection.execute(bump)
+
+
+def _record_changes(session, months):
+    if months:
+        _bump_generations(session.connection(), months)
+        session.info.setdefault('calendar_months', set()).update(months)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_calendar_changes(session, flush_context):
+    months = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (TrainingSession, Match)):
+            months.update(_months_of(obj))
+        elif isinstance(obj, (RecurrenceRule, RecurrenceException)):
+            # A rule spans many months; rule writes are rare enough to drop everything
+            months.add(_ALL)
+    _record_changes(session, months)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_calendar_changes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in (TrainingSession, Match, RecurrenceRule, RecurrenceException):
+        return
+    # Statements that know the months they touch (check-in counters) pass them along
+    months = orm_execute_state.execution_options.get('calendar_months')
+    _record_changes(orm_execute_state.session, set(months) if months is not None else {_ALL})
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_calendar_months(session):
+    pending = session.info.pop('calendar_months', None)
+    if not pending:
+        return
+    if _ALL in pending:
+        month_cache.clear()
+    else:
+        month_cache.invalidate(lambda key: (key[0], key[1]) in pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_calendar_changes(session):
+    session.info.pop('calendar_months', None)
@@ -0,0 +1,214 @@
+# ABOUTME: Bulk document import from a ZIP archive plus a CSV manifest of owners and types
+# ABOUTME: Files are extracted and hashed in a process pool; Document rows are inserted in batches
+
+import csv
+import hashlib
+import mimetypes
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, literal, select, union_all
+
+from app import db
+from app.models import Athlete, Document, Staff
+from app.utils.ingest import ingest_upload
+from app.utils.uploads import CHUNK_SIZE, allowed_file, blob_location, delete_upload, store_blob, upload_folder
+
+REQUIRED_COLUMNS = ('file', 'fiscal_code', 'document_type')
+OPTIONAL_COLUMNS = ('expiry_date', 'title', 'notes', 'entity_type')
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+# Document rows per INSERT statement (and per commit)
+IMPORT_BATCH_SIZE = 200
+
+
+def read_manifest(text_stream):
+    """Parse a CSV manifest into ``[(line_number, row), ...]``.
+
+    Comma and semicolon separators are both accepted (spreadsheets with an
+    Italian locale export the latter). Header names are case-insensitive.
+    Raises ValueError when a required column is missing.
+    """
+    sample = text_stream.read(4096)
+    text_stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(text_stream, dialect=dialect)
+    reader.fieldnames = [(name or '').strip().lower() for name in reader.fieldnames or []]
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        raise ValueError(f'manifest is missing column(s): {", ".join(missing)}')
+    return [
+        (reader.line_num, {key: (value or '').strip() for key, value in row.items() if key})
+        for row in reader
+    ]
+
+
+def parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f'invalid date {value!r}')
+
+
+def extract_member(zip_path, member, tmp_dir, max_size):
+    """Stream one archive member to a temp file, hashing it on the way.
+
+    Runs in a pool worker: each call opens the archive itself. Returns
+    (temp_path, sha256, size); raises ValueError past ``max_size`` bytes,
+    whatever size the archive header claims.
+    """
+    digest, size = hashlib.sha256(), 0
+    fd, temp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with zipfile.ZipFile(zip_path) as archive, archive.open(member) as src, os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                size += len(chunk)
+                if size > max_size:
+                    raise ValueError('file too large')
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        delete_upload(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
+
+
+def resolve_fiscal_codes(codes):
+    """``{fiscal_code: {entity_type: id}}`` for active athletes and staff, in one query."""
+    if not codes:
+        return {}
+    owners = union_all(
+        select(literal('athlete').label('entity_type'), Athlete.id, Athlete.fiscal_code)
+        .where(Athlete.fiscal_code.in_(codes), Athlete.is_active.is_(True)),
+        select(literal('staff').label('entity_type'), Staff.id, Staff.fiscal_code)
+        .where(Staff.fiscal_code.in_(codes), Staff.is_active.is_(True)),
+    )
+    resolved = {}
+    for entity_type, entity_id, fiscal_code in db.session.execute(owners):
+        resolved.setdefault(fiscal_code.upper(), {})[entity_type] = entity_id
+    return resolved
+
+
+def _archive_members(zip_path):
+    """Member names by full path and, when unambiguous, by bare file name."""
+    with zipfile.ZipFile(zip_path) as archive:
+        names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    by_basename = {}
+    for name in names:
+        by_basename.setdefault(os.path.basename(name), []).append(name)
+    members = {base: found[0] for base, found in by_basename.items() if len(found) == 1}
+    members.update({name: name for name in names})
+    return members
+
+
+def _validate_rows(rows, members):
+    """Split manifest rows into documents to import and per-row errors."""
+    owners = resolve_fiscal_codes({row['fiscal_code'].upper() for _, row in rows if row['fiscal_code']})
+    valid, errors = [], []
+    for line, row in rows:
+        def fail(message):
+            errors.append({'row': line, 'file': row.get('file', ''), 'error': message})
+
+        member = members.get(row['file'])
+        if not row['file'] or member is None:
+            fail('file not found in archive')
+            continue
+        if not allowed_file(member):
+            fail('file type not allowed')
+            continue
+        if row['document_type'] not in Document.DOCUMENT_TYPES:
+            fail(f'unknown document type {row["document_type"]!r}')
+            continue
+        try:
+            expiry_date = parse_date(row['expiry_date']) if row.get('expiry_date') else None
+        except ValueError as e:
+            fail(str(e))
+            continue
+        matches = owners.get(row['fiscal_code'].upper(), {})
+        entity_type = row.get('entity_type', '').lower() or ('athlete' if 'athlete' in matches else 'staff')
+        if entity_type not in matches:
+            fail(f'unknown fiscal code {row["fiscal_code"]!r}')
+            continue
+        valid.append((line, member, {
+            'title': (row.get('title') or os.path.splitext(os.path.basename(member))[0])[:200],
+            'document_type': row['document_type'],
+            'file_name': os.path.basename(member)[:200],
+            'mime_type': mimetypes.guess_type(member)[0],
+            'entity_type': entity_type,
+            'entity_id': matches[entity_type],
+            # Core inserts skip the model's owner-key sync
+            'athlete_id': matches[entity_type] if entity_type == 'athlete' else None,
+            'staff_id': matches[entity_type] if entity_type == 'staff' else None,
+            'expiry_date': expiry_date,
+            'notes': row.get('notes') or None,
+        }))
+    return valid, errors
+
+
+def import_documents(zip_path, manifest, user_id, workers=None, batch_size=IMPORT_BATCH_SIZE):
+    """Create one Document per manifest row from files in a ZIP archive.
+
+    ``manifest`` is a text stream (see read_manifest). Files are extracted
+    and hashed by ``workers`` processes (IMPORT_WORKERS by default, 0 runs
+    inline) and stored in the blob store, so repeated files are kept once.
+    Returns ``(imported, errors)``: the number of documents created and a
+    list of ``{'row', 'file', 'error'}``. Commits after each batch.
+    """
+    if workers is None:
+        workers = current_app.config.get('IMPORT_WORKERS', 0)
+    try:
+        members = _archive_members(zip_path)
+    except zipfile.BadZipFile:
+        raise ValueError('not a ZIP archive')
+    valid, errors = _validate_rows(read_manifest(manifest), members)
+
+    tmp_dir = os.path.join(upload_folder(), 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    max_size = current_app.config['UPLOAD_MAX_SIZE']
+    jobs = [(zip_path, member, tmp_dir, max_size) for _, member, _ in valid]
+
+    pool = None
+    if workers > 0 and len(jobs) > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        futures = [pool.submit(extract_member, *job) for job in jobs]
+        results = (future.result for future in futures)
+    else:
+        results = (lambda job=job: extract_member(*job) for job in jobs)
+
+    imported, batch = [], []
+    try:
+        for (line, member, values), result in zip(valid, results):
+            try:
+                temp_path, sha256, size = result()
+            except (ValueError, OSError, zipfile.BadZipFile) as e:
+                errors.append({'row': line, 'file': member, 'error': str(e) or type(e).__name__})
+                continue
+            blob = store_blob(temp_path, sha256, size, values['mime_type'])
+            batch.append(dict(values, file_path=blob_location(blob.storage_key), file_size=size,
+                              blob_id=blob.id, created_by=user_id))
+            imported.append((blob, values))
+            if len(batch) >= batch_size:
+                db.session.execute(insert(Document), batch)
+                db.session.commit()
+                batch = []
+        if batch:
+            db.session.execute(insert(Document), batch)
+        db.session.commit()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    for blob, values in imported:
+        ingest_upload(blob, values['mime_type'], values['file_name'])
+    errors.sort(key=lambda error: error['row'])
+    return len(imported), errors
@@ -1,11 +1,12 @@
 # ABOUTME: Email utility functions for sending mail via Flask-Mail
-# ABOUTME: Handles individual emails, announcements (async), and expiry reminder batches
+# ABOUTME: Handles individual emails, announcements (async), and expiry/overdue reminder batches
 
 import threading
+from collections import defaultdict
 
 from flask import current_app, render_template
 from flask_mail import Message
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import contains_eager, joinedload
 from app import mail, db
 
 
@@ -127,13 +128,16 @@ def send_expiry_reminders():
 
     Sends to guardians for athlete documents, and directly to staff for staff documents.
     """
-    from app.models import Document, Athlete, Staff
+    from app.models import Document, Athlete
     from datetime import date, timedelta
 
     today = date.today()
     threshold = today + timedelta(days=30)
 
-    expiring_docs = Document.query.filter(
+    # Owners come from the same query; guardians in one more for all athletes
+    expiring_docs = Document.with_owners(Document.query).options(
+        contains_eager(Document.athlete).selectinload(Athlete.guardians)
+    ).filter(
         Document.is_active.is_(True),
         Document.expiry_date.isnot(None),
         Document.expiry_date <= threshold,
@@ -151,16 +155,14 @@ def send_expiry_reminders():
             entity_name = ''
 
             if doc.entity_type == 'athlete':
-                athlete = Athlete.query.options(
-                    joinedload(Athlete.guardians)
-                ).get(doc.entity_id)
+                athlete = doc.athlete
                 if athlete and athlete.is_active:
                     entity_name = athlete.get_full_name()
                     for guardian in athlete.guardians:
                         if guardian.email and guardian.is_active:
                             recipients.append(guardian.email)
             elif doc.entity_type == 'staff':
-                staff = Staff.query.get(doc.entity_id)
+                staff = doc.staff
                 if staff and staff.is_active and staff.email:
                     entity_name = staff.get_full_name()
                     recipients.append(staff.email)
@@ -190,3 +192,71 @@ def send_expiry_reminders():
     db.session.commit()
     current_app.logger.info(f'Sent {sent_count} expiry reminder emails')
     return sent_count
+
+
+def send_overdue_equipment_reminders(resend_after_days=7):
+    """Send one reminder per family listing every overdue item of its athletes.
+
+    Families are grouped by guardian email, so siblings' kit goes in one
+    message. Assignments reminded less than ``resend_after_days`` ago are
+    skipped. Returns ``(emails_sent, assignments_reminded)``.
+    """
+    from app.models import Athlete, EquipmentAssignment
+    from app.utils.equipment import overdue_assignments
+    from datetime import date, datetime, timedelta
+    from sqlalchemy import or_, update
+
+    now = datetime.utcnow()
+    overdue = overdue_assignments(date.today()).filter(or_(
+        EquipmentAssignment.overdue_reminder_sent_at.is_(None),
+        EquipmentAssignment.overdue_reminder_sent_at < now - timedelta(days=resend_after_days)
+    )).options(
+        joinedload(EquipmentAssignment.equipment),
+        joinedload(EquipmentAssignment.athlete).selectinload(Athlete.guardians)
+    ).all()
+
+    families = defaultdict(list)
+    names = {}
+    for assignment in overdue:
+        for guardian in assignment.athlete.guardians:
+            if guardian.email and guardian.is_active:
+                email = guardian.email.strip().lower()
+                names.setdefault(email, guardian.get_full_name())
+                families[email].append(assignment)
+
+    if not families:
+        current_app.logger.info('No overdue equipment to send reminders for')
+        return 0, 0
+
+    sent_count, reminded = 0, set()
+    with mail.connect() as conn:
+        for email, assignments in families.items():
+            html_body = render_template('email/overdue_equipment.html',
+                                        guardian_name=names[email],
+                                        assignments=assignments)
+            msg = Message(
+                subject='Equipment Return Reminder',
+                recipients=[email],
+                html=html_body,
+                body='',
+                sender=current_app.config.get('MAIL_DEFAULT_SENDER')
+            )
+            try:
+                conn.send(msg)
+                sent_count += 1
+                reminded.update(a.id for a in assignments)
+            except Exception as e:
+                current_app.logger.error(f'Failed to send overdue reminder to {email}: {e}')
+
+    if reminded:
+        # Bookkeeping only: the version counter is left alone so that open
+        # return forms are not invalidated by the sweep
+        db.session.execute(
+            update(EquipmentAssignment)
+            .where(EquipmentAssignment.id.in_(reminded))
+            .values(overdue_reminder_sent_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    current_app.logger.info(f'Sent {sent_count} overdue equipment reminder emails')
+    return sent_count, len(reminded)
@@ -0,0 +1,230 @@
+# ABOUTME: Batch equipment handout/return, inventory rollups and the maintenance scheduler
+# ABOUTME: Status changes are conditional UPDATEs; a lost race raises StaleDataError
+
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import db
+from app.models import Equipment, EquipmentAssignment
+
+# Largest number of codes accepted in one batch request
+MAX_BATCH_CODES = 250
+
+EQUIPMENT_CONDITIONS = ('new', 'good', 'fair', 'poor', 'damaged')
+
+# Inventory rollup dimensions, in drill-down order
+ROLLUP_DIMENSIONS = ('category', 'size', 'condition', 'status', 'location')
+
+# Items moved to maintenance per UPDATE statement
+MAINTENANCE_BATCH_SIZE = 500
+
+
+def claim_equipment(ids, from_status, to_status, **values):
+    """Move equipment from one status to another with a conditional UPDATE.
+
+    The statement only matches rows still in ``from_status`` and bumps their
+    version, so concurrent handouts never both win. Raises StaleDataError
+    when any row was changed by someone else; the caller rolls back.
+    """
+    ids = list(ids)
+    result = db.session.execute(
+        update(Equipment)
+        .where(Equipment.id.in_(ids), Equipment.status == from_status, Equipment.is_active.is_(True))
+        .values(status=to_status, version_id=Equipment.version_id + 1, updated_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(ids):
+        raise StaleDataError(f'{len(ids) - result.rowcount} equipment item(s) no longer {from_status}')
+
+
+def normalize_codes(codes):
+    """Strip blanks and duplicates from scanned codes, keeping scan order."""
+    return list(dict.fromkeys(code for code in (str(c).strip() for c in codes) if code))
+
+
+def batch_assign(codes, athlete_id, user_id, assigned_date, expected_return_date=None, notes=None):
+    """Assign every available item among ``codes`` to one athlete.
+
+    Returns ``(assigned_codes, errors)`` where errors is a list of
+    ``{'code', 'error'}`` for unknown or unavailable items. Raises
+    StaleDataError when another user took an item meanwhile. The caller commits.
+    """
+    items = {
+        e.code: e for e in db.session.query(
+            Equipment.id, Equipment.code, Equipment.status, Equipment.condition
+        ).filter(Equipment.code.in_(codes), Equipment.is_active.is_(True))
+    }
+    errors, available = [], []
+    for code in codes:
+        item = items.get(code)
+        if item is None:
+            errors.append({'code': code, 'error': 'unknown code'})
+        elif item.status != 'available':
+            errors.append({'code': code, 'error': f'not available ({item.status})'})
+        else:
+            available.append(item)
+    if not available:
+        return [], errors
+
+    claim_equipment([item.id for item in available], 'available', 'assigned')
+    db.session.execute(insert(EquipmentAssignment), [
+        {
+            'equipment_id': item.id,
+            'athlete_id': athlete_id,
+            'assigned_by': user_id,
+            'assigned_date': assigned_date,
+            'expected_return_date': expected_return_date,
+            'condition_at_assignment': item.condition,
+            'assignment_notes': notes,
+        }
+        for item in available
+    ])
+    return [item.code for item in available], errors
+
+
+def batch_return(codes, user_id, return_date, condition=None, notes=None):
+    """Close the open assignment of every item among ``codes``.
+
+    ``condition`` sets the condition of all returned items; by default each
+    keeps its current condition. Returns ``(returned_codes, errors)``; raises
+    StaleDataError when another user returned an item meanwhile. The caller
+    commits.
+    """
+    open_assignments = {
+        row.code: row for row in db.session.query(
+            EquipmentAssignment.id, EquipmentAssignment.equipment_id, Equipment.code
+        ).join(Equipment, Equipment.id == EquipmentAssignment.equipment_id).filter(
+            Equipment.code.in_(codes),
+            EquipmentAssignment.is_returned.is_(False),
+            EquipmentAssignment.is_active.is_(True)
+        )
+    }
+    errors, returning = [], []
+    for code in codes:
+        row = open_assignments.get(code)
+        if row is None:
+            errors.append({'code': code, 'error': 'not assigned'})
+        else:
+            returning.append(row)
+    if not returning:
+        return [], errors
+
+    # The assignment rows are closed first so the default condition at
+    # return is read from the equipment before it is overwritten
+    current_condition = select(Equipment.condition).where(
+        Equipment.id == EquipmentAssignment.equipment_id
+    ).scalar_subquery()
+    result = db.session.execute(
+        update(EquipmentAssignment)
+        .where(EquipmentAssignment.id.in_([row.id for row in returning]),
+               EquipmentAssignment.is_returned.is_(False))
+        .values(
+            is_returned=True,
+            actual_return_date=return_date,
+            returned_by=user_id,
+            condition_at_return=func.coalesce(condition, current_condition),
+            return_notes=notes,
+            version_id=EquipmentAssignment.version_id + 1,
+            updated_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(returning):
+        raise StaleDataError(f'{len(returning) - result.rowcount} assignment(s) already returned')
+    values = {'condition': condition} if condition else {}
+    claim_equipment([row.equipment_id for row in returning], 'assigned', 'available', **values)
+    return [row.code for row in returning], errors
+
+
+def filter_rollup(query, filters):
+    """Restrict an Equipment query to rollup dimension values (``None`` = unset)."""
+    for dim, value in filters.items():
+        column = getattr(Equipment, dim)
+        query = query.filter(column.is_(None) if value is None else column == value)
+    return query
+
+
+def inventory_rollup(group_by, filters=None):
+    """Item counts and quantity sums grouped by one or more rollup dimensions.
+
+    ``filters`` maps dimensions to values (``None`` matches an empty
+    value). Returns rows with the grouped columns plus ``items`` and
+    ``quantity``, largest quantity first.
+    """
+    columns = [getattr(Equipment, dim) for dim in group_by]
+    query = db.session.query(
+        *columns,
+        func.count(Equipment.id).label('items'),
+        func.sum(func.coalesce(Equipment.quantity, 1)).label('quantity')
+    ).filter(Equipment.is_active.is_(True))
+    query = filter_rollup(query, filters or {})
+    return query.group_by(*columns).order_by(func.sum(func.coalesce(Equipment.quantity, 1)).desc(), *columns).all()
+
+
+def maintenance_due(until, start=None):
+    """Active items whose next maintenance falls on or before ``until``.
+
+    A range over idx_equipment_next_maintenance; ``start`` bounds the
+    window from below.
+    """
+    query = Equipment.query.filter(
+        Equipment.next_maintenance_date <= until,
+        Equipment.is_active.is_(True)
+    )
+    if start is not None:
+        query = query.filter(Equipment.next_maintenance_date >= start)
+    return query.order_by(Equipment.next_maintenance_date, Equipment.id)
+
+
+def schedule_maintenance(until, start=None, batch_size=MAINTENANCE_BATCH_SIZE):
+    """Move available items due for maintenance to the ``maintenance`` status.
+
+    Due items are read in id batches through the maintenance index and
+    moved with one conditional UPDATE per batch; items that are assigned
+    or changed meanwhile are left alone and picked up on a later run.
+    Moved items are next due EQUIPMENT_MAINTENANCE_INTERVAL_DAYS after
+    their due date (or today, if overdue), so they are not picked again
+    once back in service. Returns the number of items moved. Commits after
+    each batch.
+    """
+    interval = timedelta(days=current_app.config.get('EQUIPMENT_MAINTENANCE_INTERVAL_DAYS', 180))
+    today = date.today()
+    moved, last_id = 0, 0
+    while True:
+        query = db.session.query(Equipment.id, Equipment.next_maintenance_date).filter(
+            Equipment.next_maintenance_date <= until,
+            Equipment.is_active.is_(True),
+            Equipment.status == 'available',
+            Equipment.id > last_id
+        )
+        if start is not None:
+            query = query.filter(Equipment.next_maintenance_date >= start)
+        rows = query.order_by(Equipment.id).limit(batch_size).all()
+        if not rows:
+            return moved
+        next_dates = {row.id: max(row.next_maintenance_date, today) + interval for row in rows}
+        result = db.session.execute(
+            update(Equipment)
+            .where(Equipment.id.in_(next_dates), Equipment.status == 'available')
+            .values(status='maintenance', next_maintenance_date=case(next_dates, value=Equipment.id),
+                    version_id=Equipment.version_id + 1, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        moved += result.rowcount
+        last_id = rows[-1].id
+
+
+def overdue_assignments(today):
+    """Open assignments whose expected return date is before ``today``.
+
+    One range over idx_assignment_overdue, most overdue first.
+    """
+    return EquipmentAssignment.query.filter(
+        EquipmentAssignment.is_returned.is_(False),
+        EquipmentAssignment.expected_return_date < today,
+        EquipmentAssignment.is_active.is_(True)
+    ).order_by(EquipmentAssignment.expected_return_date, EquipmentAssignment.id)
@@ -0,0 +1,184 @@
+# ABOUTME: iCalendar (ICS) subscription feeds per team, addressed by signed tokens revoked by rotating a feed key
+# ABOUTME: Each team's feed is rendered once and reused until its schedule stamp changes
+
+import hashlib
+import secrets
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from flask import current_app, url_for
+from flask_babel import gettext as _
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from app.utils.cache import TTLCache
+from app.utils.calendar_events import range_rows, range_stamp
+
+FEED_SALT = 'calendar-feed'
+FEED_KINDS = {'team': 't', 'athlete': 'a'}
+
+# Window of the feed around today
+PAST_DAYS = 60
+FUTURE_DAYS = 365
+# Safety net only; entries are replaced as soon as the schedule stamp changes
+FEED_CACHE_SECONDS = 86400
+
+feed_cache = TTLCache()
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=FEED_SALT)
+
+
+def feed_token(kind, owner):
+    """Signed token naming a team or athlete feed, valid until the owner's feed key is rotated."""
+    return _serializer().dumps([FEED_KINDS[kind], owner.id, owner.feed_key or ''])
+
+
+def read_feed_token(token):
+    """Return (kind, id, feed_key) for a well-formed token, or (None, None, None).
+
+    The caller compares feed_key with the owner's current one. Links
+    issued before feed keys existed carry none and match an owner whose
+    key was never rotated.
+    """
+    try:
+        payload = _serializer().loads(token)
+    except BadSignature:
+        return None, None, None
+    if not isinstance(payload, list) or len(payload) not in (2, 3):
+        return None, None, None
+    code, object_id, key = (payload + [''])[:3]
+    kinds = {v: k for k, v in FEED_KINDS.items()}
+    if code not in kinds or not isinstance(object_id, int) or not isinstance(key, str):
+        return None, None, None
+    return kinds[code], object_id, key
+
+
+def feed_key_matches(owner, key):
+    return secrets.compare_digest(owner.feed_key or '', key)
+
+
+def rotate_feed_key(owner):
+    """Give a team or athlete a new feed key, revoking every link handed out so far. The caller commits."""
+    owner.feed_key = secrets.token_urlsafe(12)
+
+
+def feed_url(kind, owner):
+    return url_for('calendar.feed', token=feed_token(kind, owner), _external=True)
+
+
+def _escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line):
+    """Fold content lines at 75 octets as RFC 5545 requires."""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        # Never split a multi-byte character
+        while cut and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    parts.append(data.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def _utc_at(day, at, zone):
+    """A local wall-clock time of the club, written in UTC so clients need no VTIMEZONE."""
+    return datetime.combine(day, at, zone).astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _utc(moment):
+    return (moment or datetime(2000, 1, 1)).strftime('%Y%m%dT%H%M%SZ')
+
+
+def render_team_feed(team, start, end):
+    """The ICS document for one team's sessions and matches in [start, end]."""
+    tz = current_app.config['CALENDAR_TIMEZONE']
+    zone = ZoneInfo(tz)
+    host = current_app.config.get('SERVER_NAME') or 'fortidesk'
+    match_minutes = current_app.config.get('MATCH_DURATION_MINUTES', 120)
+    sessions, occurrences, matches = range_rows(start, end, team.id)
+
+    events = []
+    for ts in sessions:
+        events.append({
+            'uid': f'ts-{ts.id}', 'stamp': ts.updated_at, 'summary': ts.title,
+            'day': ts.date, 'start': ts.start_time, 'end': ts.end_time, 'location': ts.location,
+            'status': 'CANCELLED' if ts.cancelled else 'CONFIRMED',
+            'description': ts.cancellation_reason if ts.cancelled else None,
+        })
+    for o in occurrences:
+        events.append({
+            'uid': f'r{o.recurrence_rule_id}-{o.occurrence_date.isoformat()}', 'stamp': o.updated_at,
+            'summary': o.title, 'day': o.date, 'start': o.start_time, 'end': o.end_time,
+            'location': o.location, 'status': 'CANCELLED' if o.cancelled else 'CONFIRMED',
+            'description': o.cancellation_reason,
+        })
+    for m in matches:
+        kick_off = m.kick_off_time
+        end_time = None
+        if kick_off:
+            end_time = (datetime.combine(m.date, kick_off) + timedelta(minutes=match_minutes)).time()
+        events.append({
+            'uid': f'm-{m.id}', 'stamp': m.updated_at,
+            'summary': _('vs %(opponent)s', opponent=m.opponent),
+            'day': m.date, 'start': kick_off, 'end': end_time, 'location': m.location,
+            'status': {'cancelled': 'CANCELLED', 'postponed': 'TENTATIVE'}.get(m.status, 'CONFIRMED'),
+            'description': None,
+        })
+    events.sort(key=lambda e: (e['day'], e['start'] or datetime.min.time()))
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//FortiDesk//Team Calendar//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(team.name)}',
+        f'X-WR-TIMEZONE:{tz}',
+    ]
+    for e in events:
+        lines += ['BEGIN:VEVENT', f'UID:{e["uid"]}@{host}', f'DTSTAMP:{_utc(e["stamp"])}']
+        if e['start']:
+            lines.append(f'DTSTART:{_utc_at(e["day"], e["start"], zone)}')
+            if e['end']:
+                lines.append(f'DTEND:{_utc_at(e["day"], e["end"], zone)}')
+        else:
+            # No kick-off time yet: an all-day entry
+            lines.append(f'DTSTART;VALUE=DATE:{e["day"].strftime("%Y%m%d")}')
+        lines.append(f'SUMMARY:{_escape(e["summary"])}')
+        if e['location']:
+            lines.append(f'LOCATION:{_escape(e["location"])}')
+        if e['description']:
+            lines.append(f'DESCRIPTION:{_escape(e["description"])}')
+        lines += [f'STATUS:{e["status"]}', 'END:VEVENT']
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(_fold(line) for line in lines) + '\r\n').encode('utf-8')
+
+
+def get_team_feed(team, locale):
+    """Return (etag, body) for a team feed, re-rendering only on schedule changes.
+
+    The cached blob is keyed by team and locale and checked against the
+    schedule stamp of the feed window, so a poll with nothing new costs a
+    handful of aggregate queries.
+    """
+    today = date.today()
+    start, end = today - timedelta(days=PAST_DAYS), today + timedelta(days=FUTURE_DAYS)
+    _last_modified, fingerprint = range_stamp(start, end, team.id)
+    fingerprint = f'{start}|{team.name}|{fingerprint}'
+
+    key = (team.id, locale)
+    cached = feed_cache.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1], cached[2]
+    body = render_team_feed(team, start, end)
+    etag = hashlib.sha256(body).hexdigest()
+    feed_cache.set(key, (fingerprint, etag, body), FEED_CACHE_SECONDS)
+    return etag, body
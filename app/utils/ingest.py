@@ -0,0 +1,165 @@
+# ABOUTME: Post-upload ingest stage: image normalization, then the preview and text extraction
+# ABOUTME: Photos are re-encoded in the process pool and their documents moved to the smaller blob
+
+import importlib.util
+import mimetypes
+import os
+import tempfile
+
+from flask import current_app
+from sqlalchemy import update
+
+from app import db
+from app.utils.previews import schedule_preview
+from app.utils.storage import get_storage
+from app.utils.tasks import process_pool, run_in_background
+from app.utils.text_search import schedule_text_extraction
+from app.utils.uploads import delete_upload, discard_unused_blob, hash_file, store_blob, upload_folder
+
+NORMALIZE_MIME_TYPES = {'image/jpeg', 'image/png'}
+
+# Inches of the long edge of a converted page (A4 height)
+PDF_PAGE_INCHES = 11.69
+
+
+def normalizable(mime_type, file_name=None):
+    """Whether an upload is an image the ingest stage re-encodes."""
+    if not current_app.config.get('IMAGE_NORMALIZE', True) or importlib.util.find_spec('PIL') is None:
+        return False
+    if not mime_type and file_name:
+        mime_type = mimetypes.guess_type(file_name)[0]
+    return mime_type in NORMALIZE_MIME_TYPES
+
+
+def normalize_image(src, tmp_dir, max_dimension, quality, to_pdf):
+    """Re-encode an image upright, without metadata, within ``max_dimension`` pixels.
+
+    Runs in a pool worker. The result is a JPEG, or a single-page PDF when
+    ``to_pdf``; EXIF, XMP and text chunks are not carried over. Returns
+    (temp_path, sha256, size, mime_type).
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as original:
+        original.draft('RGB', (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+    fd, temp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            if to_pdf:
+                image.save(out, 'PDF', quality=quality, resolution=max(image.size) / PDF_PAGE_INCHES)
+            else:
+                image.save(out, 'JPEG', quality=quality, optimize=True, progressive=True)
+        sha256, size = hash_file(temp_path)
+    except BaseException:
+        delete_upload(temp_path)
+        raise
+    return temp_path, sha256, size, 'application/pdf' if to_pdf else 'image/jpeg'
+
+
+def _renamed(file_name, mime_type):
+    stem, ext = os.path.splitext(file_name)
+    if mime_type == 'application/pdf':
+        return file_name if ext.lower() == '.pdf' else f'{stem}.pdf'
+    return file_name if ext.lower() in ('.jpg', '.jpeg') else f'{stem}.jpg'
+
+
+def normalize_blob(blob_id, file_name=None):
+    """Normalize an image blob and move every document using it to the result.
+
+    The original is kept when re-encoding saves less than IMAGE_MIN_SAVING
+    percent (unless converting to PDF). Each moved document records its
+    size as uploaded in ``original_size``. Commits; returns the blob now
+    holding the content (the original one when nothing changed).
+    """
+    from app.models import Document, UploadBlob
+
+    blob = db.session.get(UploadBlob, blob_id)
+    if blob is None or not normalizable(blob.mime_type, file_name):
+        return blob
+    storage = get_storage()
+    if not storage.exists(blob.storage_key):
+        return blob
+
+    config = current_app.config
+    to_pdf = config.get('IMAGE_CONVERT_TO_PDF', False)
+    tmp_dir = os.path.join(upload_folder(), 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    pool = process_pool()
+    try:
+        with storage.local_path(blob.storage_key) as src:
+            args = (src, tmp_dir, config.get('IMAGE_MAX_DIMENSION', 2480), config.get('IMAGE_QUALITY', 85), to_pdf)
+            if pool is None:
+                temp_path, sha256, size, mime_type = normalize_image(*args)
+            else:
+                temp_path, sha256, size, mime_type = pool.submit(normalize_image, *args).result()
+    except Exception:
+        current_app.logger.exception(f'Normalizing blob {blob.sha256} failed')
+        return blob
+
+    min_saving = config.get('IMAGE_MIN_SAVING', 10) / 100
+    if sha256 == blob.sha256 or (not to_pdf and size > blob.size * (1 - min_saving)):
+        delete_upload(temp_path)
+        return blob
+
+    documents = Document.query.filter_by(blob_id=blob.id).all()
+    active = sum(1 for document in documents if document.is_active)
+    normalized = store_blob(temp_path, sha256, size, mime_type)
+    db.session.flush()
+    # store_blob took one reference; the moved active documents need ``active``
+    db.session.execute(update(UploadBlob).where(UploadBlob.id == normalized.id)
+                       .values(ref_count=UploadBlob.ref_count + active - 1))
+    db.session.execute(update(UploadBlob).where(UploadBlob.id == blob.id)
+                       .values(ref_count=UploadBlob.ref_count - active))
+    for document in documents:
+        # updated_at is kept: it dates the soft delete of inactive documents
+        db.session.execute(
+            update(Document).where(Document.id == document.id).values(
+                original_size=document.original_size or document.file_size,
+                blob_id=normalized.id,
+                file_path=storage.location(normalized.storage_key),
+                file_size=size,
+                mime_type=mime_type,
+                file_name=_renamed(document.file_name, mime_type),
+                updated_at=Document.updated_at,
+            ).execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    for document in documents:
+        db.session.refresh(document)
+    db.session.refresh(normalized)
+
+    discard_unused_blob(blob)
+    return normalized
+
+
+def _normalize_then_preview(blob_id, file_name):
+    blob = normalize_blob(blob_id, file_name)
+    if blob is not None:
+        schedule_preview(blob, blob.mime_type)
+
+
+def ingest_upload(blob, mime_type=None, file_name=None):
+    """Start post-upload work for a committed blob.
+
+    Images are normalized, then previewed; PDFs are previewed and their
+    text extracted. With a process pool the work runs off the request
+    thread and the started thread, if any, is returned; without one
+    (DOCUMENT_WORKERS=0) it runs inline.
+    """
+    if not normalizable(mime_type or blob.mime_type, file_name):
+        schedule_preview(blob, mime_type, file_name)
+        return schedule_text_extraction(blob, mime_type, file_name)
+    if process_pool() is None:
+        normalize_blob(blob.id, file_name)
+        return None
+    return run_in_background(_normalize_then_preview, blob.id, file_name)
@@ -0,0 +1,93 @@
+# ABOUTME: Diff-based lineup saving: compares submitted rows with stored entries
+# ABOUTME: Only changed rows are written, as bulk INSERT/UPDATE/DELETE statements
+
+from sqlalchemy import delete, insert, update
+
+from app import db
+from app.models import MatchLineup
+
+# Lineup columns and the form field prefix each is posted under (e.g. position_12)
+LINEUP_FIELDS = {
+    'position': 'position',
+    'jersey_number': 'jersey',
+    'is_starter': 'starter',
+    'is_captain': 'captain',
+    'notes': 'notes',
+}
+
+
+def parse_lineup_row(form, athlete_id):
+    """Column values for one athlete's row of the lineup form."""
+    jersey_raw = form.get(f'jersey_{athlete_id}', '')
+    try:
+        jersey_number = int(jersey_raw) if jersey_raw.strip() else None
+    except (ValueError, TypeError):
+        jersey_number = None
+    return {
+        'position': form.get(f'position_{athlete_id}', ''),
+        'jersey_number': jersey_number,
+        'is_starter': f'starter_{athlete_id}' in form,
+        'is_captain': f'captain_{athlete_id}' in form,
+        'notes': form.get(f'notes_{athlete_id}', ''),
+    }
+
+
+def selected_athlete_ids(form, valid_ids):
+    """Athlete ids ticked in the form, limited to valid_ids."""
+    selected = set()
+    for raw in form.getlist('athlete_ids'):
+        try:
+            athlete_id = int(raw)
+        except (ValueError, TypeError):
+            continue
+        if athlete_id in valid_ids:
+            selected.add(athlete_id)
+    return selected
+
+
+def _blank_as_none(value):
+    return None if value == '' else value
+
+
+def diff_lineup(existing, desired, scope=None):
+    """Compare ``{athlete_id: MatchLineup}`` with ``{athlete_id: values}``.
+
+    ``scope`` limits the comparison to some athletes (default: all of both).
+    Returns ``(inserts, updates, deletes)``: value dicts for new rows,
+    ``{'id': ..., changed columns}`` dicts for modified rows and the entries
+    to remove. Unchanged rows appear in none of them.
+    """
+    athlete_ids = set(existing) | set(desired) if scope is None else set(scope)
+    inserts, updates, deletes = [], [], []
+    for athlete_id in sorted(athlete_ids):
+        entry = existing.get(athlete_id)
+        values = desired.get(athlete_id)
+        if entry is None and values is not None:
+            inserts.append({'athlete_id': athlete_id, **values})
+        elif entry is not None and values is None:
+            deletes.append(entry)
+        elif entry is not None:
+            changed = {
+                column: value for column, value in values.items()
+                if _blank_as_none(getattr(entry, column)) != _blank_as_none(value)
+            }
+            if changed:
+                updates.append({'id': entry.id, **changed})
+    return inserts, updates, deletes
+
+
+def apply_lineup_diff(match_id, inserts, updates, deletes):
+    """Write a lineup diff as bulk statements, skipping empty kinds. Caller commits."""
+    if inserts:
+        db.session.execute(insert(MatchLineup), [{'match_id': match_id, **row} for row in inserts])
+    # Executemany by primary key needs rows with the same keys; group by changed columns
+    by_columns = {}
+    for row in updates:
+        by_columns.setdefault(tuple(sorted(row)), []).append(row)
+    for rows in by_columns.values():
+        db.session.execute(update(MatchLineup), rows)
+    if deletes:
+        db.session.execute(
+            delete(MatchLineup).where(MatchLineup.id.in_([entry.id for entry in deletes]))
+            .execution_options(synchronize_session=False)
+        )
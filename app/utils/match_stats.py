@@ -0,0 +1,245 @@
+# ABOUTME: Incremental maintenance of AthleteSeasonStats and TeamSeasonRecord from matches
+# ABOUTME: Views snapshot a match before and after a change and apply the difference
+
+from collections import defaultdict
+
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import AthleteSeasonStats, Match, MatchLineup, TeamSeasonRecord
+
+STAT_COLUMNS = ('appearances', 'starts', 'captaincies', 'wins', 'draws', 'losses')
+RECORD_COLUMNS = ('played', 'wins', 'draws', 'losses', 'points_for', 'points_against')
+RESULT_COLUMNS = {'win': 'wins', 'draw': 'draws', 'loss': 'losses'}
+FORM_LETTERS = {'win': 'W', 'draw': 'D', 'loss': 'L'}
+
+
+def match_counts(match):
+    """Whether a match contributes to season statistics."""
+    return bool(match.is_active and match.season_id and match.status == 'completed')
+
+
+def lineup_contribution(is_starter, is_captain, result):
+    """Counter values one lineup entry adds to its athlete's season row."""
+    values = {
+        'appearances': 1,
+        'starts': int(bool(is_starter)),
+        'captaincies': int(bool(is_captain)),
+    }
+    if result in RESULT_COLUMNS:
+        values[RESULT_COLUMNS[result]] = 1
+    return values
+
+
+def match_snapshot(match, lineup=None):
+    """``{(athlete_id, season_id): contribution}`` of a match in its current state.
+
+    ``lineup`` maps athlete ids to objects or dicts with is_starter and
+    is_captain; by default the stored lineup is read with one query.
+    """
+    if not match_counts(match):
+        return {}
+    if lineup is None:
+        rows = db.session.query(
+            MatchLineup.athlete_id, MatchLineup.is_starter, MatchLineup.is_captain
+        ).filter(MatchLineup.match_id == match.id)
+        lineup = {row.athlete_id: row for row in rows}
+
+    def field(entry, name):
+        return entry[name] if isinstance(entry, dict) else getattr(entry, name)
+
+    return {
+        (athlete_id, match.season_id): lineup_contribution(
+            field(entry, 'is_starter'), field(entry, 'is_captain'), match.result
+        )
+        for athlete_id, entry in lineup.items()
+    }
+
+
+def snapshot_deltas(before, after):
+    """Counter deltas per snapshot key between two snapshots."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for key, values in before.items():
+        for column, n in values.items():
+            deltas[key][column] -= n
+    for key, values in after.items():
+        for column, n in values.items():
+            deltas[key][column] += n
+    return {
+        key: {column: n for column, n in changes.items() if n}
+        for key, changes in deltas.items()
+        if any(changes.values())
+    }
+
+
+def team_snapshot(match):
+    """``{(team_id, season_id): contribution}`` of a match result, or {}."""
+    if not match_counts(match) or match.result not in RESULT_COLUMNS:
+        return {}
+    home, away = match.score_home or 0, match.score_away or 0
+    return {(match.team_id, match.season_id): {
+        'played': 1,
+        RESULT_COLUMNS[match.result]: 1,
+        'points_for': home if match.is_home else away,
+        'points_against': away if match.is_home else home,
+    }}
+
+
+def _apply_counter_deltas(model, key_columns, counter_columns, deltas):
+    """Add deltas keyed by (owner id, season_id) with ``col = col + n`` updates.
+
+    Missing rows are created first with one bulk insert, so concurrent
+    saves never overwrite each other's totals. A row another save created
+    in the meantime is left as it is and only updated.
+    """
+    if not deltas:
+        return
+    owner_col, season_col = (getattr(model, name) for name in key_columns)
+    keys = list(deltas)
+    existing = set(db.session.query(owner_col, season_col).filter(
+        owner_col.in_({owner for owner, _ in keys}),
+        season_col.in_({season for _, season in keys})
+    ).all())
+    missing = [key for key in keys if key not in existing]
+    rows = [
+        {key_columns[0]: owner, key_columns[1]: season, **{column: 0 for column in counter_columns}}
+        for owner, season in missing
+    ]
+    if rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(model), rows)
+        except IntegrityError:
+            # A concurrent first result created some of the rows; insert the rest one by one
+            for row in rows:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(model), [row])
+                except IntegrityError:
+                    pass
+    for (owner, season), changes in deltas.items():
+        db.session.execute(
+            update(model)
+            .where(owner_col == owner, season_col == season)
+            .values(**{column: getattr(model, column) + n for column, n in changes.items()})
+            .execution_options(synchronize_session=False)
+        )
+
+
+def apply_stats_deltas(deltas):
+    """Add deltas to AthleteSeasonStats; the caller commits."""
+    _apply_counter_deltas(AthleteSeasonStats, ('athlete_id', 'season_id'), STAT_COLUMNS, deltas)
+
+
+def recent_form(team_id, season_id):
+    """Latest results of a team in a season as letters, oldest first.
+
+    Reads only the last few matches through idx_match_team_season_date.
+    """
+    results = db.session.query(Match.result).filter(
+        Match.team_id == team_id,
+        Match.season_id == season_id,
+        Match.is_active.is_(True),
+        Match.status == 'completed',
+        Match.result.in_(RESULT_COLUMNS)
+    ).order_by(
+        Match.date.desc(), Match.kick_off_time.desc(), Match.id.desc()
+    ).limit(TeamSeasonRecord.FORM_LENGTH).all()
+    return ''.join(FORM_LETTERS[result] for (result,) in reversed(results))
+
+
+def apply_team_deltas(deltas, touched=()):
+    """Add deltas to TeamSeasonRecord and refresh the form of every touched record.
+
+    ``touched`` lists extra (team_id, season_id) keys whose form may have
+    changed without a counter change (e.g. a match moved to another date).
+    The caller commits.
+    """
+    _apply_counter_deltas(TeamSeasonRecord, ('team_id', 'season_id'), RECORD_COLUMNS, deltas)
+    db.session.flush()
+    for team_id, season_id in set(deltas) | set(touched):
+        db.session.execute(
+            update(TeamSeasonRecord)
+            .where(TeamSeasonRecord.team_id == team_id, TeamSeasonRecord.season_id == season_id)
+            .values(form=recent_form(team_id, season_id))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def snapshot_match(match):
+    """Athlete and team contributions of a match, taken before a change."""
+    return match_snapshot(match), team_snapshot(match)
+
+
+def apply_match_change(before, match):
+    """Apply the statistics difference between ``before`` and the match's current state."""
+    athletes_before, teams_before = before
+    teams_after = team_snapshot(match)
+    apply_stats_deltas(snapshot_deltas(athletes_before, match_snapshot(match)))
+    apply_team_deltas(snapshot_deltas(teams_before, teams_after), touched=set(teams_before) | set(teams_after))
+
+
+def rebuild_athlete_season_stats():
+    """Recompute every row from lineups of counted matches with one grouped query.
+
+    Returns the number of (athlete, season) rows written.
+    """
+    totals = db.session.query(
+        MatchLineup.athlete_id,
+        Match.season_id,
+        func.count(MatchLineup.id),
+        func.sum(case((MatchLineup.is_starter.is_(True), 1), else_=0)),
+        func.sum(case((MatchLineup.is_captain.is_(True), 1), else_=0)),
+        *[func.sum(case((Match.result == result, 1), else_=0)) for result in RESULT_COLUMNS]
+    ).join(Match, Match.id == MatchLineup.match_id).filter(
+        Match.is_active.is_(True),
+        Match.season_id.isnot(None),
+        Match.status == 'completed'
+    ).group_by(MatchLineup.athlete_id, Match.season_id).all()
+
+    db.session.query(AthleteSeasonStats).delete(synchronize_session=False)
+    if totals:
+        columns = ('appearances', 'starts', 'captaincies', *RESULT_COLUMNS.values())
+        db.session.execute(insert(AthleteSeasonStats), [
+            {'athlete_id': row[0], 'season_id': row[1],
+             **{column: int(value or 0) for column, value in zip(columns, row[2:])}}
+            for row in totals
+        ])
+    db.session.commit()
+    return len(totals)
+
+
+def rebuild_team_season_records():
+    """Recompute every team record from completed matches.
+
+    Returns the number of (team, season) rows written.
+    """
+    matches = db.session.query(
+        Match.team_id, Match.season_id, Match.result, Match.score_home, Match.score_away, Match.is_home
+    ).filter(
+        Match.is_active.is_(True),
+        Match.season_id.isnot(None),
+        Match.status == 'completed',
+        Match.result.in_(RESULT_COLUMNS)
+    ).order_by(Match.date, Match.kick_off_time, Match.id).all()
+
+    records = {}
+    for m in matches:
+        key = (m.team_id, m.season_id)
+        record = records.setdefault(key, {column: 0 for column in RECORD_COLUMNS} | {'form': ''})
+        home, away = m.score_home or 0, m.score_away or 0
+        record['played'] += 1
+        record[RESULT_COLUMNS[m.result]] += 1
+        record['points_for'] += home if m.is_home else away
+        record['points_against'] += away if m.is_home else home
+        record['form'] = (record['form'] + FORM_LETTERS[m.result])[-TeamSeasonRecord.FORM_LENGTH:]
+
+    db.session.query(TeamSeasonRecord).delete(synchronize_session=False)
+    if records:
+        db.session.execute(insert(TeamSeasonRecord), [
+            {'team_id': team_id, 'season_id': season_id, **values}
+            for (team_id, season_id), values in records.items()
+        ])
+    db.session.commit()
+    return len(records)
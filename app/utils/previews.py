@@ -0,0 +1,166 @@
+# ABOUTME: Downscaled preview images of uploaded documents, stored beside their blob in the storage backend
+# ABOUTME: Rasterization runs in a process pool; missing previews are rendered on first view
+
+import importlib.util
+import mimetypes
+import os
+import tempfile
+
+from flask import current_app
+
+from app.utils.storage import get_storage
+from app.utils.tasks import process_pool, run_in_background
+from app.utils.uploads import blob_path, delete_upload, upload_folder
+
+PREVIEW_FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+IMAGE_MIME_TYPES = {'image/png', 'image/jpeg'}
+
+
+def preview_kind(mime_type, file_name=None):
+    """'image' or 'pdf' when a preview can be rendered for the content, else None.
+
+    PDF pages need the optional pypdfium2 package; images need Pillow.
+    """
+    if not mime_type and file_name:
+        mime_type = mimetypes.guess_type(file_name)[0]
+    if importlib.util.find_spec('PIL') is None:
+        return None
+    if mime_type in IMAGE_MIME_TYPES:
+        return 'image'
+    if mime_type == 'application/pdf' and importlib.util.find_spec('pypdfium2') is not None:
+        return 'pdf'
+    return None
+
+
+def document_preview_kind(document):
+    if document.blob is None:
+        return None
+    return preview_kind(document.mime_type, document.file_name)
+
+
+def preview_format():
+    fmt = current_app.config.get('PREVIEW_FORMAT', 'webp')
+    return fmt if fmt in PREVIEW_FORMATS else 'webp'
+
+
+def preview_mime_type():
+    return PREVIEW_FORMATS[preview_format()][1]
+
+
+def preview_key(storage_key):
+    """Storage key of a blob's preview: ``ab/cd/<sha256>.preview.webp`` next to the content."""
+    return f'{storage_key}.preview.{preview_format()}'
+
+
+def preview_path(storage_key):
+    """Local file of a blob's preview (local storage only)."""
+    return blob_path(preview_key(storage_key))
+
+
+def delete_previews(storage_key):
+    storage = get_storage()
+    for fmt in PREVIEW_FORMATS:
+        storage.delete(f'{storage_key}.preview.{fmt}')
+
+
+def render_preview(src, dst, kind, size, fmt, quality):
+    """Write a preview of ``src`` fitting in ``size`` x ``size`` pixels to ``dst``.
+
+    Runs in a pool worker, so it takes plain arguments only. The file is
+    written under a temporary name and moved into place, so readers never
+    see a partial preview.
+    """
+    from PIL import Image, ImageOps
+
+    if kind == 'pdf':
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(src)
+        try:
+            page = pdf[0]
+            # Page sizes are in points (1/72 inch); scale the long edge to ``size``
+            image = page.render(scale=size / max(page.get_size())).to_pil()
+        finally:
+            pdf.close()
+    else:
+        image = Image.open(src)
+        # Let the JPEG decoder skip detail we are about to throw away
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+
+    image.thumbnail((size, size))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(dst), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            image.save(out, PREVIEW_FORMATS[fmt][0], quality=quality)
+        os.replace(temp_path, dst)
+    except BaseException:
+        delete_upload(temp_path)
+        raise
+    return dst
+
+
+def _render(storage_key, kind, timeout=None):
+    """Render a blob's preview (through the pool when there is one) and store it."""
+    storage = get_storage()
+    fmt = preview_format()
+    tmp_dir = os.path.join(upload_folder(), 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, dst = tempfile.mkstemp(dir=tmp_dir, suffix=f'.{fmt}')
+    os.close(fd)
+    try:
+        with storage.local_path(storage_key) as src:
+            args = (src, dst, kind, current_app.config.get('PREVIEW_SIZE', 800), fmt,
+                    current_app.config.get('PREVIEW_QUALITY', 80))
+            pool = process_pool()
+            if pool is None:
+                render_preview(*args)
+            else:
+                pool.submit(render_preview, *args).result(timeout=timeout)
+        storage.put(preview_key(storage_key), dst, PREVIEW_FORMATS[fmt][1])
+    finally:
+        delete_upload(dst)
+    return preview_key(storage_key)
+
+
+def schedule_preview(blob, mime_type=None, file_name=None):
+    """Render the preview of a freshly stored blob off the request thread.
+
+    Returns the started thread, or None when there is nothing to do (no
+    pool, no preview for this content, or a preview already stored).
+    """
+    kind = preview_kind(mime_type or blob.mime_type, file_name)
+    if kind is None or process_pool() is None or get_storage().exists(preview_key(blob.storage_key)):
+        return None
+    return run_in_background(_render, blob.storage_key, kind)
+
+
+def ensure_preview(blob, mime_type=None, file_name=None):
+    """Storage key of the blob's preview, rendering it now if missing; None if impossible.
+
+    Rendering goes through the pool when there is one, so the request
+    thread only waits on it (up to PREVIEW_TIMEOUT seconds).
+    """
+    kind = preview_kind(mime_type or blob.mime_type, file_name)
+    if kind is None:
+        return None
+    storage = get_storage()
+    key = preview_key(blob.storage_key)
+    if storage.exists(key):
+        return key
+    if not storage.exists(blob.storage_key):
+        return None
+
+    try:
+        return _render(blob.storage_key, kind, timeout=current_app.config.get('PREVIEW_TIMEOUT', 30))
+    except Exception:
+        current_app.logger.exception(f'Preview of blob {blob.sha256} failed')
+        return None
@@ -0,0 +1,172 @@
+# ABOUTME: Reconciliation of UPLOAD_FOLDER against the database: orphan and missing files
+# ABOUTME: A sorted directory walk is merged with the sorted list of referenced paths in one pass
+
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.utils.previews import PREVIEW_FORMATS
+from app.utils.storage import LocalStorage
+from app.utils.uploads import purge_document, upload_folder
+
+# Rows read per query while collecting referenced paths
+RECONCILE_BATCH_SIZE = 1000
+
+QUARANTINE_DIR = 'quarantine'
+
+
+def _path_key(relative):
+    """Sort key of a relative path: its components, so 'a/b' sorts with its directory 'a'."""
+    return tuple(relative.replace(os.sep, '/').split('/'))
+
+
+def _relative(path, root):
+    relative = os.path.relpath(os.path.abspath(path), root)
+    return None if relative.startswith(os.pardir) else relative
+
+
+def walk_upload_folder(root, skip=(QUARANTINE_DIR,)):
+    """Yield ``(key, path, entry)`` for every file under ``root`` in _path_key order.
+
+    Each directory is listed once with os.scandir and its entries visited
+    by name, so the walk never holds more than one directory listing per
+    level in memory.
+    """
+    def walk(directory, prefix):
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for entry in entries:
+            key = prefix + (entry.name,)
+            if entry.is_dir(follow_symlinks=False):
+                if not prefix and entry.name in skip:
+                    continue
+                yield from walk(entry.path, key)
+            elif entry.is_file(follow_symlinks=False):
+                yield key, entry.path, entry
+
+    if os.path.isdir(root):
+        yield from walk(root, ())
+
+
+def referenced_paths(root, batch_size=RECONCILE_BATCH_SIZE):
+    """Sorted ``[(key, required, document_id)]`` of every path the database refers to.
+
+    Document files and blobs must exist (``required``); previews and the
+    part files of open upload sessions may. Rows are read in id batches.
+    Documents stored outside ``root`` are returned separately as
+    ``[(path, document_id)]``.
+    """
+    from app.models import Document, UploadBlob, UploadSession
+
+    # Part files of open sessions are where the local backend keeps them
+    storage = LocalStorage(root)
+    references, outside = [], []
+    for model, columns in ((Document, (Document.file_path,)),
+                           (UploadBlob, (UploadBlob.storage_key,)),
+                           (UploadSession, ())):
+        last_id = None
+        while True:
+            query = db.session.query(model.id, *columns)
+            if last_id is not None:
+                query = query.filter(model.id > last_id)
+            rows = query.order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                if model is Document:
+                    relative = _relative(row.file_path, root)
+                    if relative is None:
+                        outside.append((row.file_path, row.id))
+                    else:
+                        references.append((_path_key(relative), True, row.id))
+                elif model is UploadBlob:
+                    references.append((_path_key(row.storage_key), True, None))
+                    references.extend(
+                        (_path_key(f'{row.storage_key}.preview.{fmt}'), False, None) for fmt in PREVIEW_FORMATS
+                    )
+                else:
+                    references.append((_path_key(_relative(storage.part_path(row.id), root)), False, None))
+    references.sort(key=lambda ref: ref[0])
+    return references, outside
+
+
+def _quarantine(path, relative, root):
+    target = os.path.join(root, QUARANTINE_DIR, relative)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.move(path, target)
+
+
+def purge_soft_deleted(days):
+    """Hard-delete documents soft-deleted more than ``days`` ago, with their files.
+
+    The deletion time is the document's last update. Returns the count.
+    """
+    from app.models import Document
+
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    ids = [row.id for row in db.session.query(Document.id).filter(
+        Document.is_active.is_(False), Document.updated_at < cutoff
+    ).order_by(Document.id)]
+    for document_id in ids:
+        document = db.session.get(Document, document_id)
+        if document is not None:
+            purge_document(document)
+    return len(ids)
+
+
+def reconcile_uploads(quarantine=False, grace_hours=24, purge_deleted_days=None):
+    """Compare the files under UPLOAD_FOLDER with the paths the database refers to.
+
+    Orphans are files nothing refers to that are older than ``grace_hours``
+    (younger ones may belong to an upload still in flight); they are moved
+    under ``quarantine/`` when asked. With ``purge_deleted_days``, old
+    soft-deleted documents are purged first. Returns a dict with
+    ``orphans`` [(relative_path, size)], ``missing`` [(path, [document ids])],
+    ``quarantined`` and ``purged``. Raises ValueError unless blobs are kept
+    in local storage.
+    """
+    if current_app.config.get('STORAGE_BACKEND', 'local') != 'local':
+        raise ValueError('reconcile-uploads only supports STORAGE_BACKEND=local.')
+    root = os.path.abspath(upload_folder())
+    purged = purge_soft_deleted(purge_deleted_days) if purge_deleted_days is not None else 0
+    references, outside = referenced_paths(root)
+    min_mtime = time.time() - grace_hours * 3600
+
+    orphans, missing = [], {}
+    refs = iter(references)
+    ref = next(refs, None)
+    for key, path, entry in walk_upload_folder(root):
+        # Referenced paths sorting before this file are not on disk
+        while ref is not None and ref[0] < key:
+            if ref[1]:
+                missing.setdefault(ref[0], []).append(ref[2])
+            ref = next(refs, None)
+        if ref is not None and ref[0] == key:
+            while ref is not None and ref[0] == key:
+                ref = next(refs, None)
+            continue
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime <= min_mtime:
+            orphans.append(('/'.join(key), stat.st_size))
+            if quarantine:
+                _quarantine(path, os.path.join(*key), root)
+    while ref is not None:
+        if ref[1]:
+            missing.setdefault(ref[0], []).append(ref[2])
+        ref = next(refs, None)
+
+    report_missing = [
+        (os.path.join(root, *key), sorted(i for i in ids if i is not None)) for key, ids in missing.items()
+    ]
+    report_missing += [(path, [document_id]) for path, document_id in outside if not os.path.exists(path)]
+    return {
+        'orphans': orphans,
+        'missing': report_missing,
+        'quarantined': len(orphans) if quarantine else 0,
+        'purged': purged,
+    }
@@ -0,0 +1,236 @@
+# ABOUTME: Read-time expansion of RecurrenceRule occurrences and merging with stored sessions
+# ABOUTME: Occurrence mimics TrainingSession for templates; materialize() turns one into a real row
+
+import heapq
+
+from flask import url_for
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models import RecurrenceException, RecurrenceRule, TrainingSession
+
+
+class Occurrence:
+    """One date of a RecurrenceRule that has no TrainingSession row of its own."""
+
+    is_virtual = True
+    id = None
+    present_count = absent_count = late_count = excused_count = 0
+
+    def __init__(self, rule, occurrence_date, exception=None):
+        self.rule = rule
+        self.recurrence_rule_id = rule.id
+        self.occurrence_date = occurrence_date
+        self.title = rule.title
+        self.location = rule.location
+        self.session_type = rule.session_type
+        self.notes = rule.notes
+        self.team_id = rule.team_id
+        self.team = rule.team
+        self.season_id = rule.season_id
+        self.season = rule.season
+        self.coach_id = rule.coach_id
+        self.coach = rule.coach
+        self.date = occurrence_date
+        self.start_time = rule.start_time
+        self.end_time = rule.end_time
+        self.cancelled = False
+        self.cancellation_reason = None
+        self.moved = False
+        # Last change to this date: the rule's, or a later cancel/move of it
+        changes = [t for t in (rule.updated_at, exception and exception.updated_at) if t is not None]
+        self.updated_at = max(changes) if changes else None
+        if exception is not None and exception.kind == 'cancelled':
+            self.cancelled = True
+            self.cancellation_reason = exception.reason
+        elif exception is not None and exception.kind == 'moved':
+            self.moved = True
+            self.date = exception.new_date
+            self.start_time = exception.new_start_time or rule.start_time
+            self.end_time = exception.new_end_time or rule.end_time
+
+    def __repr__(self):
+        return f'<Occurrence rule={self.recurrence_rule_id} {self.occurrence_date}>'
+
+    get_session_type_display = TrainingSession.get_session_type_display
+    is_past = TrainingSession.is_past
+    roll_call_total = TrainingSession.roll_call_total
+    turnout = TrainingSession.turnout
+    duration_minutes = TrainingSession.duration_minutes
+
+    def view_url(self):
+        return url_for('training.occurrence', rule_id=self.recurrence_rule_id,
+                       occurrence_date=self.occurrence_date.isoformat())
+
+
+def session_sort_key(session):
+    return (session.date, session.start_time)
+
+
+def expand_occurrences(start, end, *criteria, include_cancelled=False, exclude_rule_id=None):
+    """Virtual occurrences of active rules dated within [start, end].
+
+    ``criteria`` are extra filters on RecurrenceRule (team, season, venue).
+    Either bound may be None for an open window. Occurrences overridden by a
+    TrainingSession row (active or deleted) are left out, so stored rows and
+    occurrences never describe the same date twice. Uses one query each for
+    rules, exceptions and overrides.
+    """
+    window = []
+    if start is not None:
+        window.append(RecurrenceRule.end_date >= start)
+    if end is not None:
+        window.append(RecurrenceRule.start_date <= end)
+    base = [RecurrenceRule.is_active.is_(True), *criteria]
+    if exclude_rule_id:
+        base.append(RecurrenceRule.id != exclude_rule_id)
+
+    def in_window(column):
+        clauses = []
+        if start is not None:
+            clauses.append(column >= start)
+        if end is not None:
+            clauses.append(column <= end)
+        return and_(True, *clauses)
+
+    # Rules overlapping the window, plus rules with an occurrence moved into it
+    moved_in = db.select(RecurrenceException.rule_id).where(
+        RecurrenceException.kind == 'moved', in_window(RecurrenceException.new_date)
+    )
+    rules = RecurrenceRule.query.options(
+        joinedload(RecurrenceRule.team),
+        joinedload(RecurrenceRule.coach),
+        joinedload(RecurrenceRule.season)
+    ).filter(*base).filter(or_(and_(True, *window), RecurrenceRule.id.in_(moved_in))).all()
+    if not rules:
+        return []
+    rule_ids = [rule.id for rule in rules]
+
+    exceptions = {
+        (e.rule_id, e.occurrence_date): e
+        for e in RecurrenceException.query.filter(
+            RecurrenceException.rule_id.in_(rule_ids),
+            or_(in_window(RecurrenceException.occurrence_date),
+                and_(RecurrenceException.kind == 'moved', in_window(RecurrenceException.new_date)))
+        )
+    }
+    extra_dates = {occurrence_date for (_, occurrence_date) in exceptions}
+    overridden = set(db.session.query(
+        TrainingSession.recurrence_rule_id, TrainingSession.occurrence_date
+    ).filter(
+        TrainingSession.recurrence_rule_id.in_(rule_ids),
+        or_(in_window(TrainingSession.occurrence_date),
+            TrainingSession.occurrence_date.in_(extra_dates))
+    ).all())
+
+    def inside(day):
+        return (start is None or day >= start) and (end is None or day <= end)
+
+    occurrences = []
+    for rule in rules:
+        for day in rule.occurrence_dates(start or rule.start_date, end or rule.end_date):
+            if (rule.id, day) not in overridden:
+                occurrences.append(Occurrence(rule, day, exceptions.get((rule.id, day))))
+    # Occurrences whose original date is outside the window but moved into it
+    for (rule_id, day), exception in exceptions.items():
+        if (exception.kind == 'moved' and not inside(day) and inside(exception.new_date)
+                and (rule_id, day) not in overridden):
+            rule = next(r for r in rules if r.id == rule_id)
+            if rule.has_occurrence_on(day):
+                occurrences.append(Occurrence(rule, day, exception))
+
+    occurrences = [
+        o for o in occurrences
+        if inside(o.date) and (include_cancelled or not o.cancelled)
+    ]
+    occurrences.sort(key=session_sort_key)
+    return occurrences
+
+
+class SessionPagination(Pagination):
+    """Pagination over an ordered TrainingSession query merged with occurrences.
+
+    Only the first ``page * per_page`` rows are fetched and merged with the
+    (already expanded) occurrences of the same window.
+    """
+
+    def _query_items(self):
+        query = self._query_args['query']
+        occurrences = self._query_args['occurrences']
+        reverse = self._query_args.get('reverse', False)
+        rows = query.limit(self._query_offset + self.per_page).all()
+        if reverse:
+            occurrences = list(reversed(occurrences))
+        merged = heapq.merge(rows, occurrences, key=session_sort_key, reverse=reverse)
+        items = list(merged)
+        return items[self._query_offset:self._query_offset + self.per_page]
+
+    def _query_count(self):
+        return self._query_args['query'].order_by(None).count() + len(self._query_args['occurrences'])
+
+
+def get_rule_occurrence(rule_id, occurrence_date):
+    """The rule and its exception for a date, or (None, None) if the rule has no such date."""
+    rule = db.session.get(RecurrenceRule, rule_id)
+    if rule is None or not rule.is_active or not rule.has_occurrence_on(occurrence_date):
+        return None, None
+    exception = RecurrenceException.query.filter_by(
+        rule_id=rule_id, occurrence_date=occurrence_date
+    ).first()
+    return rule, exception
+
+
+def materialize(rule, occurrence_date, user_id):
+    """Return the TrainingSession row for an occurrence, creating it if needed.
+
+    The new row copies the rule (and a moved date/time or cancellation);
+    from then on it overrides the occurrence. The caller commits.
+    """
+    session = TrainingSession.query.filter_by(
+        recurrence_rule_id=rule.id, occurrence_date=occurrence_date
+    ).first()
+    if session is not None:
+        return session
+
+    exception = RecurrenceException.query.filter_by(
+        rule_id=rule.id, occurrence_date=occurrence_date
+    ).first()
+    occurrence = Occurrence(rule, occurrence_date, exception)
+    session = TrainingSession(
+        title=rule.title,
+        date=occurrence.date,
+        start_time=occurrence.start_time,
+        end_time=occurrence.end_time,
+        location=rule.location,
+        session_type=rule.session_type,
+        team_id=rule.team_id,
+        season_id=rule.season_id,
+        coach_id=rule.coach_id,
+        notes=rule.notes,
+        cancelled=occurrence.cancelled,
+        cancellation_reason=occurrence.cancellation_reason,
+        is_recurring=True,
+        recurrence_day=rule.weekday,
+        recurrence_end_date=rule.end_date,
+        recurrence_rule_id=rule.id,
+        occurrence_date=occurrence_date,
+        created_by=user_id
+    )
+    db.session.add(session)
+    db.session.flush()
+    return session
+
+
+def upcoming_team_sessions(team_id, start, end, limit):
+    """Next non-cancelled sessions of a team, stored rows and occurrences together."""
+    rows = TrainingSession.query.filter(
+        TrainingSession.team_id == team_id,
+        TrainingSession.is_active.is_(True),
+        TrainingSession.cancelled.isnot(True),
+        TrainingSession.date >= start,
+        TrainingSession.date <= end
+    ).order_by(TrainingSession.date, TrainingSession.start_time).limit(limit).all()
+    occurrences = expand_occurrences(start, end, RecurrenceRule.team_id == team_id)
+    return list(heapq.merge(rows, occurrences, key=session_sort_key))[:limit]
@@ -0,0 +1,346 @@
+# ABOUTME: Scheduling helpers for recurring training series: conflicts, rule writes, legacy collapse
+# ABOUTME: IntervalIndex answers "what overlaps this slot" per (team, date) and (venue, date) via bisect
+
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+from itertools import accumulate
+
+from flask import current_app
+from flask_babel import gettext as _
+from sqlalchemy import delete, func, insert, or_
+
+from app import db
+from app.models import Attendance, Match, RecurrenceException, RecurrenceRule, TrainingSession
+from app.utils.recurrence import expand_occurrences
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def normalize_location(location):
+    """Case- and whitespace-insensitive venue key ('' when no venue is set)."""
+    return ' '.join((location or '').split()).casefold()
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def weekly_dates(start, end, weekday):
+    """Every date between start and end (inclusive) falling on weekday (0=Monday)."""
+    current = start + timedelta(days=(weekday - start.weekday()) % 7)
+    dates = []
+    while current <= end:
+        dates.append(current)
+        current += timedelta(days=7)
+    return dates
+
+
+class IntervalIndex:
+    """Time intervals grouped by key, queried for overlaps with bisect.
+
+    Each key holds its intervals sorted by start together with a running
+    maximum of their ends: the candidates for an overlap with [start, end)
+    are those starting before ``end``, and the scan stops as soon as no
+    earlier interval can reach past ``start``.
+    """
+
+    def __init__(self):
+        self._intervals = defaultdict(list)
+        self._sorted = {}
+
+    def add(self, key, start, end, item):
+        self._intervals[key].append((start, end, item))
+        self._sorted.pop(key, None)
+
+    def _lookup(self, key):
+        built = self._sorted.get(key)
+        if built is None:
+            intervals = sorted(self._intervals.get(key, ()), key=lambda iv: iv[0])
+            built = (
+                [iv[0] for iv in intervals],
+                list(accumulate((iv[1] for iv in intervals), max)),
+                intervals,
+            )
+            self._sorted[key] = built
+        return built
+
+    def overlapping(self, key, start, end):
+        """Items whose interval under key overlaps [start, end)."""
+        starts, max_ends, intervals = self._lookup(key)
+        i = bisect_left(starts, end)
+        found = []
+        while i > 0 and max_ends[i - 1] > start:
+            i -= 1
+            if intervals[i][1] > start:
+                found.append(intervals[i][2])
+        return found
+
+
+class ConflictIndex:
+    """Existing sessions and matches indexed by (team, date) and (venue, date)."""
+
+    def __init__(self):
+        self.index = IntervalIndex()
+
+    def add(self, team_id, location, on_date, start, end, item):
+        self.index.add(('team', team_id, on_date), start, end, item)
+        venue = normalize_location(location)
+        if venue:
+            self.index.add(('venue', venue, on_date), start, end, item)
+
+    @classmethod
+    def load(cls, team_id, location, start_date, end_date, exclude_rule_id=None):
+        """Load everything the team or the venue has between two dates.
+
+        Stored sessions, matches and the occurrences of other recurrence
+        rules all go in the index; ``exclude_rule_id`` leaves out a rule
+        being edited together with its overridden occurrences.
+        """
+        conflict_index = cls()
+        venue = normalize_location(location)
+
+        ts_scope = TrainingSession.team_id == team_id
+        m_scope = Match.team_id == team_id
+        rule_scope = RecurrenceRule.team_id == team_id
+        if venue:
+            ts_scope = or_(ts_scope, func.lower(func.trim(TrainingSession.location)) == venue)
+            m_scope = or_(m_scope, func.lower(func.trim(Match.location)) == venue)
+            rule_scope = or_(rule_scope, func.lower(func.trim(RecurrenceRule.location)) == venue)
+
+        ts_query = db.session.query(
+            TrainingSession.id, TrainingSession.title, TrainingSession.date,
+            TrainingSession.start_time, TrainingSession.end_time,
+            TrainingSession.location, TrainingSession.team_id
+        ).filter(
+            ts_scope,
+            TrainingSession.date >= start_date,
+            TrainingSession.date <= end_date,
+            TrainingSession.is_active.is_(True),
+            TrainingSession.cancelled.isnot(True)
+        )
+        if exclude_rule_id:
+            ts_query = ts_query.filter(or_(
+                TrainingSession.recurrence_rule_id.is_(None),
+                TrainingSession.recurrence_rule_id != exclude_rule_id
+            ))
+        for s in ts_query:
+            conflict_index.add(s.team_id, s.location, s.date,
+                               _minutes(s.start_time), _minutes(s.end_time), {
+                                   'kind': 'training', 'id': s.id, 'title': s.title,
+                                   'team_id': s.team_id, 'location': s.location,
+                               })
+        for o in expand_occurrences(start_date, end_date, rule_scope, exclude_rule_id=exclude_rule_id):
+            conflict_index.add(o.team_id, o.location, o.date,
+                               _minutes(o.start_time), _minutes(o.end_time), {
+                                   'kind': 'occurrence', 'id': o.recurrence_rule_id,
+                                   'occurrence_date': o.occurrence_date, 'title': o.title,
+                                   'team_id': o.team_id, 'location': o.location,
+                               })
+
+        duration = current_app.config.get('MATCH_DURATION_MINUTES', 120)
+        matches = db.session.query(
+            Match.id, Match.opponent, Match.date, Match.kick_off_time, Match.location, Match.team_id
+        ).filter(
+            m_scope,
+            Match.date >= start_date,
+            Match.date <= end_date,
+            Match.is_active.is_(True),
+            Match.status != 'cancelled'
+        )
+        for m in matches:
+            # Without a kick-off time the match blocks the whole day
+            start = _minutes(m.kick_off_time) if m.kick_off_time else 0
+            end = min(start + duration, MINUTES_PER_DAY) if m.kick_off_time else MINUTES_PER_DAY
+            conflict_index.add(m.team_id, m.location, m.date, start, end, {
+                'kind': 'match', 'id': m.id, 'title': m.opponent,
+                'team_id': m.team_id, 'location': m.location,
+            })
+        return conflict_index
+
+    def conflicts(self, team_id, location, on_date, start_time, end_time):
+        """Sessions and matches clashing with a slot, each tagged with the clash reason."""
+        start, end = _minutes(start_time), _minutes(end_time)
+        found = {}
+        for item in self.index.overlapping(('team', team_id, on_date), start, end):
+            found[(item['kind'], item['id'], item.get('occurrence_date'))] = dict(item, reason='team')
+        venue = normalize_location(location)
+        if venue:
+            for item in self.index.overlapping(('venue', venue, on_date), start, end):
+                found.setdefault((item['kind'], item['id'], item.get('occurrence_date')),
+                                 dict(item, reason='venue'))
+        return list(found.values())
+
+
+def plan_series(pattern, rule_id=None):
+    """Dry run: the weekly dates of a pattern with the conflicts of each one.
+
+    ``pattern`` holds the RecurringSessionForm values. The occurrences of
+    ``rule_id`` itself are ignored, so a rule can be edited over its own
+    dates. Returns a list of ``{'date', 'conflicts'}`` dicts.
+    """
+    dates = weekly_dates(pattern['start_date'], pattern['end_date'], pattern['recurrence_day'])
+    if not dates:
+        return []
+    conflict_index = ConflictIndex.load(pattern['team_id'], pattern['location'],
+                                        dates[0], dates[-1], exclude_rule_id=rule_id)
+    return [{
+        'date': d,
+        'conflicts': conflict_index.conflicts(pattern['team_id'], pattern['location'], d,
+                                              pattern['start_time'], pattern['end_time']),
+    } for d in dates]
+
+
+def save_rule(pattern, plan, user_id, rule=None, skip_conflicts=True):
+    """Create or update the RecurrenceRule of a planned series.
+
+    Editing a series is a single-row update of its rule: occurrences are
+    expanded when read, so a new time, venue or end date applies to every
+    date at once. Exceptions on dates the pattern no longer produces are
+    dropped; planned dates with conflicts become cancellation exceptions
+    (bulk inserted) when ``skip_conflicts`` is set. Overridden occurrences
+    keep their TrainingSession rows. The caller commits.
+
+    Returns ``(rule, counts)`` with ``scheduled`` and ``skipped``.
+    """
+    if rule is None:
+        rule = RecurrenceRule(created_by=user_id)
+        db.session.add(rule)
+    rule.title = pattern['title']
+    rule.start_time = pattern['start_time']
+    rule.end_time = pattern['end_time']
+    rule.location = pattern['location']
+    rule.session_type = pattern['session_type']
+    rule.notes = pattern['notes']
+    rule.weekday = pattern['recurrence_day']
+    rule.start_date = pattern['start_date']
+    rule.end_date = pattern['end_date']
+    rule.team_id = pattern['team_id']
+    rule.season_id = pattern['season_id']
+    rule.coach_id = pattern['coach_id']
+    db.session.flush()
+
+    planned = {entry['date'] for entry in plan}
+    existing = {
+        e.occurrence_date: e.id for e in db.session.query(
+            RecurrenceException.id, RecurrenceException.occurrence_date
+        ).filter(RecurrenceException.rule_id == rule.id)
+    }
+    stale = [exception_id for day, exception_id in existing.items() if day not in planned]
+    if stale:
+        db.session.execute(delete(RecurrenceException).where(RecurrenceException.id.in_(stale)))
+
+    skipped = []
+    if skip_conflicts:
+        skipped = [entry['date'] for entry in plan if entry['conflicts']]
+    new_exceptions = [
+        {'rule_id': rule.id, 'occurrence_date': day, 'kind': 'cancelled',
+         'reason': _('Skipped: conflicts with another session or match'), 'created_by': user_id}
+        for day in skipped if day not in existing
+    ]
+    if new_exceptions:
+        db.session.execute(insert(RecurrenceException), new_exceptions)
+
+    return rule, {'scheduled': len(plan) - len(skipped), 'skipped': len(skipped)}
+
+
+def rule_pattern(rule):
+    """Pattern of an existing rule to prefill the form."""
+    return {
+        'title': rule.title,
+        'start_date': rule.start_date,
+        'end_date': rule.end_date,
+        'recurrence_day': rule.weekday,
+        'start_time': rule.start_time,
+        'end_time': rule.end_time,
+        'location': rule.location,
+        'session_type': rule.session_type,
+        'team_id': rule.team_id,
+        'season_id': rule.season_id,
+        'coach_id': rule.coach_id,
+        'notes': rule.notes,
+    }
+
+
+def _legacy_series_key(session):
+    if session.series_id:
+        return ('series', session.series_id)
+    return ('pattern', session.team_id, session.title, session.recurrence_day, session.start_time,
+            session.end_time, session.location, session.session_type, session.recurrence_end_date)
+
+
+def collapse_legacy_series(user_id):
+    """Replace weekly series stored one row per week with RecurrenceRules.
+
+    Rows with attendance are kept as overrides of their occurrence; other
+    cancelled rows become cancellation exceptions and the rest are deleted.
+    Weeks missing from a series (deleted sessions) become cancellations too,
+    so expansion does not bring them back. Commits and returns
+    ``(rules_created, rows_deleted, rows_kept)``.
+    """
+    rows = TrainingSession.query.filter(
+        TrainingSession.is_recurring.is_(True),
+        TrainingSession.recurrence_rule_id.is_(None),
+        TrainingSession.is_active.is_(True)
+    ).order_by(TrainingSession.date).all()
+    if not rows:
+        return 0, 0, 0
+
+    with_attendance = {
+        row.training_session_id for row in db.session.query(Attendance.training_session_id).filter(
+            Attendance.training_session_id.in_([r.id for r in rows])
+        ).distinct()
+    }
+
+    groups = defaultdict(list)
+    for row in rows:
+        groups[_legacy_series_key(row)].append(row)
+
+    rules_created = rows_deleted = rows_kept = 0
+    for sessions in groups.values():
+        first = sessions[0]
+        weekday = first.recurrence_day if first.recurrence_day is not None else first.date.weekday()
+        sessions = [s for s in sessions if s.date.weekday() == weekday]
+        if len(sessions) < 2:
+            continue
+        rule = RecurrenceRule(
+            title=first.title, start_time=first.start_time, end_time=first.end_time,
+            location=first.location, session_type=first.session_type, notes=first.notes,
+            weekday=weekday, start_date=sessions[0].date,
+            end_date=max(sessions[-1].date, first.recurrence_end_date or sessions[-1].date),
+            team_id=first.team_id, season_id=first.season_id, coach_id=first.coach_id,
+            created_by=user_id
+        )
+        db.session.add(rule)
+        db.session.flush()
+        rules_created += 1
+
+        by_date = {s.date: s for s in sessions}
+        exceptions = []
+        delete_ids = []
+        for day in rule.occurrence_dates(rule.start_date, rule.end_date):
+            session = by_date.get(day)
+            if session is None:
+                if day <= sessions[-1].date:
+                    exceptions.append({'rule_id': rule.id, 'occurrence_date': day, 'kind': 'cancelled',
+                                       'reason': None, 'created_by': user_id})
+            elif session.id in with_attendance:
+                session.recurrence_rule_id = rule.id
+                session.occurrence_date = day
+                rows_kept += 1
+            else:
+                if session.cancelled:
+                    exceptions.append({'rule_id': rule.id, 'occurrence_date': day, 'kind': 'cancelled',
+                                       'reason': session.cancellation_reason, 'created_by': user_id})
+                delete_ids.append(session.id)
+        if exceptions:
+            db.session.execute(insert(RecurrenceException), exceptions)
+        if delete_ids:
+            db.session.execute(
+                delete(TrainingSession).where(TrainingSession.id.in_(delete_ids))
+                .execution_options(synchronize_session=False)
+            )
+            rows_deleted += len(delete_ids)
+
+    db.session.commit()
+    return rules_created, rows_deleted, rows_kept
@@ -0,0 +1,295 @@
+# ABOUTME: Storage backends holding blob and preview files: the local upload folder or an S3-compatible bucket
+# ABOUTME: Keys are '/'-separated blob store keys; S3 downloads are presigned URLs, S3 chunked uploads multipart uploads
+
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from flask import current_app
+
+from app.utils.uploads import CHUNK_SIZE, hash_file, hash_stream, upload_folder
+
+
+class Storage(ABC):
+    """Where blob files live. Keys look like ``ab/cd/<sha256>``.
+
+    The ``*_parts`` methods stage the chunks of an UploadSession until it is
+    finalized; any app instance may receive any chunk.
+    """
+
+    # Smallest chunk a chunked upload may use (the last one excepted)
+    min_part_size = 0
+
+    @abstractmethod
+    def put(self, key, temp_path, mime_type=None):
+        """Store a local temp file under ``key``; the temp file is consumed."""
+
+    @abstractmethod
+    def exists(self, key):
+        """Whether ``key`` is stored."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove ``key``; a missing key is not an error."""
+
+    @abstractmethod
+    def location(self, key):
+        """Value recorded in Document.file_path for ``key``."""
+
+    @abstractmethod
+    def local_path(self, key):
+        """Context manager yielding a local file with the content of ``key``, for pool workers to read."""
+
+    @abstractmethod
+    def start_parts(self, upload_id, mime_type=None):
+        """Begin staging the chunks of an upload session; returns the multipart upload id or None."""
+
+    @abstractmethod
+    def write_part(self, upload, index, temp_path):
+        """Stage chunk ``index`` from a local temp file, replacing an interrupted attempt.
+
+        The temp file is consumed. Returns the part's ETag, or None.
+        """
+
+    @abstractmethod
+    def complete_parts(self, upload):
+        """Assemble the staged chunks of a complete upload; returns (sha256, size)."""
+
+    @abstractmethod
+    def put_parts(self, key, upload, mime_type=None):
+        """Store the assembled upload under ``key``; the staged copy is consumed."""
+
+    @abstractmethod
+    def discard_parts(self, upload):
+        """Drop what an upload staged; nothing staged is not an error."""
+
+    def download_url(self, key, file_name=None, mime_type=None, inline=False):
+        """URL the browser can fetch ``key`` from without the app, or None to serve it locally."""
+        return None
+
+
+class LocalStorage(Storage):
+    """Files under UPLOAD_FOLDER, served by Flask or the front proxy."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, key, temp_path, mime_type=None):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def delete(self, key):
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def location(self, key):
+        return self.path(key)
+
+    @contextmanager
+    def local_path(self, key):
+        yield self.path(key)
+
+    def part_path(self, upload_id):
+        """Temp file collecting the chunks of an upload session."""
+        return os.path.join(self.root, 'tmp', f'{upload_id}.part')
+
+    def start_parts(self, upload_id, mime_type=None):
+        path = self.part_path(upload_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+        return None
+
+    def write_part(self, upload, index, temp_path):
+        # Data past the last acknowledged chunk (left by an interrupted attempt) is overwritten
+        with open(self.part_path(upload.id), 'r+b') as out, open(temp_path, 'rb') as chunk:
+            out.seek(upload.received_bytes)
+            out.truncate()
+            shutil.copyfileobj(chunk, out, CHUNK_SIZE)
+        os.remove(temp_path)
+        return None
+
+    def complete_parts(self, upload):
+        return hash_file(self.part_path(upload.id))
+
+    def put_parts(self, key, upload, mime_type=None):
+        self.put(key, self.part_path(upload.id), mime_type)
+
+    def discard_parts(self, upload):
+        path = self.part_path(upload.id)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class S3Storage(Storage):
+    """Objects in an S3-compatible bucket (AWS S3, MinIO).
+
+    Puts stream the temp file in multipart chunks and downloads never pass
+    through the app: browsers are redirected to a presigned GET URL. Each
+    chunked upload session is an S3 multipart upload to ``tmp/<id>``, so
+    no chunk is kept on the local volume between requests.
+    """
+
+    # S3 refuses multipart parts under 5 MB, except the last
+    min_part_size = 5 * 1024 * 1024
+
+    def __init__(self, client, bucket, prefix='', url_expires=300, multipart_chunk_size=8 * 1024 * 1024):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.url_expires = url_expires
+        self.multipart_chunk_size = multipart_chunk_size
+
+    @classmethod
+    def from_config(cls, config):
+        import boto3
+
+        client = boto3.client(
+            's3',
+            endpoint_url=config.get('S3_ENDPOINT_URL') or None,
+            region_name=config.get('S3_REGION') or None,
+            aws_access_key_id=config.get('S3_ACCESS_KEY_ID') or None,
+            aws_secret_access_key=config.get('S3_SECRET_ACCESS_KEY') or None,
+        )
+        return cls(client, config['S3_BUCKET'], config.get('S3_PREFIX', ''),
+                   config.get('S3_URL_EXPIRES', 300), config.get('S3_MULTIPART_CHUNK_SIZE', 8 * 1024 * 1024))
+
+    def object_key(self, key):
+        return self.prefix + key
+
+    def _transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(multipart_threshold=self.multipart_chunk_size,
+                              multipart_chunksize=self.multipart_chunk_size)
+
+    def put(self, key, temp_path, mime_type=None):
+        extra = {'ContentType': mime_type} if mime_type else None
+        self.client.upload_file(temp_path, self.bucket, self.object_key(key), ExtraArgs=extra,
+                                Config=self._transfer_config())
+        os.remove(temp_path)
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if _error_code(e) in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    def location(self, key):
+        return f's3://{self.bucket}/{self.object_key(key)}'
+
+    @contextmanager
+    def local_path(self, key):
+        tmp_dir = os.path.join(upload_folder(), 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=tmp_dir)
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self.object_key(key), path)
+            yield path
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def staging_key(self, upload_id):
+        return f'tmp/{upload_id}'
+
+    def start_parts(self, upload_id, mime_type=None):
+        extra = {'ContentType': mime_type} if mime_type else {}
+        response = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=self.object_key(self.staging_key(upload_id)), **extra
+        )
+        return response['UploadId']
+
+    def write_part(self, upload, index, temp_path):
+        # Uploading a part number again replaces the interrupted attempt
+        try:
+            with open(temp_path, 'rb') as body:
+                response = self.client.upload_part(
+                    Bucket=self.bucket, Key=self.object_key(self.staging_key(upload.id)),
+                    UploadId=upload.multipart_id, PartNumber=index + 1, Body=body,
+                )
+        finally:
+            os.remove(temp_path)
+        return response['ETag']
+
+    def complete_parts(self, upload):
+        from botocore.exceptions import ClientError
+
+        key = self.object_key(self.staging_key(upload.id))
+        parts = [{'PartNumber': number, 'ETag': etag} for number, etag in enumerate(upload.etags(), 1)]
+        try:
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload.multipart_id,
+                                                  MultipartUpload={'Parts': parts})
+        except ClientError as e:
+            # Completed by an earlier finalize attempt that failed afterwards
+            if _error_code(e) != 'NoSuchUpload' or not self.exists(self.staging_key(upload.id)):
+                raise
+        body = self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+        try:
+            return hash_stream(body)
+        finally:
+            body.close()
+
+    def put_parts(self, key, upload, mime_type=None):
+        staged = self.object_key(self.staging_key(upload.id))
+        self.client.copy({'Bucket': self.bucket, 'Key': staged}, self.bucket, self.object_key(key),
+                         Config=self._transfer_config())
+        self.client.delete_object(Bucket=self.bucket, Key=staged)
+
+    def discard_parts(self, upload):
+        from botocore.exceptions import ClientError
+
+        if upload.multipart_id:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket,
+                                                   Key=self.object_key(self.staging_key(upload.id)),
+                                                   UploadId=upload.multipart_id)
+            except ClientError as e:
+                if _error_code(e) != 'NoSuchUpload':
+                    raise
+        self.delete(self.staging_key(upload.id))
+
+    def download_url(self, key, file_name=None, mime_type=None, inline=False):
+        params = {'Bucket': self.bucket, 'Key': self.object_key(key)}
+        if file_name:
+            disposition = 'inline' if inline else 'attachment'
+            params['ResponseContentDisposition'] = f'{disposition}; filename="{file_name}"'
+        if mime_type:
+            params['ResponseContentType'] = mime_type
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=self.url_expires)
+
+
+def _error_code(error):
+    return error.response.get('Error', {}).get('Code')
+
+
+def get_storage():
+    """The backend selected by STORAGE_BACKEND ('local' or 's3')."""
+    backend = current_app.config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(upload_folder())
+    if backend == 's3':
+        # The boto3 client is thread-safe and costly to build; keep one per app
+        storage = current_app.extensions.get('s3_storage')
+        if storage is None:
+            storage = current_app.extensions['s3_storage'] = S3Storage.from_config(current_app.config)
+        return storage
+    raise RuntimeError(f'Unknown STORAGE_BACKEND {backend!r}')
@@ -0,0 +1,55 @@
+# ABOUTME: Fire-and-forget background work in a daemon thread with an application context
+# ABOUTME: Also owns the process pool that runs CPU-heavy document work (previews, image re-encoding)
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Call func(*args, **kwargs) in a daemon thread inside an app context.
+
+    Returns the started thread so callers (and tests) may join it.
+    """
+    app = current_app._get_current_object()
+
+    def _worker():
+        with app.app_context():
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                app.logger.exception(f'Background task {func.__name__} failed')
+
+    thread = threading.Thread(target=_worker, daemon=True)
+    thread.start()
+    return thread
+
+
+def process_pool():
+    """The shared document worker pool, or None when DOCUMENT_WORKERS is 0.
+
+    Workers are spawned rather than forked so they never inherit the
+    locks or connections of a threaded web worker. Jobs must be plain
+    top-level functions taking picklable arguments.
+    """
+    global _pool
+    workers = current_app.config.get('DOCUMENT_WORKERS', 0)
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def shutdown_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,242 @@
+# ABOUTME: Text extraction from uploaded PDFs and full-text search over it with highlighted snippets
+# ABOUTME: Extraction is incremental per blob and runs in the process pool; FTS5 on SQLite, FULLTEXT on MySQL
+
+import importlib.util
+import mimetypes
+import re
+from contextlib import ExitStack
+
+from flask import current_app
+from markupsafe import Markup, escape
+from sqlalchemy import Integer, and_, bindparam, column, select, text
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.utils.storage import get_storage
+from app.utils.tasks import process_pool, run_in_background
+
+TEXT_MIME_TYPES = {'application/pdf'}
+
+# Blobs extracted per batch (and per commit) by extract_pending_texts
+TEXT_BATCH_SIZE = 50
+
+# Words around the first match shown in a search snippet
+SNIPPET_WORDS = 16
+
+# Search words used; the rest of a long query is ignored
+MAX_SEARCH_TERMS = 8
+
+# Control characters marking matches in raw snippets, replaced once escaped
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def extractable(mime_type, file_name=None):
+    """Whether text can be extracted from the content (PDFs, with pypdf installed)."""
+    if not mime_type and file_name:
+        mime_type = mimetypes.guess_type(file_name)[0]
+    return mime_type in TEXT_MIME_TYPES and importlib.util.find_spec('pypdf') is not None
+
+
+def extract_pdf_text(path, max_chars):
+    """Embedded text of a PDF with whitespace collapsed. Runs in a pool worker.
+
+    Returns (text, page_count); scanned pages without a text layer yield
+    nothing.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    parts, length = [], 0
+    for page in reader.pages:
+        page_text = ' '.join((page.extract_text() or '').split())
+        parts.append(page_text)
+        length += len(page_text) + 1
+        if length >= max_chars:
+            break
+    return ' '.join(part for part in parts if part)[:max_chars], len(reader.pages)
+
+
+def _store_text(blob_id, content, pages):
+    from app.models import DocumentText
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(DocumentText(blob_id=blob_id, content=content, pages=pages))
+    except IntegrityError:
+        # Extracted concurrently by another worker
+        pass
+
+
+def _extract(pool, path):
+    """Text of a local PDF copy, or a Future for it when there is a pool."""
+    from app.models import DocumentText
+
+    if pool is None:
+        return extract_pdf_text(path, DocumentText.MAX_CHARS)
+    return pool.submit(extract_pdf_text, path, DocumentText.MAX_CHARS)
+
+
+def extract_blob_text(blob_id):
+    """Extract and store the text of one blob, through the pool when there is one. Commits."""
+    from app.models import DocumentText, UploadBlob
+
+    blob = db.session.get(UploadBlob, blob_id)
+    if blob is None or not extractable(blob.mime_type) or \
+       DocumentText.query.filter_by(blob_id=blob_id).count():
+        return
+    pool = process_pool()
+    try:
+        with get_storage().local_path(blob.storage_key) as path:
+            result = _extract(pool, path)
+            content, pages = result if pool is None else result.result()
+    except Exception as e:
+        current_app.logger.warning(f'No text extracted from blob {blob.sha256}: {e}')
+        content, pages = '', None
+    _store_text(blob_id, content, pages)
+    db.session.commit()
+
+
+def schedule_text_extraction(blob, mime_type=None, file_name=None):
+    """Extract a new blob's text off the request thread (inline without a pool)."""
+    if not extractable(mime_type or blob.mime_type, file_name):
+        return None
+    if process_pool() is None:
+        extract_blob_text(blob.id)
+        return None
+    return run_in_background(extract_blob_text, blob.id)
+
+
+def pending_text_blob_ids(after_id=0, limit=TEXT_BATCH_SIZE):
+    """Ids of PDF blobs without extracted text, in id order."""
+    from app.models import DocumentText, UploadBlob
+
+    return [row.id for row in db.session.query(UploadBlob.id).outerjoin(
+        DocumentText, DocumentText.blob_id == UploadBlob.id
+    ).filter(
+        DocumentText.id.is_(None),
+        UploadBlob.mime_type.in_(TEXT_MIME_TYPES),
+        UploadBlob.id > after_id
+    ).order_by(UploadBlob.id).limit(limit)]
+
+
+def extract_pending_texts(batch_size=TEXT_BATCH_SIZE):
+    """Extract the text of every PDF blob that has none yet.
+
+    Each batch is spread over the process pool (inline without one) and
+    committed as a whole. Returns (blobs_extracted, blobs_failed).
+    """
+    from app.models import UploadBlob
+
+    if importlib.util.find_spec('pypdf') is None:
+        return 0, 0
+    extracted = failed = last_id = 0
+    pool = process_pool()
+    storage = get_storage()
+    while True:
+        ids = pending_text_blob_ids(last_id, batch_size)
+        if not ids:
+            return extracted, failed
+        last_id = ids[-1]
+        blobs = UploadBlob.query.filter(UploadBlob.id.in_(ids)).order_by(UploadBlob.id).all()
+        # Local copies (for remote storage) stay open until the whole batch is read
+        with ExitStack() as stack:
+            jobs = []
+            for blob in blobs:
+                try:
+                    job = _extract(pool, stack.enter_context(storage.local_path(blob.storage_key)))
+                except Exception as e:
+                    job = e
+                jobs.append((blob, job))
+            for blob, job in jobs:
+                try:
+                    if isinstance(job, Exception):
+                        raise job
+                    content, pages = job if pool is None else job.result()
+                    extracted += 1
+                except Exception as e:
+                    current_app.logger.warning(f'No text extracted from blob {blob.sha256}: {e}')
+                    content, pages = '', None
+                    failed += 1
+                _store_text(blob.id, content, pages)
+        db.session.commit()
+
+
+def search_terms(search):
+    return re.findall(r'\w+', (search or '').lower())[:MAX_SEARCH_TERMS]
+
+
+def text_match_blob_ids(search):
+    """Select of the blob ids whose text contains every word of ``search`` (as a prefix).
+
+    Returns None when the search has no words.
+    """
+    from app.models import DocumentText
+
+    terms = search_terms(search)
+    if not terms:
+        return None
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        matches = text('SELECT rowid FROM document_text_fts WHERE document_text_fts MATCH :q').bindparams(
+            q=' '.join(f'"{term}"*' for term in terms)
+        ).columns(column('rowid', Integer))
+        return select(DocumentText.blob_id).where(DocumentText.id.in_(matches))
+    if dialect == 'mysql':
+        return select(DocumentText.blob_id).where(
+            text('MATCH (document_text.content) AGAINST (:q IN BOOLEAN MODE)').bindparams(
+                q=' '.join(f'+{term}*' for term in terms)
+            )
+        )
+    return select(DocumentText.blob_id).where(and_(*[DocumentText.content.ilike(f'%{term}%') for term in terms]))
+
+
+def _matches(token, terms):
+    word = token.lower().lstrip('([{"\'')
+    return any(word.startswith(term) for term in terms)
+
+
+def make_snippet(content, terms, words=SNIPPET_WORDS):
+    """Raw snippet of ``content`` around the first word starting with a term, matches marked."""
+    tokens = content.split()
+    first = next((i for i, token in enumerate(tokens) if _matches(token, terms)), None)
+    if first is None:
+        return None
+    start = max(0, first - words // 3)
+    marked = [f'{MARK_START}{token}{MARK_END}' if _matches(token, terms) else token
+              for token in tokens[start:start + words]]
+    return ('… ' if start else '') + ' '.join(marked) + (' …' if start + words < len(tokens) else '')
+
+
+def highlight(raw):
+    """Escape a raw snippet and turn its match markers into <mark> tags."""
+    return escape(raw).replace(MARK_START, Markup('<mark>')).replace(MARK_END, Markup('</mark>'))
+
+
+def search_snippets(search, documents):
+    """``{document id: Markup}`` snippets of matching text for a page of search results."""
+    from app.models import DocumentText
+
+    terms = search_terms(search)
+    blob_ids = {d.blob_id for d in documents if d.blob_id is not None}
+    if not terms or not blob_ids:
+        return {}
+
+    if db.engine.dialect.name == 'sqlite':
+        rows = db.session.execute(text(
+            'SELECT t.blob_id, snippet(document_text_fts, 0, :start, :end, :ellipsis, :words) '
+            'FROM document_text_fts JOIN document_text t ON t.id = document_text_fts.rowid '
+            'WHERE document_text_fts MATCH :q AND t.blob_id IN :ids'
+        ).bindparams(bindparam('ids', expanding=True)), {
+            'start': MARK_START, 'end': MARK_END, 'ellipsis': '…', 'words': SNIPPET_WORDS,
+            'q': ' '.join(f'"{term}"*' for term in terms), 'ids': list(blob_ids),
+        })
+    else:
+        rows = [
+            (blob_id, make_snippet(content, terms))
+            for blob_id, content in db.session.query(DocumentText.blob_id, DocumentText.content).filter(
+                DocumentText.blob_id.in_(blob_ids),
+                DocumentText.blob_id.in_(text_match_blob_ids(search))
+            )
+        ]
+    by_blob = {blob_id: highlight(raw) for blob_id, raw in rows if raw}
+    return {d.id: by_blob[d.blob_id] for d in documents if d.blob_id in by_blob}
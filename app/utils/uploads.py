@@ -1,21 +1,158 @@
 # ABOUTME: File upload utilities for saving, deleting, and validating uploads
-# ABOUTME: Uses UUID naming to prevent conflicts and directory traversal
+# ABOUTME: Content-addressed store: uploads are hashed while streaming and kept once per SHA-256
 
+import hashlib
+import json
 import os
+import tempfile
 import uuid
+from datetime import datetime, timedelta
+
 from flask import current_app
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from werkzeug.utils import secure_filename
 
+from app import db
+
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
 
+# Bytes read per step while streaming an upload to disk
+CHUNK_SIZE = 64 * 1024
+
 
 def allowed_file(filename):
     """Check if file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def upload_folder():
+    return current_app.config.get('UPLOAD_FOLDER', 'uploads')
+
+
+def blob_key(sha256):
+    """Two-level sharded storage key of a digest: ``ab/cd/abcd...``."""
+    return f'{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+def blob_path(storage_key):
+    """Local file of a blob under UPLOAD_FOLDER (local storage only)."""
+    return os.path.join(upload_folder(), *storage_key.split('/'))
+
+
+def blob_location(storage_key):
+    """Document.file_path of a blob in the configured storage backend."""
+    from app.utils.storage import get_storage
+    return get_storage().location(storage_key)
+
+
+def hash_stream(stream):
+    """SHA-256 hex digest and size of a readable stream, read in chunks."""
+    digest, size = hashlib.sha256(), 0
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def hash_file(path):
+    """SHA-256 hex digest and size of a file on disk, read in chunks."""
+    with open(path, 'rb') as f:
+        return hash_stream(f)
+
+
+def stream_to_temp(stream, max_size=None):
+    """Copy a stream to a temp file under UPLOAD_FOLDER, hashing it on the way.
+
+    Returns (temp_path, sha256, size). The temp file sits on the same
+    filesystem as the blobs so it can be moved into place atomically.
+    Raises ValueError, leaving nothing behind, past ``max_size`` bytes.
+    """
+    tmp_dir = os.path.join(upload_folder(), 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest, size = hashlib.sha256(), 0
+    fd, temp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise ValueError('chunk too large')
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
+
+
+def acquire_blob(blob):
+    """Take one reference on a blob for an active document."""
+    from app.models import UploadBlob
+    db.session.execute(
+        update(UploadBlob).where(UploadBlob.id == blob.id).values(ref_count=UploadBlob.ref_count + 1)
+    )
+
+
+def release_blob(blob):
+    """Drop one reference, e.g. when a document is soft-deleted. The file stays on disk."""
+    from app.models import UploadBlob
+    db.session.execute(
+        update(UploadBlob)
+        .where(UploadBlob.id == blob.id, UploadBlob.ref_count > 0)
+        .values(ref_count=UploadBlob.ref_count - 1)
+    )
+
+
+def store_blob(temp_path, sha256, size, mime_type=None):
+    """Move a hashed temp file into the blob store and take one reference.
+
+    Identical content already stored is reused and the temp file discarded.
+    Returns the UploadBlob; the caller commits.
+    """
+    from app.utils.storage import get_storage
+
+    storage = get_storage()
+    return _claim_blob(sha256, size, mime_type,
+                       put=lambda key: storage.put(key, temp_path, mime_type),
+                       discard=lambda: os.remove(temp_path))
+
+
+def _claim_blob(sha256, size, mime_type, put, discard):
+    """store_blob for content of any origin: ``put(key)`` stores it, ``discard()`` drops it."""
+    from app.models import UploadBlob
+    from app.utils.storage import get_storage
+
+    storage = get_storage()
+    key = blob_key(sha256)
+    blob = UploadBlob.query.filter_by(sha256=sha256).first()
+    if blob is None:
+        put(key)
+        try:
+            with db.session.begin_nested():
+                blob = UploadBlob(sha256=sha256, storage_key=key, size=size, mime_type=mime_type, ref_count=1)
+                db.session.add(blob)
+            return blob
+        except IntegrityError:
+            # A concurrent upload of the same content created the row first;
+            # the file it points to is byte-identical to ours
+            blob = UploadBlob.query.filter_by(sha256=sha256).one()
+    elif not storage.exists(key):
+        # Restore a blob file lost from storage
+        put(key)
+    else:
+        discard()
+    acquire_blob(blob)
+    return blob
+
+
 def save_upload(file):
-    """Save uploaded file with UUID name. Returns (saved_path, original_filename, file_size, mime_type)."""
+    """Store an uploaded file in the blob store.
+
+    Returns (saved_path, original_filename, file_size, mime_type, blob), or
+    None for a missing or disallowed file. The caller commits.
+    """
     if not file or not file.filename:
         return None
 
@@ -23,22 +160,217 @@ def save_upload(file):
     if not allowed_file(original_filename):
         return None
 
-    ext = original_filename.rsplit('.', 1)[1].lower()
-    unique_name = f"{uuid.uuid4().hex}.{ext}"
+    mime_type = file.content_type
+    temp_path, sha256, file_size = stream_to_temp(file.stream)
+    blob = store_blob(temp_path, sha256, file_size, mime_type)
 
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-    os.makedirs(upload_folder, exist_ok=True)
+    return blob_location(blob.storage_key), original_filename, file_size, mime_type, blob
 
-    save_path = os.path.join(upload_folder, unique_name)
-    file.save(save_path)
 
-    file_size = os.path.getsize(save_path)
-    mime_type = file.content_type
+def start_upload_session(file_name, total_size, mime_type, user_id):
+    """Open a chunked upload; returns the UploadSession, or None if the file is refused.
 
-    return save_path, original_filename, file_size, mime_type
+    Chunks are never smaller than the storage backend accepts for a part.
+    The caller commits.
+    """
+    from app.models import UploadSession
+    from app.utils.storage import get_storage
+
+    file_name = secure_filename(file_name or '')
+    if not allowed_file(file_name) or not 0 < total_size <= current_app.config['UPLOAD_MAX_SIZE']:
+        return None
+    storage = get_storage()
+    upload = UploadSession(
+        id=uuid.uuid4().hex, created_by=user_id, file_name=file_name, mime_type=mime_type,
+        total_size=total_size, chunk_size=max(current_app.config['UPLOAD_CHUNK_SIZE'], storage.min_part_size),
+        next_chunk=0, received_bytes=0,
+    )
+    upload.multipart_id = storage.start_parts(upload.id, mime_type)
+    db.session.add(upload)
+    return upload
+
+
+def write_chunk(upload, index, stream, expected_sha256=None):
+    """Check chunk ``index`` while it streams to a scratch file, then stage it in storage.
+
+    A chunk written again after an interrupted attempt replaces it. Raises
+    ValueError for an out-of-order chunk, a wrong length or a checksum
+    mismatch, and StaleDataError if a concurrent request stored the chunk
+    first. The caller commits.
+    """
+    from app.models import UploadSession
+    from app.utils.storage import get_storage
+
+    if index != upload.next_chunk:
+        raise ValueError('unexpected chunk')
+    expected_size = upload.expected_chunk_size(index)
+    temp_path, sha256, written = stream_to_temp(stream, max_size=expected_size)
+    error = None
+    if written != expected_size:
+        error = 'incomplete chunk'
+    elif expected_sha256 and sha256 != expected_sha256.lower():
+        error = 'checksum mismatch'
+    if error:
+        os.remove(temp_path)
+        raise ValueError(error)
+    etag = get_storage().write_part(upload, index, temp_path)
+
+    values = {'next_chunk': index + 1, 'received_bytes': UploadSession.received_bytes + written,
+              'updated_at': datetime.utcnow()}
+    if etag is not None:
+        values['part_etags'] = json.dumps(upload.etags()[:index] + [etag])
+    result = db.session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload.id, UploadSession.next_chunk == index)
+        .values(**values)
+    )
+    if result.rowcount != 1:
+        raise StaleDataError('chunk already stored')
+
+
+def finalize_upload_session(upload):
+    """Move a complete upload into the blob store and drop the session.
+
+    Returns (saved_path, original_filename, file_size, mime_type, blob) like
+    save_upload, or None while chunks are missing. The caller creates the
+    Document and commits both in one transaction.
+    """
+    from app.utils.storage import get_storage
+
+    if upload.received_bytes != upload.total_size:
+        return None
+    storage = get_storage()
+    sha256, size = storage.complete_parts(upload)
+    blob = _claim_blob(sha256, size, upload.mime_type,
+                       put=lambda key: storage.put_parts(key, upload, upload.mime_type),
+                       discard=lambda: storage.discard_parts(upload))
+    result = (blob_location(blob.storage_key), upload.file_name, size, upload.mime_type, blob)
+    db.session.delete(upload)
+    return result
+
+
+def discard_upload_session(upload):
+    """Delete a session and the chunks it staged; the caller commits."""
+    from app.utils.storage import get_storage
+
+    get_storage().discard_parts(upload)
+    db.session.delete(upload)
+
+
+def expire_upload_sessions(hours):
+    """Discard sessions idle for more than ``hours``. Returns how many were removed."""
+    from app.models import UploadSession
+
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    for upload in stale:
+        discard_upload_session(upload)
+    db.session.commit()
+    return len(stale)
 
 
 def delete_upload(file_path):
     """Delete an uploaded file from disk."""
     if file_path and os.path.exists(file_path):
         os.remove(file_path)
+
+
+def purge_document(document):
+    """Hard-delete a document and commit; the file goes once nothing references it.
+
+    Active documents release their blob reference first. Legacy documents
+    without a blob lose their own file.
+    """
+    from app.models import Document
+
+    blob, file_path = document.blob, document.file_path
+    if blob is not None and document.is_active:
+        release_blob(blob)
+    db.session.delete(document)
+    db.session.commit()
+
+    if blob is None:
+        if not Document.query.filter_by(file_path=file_path).count():
+            delete_upload(file_path)
+        return
+    if not discard_unused_blob(blob) and blob.ref_count <= 0:
+        # Only soft-deleted documents still point at it; keep for restoration
+        current_app.logger.info(f'Blob {blob.sha256} kept for soft-deleted documents')
+
+
+def discard_unused_blob(blob):
+    """Delete a blob, its file and previews once nothing refers to it, and commit.
+
+    Returns whether the blob was deleted.
+    """
+    from app.models import Document
+    from app.utils.previews import delete_previews
+    from app.utils.storage import get_storage
+
+    db.session.refresh(blob)
+    if blob.ref_count > 0 or Document.query.filter_by(blob_id=blob.id).count():
+        return False
+    key = blob.storage_key
+    db.session.delete(blob)
+    db.session.commit()
+    get_storage().delete(key)
+    delete_previews(key)
+    return True
+
+
+def recount_blob_references():
+    """Set every blob's ref_count to its number of active documents."""
+    from app.models import Document, UploadBlob
+
+    counts = dict(db.session.query(Document.blob_id, func.count(Document.id)).filter(
+        Document.blob_id.isnot(None), Document.is_active.is_(True)
+    ).group_by(Document.blob_id).all())
+    for blob in UploadBlob.query.all():
+        blob.ref_count = counts.get(blob.id, 0)
+    db.session.commit()
+
+
+def dedup_legacy_uploads(batch_size=200):
+    """Move documents stored as ``<uuid>.<ext>`` files into the blob store.
+
+    Each file is hashed in place; the first copy of some content becomes
+    the blob and later copies are deleted. Reference counts are rebuilt at
+    the end. Returns (documents_migrated, duplicates_removed, bytes_saved,
+    missing_files).
+    """
+    from app.models import Document, UploadBlob
+    from app.utils.storage import get_storage
+
+    storage = get_storage()
+    migrated = duplicates = saved = missing = 0
+    last_id = 0
+    while True:
+        documents = Document.query.filter(
+            Document.blob_id.is_(None), Document.id > last_id
+        ).order_by(Document.id).limit(batch_size).all()
+        if not documents:
+            break
+        last_id = documents[-1].id
+        for document in documents:
+            if not os.path.exists(document.file_path):
+                missing += 1
+                continue
+            sha256, size = hash_file(document.file_path)
+            blob = UploadBlob.query.filter_by(sha256=sha256).first()
+            if blob is None:
+                key = blob_key(sha256)
+                storage.put(key, document.file_path, document.mime_type)
+                blob = UploadBlob(sha256=sha256, storage_key=key, size=size, mime_type=document.mime_type)
+                db.session.add(blob)
+                db.session.flush()
+            elif os.path.abspath(document.file_path) != os.path.abspath(storage.location(blob.storage_key)):
+                os.remove(document.file_path)
+                duplicates += 1
+                saved += size
+            document.blob_id = blob.id
+            document.file_path = storage.location(blob.storage_key)
+            migrated += 1
+        db.session.commit()
+
+    recount_blob_references()
+    return migrated, duplicates, saved, missing
@@ -4,10 +4,12 @@ from flask_login import login_required, current_user
 from flask_babel import gettext as _
 from app import db
 from sqlalchemy.orm import joinedload
-from app.models import Athlete, Guardian, Team, Match, MatchLineup, EmergencyContact, Insurance
+from app.models import (Athlete, Guardian, Team, Match, MatchLineup, EmergencyContact, Insurance,
+                        AthleteSeasonStats, Season)
 from app.forms.athletes_forms import AthleteForm
 from app.forms.emergency_contact_forms import EmergencyContactForm
 from app.forms.insurance_forms import InsuranceForm
+from app.utils.ics import feed_url, rotate_feed_key
 
 athletes_bp = Blueprint('athletes', __name__, url_prefix='/athletes')
 
@@ -132,14 +134,23 @@ def detail(id):
     if not athlete.is_active:
         abort(404)
 
-    # Get match history from lineups, ordered by match date descending
+    # Per-season totals come precomputed; the match history is paginated
+    season_stats = AthleteSeasonStats.query.join(AthleteSeasonStats.season).options(
+        joinedload(AthleteSeasonStats.season)
+    ).filter(
+        AthleteSeasonStats.athlete_id == id,
+        AthleteSeasonStats.appearances > 0
+    ).order_by(Season.start_date.desc()).all()
+
+    matches_page = request.args.get('matches_page', 1, type=int)
     match_lineups = MatchLineup.query.join(
         MatchLineup.match
     ).options(
         joinedload(MatchLineup.match)
     ).filter(
-        MatchLineup.athlete_id == id
-    ).order_by(Match.date.desc()).all()
+        MatchLineup.athlete_id == id,
+        Match.is_active.is_(True)
+    ).order_by(Match.date.desc()).paginate(page=matches_page, per_page=10, error_out=False)
 
     emergency_contacts = EmergencyContact.query.filter_by(
         athlete_id=id, is_active=True
@@ -147,7 +158,9 @@ def detail(id):
 
     return render_template('athletes/detail.html', athlete=athlete,
                            match_lineups=match_lineups,
-                           emergency_contacts=emergency_contacts)
+                           season_stats=season_stats,
+                           emergency_contacts=emergency_contacts,
+                           calendar_feed_url=feed_url('athlete', athlete) if athlete.team_id else None)
 
 @athletes_bp.route('/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -304,6 +317,20 @@ def delete(id):
         print(f"Error: {e}")
         return redirect(url_for('athletes.detail', id=id))
 
+@athletes_bp.route('/<int:id>/calendar-feed/reset', methods=['POST'])
+@login_required
+def reset_calendar_feed(id):
+    """Issue a new calendar feed link; subscriptions to the old one stop working"""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        flash(_('Permission denied.'), 'danger')
+        return redirect(url_for('athletes.detail', id=id))
+
+    athlete = Athlete.query.get_or_404(id)
+    rotate_feed_key(athlete)
+    db.session.commit()
+    flash(_('Calendar feed link reset. Old subscriptions no longer update.'), 'success')
+    return redirect(url_for('athletes.detail', id=athlete.id))
+
 
 @athletes_bp.route('/<int:id>/emergency-contacts/add', methods=['GET', 'POST'])
 @login_required
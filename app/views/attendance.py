@@ -1,10 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+import heapq
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from flask_babel import gettext as _
+from flask_wtf.csrf import generate_csrf
 from app import db
-from app.models import Attendance, Athlete, Team
+from app.models import Attendance, Athlete, Team, TrainingSession, RecurrenceRule
 from app.forms.attendance_forms import AttendanceForm, BulkAttendanceForm, AttendanceReportForm
-from datetime import datetime
+from app.utils.attendance import (ATTENDANCE_STATUSES, AttendanceMatrix, adjust_roll_call,
+                                  apply_attendance_marks, parse_marked_at)
+from app.utils.recurrence import expand_occurrences, get_rule_occurrence, materialize, session_sort_key
+from datetime import datetime, date, timedelta
 
 attendance_bp = Blueprint('attendance', __name__, url_prefix='/attendance')
 
@@ -59,9 +64,53 @@ def check_in():
         return redirect(url_for('attendance.index'))
 
     form = BulkAttendanceForm()
+    team_id = request.args.get('team_id', type=int)
+
+    # Opening check-in from a training session pre-fills team, date and type
+    selected_session = None
+    selected_session_id = request.values.get('training_session_id', type=int)
+    if selected_session_id:
+        selected_session = TrainingSession.query.filter_by(id=selected_session_id, is_active=True).first()
+        if selected_session:
+            team_id = team_id or selected_session.team_id
+
+    form.training_session_id.choices = [('', _('-- No Session --'))] + [
+        (_session_choice_value(s), f'{s.date.strftime("%d/%m/%Y")} {s.start_time.strftime("%H:%M")} - {s.title}')
+        for s in _check_in_sessions(team_id, selected_session)
+    ]
+
+    if form.validate_on_submit():
+        training_session_id = _resolve_session_choice(form.training_session_id.data)
+        # Checkbox names are the statuses, values are athlete ids
+        marks = []
+        for status in ATTENDANCE_STATUSES:
+            for athlete_id in request.form.getlist(status):
+                try:
+                    athlete_id = int(athlete_id)
+                except (ValueError, TypeError):
+                    continue
+                marks.append({
+                    'athlete_id': athlete_id,
+                    'date': form.date.data,
+                    'session_type': form.session_type.data,
+                    'training_session_id': training_session_id,
+                    'status': status,
+                    'notes': form.notes.data,
+                })
+
+        outcomes = apply_attendance_marks(marks, current_user.id)
+        db.session.commit()
+        count = sum(1 for o in outcomes if o['outcome'] in ('created', 'updated'))
+        flash(_('Attendance recorded for %(count)d athletes.', count=count), 'success')
+        return redirect(url_for('attendance.index'))
+
+    if selected_session and request.method == 'GET':
+        form.training_session_id.data = str(selected_session.id)
+        form.date.data = selected_session.date
+        form.session_type.data = 'training' if selected_session.session_type == 'training' else (
+            'match' if selected_session.session_type in ('friendly', 'tournament') else 'event')
 
     # Filter athletes by team if selected
-    team_id = request.args.get('team_id', type=int)
     query = Athlete.query.filter_by(is_active=True)
     if team_id:
         query = query.filter_by(team_id=team_id)
@@ -70,67 +119,208 @@ def check_in():
     # Get teams for filter dropdown
     teams = Team.query.filter_by(is_active=True).order_by(Team.name).all()
 
-    if form.validate_on_submit():
-        # Get selected athletes from request (checkboxes)
-        present_ids = request.form.getlist('present')
-        absent_ids = request.form.getlist('absent')
-        excused_ids = request.form.getlist('excused')
-        late_ids = request.form.getlist('late')
-
-        count = 0
-        for athlete_id in present_ids:
-            attendance = Attendance(
-                athlete_id=int(athlete_id),
-                date=form.date.data,
-                session_type=form.session_type.data,
-                status='present',
-                notes=form.notes.data,
-                created_by=current_user.id
-            )
-            db.session.add(attendance)
-            count += 1
-
-        for athlete_id in absent_ids:
-            attendance = Attendance(
-                athlete_id=int(athlete_id),
-                date=form.date.data,
-                session_type=form.session_type.data,
-                status='absent',
-                notes=form.notes.data,
-                created_by=current_user.id
-            )
-            db.session.add(attendance)
-            count += 1
-
-        for athlete_id in excused_ids:
-            attendance = Attendance(
-                athlete_id=int(athlete_id),
-                date=form.date.data,
-                session_type=form.session_type.data,
-                status='excused',
-                notes=form.notes.data,
-                created_by=current_user.id
-            )
-            db.session.add(attendance)
-            count += 1
-
-        for athlete_id in late_ids:
-            attendance = Attendance(
-                athlete_id=int(athlete_id),
-                date=form.date.data,
-                session_type=form.session_type.data,
-                status='late',
-                notes=form.notes.data,
-                created_by=current_user.id
-            )
-            db.session.add(attendance)
-            count += 1
+    return render_template('attendance/check_in.html', form=form, athletes=athletes, teams=teams, selected_team=team_id)
 
-        db.session.commit()
-        flash(_('Attendance recorded for %(count)d athletes.', count=count), 'success')
+
+def _check_in_sessions(team_id, selected_session=None):
+    """Sessions offered on the check-in form: the past week to the next one, for the team if any."""
+    today = date.today()
+    query = TrainingSession.query.filter(
+        TrainingSession.is_active.is_(True),
+        TrainingSession.cancelled.isnot(True),
+        TrainingSession.date >= today - timedelta(days=7),
+        TrainingSession.date <= today + timedelta(days=7)
+    )
+    if team_id:
+        query = query.filter(TrainingSession.team_id == team_id)
+    rows = query.order_by(TrainingSession.date, TrainingSession.start_time).all()
+    rule_filters = [RecurrenceRule.team_id == team_id] if team_id else []
+    occurrences = expand_occurrences(today - timedelta(days=7), today + timedelta(days=7), *rule_filters)
+    sessions = list(heapq.merge(rows, occurrences, key=session_sort_key))
+    if selected_session and selected_session not in sessions:
+        sessions.insert(0, selected_session)
+    return sessions
+
+
+def _session_choice_value(session):
+    """Select value for a session; occurrences of a rule are 'r<rule id>:<date>'."""
+    if session.is_virtual:
+        return f'r{session.recurrence_rule_id}:{session.occurrence_date.isoformat()}'
+    return str(session.id)
+
+
+def _resolve_session_choice(value):
+    """Training session id for a submitted choice, materializing a rule occurrence if needed."""
+    if not value:
+        return None
+    if not value.startswith('r'):
+        return int(value)
+    rule_id, _sep, day = value[1:].partition(':')
+    day = datetime.strptime(day, '%Y-%m-%d').date()
+    rule, _exception = get_rule_occurrence(int(rule_id), day)
+    if rule is None:
+        return None
+    return materialize(rule, day, current_user.id).id
+
+
+@attendance_bp.route('/sw.js')
+def service_worker():
+    """Serve the check-in service worker from /attendance/ so its scope covers the check-in page."""
+    response = current_app.send_static_file('js/checkin-sw.js')
+    response.headers['Content-Type'] = 'application/javascript'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@attendance_bp.route('/api/roster')
+@login_required
+def api_roster():
+    """Return active teams and athletes for offline check-in, plus a fresh CSRF token."""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        return jsonify({'error': 'forbidden'}), 403
+
+    teams = db.session.query(Team.id, Team.name).filter(
+        Team.is_active.is_(True)
+    ).order_by(Team.name).all()
+    athletes = db.session.query(
+        Athlete.id, Athlete.first_name, Athlete.last_name, Athlete.team_id
+    ).filter(
+        Athlete.is_active.is_(True)
+    ).order_by(Athlete.last_name, Athlete.first_name).all()
+
+    return jsonify({
+        'csrf_token': generate_csrf(),
+        'teams': [{'id': t.id, 'name': t.name} for t in teams],
+        'athletes': [
+            {'id': a.id, 'name': f'{a.first_name} {a.last_name}', 'team_id': a.team_id}
+            for a in athletes
+        ],
+    })
+
+
+@attendance_bp.route('/api/sync', methods=['POST'])
+@login_required
+def api_sync():
+    """Apply queued offline check-ins in a single transaction.
+
+    Expects ``{"sessions": [{"date", "session_type", "training_session_id",
+    "notes", "marks": [{"athlete_id", "status", "marked_at"}]}]}``, where
+    ``training_session_id`` is the check-in form's choice value (a session id
+    or an ``r<rule_id>:<date>`` occurrence, materialized here). Conflicting
+    marks are resolved last-writer-wins on ``marked_at``; the response lists
+    one outcome per mark so the client can drop what was applied.
+    """
+    if not (current_user.is_admin() or current_user.is_coach()):
+        return jsonify({'error': 'forbidden'}), 403
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('sessions'), list):
+        return jsonify({'error': 'invalid payload'}), 400
+
+    marks = []
+    positions = []
+    errors = []
+    for s_index, entry in enumerate(payload['sessions']):
+        if not isinstance(entry, dict):
+            errors.append({'session': s_index, 'error': 'invalid session'})
+            continue
+        try:
+            session_date = datetime.strptime(str(entry.get('date')), '%Y-%m-%d').date()
+        except ValueError:
+            errors.append({'session': s_index, 'error': 'invalid date'})
+            continue
+        choice = entry.get('training_session_id')
+        try:
+            if choice is not None and (isinstance(choice, bool) or not isinstance(choice, (int, str))):
+                raise ValueError(choice)
+            training_session_id = _resolve_session_choice(None if choice is None else str(choice))
+        except ValueError:
+            errors.append({'session': s_index, 'error': 'invalid training session'})
+            continue
+
+        for mark in entry.get('marks') or []:
+            if not isinstance(mark, dict) or not isinstance(mark.get('athlete_id'), int):
+                errors.append({'session': s_index, 'error': 'invalid mark'})
+                continue
+            marks.append({
+                'athlete_id': mark['athlete_id'],
+                'date': session_date,
+                'session_type': entry.get('session_type'),
+                'training_session_id': training_session_id,
+                'status': mark.get('status'),
+                'notes': entry.get('notes') or None,
+                'marked_at': parse_marked_at(mark.get('marked_at')),
+            })
+            positions.append(s_index)
+
+    outcomes = apply_attendance_marks(marks, current_user.id)
+    db.session.commit()
+
+    for s_index, outcome in zip(positions, outcomes):
+        outcome['session'] = s_index
+
+    summary = {'created': 0, 'updated': 0, 'stale': 0, 'rejected': len(errors)}
+    for outcome in outcomes:
+        summary[outcome['outcome']] += 1
+
+    return jsonify({'summary': summary, 'results': outcomes, 'errors': errors})
+
+
+@attendance_bp.route('/matrix')
+@login_required
+def matrix():
+    """Team athletes x sessions attendance grid with per-athlete and per-session stats.
+
+    Returns compact JSON with ``format=json``, the table partial for HTMX
+    requests, or the full page otherwise.
+    """
+    if not (current_user.is_admin() or current_user.is_coach()):
+        if request.args.get('format') == 'json':
+            return jsonify({'error': 'forbidden'}), 403
+        flash(_('Permission denied.'), 'error')
         return redirect(url_for('attendance.index'))
 
-    return render_template('attendance/check_in.html', form=form, athletes=athletes, teams=teams, selected_team=team_id)
+    teams = Team.query.filter_by(is_active=True).order_by(Team.name).all()
+    team_id = request.args.get('team_id', type=int)
+    session_type = request.args.get('session_type', '')
+
+    end = _parse_date(request.args.get('end')) or date.today()
+    start = _parse_date(request.args.get('start')) or end - timedelta(days=90)
+
+    grid = None
+    if team_id:
+        grid = AttendanceMatrix.for_team(team_id, start, end, session_type or None)
+
+    if request.args.get('format') == 'json':
+        if grid is None:
+            return jsonify({'error': 'team_id is required'}), 400
+        data = grid.to_compact()
+        data.update(team_id=team_id, start=start.isoformat(), end=end.isoformat())
+        return jsonify(data)
+
+    context = {
+        'grid': grid,
+        'rows': list(zip(grid.athletes, grid.row_strings(), grid.row_stats())) if grid else [],
+        'column_stats': grid.column_stats() if grid else [],
+        'teams': teams,
+        'selected_team': team_id,
+        'selected_session_type': session_type,
+        'start': start,
+        'end': end,
+    }
+    if request.headers.get('HX-Request'):
+        return render_template('attendance/_matrix.html', **context)
+    return render_template('attendance/matrix.html', **context)
+
+
+def _parse_date(value):
+    """Parse a YYYY-MM-DD query argument, returning None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
 
 
 @attendance_bp.route('/<int:id>')
@@ -157,11 +347,14 @@ def edit(id):
     form.athlete_id.choices = [(a.id, a.get_full_name()) for a in athletes]
 
     if form.validate_on_submit():
+        adjust_roll_call(attendance.training_session_id, attendance.status, form.status.data)
+
         attendance.athlete_id = form.athlete_id.data
         attendance.date = form.date.data
         attendance.session_type = form.session_type.data
         attendance.status = form.status.data
         attendance.notes = form.notes.data
+        attendance.marked_at = datetime.utcnow()
         attendance.updated_at = datetime.utcnow()
 
         db.session.commit()
@@ -180,6 +373,8 @@ def delete(id):
         return redirect(url_for('attendance.index'))
 
     attendance = Attendance.query.get_or_404(id)
+    if attendance.is_active:
+        adjust_roll_call(attendance.training_session_id, attendance.status, None)
     attendance.is_active = False
     db.session.commit()
 
@@ -1,14 +1,20 @@
 # ABOUTME: Calendar view showing training sessions and matches in a monthly grid
 # ABOUTME: Supports HTMX navigation for month switching and team filtering
 
-from calendar import monthrange, monthcalendar
-from datetime import date
+import hashlib
+from calendar import monthcalendar
+from datetime import date, timedelta, timezone
 
-from flask import Blueprint, render_template, request, url_for
+from flask import Blueprint, abort, current_app, jsonify, render_template, request
 from flask_login import login_required
-from flask_babel import gettext as _
+from flask_babel import get_locale, gettext as _
 
-from app.models import TrainingSession, Match, Team
+from app import db
+from app.models import Athlete, Team
+from app.utils.calendar_events import (
+    build_range_events, event_url_templates, get_month_events, prefetch_months, range_stamp
+)
+from app.utils.ics import feed_key_matches, get_team_feed, read_feed_token
 
 calendar_bp = Blueprint('calendar', __name__, url_prefix='/calendar')
 
@@ -32,54 +38,10 @@ def index():
     # Build calendar weeks (list of lists, each inner list = week of day numbers, 0 = empty)
     cal_weeks = monthcalendar(year, month)
 
-    # Get last day of month (first element from monthrange is weekday of day 1, unused)
-    last_day = monthrange(year, month)[1]
-    first_date = date(year, month, 1)
-    last_date = date(year, month, last_day)
-
-    # Query training sessions in this month
-    ts_query = TrainingSession.query.filter(
-        TrainingSession.date >= first_date,
-        TrainingSession.date <= last_date,
-        TrainingSession.is_active == True  # noqa: E712
-    )
-    if team_id:
-        ts_query = ts_query.filter(TrainingSession.team_id == team_id)
-    training_sessions = ts_query.all()
-
-    # Query matches in this month
-    m_query = Match.query.filter(
-        Match.date >= first_date,
-        Match.date <= last_date,
-        Match.is_active == True  # noqa: E712
-    )
-    if team_id:
-        m_query = m_query.filter(Match.team_id == team_id)
-    matches = m_query.all()
-
-    # Build events dict: {day_number: [event, event, ...]}
-    events = {}
-    for ts in training_sessions:
-        day = ts.date.day
-        events.setdefault(day, []).append({
-            'type': 'training',
-            'title': ts.title,
-            'time': ts.start_time.strftime('%H:%M') if ts.start_time else '',
-            'url': url_for('training.view', id=ts.id),
-            'cancelled': ts.cancelled,
-            'team': ts.team.name if ts.team else ''
-        })
-    for m in matches:
-        day = m.date.day
-        events.setdefault(day, []).append({
-            'type': 'match',
-            'title': _('vs %(opponent)s', opponent=m.opponent),
-            'time': m.kick_off_time.strftime('%H:%M') if m.kick_off_time else '',
-            'url': url_for('matches.view', id=m.id),
-            'cancelled': m.status == 'cancelled',
-            'team': m.team.name if m.team else '',
-            'is_home': m.is_home
-        })
+    # Events come from the per-month cache; invalidated on session/match writes
+    urls = event_url_templates()
+    locale = str(get_locale())
+    events = get_month_events(year, month, team_id, locale, urls)
 
     teams = Team.query.filter_by(is_active=True).order_by(Team.name).all()
 
@@ -110,6 +72,9 @@ def index():
         next_month = month + 1
         next_year = year
 
+    # Warm the neighbouring months so prev/next navigation is served from cache
+    prefetch_months([(prev_year, prev_month), (next_year, next_month)], team_id, locale, urls)
+
     context = {
         'year': year,
         'month': month,
@@ -131,3 +96,89 @@ def index():
         return render_template('calendar/_grid.html', **context)
 
     return render_template('calendar/index.html', **context)
+
+
+# Longest window the JSON feed serves in one request
+MAX_FEED_DAYS = 366
+
+
+def _parse_feed_date(value):
+    """Accept plain dates and the ISO datetimes calendar widgets send."""
+    try:
+        return date.fromisoformat(value[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+@calendar_bp.route('/events.json')
+@login_required
+def events_json():
+    """Events between start and end (inclusive) as compact JSON records.
+
+    Answers 304 from a cheap stamp query (newest updated_at and row counts)
+    before the event queries run when the client's copy is current.
+    """
+    start_arg = request.args.get('start')
+    end_arg = request.args.get('end')
+    start = _parse_feed_date(start_arg) if start_arg else date.today()
+    if start is None:
+        return jsonify({'error': 'invalid date'}), 400
+    end = _parse_feed_date(end_arg) if end_arg else start + timedelta(days=30)
+    if end is None:
+        return jsonify({'error': 'invalid date'}), 400
+    if end < start or (end - start).days > MAX_FEED_DAYS:
+        return jsonify({'error': 'invalid range'}), 400
+    team_id = request.args.get('team_id', type=int)
+
+    last_modified, fingerprint = range_stamp(start, end, team_id)
+    key = f'{start}|{end}|{team_id}|{get_locale()}|{fingerprint}'
+    etag = hashlib.sha1(key.encode()).hexdigest()
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+
+    not_modified = (
+        request.if_none_match.contains(etag) if request.if_none_match
+        else bool(last_modified and request.if_modified_since
+                  and last_modified <= request.if_modified_since)
+    )
+    if not_modified:
+        response = current_app.response_class(status=304)
+    else:
+        events = build_range_events(start, end, team_id, event_url_templates())
+        response = jsonify({'start': start.isoformat(), 'end': end.isoformat(), 'events': events})
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@calendar_bp.route('/feeds/<token>.ics')
+def feed(token):
+    """ICS subscription feed of a team, or of an athlete's team; no login, the token is the key."""
+    kind, object_id, key = read_feed_token(token)
+    if kind == 'athlete':
+        athlete = db.session.get(Athlete, object_id)
+        if athlete is None or not athlete.is_active or athlete.team_id is None or \
+           not feed_key_matches(athlete, key):
+            abort(404)
+        team = db.session.get(Team, athlete.team_id)
+    elif kind == 'team':
+        team = db.session.get(Team, object_id)
+        if team is not None and not feed_key_matches(team, key):
+            abort(404)
+    else:
+        abort(404)
+    if team is None or not team.is_active:
+        abort(404)
+
+    etag, body = get_team_feed(team, str(get_locale()))
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype='text/calendar')
+        response.headers['Content-Disposition'] = f'inline; filename="team-{team.id}.ics"'
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response
@@ -1,43 +1,37 @@
 # ABOUTME: Document management views for uploading, viewing, and tracking document expiry
-# ABOUTME: Supports file upload/download for athlete and staff documents
+# ABOUTME: Supports single-post and chunked resumable uploads, and downloads, for athlete and staff documents
 
+import io
 import os
+import tempfile
 from datetime import date, timedelta
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, jsonify
+from flask import (Blueprint, render_template, redirect, url_for, flash, request, send_file, jsonify, abort,
+                   current_app)
 from flask_login import login_required, current_user
 from flask_babel import gettext as _
+from sqlalchemy.orm.exc import StaleDataError
 
 from app import db
-from app.models import Document, Athlete, Staff
-from app.forms.document_forms import DocumentUploadForm, DocumentSearchForm
-from app.utils.uploads import save_upload
+from app.models import Document, Athlete, Staff, UploadSession
+from app.forms.document_forms import DocumentImportForm, DocumentUploadForm, DocumentSearchForm
+from app.utils.document_import import import_documents
+from app.utils.ingest import ingest_upload
+from app.utils.previews import document_preview_kind, ensure_preview, preview_mime_type
+from app.utils.storage import get_storage
+from app.utils.text_search import search_snippets, text_match_blob_ids
+from app.utils.uploads import (delete_upload, discard_upload_session, finalize_upload_session, release_blob,
+                               save_upload, start_upload_session, upload_folder, write_chunk)
 
 documents_bp = Blueprint('documents', __name__, url_prefix='/documents')
 
 
-def _batch_resolve_entity_names(documents):
-    """Batch-resolve entity names to avoid N+1 queries."""
-    athlete_ids = {d.entity_id for d in documents if d.entity_type == 'athlete'}
-    staff_ids = {d.entity_id for d in documents if d.entity_type == 'staff'}
+SORT_ORDERS = ('newest', 'owner', 'expiry')
 
-    athlete_map = {}
-    if athlete_ids:
-        athletes = Athlete.query.filter(Athlete.id.in_(athlete_ids)).all()
-        athlete_map = {a.id: a.get_full_name() for a in athletes}
 
-    staff_map = {}
-    if staff_ids:
-        staff_members = Staff.query.filter(Staff.id.in_(staff_ids)).all()
-        staff_map = {s.id: s.get_full_name() for s in staff_members}
-
-    entity_names = {}
-    for doc in documents:
-        if doc.entity_type == 'athlete':
-            entity_names[doc.id] = athlete_map.get(doc.entity_id, _('Unknown'))
-        else:
-            entity_names[doc.id] = staff_map.get(doc.entity_id, _('Unknown'))
-    return entity_names
+def _owner_names(documents):
+    """``{document id: owner name}`` for documents loaded through Document.with_owners()."""
+    return {doc.id: doc.get_owner_name() for doc in documents}
 
 
 @documents_bp.route('/')
@@ -52,7 +46,7 @@ def index():
     per_page = 20
 
     form = DocumentSearchForm(formdata=request.args)
-    query = Document.query.filter_by(is_active=True)
+    query = Document.with_owners(Document.query).filter(Document.is_active.is_(True))
 
     # Apply filters
     if form.document_type.data:
@@ -71,25 +65,47 @@ def index():
 
     search = request.args.get('search', '')
     if search:
-        query = query.filter(
-            db.or_(
-                Document.title.ilike(f'%{search}%'),
-                Document.file_name.ilike(f'%{search}%'),
-            )
-        )
+        conditions = [
+            Document.title.ilike(f'%{search}%'),
+            Document.file_name.ilike(f'%{search}%'),
+            Document.owner_name().ilike(f'%{search}%'),
+        ]
+        text_matches = text_match_blob_ids(search)
+        if text_matches is not None:
+            conditions.append(Document.blob_id.in_(text_matches))
+        query = query.filter(db.or_(*conditions))
+
+    sort = form.sort.data if form.sort.data in SORT_ORDERS else 'newest'
+    if sort == 'owner':
+        query = query.order_by(*Document.owner_order(), Document.created_at.desc())
+    elif sort == 'expiry':
+        query = query.order_by(Document.expiry_date.is_(None), Document.expiry_date.asc())
+    else:
+        query = query.order_by(Document.created_at.desc())
 
-    pagination = query.order_by(Document.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     documents = pagination.items
-    entity_names = _batch_resolve_entity_names(documents)
+    entity_names = _owner_names(documents)
+    snippets = search_snippets(search, documents) if search else {}
 
     return render_template('documents/index.html',
                            documents=documents,
                            pagination=pagination,
                            form=form,
                            search=search,
-                           entity_names=entity_names)
+                           entity_names=entity_names,
+                           snippets=snippets)
+
+
+def _populate_entity_choices(form):
+    """Offer athletes by default, staff when the form or query string asks for them."""
+    if (request.method == 'POST' and form.entity_type.data == 'staff') or \
+       request.args.get('entity_type') == 'staff':
+        staff_members = Staff.query.filter_by(is_active=True).order_by(Staff.last_name).all()
+        form.entity_id.choices = [(s.id, s.get_full_name()) for s in staff_members]
+    else:
+        athletes = Athlete.query.filter_by(is_active=True).order_by(Athlete.last_name).all()
+        form.entity_id.choices = [(a.id, a.get_full_name()) for a in athletes]
 
 
 @documents_bp.route('/upload', methods=['GET', 'POST'])
@@ -101,16 +117,7 @@ def upload():
         return redirect(url_for('documents.index'))
 
     form = DocumentUploadForm()
-
-    # Populate entity_id choices with athletes by default
-    athletes = Athlete.query.filter_by(is_active=True).order_by(Athlete.last_name).all()
-    form.entity_id.choices = [(a.id, a.get_full_name()) for a in athletes]
-
-    # If entity_type is staff (on POST or via query param), repopulate with staff
-    if (request.method == 'POST' and form.entity_type.data == 'staff') or \
-       request.args.get('entity_type') == 'staff':
-        staff_members = Staff.query.filter_by(is_active=True).order_by(Staff.last_name).all()
-        form.entity_id.choices = [(s.id, s.get_full_name()) for s in staff_members]
+    _populate_entity_choices(form)
 
     if form.validate_on_submit():
         result = save_upload(form.file.data)
@@ -118,7 +125,7 @@ def upload():
             flash(_('File upload failed. Please check the file type and try again.'), 'error')
             return render_template('documents/upload.html', form=form)
 
-        save_path, original_filename, file_size, mime_type = result
+        save_path, original_filename, file_size, mime_type, blob = result
 
         document = Document(
             title=form.title.data,
@@ -127,6 +134,7 @@ def upload():
             file_name=original_filename,
             file_size=file_size,
             mime_type=mime_type,
+            blob_id=blob.id,
             entity_type=form.entity_type.data,
             entity_id=form.entity_id.data,
             expiry_date=form.expiry_date.data,
@@ -136,6 +144,7 @@ def upload():
 
         db.session.add(document)
         db.session.commit()
+        ingest_upload(blob, mime_type, original_filename)
 
         flash(_('Document uploaded successfully.'), 'success')
         return redirect(url_for('documents.view', id=document.id))
@@ -143,6 +152,147 @@ def upload():
     return render_template('documents/upload.html', form=form)
 
 
+@documents_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def bulk_import():
+    """Import many documents from a ZIP archive and a CSV manifest."""
+    if not current_user.is_admin():
+        flash(_('Permission denied.'), 'error')
+        return redirect(url_for('documents.index'))
+
+    form = DocumentImportForm()
+    imported, errors = None, []
+    if form.validate_on_submit():
+        tmp_dir = os.path.join(upload_folder(), 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, archive_path = tempfile.mkstemp(dir=tmp_dir, suffix='.zip')
+        os.close(fd)
+        try:
+            form.archive.data.save(archive_path)
+            manifest = io.TextIOWrapper(form.manifest.data.stream, encoding='utf-8-sig', newline='')
+            imported, errors = import_documents(archive_path, manifest, current_user.id)
+        except (ValueError, UnicodeDecodeError) as e:
+            flash(_('Import failed: %(error)s', error=str(e)), 'error')
+        finally:
+            delete_upload(archive_path)
+        if imported is not None:
+            flash(_('Imported %(count)d document(s).', count=imported), 'success' if not errors else 'warning')
+
+    return render_template('documents/import.html', form=form, imported=imported, errors=errors)
+
+
+def _upload_session_or_404(upload_id):
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.created_by != current_user.id:
+        abort(404)
+    return upload
+
+
+def _upload_state(upload):
+    return {
+        'upload_id': upload.id,
+        'chunk_size': upload.chunk_size,
+        'chunk_count': upload.chunk_count(),
+        'next_chunk': upload.next_chunk,
+        'received_bytes': upload.received_bytes,
+    }
+
+
+@documents_bp.route('/uploads', methods=['POST'])
+@login_required
+def upload_init():
+    """Open a chunked upload: JSON {file_name, total_size, mime_type}."""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        return jsonify({'error': 'forbidden'}), 403
+
+    payload = request.get_json(silent=True) or {}
+    total_size = payload.get('total_size')
+    if not isinstance(total_size, int):
+        return jsonify({'error': 'total_size is required'}), 400
+    upload = start_upload_session(payload.get('file_name'), total_size,
+                                  payload.get('mime_type'), current_user.id)
+    if upload is None:
+        return jsonify({'error': 'file type or size not allowed'}), 400
+    db.session.commit()
+    return jsonify(_upload_state(upload)), 201
+
+
+@documents_bp.route('/uploads/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    """Where to resume an interrupted upload."""
+    return jsonify(_upload_state(_upload_session_or_404(upload_id)))
+
+
+@documents_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def upload_cancel(upload_id):
+    discard_upload_session(_upload_session_or_404(upload_id))
+    db.session.commit()
+    return '', 204
+
+
+@documents_bp.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id, index):
+    """Store one chunk; the raw request body is streamed to disk."""
+    upload = _upload_session_or_404(upload_id)
+    if index < upload.next_chunk:
+        # Already acknowledged: a retry after a lost response
+        return jsonify(_upload_state(upload))
+    if index > upload.next_chunk:
+        return jsonify(dict(_upload_state(upload), error='chunk out of order')), 409
+
+    try:
+        write_chunk(upload, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify(dict(_upload_state(upload), error=str(e))), 400
+    except StaleDataError:
+        db.session.rollback()
+    db.session.refresh(upload)
+    return jsonify(_upload_state(upload))
+
+
+@documents_bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+def upload_finalize(upload_id):
+    """Create the Document from a complete upload and the upload form fields."""
+    upload = _upload_session_or_404(upload_id)
+    form = DocumentUploadForm()
+    del form.file
+    _populate_entity_choices(form)
+    if not form.validate():
+        return jsonify({'error': 'invalid form', 'fields': form.errors}), 400
+
+    result = finalize_upload_session(upload)
+    if result is None:
+        return jsonify(dict(_upload_state(upload), error='upload incomplete')), 409
+    save_path, original_filename, file_size, mime_type, blob = result
+
+    document = Document(
+        title=form.title.data,
+        document_type=form.document_type.data,
+        file_path=save_path,
+        file_name=original_filename,
+        file_size=file_size,
+        mime_type=mime_type,
+        blob_id=blob.id,
+        entity_type=form.entity_type.data,
+        entity_id=form.entity_id.data,
+        expiry_date=form.expiry_date.data,
+        notes=form.notes.data,
+        created_by=current_user.id
+    )
+    db.session.add(document)
+    db.session.commit()
+    ingest_upload(blob, mime_type, original_filename)
+
+    flash(_('Document uploaded successfully.'), 'success')
+    return jsonify({'document_id': document.id, 'url': url_for('documents.view', id=document.id)}), 201
+
+
 @documents_bp.route('/api/entities/<entity_type>')
 @login_required
 def api_entities(entity_type):
@@ -167,30 +317,28 @@ def view(id):
         flash(_('Permission denied.'), 'error')
         return redirect(url_for('main.dashboard'))
 
-    document = Document.query.get_or_404(id)
+    document = Document.with_owners(Document.query).filter(Document.id == id).first_or_404()
     if not document.is_active:
         flash(_('Document not found.'), 'error')
         return redirect(url_for('documents.index'))
 
-    # Resolve entity
-    if document.entity_type == 'athlete':
-        entity = Athlete.query.get(document.entity_id)
-    elif document.entity_type == 'staff':
-        entity = Staff.query.get(document.entity_id)
-    else:
-        entity = None
-    entity_name = entity.get_full_name() if entity else _('Unknown')
-
     return render_template('documents/view.html',
                            document=document,
-                           entity=entity,
-                           entity_name=entity_name)
+                           entity=document.owner,
+                           entity_name=document.get_owner_name(),
+                           has_preview=document_preview_kind(document) is not None)
 
 
 @documents_bp.route('/<int:id>/download')
 @login_required
 def download(id):
-    """Download the document file."""
+    """Download the document file, after the permission check.
+
+    With remote storage the browser is redirected to a short-lived
+    presigned URL. Local bytes are sent by the front proxy in the
+    'x-accel'/'x-sendfile' delivery modes; 'direct' serves them from Flask
+    with Range support.
+    """
     if not (current_user.is_admin() or current_user.is_coach()):
         flash(_('Permission denied.'), 'error')
         return redirect(url_for('main.dashboard'))
@@ -200,11 +348,89 @@ def download(id):
         flash(_('Document not found.'), 'error')
         return redirect(url_for('documents.index'))
 
-    if not os.path.exists(document.file_path):
+    # Blob content never changes, so its digest is a strong validator
+    etag = document.blob.sha256 if document.blob is not None else None
+    if etag and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return _private_cache(response)
+
+    if document.blob is not None:
+        url = get_storage().download_url(document.blob.storage_key, document.file_name, document.mime_type)
+        if url:
+            return _no_store(redirect(url))
+
+    mode = current_app.config.get('DOCUMENT_DELIVERY', 'direct')
+    if mode in ('x-accel', 'x-sendfile'):
+        return _private_cache(_offloaded_download(document, mode, etag))
+
+    try:
+        response = send_file(document.file_path, as_attachment=True, download_name=document.file_name,
+                             mimetype=document.mime_type, conditional=True, etag=etag or True)
+    except FileNotFoundError:
         flash(_('File not found on server.'), 'error')
         return redirect(url_for('documents.view', id=document.id))
+    return _private_cache(response)
+
+
+@documents_bp.route('/<int:id>/preview')
+@login_required
+def preview(id):
+    """Downscaled image of the document, rendered on first request if missing.
+
+    The preview URL carries the blob digest and a blob never changes, so
+    browsers may keep the image for a year without revalidating.
+    """
+    if not (current_user.is_admin() or current_user.is_coach()):
+        abort(403)
+
+    document = Document.query.get_or_404(id)
+    if not document.is_active or document.blob is None:
+        abort(404)
+    key = ensure_preview(document.blob, document.mime_type, document.file_name)
+    if key is None:
+        abort(404)
+
+    storage = get_storage()
+    url = storage.download_url(key, mime_type=preview_mime_type(), inline=True)
+    if url:
+        return _no_store(redirect(url))
+    response = send_file(storage.path(key), mimetype=preview_mime_type(), conditional=True,
+                         etag=f'{document.blob.sha256}-preview', max_age=current_app.config['PREVIEW_MAX_AGE'])
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
+def _offloaded_download(document, mode, etag):
+    """Empty response telling the front proxy which file to send."""
+    response = current_app.response_class(mimetype=document.mime_type or 'application/octet-stream')
+    response.headers['Content-Disposition'] = f'attachment; filename="{document.file_name}"'
+    if mode == 'x-accel':
+        relative = os.path.relpath(document.file_path, current_app.config['UPLOAD_FOLDER'])
+        response.headers['X-Accel-Redirect'] = (
+            current_app.config['DOCUMENT_ACCEL_PREFIX'].rstrip('/') + '/' + relative.replace(os.sep, '/')
+        )
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(document.file_path)
+    if etag:
+        response.set_etag(etag)
+    return response
+
+
+def _private_cache(response):
+    """Browsers may keep a copy but must revalidate; shared caches must not store it."""
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 
-    return send_file(document.file_path, as_attachment=True, download_name=document.file_name)
+def _no_store(response):
+    """For redirects to presigned URLs, which expire and must not be reused."""
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
 
 
 @documents_bp.route('/<int:id>/delete', methods=['POST'])
@@ -216,6 +442,8 @@ def delete(id):
         return redirect(url_for('documents.index'))
 
     document = Document.query.get_or_404(id)
+    if document.is_active and document.blob is not None:
+        release_blob(document.blob)
     document.is_active = False
     db.session.commit()
 
@@ -235,7 +463,7 @@ def expiring():
     entity_type = request.args.get('entity_type', '')
 
     cutoff = date.today() + timedelta(days=days)
-    query = Document.query.filter(
+    query = Document.with_owners(Document.query).filter(
         Document.is_active.is_(True),
         Document.expiry_date.isnot(None),
         Document.expiry_date <= cutoff
@@ -244,8 +472,8 @@ def expiring():
     if entity_type:
         query = query.filter(Document.entity_type == entity_type)
 
-    documents = query.order_by(Document.expiry_date.asc()).all()
-    entity_names = _batch_resolve_entity_names(documents)
+    documents = query.order_by(Document.expiry_date.asc(), *Document.owner_order()).all()
+    entity_names = _owner_names(documents)
 
     return render_template('documents/expiring.html',
                            documents=documents,
@@ -1,11 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from flask_babel import gettext as _
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
 from app import db
-from app.models import Equipment, EquipmentAssignment, Athlete
+from app.models import Equipment, EquipmentAssignment, Athlete, Team
 from app.forms.equipment_forms import (EquipmentForm, EquipmentAssignmentForm,
                                        EquipmentReturnForm, EquipmentSearchForm)
-from datetime import datetime
+from app.utils.equipment import (EQUIPMENT_CONDITIONS, MAX_BATCH_CODES, batch_assign, batch_return,
+                                 claim_equipment, normalize_codes, overdue_assignments)
+from datetime import datetime, date
 
 equipment_bp = Blueprint('equipment', __name__, url_prefix='/equipment')
 
@@ -122,6 +126,10 @@ def edit(id):
     form = EquipmentForm(obj=equipment)
 
     if form.validate_on_submit():
+        if form.version_id.data != str(equipment.version_id):
+            flash(_('This equipment was changed by someone else. Review the current values and save again.'), 'warning')
+            return redirect(url_for('equipment.edit', id=id))
+
         # Check code uniqueness
         existing = Equipment.query.filter(
             Equipment.code == form.code.data,
@@ -149,7 +157,12 @@ def edit(id):
         equipment.next_maintenance_date = form.next_maintenance_date.data
         equipment.updated_at = datetime.utcnow()
 
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            flash(_('This equipment was changed by someone else. Review the current values and save again.'), 'warning')
+            return redirect(url_for('equipment.edit', id=id))
         flash(_('Equipment updated successfully.'), 'success')
         return redirect(url_for('equipment.view', id=equipment.id))
 
@@ -190,8 +203,6 @@ def assign():
     form.athlete_id.choices = [(a.id, a.get_full_name()) for a in athletes]
 
     if form.validate_on_submit():
-        equipment = Equipment.query.get(form.equipment_id.data)
-
         assignment = EquipmentAssignment(
             equipment_id=form.equipment_id.data,
             athlete_id=form.athlete_id.data,
@@ -202,11 +213,15 @@ def assign():
             assigned_by=current_user.id
         )
 
-        # Update equipment status
-        equipment.status = 'assigned'
-
-        db.session.add(assignment)
-        db.session.commit()
+        # Only one of two concurrent handouts of the same item can win
+        try:
+            claim_equipment([form.equipment_id.data], 'available', 'assigned')
+            db.session.add(assignment)
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            flash(_('This equipment has just been assigned by someone else.'), 'error')
+            return redirect(url_for('equipment.assign'))
 
         flash(_('Equipment assigned successfully.'), 'success')
         return redirect(url_for('equipment.assignments'))
@@ -214,6 +229,127 @@ def assign():
     return render_template('equipment/assign.html', form=form)
 
 
+@equipment_bp.route('/scan')
+@login_required
+def scan():
+    """Scan-driven batch handout or return; codes are collected client-side"""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        flash(_('Permission denied.'), 'error')
+        return redirect(url_for('equipment.index'))
+
+    mode = 'return' if request.args.get('mode') == 'return' else 'assign'
+    teams = Team.query.filter_by(is_active=True).order_by(Team.name).all()
+    return render_template('equipment/scan.html', mode=mode, teams=teams,
+                           today=date.today(), max_batch=MAX_BATCH_CODES)
+
+
+@equipment_bp.route('/api/athletes')
+@login_required
+def api_athletes():
+    """Athletes matching a name fragment and/or team, for the scan page picker"""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        return jsonify({'error': 'forbidden'}), 403
+
+    query = db.session.query(Athlete.id, Athlete.first_name, Athlete.last_name).filter(
+        Athlete.is_active.is_(True)
+    )
+    team_id = request.args.get('team_id', type=int)
+    if team_id:
+        query = query.filter(Athlete.team_id == team_id)
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(db.or_(
+            Athlete.first_name.ilike(f'%{search}%'),
+            Athlete.last_name.ilike(f'%{search}%')
+        ))
+    athletes = query.order_by(Athlete.last_name, Athlete.first_name).limit(50).all()
+    return jsonify({'athletes': [{'id': a.id, 'name': f'{a.last_name} {a.first_name}'} for a in athletes]})
+
+
+def _batch_payload():
+    """Parse a batch request body; returns (payload, codes, error response)."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('codes'), list):
+        return None, None, (jsonify({'error': 'invalid payload'}), 400)
+    codes = normalize_codes(payload['codes'])
+    if not codes:
+        return None, None, (jsonify({'error': 'no codes'}), 400)
+    if len(codes) > MAX_BATCH_CODES:
+        return None, None, (jsonify({'error': f'at most {MAX_BATCH_CODES} codes per request'}), 400)
+    return payload, codes, None
+
+
+def _payload_date(payload, key):
+    """ISO date from the payload, None when absent; raises ValueError when malformed."""
+    value = payload.get(key)
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(key)
+    return date.fromisoformat(value)
+
+
+@equipment_bp.route('/api/batch-assign', methods=['POST'])
+@login_required
+def api_batch_assign():
+    """Assign all scanned items to one athlete in a single transaction"""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        return jsonify({'error': 'forbidden'}), 403
+    payload, codes, error = _batch_payload()
+    if error:
+        return error
+
+    athlete_id = payload.get('athlete_id')
+    athlete = db.session.get(Athlete, athlete_id) if isinstance(athlete_id, int) else None
+    if athlete is None or not athlete.is_active:
+        return jsonify({'error': 'invalid athlete'}), 400
+    try:
+        assigned_date = _payload_date(payload, 'assigned_date') or date.today()
+        expected_return_date = _payload_date(payload, 'expected_return_date')
+    except ValueError:
+        return jsonify({'error': 'invalid date'}), 400
+
+    try:
+        assigned, errors = batch_assign(
+            codes, athlete.id, current_user.id, assigned_date,
+            expected_return_date=expected_return_date, notes=payload.get('notes') or None
+        )
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'conflict'}), 409
+    return jsonify({'assigned': assigned, 'errors': errors})
+
+
+@equipment_bp.route('/api/batch-return', methods=['POST'])
+@login_required
+def api_batch_return():
+    """Close the open assignments of all scanned items in a single transaction"""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        return jsonify({'error': 'forbidden'}), 403
+    payload, codes, error = _batch_payload()
+    if error:
+        return error
+
+    try:
+        return_date = _payload_date(payload, 'return_date') or date.today()
+    except ValueError:
+        return jsonify({'error': 'invalid date'}), 400
+    condition = payload.get('condition') or None
+    if condition is not None and condition not in EQUIPMENT_CONDITIONS:
+        return jsonify({'error': 'invalid condition'}), 400
+
+    try:
+        returned, errors = batch_return(
+            codes, current_user.id, return_date, condition=condition, notes=payload.get('notes') or None
+        )
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'conflict'}), 409
+    return jsonify({'returned': returned, 'errors': errors})
+
+
 @equipment_bp.route('/assignments')
 @login_required
 def assignments():
@@ -239,6 +375,23 @@ def assignments():
                            show_all=show_all)
 
 
+@equipment_bp.route('/overdue')
+@login_required
+def overdue():
+    """Overdue assignments, most overdue first, paginated in SQL"""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        flash(_('Permission denied.'), 'error')
+        return redirect(url_for('equipment.index'))
+
+    page = request.args.get('page', 1, type=int)
+    pagination = overdue_assignments(date.today()).options(
+        joinedload(EquipmentAssignment.equipment),
+        joinedload(EquipmentAssignment.athlete)
+    ).paginate(page=page, per_page=20, error_out=False)
+
+    return render_template('equipment/overdue.html', pagination=pagination)
+
+
 @equipment_bp.route('/assignments/<int:id>/return', methods=['GET', 'POST'])
 @login_required
 def return_equipment(id):
@@ -263,12 +416,17 @@ def return_equipment(id):
         assignment.returned_by = current_user.id
         assignment.updated_at = datetime.utcnow()
 
-        # Update equipment status and condition
-        equipment = assignment.equipment
-        equipment.status = 'available'
-        equipment.condition = form.condition_at_return.data
-
-        db.session.commit()
+        # The versioned assignment flush and the conditional status change
+        # both fail if someone else processed this return meanwhile
+        try:
+            db.session.flush()
+            claim_equipment([assignment.equipment_id], 'assigned', 'available',
+                            condition=form.condition_at_return.data)
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            flash(_('This equipment has already been returned.'), 'warning')
+            return redirect(url_for('equipment.assignments'))
 
         flash(_('Equipment return processed successfully.'), 'success')
         return redirect(url_for('equipment.assignments'))
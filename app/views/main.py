@@ -4,9 +4,13 @@ from flask import Blueprint, render_template, redirect, url_for, session, reques
 from flask_login import login_required, current_user
 from datetime import date, timedelta
 from app.models import Athlete, Staff, Team, Equipment, Attendance, Document
+from app.utils.equipment import maintenance_due
 
 main_bp = Blueprint('main', __name__)
 
+# Maintenance alerts listed on the dashboard; the rest are counted
+MAINTENANCE_ALERT_LIMIT = 10
+
 
 @main_bp.route('/')
 def index():
@@ -64,11 +68,13 @@ def dashboard():
         Document.expiry_date <= alert_threshold
     ).order_by(Document.expiry_date).all()
 
-    # Equipment needing maintenance
-    equipment_maintenance = Equipment.query.filter(
-        Equipment.is_active == True,  # noqa: E712
-        Equipment.next_maintenance_date <= today
-    ).all()
+    # Equipment needing maintenance: an index range, most overdue first
+    maintenance_query = maintenance_due(today)
+    equipment_maintenance = maintenance_query.limit(MAINTENANCE_ALERT_LIMIT).all()
+    equipment_maintenance_count = (
+        maintenance_query.order_by(None).count()
+        if len(equipment_maintenance) == MAINTENANCE_ALERT_LIMIT else len(equipment_maintenance)
+    )
 
     # Recent activity
     recent_athletes = Athlete.query.filter_by(is_active=True).order_by(
@@ -92,6 +98,7 @@ def dashboard():
         staff_bg_alerts=staff_bg_alerts,
         document_expiry_alerts=document_expiry_alerts,
         equipment_maintenance=equipment_maintenance,
+        equipment_maintenance_count=equipment_maintenance_count,
         recent_athletes=recent_athletes,
         recent_attendance=recent_attendance,
         today=today,
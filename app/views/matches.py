@@ -8,6 +8,9 @@ from sqlalchemy.orm import joinedload
 from app import db
 from app.models import Match, MatchLineup, Team, Season, Athlete
 from app.forms.match_forms import MatchForm, MatchResultForm, MatchLineupForm
+from app.utils.lineup import apply_lineup_diff, diff_lineup, parse_lineup_row, selected_athlete_ids
+from app.utils.match_stats import (apply_match_change, apply_stats_deltas, match_snapshot, snapshot_deltas,
+                                   snapshot_match)
 from datetime import datetime
 
 matches_bp = Blueprint('matches', __name__, url_prefix='/matches')
@@ -138,6 +141,7 @@ def edit(id):
     _populate_form_choices(form)
 
     if form.validate_on_submit():
+        stats_before = snapshot_match(match)
         match.date = form.date.data
         match.kick_off_time = form.kick_off_time.data
         match.opponent = form.opponent.data
@@ -148,6 +152,7 @@ def edit(id):
         match.season_id = form.season_id.data if form.season_id.data else None
         match.notes = form.notes.data
         match.updated_at = datetime.utcnow()
+        apply_match_change(stats_before, match)
         db.session.commit()
         flash(_('Match updated successfully.'), 'success')
         return redirect(url_for('matches.view', id=match.id))
@@ -164,7 +169,9 @@ def delete(id):
         return redirect(url_for('matches.index'))
 
     match = Match.query.get_or_404(id)
+    stats_before = snapshot_match(match)
     match.is_active = False
+    apply_match_change(stats_before, match)
     db.session.commit()
     flash(_('Match deleted.'), 'success')
     return redirect(url_for('matches.index'))
@@ -184,12 +191,14 @@ def result(id):
     form = MatchResultForm(obj=match)
 
     if form.validate_on_submit():
+        stats_before = snapshot_match(match)
         match.score_home = form.score_home.data
         match.score_away = form.score_away.data
         match.result = form.result.data
         match.notes = form.notes.data
         match.status = 'completed'
         match.updated_at = datetime.utcnow()
+        apply_match_change(stats_before, match)
         db.session.commit()
         flash(_('Match result saved.'), 'success')
         return redirect(url_for('matches.view', id=match.id))
@@ -208,6 +217,9 @@ def lineup(id):
     match = Match.query.options(
         joinedload(Match.team)
     ).get_or_404(id)
+    if not match.is_active:
+        flash(_('Match not found.'), 'error')
+        return redirect(url_for('matches.index'))
     form = MatchLineupForm()  # for CSRF
 
     # Get team athletes
@@ -219,39 +231,46 @@ def lineup(id):
     existing = {entry.athlete_id: entry for entry in match.lineups.all()}
 
     if form.validate_on_submit():
-        # Clear existing lineup
-        MatchLineup.query.filter_by(match_id=id).delete()
-
-        # Build set of valid athlete IDs for this team
+        # Write only what changed against the stored entries
         valid_athlete_ids = {a.id for a in athletes}
-
-        selected_ids = request.form.getlist('athlete_ids')
-        for athlete_id_str in selected_ids:
-            try:
-                athlete_id = int(athlete_id_str)
-            except (ValueError, TypeError):
-                continue
-            if athlete_id not in valid_athlete_ids:
-                continue
-            jersey_raw = request.form.get(f'jersey_{athlete_id}', '')
-            try:
-                jersey_number = int(jersey_raw) if jersey_raw.strip() else None
-            except (ValueError, TypeError):
-                jersey_number = None
-            entry = MatchLineup(
-                match_id=id,
-                athlete_id=athlete_id,
-                position=request.form.get(f'position_{athlete_id}', ''),
-                jersey_number=jersey_number,
-                is_starter=f'starter_{athlete_id}' in request.form,
-                is_captain=f'captain_{athlete_id}' in request.form,
-                notes=request.form.get(f'notes_{athlete_id}', '')
-            )
-            db.session.add(entry)
-
+        desired = {
+            athlete_id: parse_lineup_row(request.form, athlete_id)
+            for athlete_id in selected_athlete_ids(request.form, valid_athlete_ids)
+        }
+        # Snapshot before writing: the bulk UPDATE refreshes the loaded entries
+        stats_deltas = snapshot_deltas(match_snapshot(match, existing), match_snapshot(match, desired))
+        apply_lineup_diff(id, *diff_lineup(existing, desired))
+        apply_stats_deltas(stats_deltas)
         db.session.commit()
         flash(_('Lineup saved.'), 'success')
         return redirect(url_for('matches.view', id=id))
 
     return render_template('matches/lineup.html', match=match, form=form,
                            athletes=athletes, existing=existing)
+
+
+@matches_bp.route('/<int:id>/lineup/<int:athlete_id>', methods=['POST'])
+@login_required
+def lineup_row(id, athlete_id):
+    """HTMX autosave of one lineup row; only the columns that changed are written."""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        return render_template('matches/_lineup_row_status.html', error=_('Permission denied.')), 403
+
+    match = Match.query.get_or_404(id)
+    if not match.is_active:
+        return render_template('matches/_lineup_row_status.html', error=_('Match not found.')), 404
+    athlete = db.session.get(Athlete, athlete_id)
+    if athlete is None or not athlete.is_active or athlete.team_id != match.team_id:
+        return render_template('matches/_lineup_row_status.html', error=_('Athlete not in this team.')), 400
+
+    entry = MatchLineup.query.filter_by(match_id=id, athlete_id=athlete_id).first()
+    existing = {athlete_id: entry} if entry else {}
+    desired = {}
+    if athlete_id in selected_athlete_ids(request.form, {athlete_id}):
+        desired[athlete_id] = parse_lineup_row(request.form, athlete_id)
+    inserts, updates, deletes = diff_lineup(existing, desired, scope=[athlete_id])
+    stats_deltas = snapshot_deltas(match_snapshot(match, existing), match_snapshot(match, desired))
+    apply_lineup_diff(id, inserts, updates, deletes)
+    apply_stats_deltas(stats_deltas)
+    db.session.commit()
+    return render_template('matches/_lineup_row_status.html', changed=bool(inserts or updates or deletes))
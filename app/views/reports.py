@@ -11,9 +11,10 @@ from sqlalchemy.orm import joinedload
 
 from app import db
 from app.models import (
-    Athlete, Team, Season, Equipment, Attendance, Document, Insurance, Staff
+    Athlete, Team, Season, Equipment, Attendance, Document, Insurance
 )
 from app.forms.report_forms import ReportFilterForm
+from app.utils.equipment import ROLLUP_DIMENSIONS, filter_rollup, inventory_rollup
 from app.utils.export import export_csv, export_pdf
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/reports')
@@ -222,6 +223,77 @@ def equipment_inventory():
                            equipment=equipment)
 
 
+def _rollup_filters():
+    """Drill-down filters from the query string; an empty value matches unset columns."""
+    return {
+        dim: request.args[dim] or None
+        for dim in ROLLUP_DIMENSIONS if dim in request.args
+    }
+
+
+def _rollup_label(dim, value):
+    """Localized display of a rollup dimension value."""
+    if value is None:
+        return _('Not set')
+    labels = {
+        'category': Equipment.CATEGORY_LABELS,
+        'condition': Equipment.CONDITION_LABELS,
+        'status': Equipment.STATUS_LABELS,
+    }.get(dim, {})
+    return str(labels.get(value, value))
+
+
+@reports_bp.route('/equipment-rollup')
+@login_required
+def equipment_rollup():
+    """Equipment quantities grouped by category, size, condition, status and location.
+
+    Each level groups by the next dimension not yet filtered; rows drill down
+    via HTMX. CSV/PDF export the full rollup under the current filters.
+    """
+    if not (current_user.is_admin() or current_user.is_coach()):
+        flash(_('Permission denied.'), 'error')
+        return redirect(url_for('main.dashboard'))
+
+    filters = _rollup_filters()
+
+    fmt = request.args.get('format')
+    if fmt in ('csv', 'pdf'):
+        rows = inventory_rollup(ROLLUP_DIMENSIONS, filters)
+        headers = [_('Category'), _('Size'), _('Condition'), _('Status'), _('Location'),
+                   _('Items'), _('Quantity')]
+        data = [
+            [_rollup_label(dim, value) for dim, value in zip(ROLLUP_DIMENSIONS, row)]
+            + [str(row.items), str(row.quantity or 0)]
+            for row in rows
+        ]
+        if fmt == 'csv':
+            return export_csv('equipment_rollup', headers, data)
+        return export_pdf('equipment_rollup', _('Equipment Rollup Report'), headers, data)
+
+    remaining = [dim for dim in ROLLUP_DIMENSIONS if dim not in filters]
+    group = remaining[0] if remaining else None
+    context = {
+        'filters': filters,
+        'group': group,
+        'breadcrumbs': [
+            (dim, _rollup_label(dim, value), {d: v or '' for d, v in list(filters.items())[:i]})
+            for i, (dim, value) in enumerate(filters.items())
+        ],
+        'rows': [
+            (_rollup_label(group, row[0]), row[0] or '', row.items, row.quantity or 0)
+            for row in inventory_rollup([group], filters)
+        ] if group else [],
+        'items': [] if group else filter_rollup(
+            Equipment.query.filter_by(is_active=True), filters
+        ).order_by(Equipment.name).all(),
+        'query_args': {dim: value or '' for dim, value in filters.items()},
+    }
+    if request.headers.get('HX-Request'):
+        return render_template('reports/_equipment_rollup.html', **context)
+    return render_template('reports/equipment_rollup.html', **context)
+
+
 @reports_bp.route('/document-status')
 @login_required
 def document_status():
@@ -230,24 +302,10 @@ def document_status():
         flash(_('Permission denied.'), 'error')
         return redirect(url_for('main.dashboard'))
 
-    documents = Document.query.filter(
+    documents = Document.with_owners(Document.query).filter(
         Document.is_active.is_(True),
         Document.expiry_date.isnot(None)
-    ).order_by(Document.expiry_date.asc()).all()
-
-    # Batch resolve entity names
-    athlete_ids = {d.entity_id for d in documents if d.entity_type == 'athlete'}
-    staff_ids = {d.entity_id for d in documents if d.entity_type == 'staff'}
-
-    athlete_map = {}
-    if athlete_ids:
-        for a in Athlete.query.filter(Athlete.id.in_(athlete_ids)).all():
-            athlete_map[a.id] = a.get_full_name()
-
-    staff_map = {}
-    if staff_ids:
-        for s in Staff.query.filter(Staff.id.in_(staff_ids)).all():
-            staff_map[s.id] = s.get_full_name()
+    ).order_by(Document.expiry_date.asc(), *Document.owner_order()).all()
 
     today = date.today()
     alert_date = today + timedelta(days=30)
@@ -258,10 +316,7 @@ def document_status():
     rows = []
     entity_names = {}
     for d in documents:
-        if d.entity_type == 'athlete':
-            ename = athlete_map.get(d.entity_id, _('Unknown'))
-        else:
-            ename = staff_map.get(d.entity_id, _('Unknown'))
+        ename = d.get_owner_name()
         entity_names[d.id] = ename
 
         status = _('Expired') if d.expiry_date < today else (
@@ -1,12 +1,14 @@
 # ABOUTME: Blueprint for season management CRUD operations
 # ABOUTME: Handles listing, creating, viewing, editing, deleting, and setting current season
 
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from flask_babel import gettext as _
 from app import db
-from app.models import Season
+from sqlalchemy.orm import contains_eager
+from app.models import Season, Team, Athlete, AthleteSeasonStats, TeamSeasonRecord
 from app.forms.season_forms import SeasonForm
+from app.utils.match_stats import STAT_COLUMNS
 from datetime import datetime
 
 seasons_bp = Blueprint('seasons', __name__, url_prefix='/seasons')
@@ -53,8 +55,48 @@ def view(id):
     season = Season.query.get_or_404(id)
     teams_count = season.teams.filter_by(is_active=True).count()
     sessions_count = season.training_sessions.filter_by(is_active=True).count()
+    standings = TeamSeasonRecord.query.join(TeamSeasonRecord.team).options(
+        contains_eager(TeamSeasonRecord.team)
+    ).filter(
+        TeamSeasonRecord.season_id == id,
+        TeamSeasonRecord.played > 0
+    ).order_by(
+        TeamSeasonRecord.wins.desc(), TeamSeasonRecord.draws.desc(),
+        (TeamSeasonRecord.points_for - TeamSeasonRecord.points_against).desc(), Team.name
+    ).all()
     return render_template('seasons/view.html', season=season,
-                           teams_count=teams_count, sessions_count=sessions_count)
+                           teams_count=teams_count, sessions_count=sessions_count,
+                           standings=standings)
+
+
+@seasons_bp.route('/<int:id>/leaderboard')
+@login_required
+def leaderboard(id):
+    """Athletes ranked by a precomputed season statistic"""
+    season = Season.query.get_or_404(id)
+    sort = request.args.get('sort', 'appearances')
+    if sort not in STAT_COLUMNS:
+        sort = 'appearances'
+    team_id = request.args.get('team_id', type=int)
+    page = request.args.get('page', 1, type=int)
+
+    query = AthleteSeasonStats.query.join(AthleteSeasonStats.athlete).options(
+        contains_eager(AthleteSeasonStats.athlete)
+    ).filter(
+        AthleteSeasonStats.season_id == id,
+        AthleteSeasonStats.appearances > 0
+    )
+    if team_id:
+        query = query.filter(Athlete.team_id == team_id)
+    pagination = query.order_by(
+        getattr(AthleteSeasonStats, sort).desc(),
+        AthleteSeasonStats.appearances.desc(),
+        Athlete.last_name, Athlete.first_name
+    ).paginate(page=page, per_page=25, error_out=False)
+
+    teams = Team.query.filter_by(is_active=True).order_by(Team.name).all()
+    return render_template('seasons/leaderboard.html', season=season, pagination=pagination,
+                           teams=teams, selected_team=team_id, sort=sort)
 
 
 @seasons_bp.route('/<int:id>/edit', methods=['GET', 'POST'])
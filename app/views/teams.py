@@ -3,7 +3,9 @@ from flask_login import login_required, current_user
 from flask_babel import gettext as _
 from sqlalchemy.orm import joinedload
 from app import db
-from app.models import Team, TeamStaffAssignment, Staff, Athlete, Season, TrainingSession, Match
+from app.models import Team, TeamStaffAssignment, Staff, Athlete, Season, Match, TeamSeasonRecord
+from app.utils.ics import feed_url, rotate_feed_key
+from app.utils.recurrence import upcoming_team_sessions
 from app.forms.team_forms import TeamForm, TeamStaffAssignmentForm
 from datetime import datetime, date, timedelta
 
@@ -66,13 +68,7 @@ def view(id):
     ).filter_by(team_id=id, role='escort', is_active=True).all()
 
     # Get upcoming training sessions (next 30 days)
-    upcoming_sessions = TrainingSession.query.filter(
-        TrainingSession.team_id == id,
-        TrainingSession.is_active == True,  # noqa: E712
-        TrainingSession.cancelled == False,  # noqa: E712
-        TrainingSession.date >= date.today(),
-        TrainingSession.date <= date.today() + timedelta(days=30)
-    ).order_by(TrainingSession.date, TrainingSession.start_time).limit(5).all()
+    upcoming_sessions = upcoming_team_sessions(id, date.today(), date.today() + timedelta(days=30), 5)
 
     # Get upcoming matches (next 60 days)
     upcoming_matches = Match.query.filter(
@@ -83,11 +79,20 @@ def view(id):
         Match.date <= date.today() + timedelta(days=60)
     ).order_by(Match.date).limit(5).all()
 
+    season_records = TeamSeasonRecord.query.join(TeamSeasonRecord.season).options(
+        joinedload(TeamSeasonRecord.season)
+    ).filter(
+        TeamSeasonRecord.team_id == id,
+        TeamSeasonRecord.played > 0
+    ).order_by(Season.start_date.desc()).all()
+
     return render_template('teams/view.html', team=team, athletes=athletes,
                            assistant_assignments=assistant_assignments,
                            escort_assignments=escort_assignments,
                            upcoming_sessions=upcoming_sessions,
-                           upcoming_matches=upcoming_matches)
+                           upcoming_matches=upcoming_matches,
+                           season_records=season_records,
+                           calendar_feed_url=feed_url('team', team))
 
 
 @teams_bp.route('/<int:id>/edit', methods=['GET', 'POST'])
@@ -135,6 +140,21 @@ def delete(id):
     return redirect(url_for('teams.index'))
 
 
+@teams_bp.route('/<int:id>/calendar-feed/reset', methods=['POST'])
+@login_required
+def reset_calendar_feed(id):
+    """Issue a new calendar feed link; subscriptions to the old one stop working"""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        flash(_('Permission denied.'), 'error')
+        return redirect(url_for('teams.view', id=id))
+
+    team = Team.query.get_or_404(id)
+    rotate_feed_key(team)
+    db.session.commit()
+    flash(_('Calendar feed link reset. Old subscriptions no longer update.'), 'success')
+    return redirect(url_for('teams.view', id=team.id))
+
+
 @teams_bp.route('/<int:id>/assign-staff', methods=['GET', 'POST'])
 @login_required
 def assign_staff(id):
@@ -1,19 +1,25 @@
-# ABOUTME: Training session management views with CRUD, cancellation, and recurring generation
-# ABOUTME: Blueprint for scheduling team practices, friendlies, tournaments, and events
+# ABOUTME: Training session management views with CRUD, cancellation, and recurrence rules
+# ABOUTME: Rule occurrences are expanded per listing window and materialized only when overridden
 
-from datetime import datetime, timedelta
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from datetime import date, datetime, timedelta
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
 from flask_login import login_required, current_user
 from flask_babel import gettext as _
 from sqlalchemy.orm import joinedload
 from app import db
-from app.models import TrainingSession, Team, Season, Staff
+from app.models import TrainingSession, RecurrenceRule, RecurrenceException, Team, Season, Staff
 from app.forms.training_forms import (
-    TrainingSessionForm, RecurringSessionForm, CancelSessionForm
+    TrainingSessionForm, RecurringSessionForm, CancelSessionForm, MoveOccurrenceForm
 )
+from app.utils.recurrence import (Occurrence, SessionPagination, expand_occurrences,
+                                  get_rule_occurrence, materialize)
+from app.utils.scheduling import plan_series, rule_pattern, save_rule
 
 training_bp = Blueprint('training', __name__, url_prefix='/training')
 
+# Weeks either side of today listed when neither dates nor a current season bound the list
+LISTING_WINDOW_WEEKS = 26
+
 
 def _populate_form_choices(form):
     """Populate SelectField choices for team, season, and coach fields."""
@@ -49,27 +55,13 @@ def index():
     if team_id:
         query = query.filter(TrainingSession.team_id == team_id)
 
-    # Filter by date range
-    date_from = request.args.get('date_from')
-    if date_from:
-        try:
-            query = query.filter(
-                TrainingSession.date >= datetime.strptime(date_from, '%Y-%m-%d').date()
-            )
-        except ValueError:
-            pass
-
-    date_to = request.args.get('date_to')
-    if date_to:
-        try:
-            query = query.filter(
-                TrainingSession.date <= datetime.strptime(date_to, '%Y-%m-%d').date()
-            )
-        except ValueError:
-            pass
+    # Filter by date range; rules are only expanded inside it, so it is always bounded
+    season_id = request.args.get('season_id', type=int)
+    date_from, date_to = _listing_window(_parse_date(request.args.get('date_from')),
+                                         _parse_date(request.args.get('date_to')), season_id)
+    query = query.filter(TrainingSession.date >= date_from, TrainingSession.date <= date_to)
 
     # Filter by season
-    season_id = request.args.get('season_id', type=int)
     if season_id:
         query = query.filter(TrainingSession.season_id == season_id)
 
@@ -78,8 +70,18 @@ def index():
     if show_cancelled != '1':
         query = query.filter(TrainingSession.cancelled == False)  # noqa: E712
 
+    # Recurring series are expanded for the same window and merged in date order
+    rule_filters = []
+    if team_id:
+        rule_filters.append(RecurrenceRule.team_id == team_id)
+    if season_id:
+        rule_filters.append(RecurrenceRule.season_id == season_id)
+    occurrences = expand_occurrences(date_from, date_to, *rule_filters,
+                                     include_cancelled=show_cancelled == '1')
+
     query = query.order_by(TrainingSession.date.desc(), TrainingSession.start_time.desc())
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = SessionPagination(query=query, occurrences=occurrences, reverse=True,
+                                   page=page, per_page=per_page, error_out=False)
     sessions = pagination.items
 
     # Populate filter dropdowns
@@ -94,10 +96,45 @@ def index():
         seasons=seasons,
         selected_team=team_id,
         selected_season=season_id,
+        date_from=date_from,
+        date_to=date_to,
         show_cancelled=show_cancelled
     )
 
 
+def _listing_window(date_from, date_to, season_id=None):
+    """(start, end) of the training list.
+
+    Missing bounds come from the selected season, else the current one,
+    else today +/- LISTING_WINDOW_WEEKS. A single given bound that falls
+    outside that range is widened by the same span instead.
+    """
+    if date_from and date_to:
+        return date_from, date_to
+    season = db.session.get(Season, season_id) if season_id else \
+        Season.query.filter_by(is_current=True, is_active=True).first()
+    span = timedelta(weeks=LISTING_WINDOW_WEEKS)
+    if season is not None:
+        start, end = season.start_date, season.end_date
+    else:
+        start, end = date.today() - span, date.today() + span
+    if date_from:
+        return date_from, end if end >= date_from else date_from + span
+    if date_to:
+        return start if start <= date_to else date_to - span, date_to
+    return start, end
+
+
+def _parse_date(value):
+    """Parse a YYYY-MM-DD query argument, returning None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
 @training_bp.route('/new', methods=['GET', 'POST'])
 @login_required
 def new():
@@ -214,7 +251,7 @@ def cancel(id):
 @training_bp.route('/generate-recurring', methods=['GET', 'POST'])
 @login_required
 def generate_recurring():
-    """Generate multiple sessions from a recurring pattern."""
+    """Create a recurrence rule from a weekly pattern."""
     if not (current_user.is_admin() or current_user.is_coach()):
         flash(_('Permission denied. Only admins and coaches can generate sessions.'), 'error')
         return redirect(url_for('training.index'))
@@ -223,46 +260,197 @@ def generate_recurring():
     _populate_form_choices(form)
 
     if form.validate_on_submit():
-        start = form.start_date.data
-        end = form.end_date.data
-        if start is None or end is None:
-            flash(_('Start date and end date are required.'), 'error')
-            return render_template('training/generate_recurring.html', form=form)
-
-        # Jump to first occurrence of the target weekday, then step by 7 days
-        days_ahead = (form.recurrence_day.data - start.weekday()) % 7
-        current_date = start + timedelta(days=days_ahead)
-        count = 0
-
-        while current_date <= end:
-            session = TrainingSession(
-                title=form.title.data,
-                date=current_date,
-                start_time=form.start_time.data,
-                end_time=form.end_time.data,
-                location=form.location.data,
-                session_type=form.session_type.data,
-                team_id=form.team_id.data,
-                season_id=form.season_id.data if form.season_id.data else None,
-                coach_id=form.coach_id.data if form.coach_id.data else None,
-                notes=form.notes.data,
-                is_recurring=True,
-                recurrence_day=form.recurrence_day.data,
-                recurrence_end_date=end,
-                created_by=current_user.id
-            )
-            db.session.add(session)
-            count += 1
-            current_date += timedelta(days=7)
+        return _save_rule(form)
+
+    return render_template('training/generate_recurring.html', form=form)
+
+
+@training_bp.route('/rules/<int:rule_id>/edit', methods=['GET', 'POST'])
+@login_required
+def edit_rule(rule_id):
+    """Change or extend a recurring series by editing its rule."""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        flash(_('Permission denied. Only admins and coaches can generate sessions.'), 'error')
+        return redirect(url_for('training.index'))
+
+    rule = RecurrenceRule.query.filter_by(id=rule_id, is_active=True).first_or_404()
+    if request.method == 'GET':
+        form = RecurringSessionForm(data=rule_pattern(rule))
+    else:
+        form = RecurringSessionForm()
+    _populate_form_choices(form)
+
+    if form.validate_on_submit():
+        return _save_rule(form, rule=rule)
+
+    return render_template('training/generate_recurring.html', form=form, rule=rule)
+
+
+@training_bp.route('/rules/<int:rule_id>/delete', methods=['POST'])
+@login_required
+def delete_rule(rule_id):
+    """Soft delete a recurrence rule; sessions already materialized stay."""
+    if not current_user.is_admin():
+        flash(_('Permission denied. Only admins can delete training sessions.'), 'error')
+        return redirect(url_for('training.index'))
+
+    rule = RecurrenceRule.query.get_or_404(rule_id)
+    rule.is_active = False
+    db.session.commit()
+
+    flash(_('Recurring series deleted.'), 'success')
+    return redirect(url_for('training.index'))
+
+
+def _save_rule(form, rule=None):
+    """Preview or save a weekly series from a submitted RecurringSessionForm."""
+    pattern = {
+        'title': form.title.data,
+        'start_date': form.start_date.data,
+        'end_date': form.end_date.data,
+        'recurrence_day': form.recurrence_day.data,
+        'start_time': form.start_time.data,
+        'end_time': form.end_time.data,
+        'location': form.location.data or None,
+        'session_type': form.session_type.data,
+        'team_id': form.team_id.data,
+        'season_id': form.season_id.data or None,
+        'coach_id': form.coach_id.data or None,
+        'notes': form.notes.data,
+    }
+    plan = plan_series(pattern, rule_id=rule.id if rule else None)
+
+    if form.preview.data:
+        return render_template('training/generate_recurring.html', form=form, plan=plan, rule=rule,
+                               conflict_count=sum(1 for entry in plan if entry['conflicts']))
+
+    rule, counts = save_rule(pattern, plan, current_user.id, rule=rule,
+                             skip_conflicts=form.skip_conflicts.data)
+    db.session.commit()
+    flash(
+        _('%(scheduled)d sessions scheduled, %(skipped)d skipped because of conflicts.', **counts),
+        'success'
+    )
+    return redirect(url_for('training.index', team_id=pattern['team_id']))
+
+
+def _get_occurrence_or_404(rule_id, occurrence_date):
+    try:
+        day = datetime.strptime(occurrence_date, '%Y-%m-%d').date()
+    except ValueError:
+        abort(404)
+    rule, exception = get_rule_occurrence(rule_id, day)
+    if rule is None:
+        abort(404)
+    return rule, day, exception
 
+
+def _override_for(rule, day):
+    return TrainingSession.query.filter_by(recurrence_rule_id=rule.id, occurrence_date=day).first()
+
+
+@training_bp.route('/rules/<int:rule_id>/<occurrence_date>')
+@login_required
+def occurrence(rule_id, occurrence_date):
+    """View one occurrence of a recurring series."""
+    rule, day, exception = _get_occurrence_or_404(rule_id, occurrence_date)
+    override = _override_for(rule, day)
+    if override is not None:
+        return redirect(url_for('training.view', id=override.id))
+
+    session = Occurrence(rule, day, exception)
+    move_form = MoveOccurrenceForm(data={
+        'new_date': session.date,
+        'new_start_time': session.start_time,
+        'new_end_time': session.end_time,
+    })
+    return render_template('training/occurrence.html', session=session, rule=rule,
+                           cancel_form=CancelSessionForm(), move_form=move_form)
+
+
+@training_bp.route('/rules/<int:rule_id>/<occurrence_date>/materialize', methods=['POST'])
+@login_required
+def materialize_occurrence(rule_id, occurrence_date):
+    """Store an occurrence as its own session, then edit it or take attendance."""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        flash(_('Permission denied.'), 'error')
+        return redirect(url_for('training.index'))
+
+    rule, day, _exception = _get_occurrence_or_404(rule_id, occurrence_date)
+    session = materialize(rule, day, current_user.id)
+    db.session.commit()
+
+    if request.form.get('action') == 'check_in':
+        return redirect(url_for('training.check_in', id=session.id))
+    return redirect(url_for('training.edit', id=session.id))
+
+
+@training_bp.route('/rules/<int:rule_id>/<occurrence_date>/cancel', methods=['POST'])
+@login_required
+def cancel_occurrence(rule_id, occurrence_date):
+    """Cancel one occurrence by recording an exception on its rule."""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        flash(_('Permission denied.'), 'error')
+        return redirect(url_for('training.index'))
+
+    rule, day, exception = _get_occurrence_or_404(rule_id, occurrence_date)
+    form = CancelSessionForm()
+    if form.validate_on_submit():
+        if exception is None:
+            exception = RecurrenceException(rule_id=rule.id, occurrence_date=day, created_by=current_user.id)
+            db.session.add(exception)
+        exception.kind = 'cancelled'
+        exception.reason = form.cancellation_reason.data
         db.session.commit()
-        flash(
-            _('%(count)d recurring sessions generated successfully.', count=count),
-            'success'
-        )
+        flash(_('Training session cancelled.'), 'success')
+    else:
+        flash(_('Error cancelling session.'), 'error')
+
+    return redirect(url_for('training.occurrence', rule_id=rule.id, occurrence_date=occurrence_date))
+
+
+@training_bp.route('/rules/<int:rule_id>/<occurrence_date>/move', methods=['POST'])
+@login_required
+def move_occurrence(rule_id, occurrence_date):
+    """Move one occurrence to another date or time."""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        flash(_('Permission denied.'), 'error')
         return redirect(url_for('training.index'))
 
-    return render_template('training/generate_recurring.html', form=form)
+    rule, day, exception = _get_occurrence_or_404(rule_id, occurrence_date)
+    form = MoveOccurrenceForm(rule.start_time, rule.end_time)
+    if form.validate_on_submit():
+        if exception is None:
+            exception = RecurrenceException(rule_id=rule.id, occurrence_date=day, created_by=current_user.id)
+            db.session.add(exception)
+        exception.kind = 'moved'
+        exception.reason = None
+        exception.new_date = form.new_date.data
+        exception.new_start_time = form.new_start_time.data
+        exception.new_end_time = form.new_end_time.data
+        db.session.commit()
+        flash(_('Training session moved.'), 'success')
+    else:
+        flash(_('Error moving session.'), 'error')
+
+    return redirect(url_for('training.occurrence', rule_id=rule.id, occurrence_date=occurrence_date))
+
+
+@training_bp.route('/rules/<int:rule_id>/<occurrence_date>/restore', methods=['POST'])
+@login_required
+def restore_occurrence(rule_id, occurrence_date):
+    """Undo a cancellation or move, restoring the occurrence from its rule."""
+    if not (current_user.is_admin() or current_user.is_coach()):
+        flash(_('Permission denied.'), 'error')
+        return redirect(url_for('training.index'))
+
+    rule, day, exception = _get_occurrence_or_404(rule_id, occurrence_date)
+    if exception is not None:
+        db.session.delete(exception)
+        db.session.commit()
+        flash(_('Training session restored.'), 'success')
+
+    return redirect(url_for('training.occurrence', rule_id=rule.id, occurrence_date=occurrence_date))
 
 
 @training_bp.route('/<int:id>/check-in')
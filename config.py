@@ -23,6 +23,44 @@ class Config:
     # File uploads
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+    # Chunked uploads: bytes per chunk (below MAX_CONTENT_LENGTH), largest file, hours kept when idle
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024))
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', 200 * 1024 * 1024))
+    UPLOAD_SESSION_HOURS = int(os.environ.get('UPLOAD_SESSION_HOURS', 24))
+    # Document downloads: 'direct' (served by Flask), 'x-accel' (nginx) or 'x-sendfile'
+    DOCUMENT_DELIVERY = os.environ.get('DOCUMENT_DELIVERY', 'direct')
+    # nginx internal location aliased to UPLOAD_FOLDER, used with 'x-accel'
+    DOCUMENT_ACCEL_PREFIX = os.environ.get('DOCUMENT_ACCEL_PREFIX', '/protected-uploads/')
+    # Where blobs and previews are kept: 'local' (UPLOAD_FOLDER) or 's3' (any S3-compatible
+    # bucket, e.g. MinIO via S3_ENDPOINT_URL). S3 downloads are presigned redirects valid for
+    # S3_URL_EXPIRES seconds; uploads are sent in S3_MULTIPART_CHUNK_SIZE parts
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_PREFIX = os.environ.get('S3_PREFIX', '')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
+    S3_URL_EXPIRES = int(os.environ.get('S3_URL_EXPIRES', 300))
+    S3_MULTIPART_CHUNK_SIZE = int(os.environ.get('S3_MULTIPART_CHUNK_SIZE', 8 * 1024 * 1024))
+    # Processes for CPU-heavy document work: previews, image normalization (0 = inline, on demand)
+    DOCUMENT_WORKERS = int(os.environ.get('DOCUMENT_WORKERS', 2))
+    # Document previews: long edge in pixels, 'webp' or 'jpeg', encoder quality,
+    # seconds a view waits for a render
+    PREVIEW_SIZE = int(os.environ.get('PREVIEW_SIZE', 800))
+    PREVIEW_FORMAT = os.environ.get('PREVIEW_FORMAT', 'webp')
+    PREVIEW_QUALITY = int(os.environ.get('PREVIEW_QUALITY', 80))
+    PREVIEW_TIMEOUT = int(os.environ.get('PREVIEW_TIMEOUT', 30))
+    PREVIEW_MAX_AGE = 365 * 24 * 3600
+    # Image uploads are re-encoded upright and without metadata within IMAGE_MAX_DIMENSION
+    # pixels, kept only if at least IMAGE_MIN_SAVING percent smaller (or converted to a PDF page)
+    IMAGE_NORMALIZE = os.environ.get('IMAGE_NORMALIZE', 'true').lower() in ('true', '1', 'yes')
+    IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 2480))
+    IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 85))
+    IMAGE_MIN_SAVING = int(os.environ.get('IMAGE_MIN_SAVING', 10))
+    IMAGE_CONVERT_TO_PDF = os.environ.get('IMAGE_CONVERT_TO_PDF', 'false').lower() in ('true', '1', 'yes')
+    # Bulk document import: processes extracting and hashing archive members (0 = inline)
+    IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 4))
 
     # Babel i18n configuration
     BABEL_DEFAULT_LOCALE = 'en'
@@ -41,6 +79,17 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@fortitudo1901.it')
 
+    # Scheduling: how long a match occupies its team and venue for conflict checks
+    MATCH_DURATION_MINUTES = int(os.environ.get('MATCH_DURATION_MINUTES', 120))
+    # Equipment: days from one scheduled maintenance to the next
+    EQUIPMENT_MAINTENANCE_INTERVAL_DAYS = int(os.environ.get('EQUIPMENT_MAINTENANCE_INTERVAL_DAYS', 180))
+
+    # Calendar: seconds a month grid stays cached (0 disables) and neighbour prefetch
+    CALENDAR_CACHE_TTL = int(os.environ.get('CALENDAR_CACHE_TTL', 300))
+    CALENDAR_PREFETCH = os.environ.get('CALENDAR_PREFETCH', 'true').lower() in ('true', '1', 'yes')
+    # Time zone of session/match times, declared in ICS subscription feeds
+    CALENDAR_TIMEZONE = os.environ.get('CALENDAR_TIMEZONE', 'Europe/Rome')
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
@@ -50,6 +99,9 @@ class TestingConfig(Config):
     WTF_CSRF_ENABLED = False
     SERVER_NAME = 'localhost'
     UPLOAD_FOLDER = '/tmp/fortidesk_test_uploads'
+    CALENDAR_PREFETCH = False
+    DOCUMENT_WORKERS = 0
+    IMPORT_WORKERS = 0
 
 
 class ProductionConfig(Config):
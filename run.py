@@ -3,8 +3,9 @@ import time
 from app import create_app, db
 from app.models import (User, Athlete, Guardian, Staff, Team, TeamStaffAssignment,
                         Attendance, Equipment, EquipmentAssignment,
-                        Season, TrainingSession, Match, MatchLineup,
-                        Document, EmergencyContact, Announcement, Insurance)
+                        Season, TrainingSession, RecurrenceRule, RecurrenceException,
+                        Match, MatchLineup, AthleteSeasonStats, TeamSeasonRecord,
+                        Document, DocumentText, UploadBlob, UploadSession, EmergencyContact, Announcement, Insurance)
 
 app = create_app(os.getenv('FLASK_CONFIG') or 'default')
 
@@ -23,9 +24,16 @@ def make_shell_context():
         'EquipmentAssignment': EquipmentAssignment,
         'Season': Season,
         'TrainingSession': TrainingSession,
+        'RecurrenceRule': RecurrenceRule,
+        'RecurrenceException': RecurrenceException,
         'Match': Match,
         'MatchLineup': MatchLineup,
+        'AthleteSeasonStats': AthleteSeasonStats,
+        'TeamSeasonRecord': TeamSeasonRecord,
         'Document': Document,
+        'DocumentText': DocumentText,
+        'UploadBlob': UploadBlob,
+        'UploadSession': UploadSession,
         'EmergencyContact': EmergencyContact,
         'Announcement': Announcement,
         'Insurance': Insurance
@@ -126,6 +134,131 @@ def _apply_schema_updates():
             ))
             db.session.commit()
             app.logger.info('Added training_session_id column to attendance table')
+        if 'marked_at' not in columns:
+            db.session.execute(text(
+                'ALTER TABLE attendance ADD COLUMN marked_at DATETIME NULL'
+            ))
+            db.session.commit()
+            app.logger.info('Added marked_at column to attendance table')
+        indexes = [i['name'] for i in inspector.get_indexes('attendance')]
+        if 'idx_attendance_training_session' not in indexes:
+            db.session.execute(text(
+                'CREATE INDEX idx_attendance_training_session ON attendance (training_session_id)'
+            ))
+            db.session.commit()
+            app.logger.info('Added idx_attendance_training_session index')
+
+    # training_sessions roll-call counters, recurring series id and rule overrides
+    if 'training_sessions' in inspector.get_table_names():
+        columns = [c['name'] for c in inspector.get_columns('training_sessions')]
+        for col_name in ('present_count', 'absent_count', 'late_count', 'excused_count'):
+            if col_name not in columns:
+                db.session.execute(text(
+                    f'ALTER TABLE training_sessions ADD COLUMN {col_name} INTEGER NOT NULL DEFAULT 0'
+                ))
+                db.session.commit()
+                app.logger.info(f'Added {col_name} column to training_sessions table')
+        if 'series_id' not in columns:
+            db.session.execute(text(
+                'ALTER TABLE training_sessions ADD COLUMN series_id VARCHAR(32) NULL'
+            ))
+            db.session.execute(text(
+                'CREATE INDEX ix_training_sessions_series_id ON training_sessions (series_id)'
+            ))
+            db.session.commit()
+            app.logger.info('Added series_id column to training_sessions table')
+        if 'recurrence_rule_id' not in columns:
+            db.session.execute(text(
+                'ALTER TABLE training_sessions ADD COLUMN recurrence_rule_id INTEGER NULL'
+            ))
+            db.session.execute(text(
+                'ALTER TABLE training_sessions ADD COLUMN occurrence_date DATE NULL'
+            ))
+            db.session.execute(text(
+                'CREATE UNIQUE INDEX idx_training_rule_occurrence'
+                ' ON training_sessions (recurrence_rule_id, occurrence_date)'
+            ))
+            db.session.commit()
+            app.logger.info('Added recurrence override columns to training_sessions table')
+
+    # matches: index for the latest results of a team in a season (standings form)
+    if 'matches' in inspector.get_table_names():
+        indexes = [i['name'] for i in inspector.get_indexes('matches')]
+        if 'idx_match_team_season_date' not in indexes:
+            db.session.execute(text(
+                'CREATE INDEX idx_match_team_season_date ON matches (team_id, season_id, date)'
+            ))
+            db.session.commit()
+            app.logger.info('Added idx_match_team_season_date index')
+
+    # equipment / equipment_assignments optimistic locking version counters
+    for table in ('equipment', 'equipment_assignments'):
+        if table in inspector.get_table_names():
+            columns = [c['name'] for c in inspector.get_columns(table)]
+            if 'version_id' not in columns:
+                db.session.execute(text(
+                    f'ALTER TABLE {table} ADD COLUMN version_id INTEGER NOT NULL DEFAULT 1'
+                ))
+                db.session.commit()
+                app.logger.info(f'Added version_id column to {table} table')
+
+    # equipment_assignments: overdue queue index and reminder timestamp
+    if 'equipment_assignments' in inspector.get_table_names():
+        columns = [c['name'] for c in inspector.get_columns('equipment_assignments')]
+        if 'overdue_reminder_sent_at' not in columns:
+            db.session.execute(text(
+                'ALTER TABLE equipment_assignments ADD COLUMN overdue_reminder_sent_at DATETIME NULL'
+            ))
+            db.session.commit()
+            app.logger.info('Added overdue_reminder_sent_at column to equipment_assignments table')
+        indexes = [i['name'] for i in inspector.get_indexes('equipment_assignments')]
+        if 'idx_assignment_overdue' not in indexes:
+            db.session.execute(text(
+                'CREATE INDEX idx_assignment_overdue ON equipment_assignments (is_returned, expected_return_date)'
+            ))
+            db.session.commit()
+            app.logger.info('Added idx_assignment_overdue index')
+
+    # equipment: index for the maintenance scheduler and dashboard alerts
+    if 'equipment' in inspector.get_table_names():
+        indexes = [i['name'] for i in inspector.get_indexes('equipment')]
+        if 'idx_equipment_next_maintenance' not in indexes:
+            db.session.execute(text(
+                'CREATE INDEX idx_equipment_next_maintenance ON equipment (next_maintenance_date)'
+            ))
+            db.session.commit()
+            app.logger.info('Added idx_equipment_next_maintenance index')
+
+    # documents.blob_id (content-addressed upload storage)
+    if 'documents' in inspector.get_table_names():
+        columns = [c['name'] for c in inspector.get_columns('documents')]
+        if 'blob_id' not in columns:
+            db.session.execute(text(
+                'ALTER TABLE documents ADD COLUMN blob_id INTEGER NULL, '
+                'ADD INDEX ix_documents_blob_id (blob_id), '
+                'ADD CONSTRAINT fk_documents_blob_id FOREIGN KEY (blob_id) REFERENCES upload_blobs(id)'
+            ))
+            db.session.commit()
+            app.logger.info('Added blob_id column to documents table')
+        if 'original_size' not in columns:
+            db.session.execute(text('ALTER TABLE documents ADD COLUMN original_size INTEGER NULL'))
+            db.session.commit()
+            app.logger.info('Added original_size column to documents table')
+        # Typed owner keys, backfilled from entity_type/entity_id (owners since deleted stay NULL)
+        for col_name, entity_type, owner_table in (('athlete_id', 'athlete', 'athletes'),
+                                                   ('staff_id', 'staff', 'staff')):
+            if col_name not in columns:
+                db.session.execute(text(
+                    f'ALTER TABLE documents ADD COLUMN {col_name} INTEGER NULL, '
+                    f'ADD INDEX ix_documents_{col_name} ({col_name}), '
+                    f'ADD CONSTRAINT fk_documents_{col_name} FOREIGN KEY ({col_name}) REFERENCES {owner_table}(id)'
+                ))
+                db.session.execute(text(
+                    f'UPDATE documents SET {col_name} = entity_id '
+                    f'WHERE entity_type = :entity_type AND entity_id IN (SELECT id FROM {owner_table})'
+                ), {'entity_type': entity_type})
+                db.session.commit()
+                app.logger.info(f'Added {col_name} column to documents table')
 
     # athletes medical fields (allergies, medical_conditions, blood_type, special_notes)
     if 'athletes' in inspector.get_table_names():
@@ -155,6 +288,33 @@ def _apply_schema_updates():
             db.session.commit()
             app.logger.info('Added fir_id column to athletes table')
 
+    # recurrence_exceptions.updated_at (exceptions are edited in place by cancel/move)
+    if 'recurrence_exceptions' in inspector.get_table_names():
+        columns = [c['name'] for c in inspector.get_columns('recurrence_exceptions')]
+        if 'updated_at' not in columns:
+            db.session.execute(text('ALTER TABLE recurrence_exceptions ADD COLUMN updated_at DATETIME NULL'))
+            db.session.execute(text('UPDATE recurrence_exceptions SET updated_at = created_at'))
+            db.session.commit()
+            app.logger.info('Added updated_at column to recurrence_exceptions table')
+
+    # upload_sessions: S3 multipart upload id and part ETags
+    if 'upload_sessions' in inspector.get_table_names():
+        columns = [c['name'] for c in inspector.get_columns('upload_sessions')]
+        for col_name, col_type in [('multipart_id', 'VARCHAR(255)'), ('part_etags', 'TEXT')]:
+            if col_name not in columns:
+                db.session.execute(text(f'ALTER TABLE upload_sessions ADD COLUMN {col_name} {col_type} NULL'))
+                db.session.commit()
+                app.logger.info(f'Added {col_name} column to upload_sessions table')
+
+    # teams.feed_key / athletes.feed_key (revocable calendar feed links)
+    for table in ('teams', 'athletes'):
+        if table in inspector.get_table_names():
+            columns = [c['name'] for c in inspector.get_columns(table)]
+            if 'feed_key' not in columns:
+                db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN feed_key VARCHAR(32) NULL'))
+                db.session.commit()
+                app.logger.info(f'Added feed_key column to {table} table')
+
 
 if __name__ == '__main__':
     init_db()
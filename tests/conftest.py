@@ -1,11 +1,15 @@
 # ABOUTME: Shared pytest fixtures for FortiDesk test suite
-# ABOUTME: Provides app, client, db_session, and sample data fixtures
+# ABOUTME: Provides app, client, db_session, sample data fixtures and the upload helpers
+
+import io
 
 import pytest
-from datetime import date
+from datetime import date, time
 
 from app import create_app, db
-from app.models import User, Staff, Team, Season, Athlete, Guardian
+from app.models import User, Staff, Team, Season, Athlete, Guardian, TrainingSession, Match, Document
+from app.utils.calendar_events import month_cache
+from app.utils.ics import feed_cache
 
 
 @pytest.fixture(scope='session')
@@ -31,6 +35,8 @@ def _setup_db(app):
         yield
         db.session.remove()
         db.drop_all()
+    month_cache.clear()
+    feed_cache.clear()
 
 
 @pytest.fixture(scope='function')
@@ -188,6 +194,44 @@ def sample_athlete(admin_user, sample_team):
     return athlete
 
 
+@pytest.fixture(scope='function')
+def sample_training_session(admin_user, sample_team, sample_season):
+    """A training session for the sample team on 2 March 2026."""
+    session = TrainingSession(
+        title='Allenamento',
+        date=date(2026, 3, 2),
+        start_time=time(17, 0),
+        end_time=time(18, 30),
+        location='Campo A',
+        session_type='training',
+        team_id=sample_team.id,
+        season_id=sample_season.id,
+        created_by=admin_user.id,
+    )
+    db.session.add(session)
+    db.session.commit()
+    return session
+
+
+@pytest.fixture(scope='function')
+def sample_match(admin_user, sample_team, sample_season):
+    """A scheduled home league match for the sample team on 14 March 2026."""
+    match = Match(
+        opponent='Rugby Parma',
+        date=date(2026, 3, 14),
+        kick_off_time=time(15, 0),
+        location='Campo A',
+        is_home=True,
+        match_type='league',
+        team_id=sample_team.id,
+        season_id=sample_season.id,
+        created_by=admin_user.id,
+    )
+    db.session.add(match)
+    db.session.commit()
+    return match
+
+
 # ---- Authenticated client fixtures -------------------------------------------
 
 @pytest.fixture(scope='function')
@@ -219,3 +263,26 @@ def logged_in_coach(client, coach_user):
         f'Login failed with status {response.status_code}'
     )
     return client
+
+
+# ---- Upload fixtures ---------------------------------------------------------
+
+@pytest.fixture(scope='function')
+def upload_dir(app, tmp_path, monkeypatch):
+    """An empty UPLOAD_FOLDER for the test.
+
+    Test modules needing more upload config override this fixture,
+    requesting it by name, and set only their own keys.
+    """
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def upload_document(client, athlete, content, name='certificate.pdf', title='Certificate'):
+    """Upload ``content`` as a medical certificate of ``athlete``; returns the newest Document."""
+    client.post('/documents/upload', data={
+        'title': title, 'document_type': 'medical_certificate',
+        'entity_type': 'athlete', 'entity_id': athlete.id,
+        'file': (io.BytesIO(content), name),
+    }, content_type='multipart/form-data')
+    return Document.query.order_by(Document.id.desc()).first()
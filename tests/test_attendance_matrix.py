@@ -0,0 +1,101 @@
+# ABOUTME: Tests for the team x session attendance matrix (bytearray grid and aggregates)
+# ABOUTME: Checks grid packing, row/column statistics and the JSON/HTMX endpoint
+
+from datetime import date
+
+from app import db
+from app.models import Attendance, Athlete
+from app.utils.attendance import AttendanceMatrix
+
+
+def _second_athlete(sample_athlete, admin_user):
+    other = Athlete(
+        first_name='Luca', last_name='Verdi',
+        birth_date=date(2015, 5, 1), birth_place='Bologna',
+        fiscal_code='VRDLCU15E01A944Z',
+        street_address='Via Test', street_number='1',
+        postal_code='40100', city='Bologna', province='BO',
+        document_number='CC1', issuing_authority='Test',
+        document_expiry=date(2030, 1, 1),
+        team_id=sample_athlete.team_id, created_by=admin_user.id,
+    )
+    db.session.add(other)
+    db.session.commit()
+    return other
+
+
+def _mark(athlete, day, status, admin_user):
+    db.session.add(Attendance(
+        athlete_id=athlete.id, date=date(2026, 3, day), session_type='training',
+        status=status, created_by=admin_user.id,
+    ))
+
+
+def _seed(sample_athlete, admin_user):
+    other = _second_athlete(sample_athlete, admin_user)
+    for day, status in zip((2, 4, 9, 11, 16), ('absent', 'present', 'present', 'late', 'present')):
+        _mark(sample_athlete, day, status, admin_user)
+    _mark(other, 2, 'present', admin_user)
+    _mark(other, 16, 'excused', admin_user)
+    db.session.commit()
+    return other
+
+
+def test_matrix_packs_grid_and_stats(sample_athlete, admin_user):
+    _seed(sample_athlete, admin_user)
+    grid = AttendanceMatrix.for_team(sample_athlete.team_id, date(2026, 3, 1), date(2026, 3, 31))
+
+    # Rows are ordered by last name: Bianchi, Verdi
+    assert grid.row_strings() == ['APPLP', 'P...E']
+
+    bianchi, verdi = grid.row_stats()
+    assert bianchi['presence_pct'] == 80.0
+    assert bianchi['current_streak'] == 4
+    assert bianchi['longest_streak'] == 4
+    assert bianchi['trend'] == 50.0
+    assert verdi['presence_pct'] == 50.0
+    assert verdi['current_streak'] == 0
+    assert verdi['trend'] is None
+
+    first_session = grid.column_stats()[0]
+    assert (first_session['present'], first_session['absent']) == (1, 1)
+    assert first_session['presence_pct'] == 50.0
+
+
+def test_matrix_json_endpoint(logged_in_admin, sample_athlete, admin_user):
+    _seed(sample_athlete, admin_user)
+    response = logged_in_admin.get(
+        f'/attendance/matrix?team_id={sample_athlete.team_id}&start=2026-03-01&end=2026-03-10&format=json'
+    )
+    data = response.get_json()
+    assert data['grid'] == ['APP', 'P..']
+    assert [s[0] for s in data['sessions']] == ['2026-03-02', '2026-03-04', '2026-03-09']
+    assert data['columns'][0][:4] == [1, 0, 0, 1]
+
+
+def test_matrix_htmx_partial(logged_in_admin, sample_athlete, admin_user):
+    _seed(sample_athlete, admin_user)
+    response = logged_in_admin.get(
+        f'/attendance/matrix?team_id={sample_athlete.team_id}&start=2026-03-01&end=2026-03-31',
+        headers={'HX-Request': 'true'}
+    )
+    html = response.data.decode()
+    assert response.status_code == 200
+    assert 'attendance-matrix' in html
+    assert '<nav' not in html
+
+
+def test_matrix_forbidden_for_parents(client, db_session, sample_athlete, admin_user):
+    from app.models import User
+    _seed(sample_athlete, admin_user)
+    parent = User(username='parent', email='parent@test.com', first_name='P', last_name='G', role='parent')
+    parent.set_password('password123')
+    db_session.add(parent)
+    db_session.commit()
+    client.post('/auth/login', data={'username_or_email': 'parent', 'password': 'password123'})
+
+    response = client.get(f'/attendance/matrix?team_id={sample_athlete.team_id}&format=json')
+    assert response.status_code == 403
+    assert 'grid' not in response.get_json()
+    response = client.get(f'/attendance/matrix?team_id={sample_athlete.team_id}')
+    assert response.status_code == 302
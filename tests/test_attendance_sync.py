@@ -0,0 +1,108 @@
+# ABOUTME: Tests for offline check-in support (roster API, batch sync, last-writer-wins)
+# ABOUTME: Covers the JSON sync endpoint and the form check-in sharing the same upsert logic
+
+from datetime import date, time
+
+from app import db
+from app.models import Attendance, RecurrenceRule, TrainingSession
+
+
+def _sync(client, sessions):
+    return client.post('/attendance/api/sync', json={'sessions': sessions})
+
+
+def _session(athlete_id, status, marked_at, **overrides):
+    entry = {
+        'date': '2026-03-02',
+        'session_type': 'training',
+        'marks': [{'athlete_id': athlete_id, 'status': status, 'marked_at': marked_at}],
+    }
+    entry.update(overrides)
+    return entry
+
+
+def test_roster_lists_athletes_and_token(logged_in_coach, sample_athlete):
+    response = logged_in_coach.get('/attendance/api/roster')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['csrf_token']
+    assert data['athletes'] == [{
+        'id': sample_athlete.id, 'name': 'Marco Bianchi', 'team_id': sample_athlete.team_id,
+    }]
+
+
+def test_sync_creates_records(logged_in_coach, sample_athlete):
+    response = _sync(logged_in_coach, [_session(sample_athlete.id, 'present', '2026-03-02T17:00:00Z')])
+    assert response.status_code == 200
+    assert response.get_json()['summary']['created'] == 1
+
+    record = Attendance.query.one()
+    assert record.status == 'present'
+    assert record.date == date(2026, 3, 2)
+
+
+def test_sync_last_writer_wins(logged_in_coach, sample_athlete):
+    _sync(logged_in_coach, [_session(sample_athlete.id, 'late', '2026-03-02T17:10:00Z')])
+
+    # An older mark from another phone arrives later and must not win
+    stale = _sync(logged_in_coach, [_session(sample_athlete.id, 'absent', '2026-03-02T17:05:00Z')])
+    assert stale.get_json()['summary']['stale'] == 1
+    assert Attendance.query.one().status == 'late'
+
+    newer = _sync(logged_in_coach, [_session(sample_athlete.id, 'present', '2026-03-02T17:20:00Z')])
+    assert newer.get_json()['summary']['updated'] == 1
+    assert Attendance.query.one().status == 'present'
+
+
+def test_sync_rejects_unknown_athlete_and_bad_payload(logged_in_coach, sample_athlete):
+    response = _sync(logged_in_coach, [_session(9999, 'present', '2026-03-02T17:00:00Z')])
+    assert response.get_json()['summary']['rejected'] == 1
+    assert Attendance.query.count() == 0
+
+    assert logged_in_coach.post('/attendance/api/sync', json={'foo': 1}).status_code == 400
+
+
+def test_sync_materializes_rule_occurrence(logged_in_coach, admin_user, sample_team, sample_athlete):
+    rule = RecurrenceRule(title='Allenamento U10', start_time=time(17, 30), end_time=time(19, 0),
+                          session_type='training', weekday=0, start_date=date(2026, 3, 1),
+                          end_date=date(2026, 3, 31), team_id=sample_team.id, created_by=admin_user.id)
+    db.session.add(rule)
+    db.session.commit()
+
+    response = _sync(logged_in_coach, [_session(sample_athlete.id, 'present', '2026-03-02T17:00:00Z',
+                                                training_session_id=f'r{rule.id}:2026-03-02')])
+    assert response.get_json()['summary']['created'] == 1
+
+    session = TrainingSession.query.one()
+    assert session.recurrence_rule_id == rule.id
+    assert session.occurrence_date == date(2026, 3, 2)
+    assert Attendance.query.one().training_session_id == session.id
+    assert session.present_count == 1
+
+
+def test_sync_rejects_malformed_session_choice(logged_in_coach, sample_athlete):
+    response = _sync(logged_in_coach, [_session(sample_athlete.id, 'present', '2026-03-02T17:00:00Z',
+                                                training_session_id='r1:not-a-date')])
+    assert response.get_json()['errors'] == [{'session': 0, 'error': 'invalid training session'}]
+    assert Attendance.query.count() == 0
+
+
+def test_form_check_in_does_not_duplicate(logged_in_coach, sample_athlete):
+    data = {
+        'date': '2026-03-02',
+        'session_type': 'training',
+        'notes': '',
+        'present': [str(sample_athlete.id)],
+    }
+    logged_in_coach.post('/attendance/check-in', data=data)
+    data['late'] = data.pop('present')
+    logged_in_coach.post('/attendance/check-in', data=data)
+
+    record = Attendance.query.one()
+    assert record.status == 'late'
+
+
+def test_service_worker_served_under_attendance_scope(client):
+    response = client.get('/attendance/sw.js')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('application/javascript')
@@ -0,0 +1,129 @@
+# ABOUTME: Tests for the calendar month-events cache and its write-time invalidation
+# ABOUTME: Covers cache hits, per-month generations, writes from other workers, rollbacks and neighbour prefetch
+
+from datetime import date, time
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Match
+from app.utils.calendar_events import event_url_templates, month_cache, prefetch_months, warm_months
+
+
+def _month(client, year=2026, month=3):
+    return client.get(f'/calendar/?year={year}&month={month}')
+
+
+def test_month_is_cached_after_first_view(logged_in_admin, sample_training_session):
+    assert _month(logged_in_admin).status_code == 200
+    assert any(key[:3] == (2026, 3, None) for key in month_cache._data)
+
+    # A raw write bypasses the hooks, so no generation moves: served as cached
+    db.session.connection().exec_driver_sql("UPDATE training_sessions SET title = 'Stale check'")
+    db.session.commit()
+    assert b'Stale check' not in _month(logged_in_admin).data
+
+
+def test_session_write_invalidates_only_its_month(logged_in_admin, sample_training_session):
+    _month(logged_in_admin, month=3)
+    _month(logged_in_admin, month=4)
+
+    sample_training_session.title = 'Sessione spostata'
+    db.session.commit()
+
+    assert not any(key[:2] == (2026, 3) for key in month_cache._data)
+    assert any(key[:2] == (2026, 4) for key in month_cache._data)
+    assert b'Sessione spostata' in _month(logged_in_admin, month=3).data
+
+
+def test_moving_a_session_invalidates_old_and_new_month(logged_in_admin, sample_training_session):
+    _month(logged_in_admin, month=3)
+    _month(logged_in_admin, month=5)
+
+    sample_training_session.date = date(2026, 5, 4)
+    db.session.commit()
+
+    assert not month_cache._data
+    assert b'Allenamento' in _month(logged_in_admin, month=5).data
+
+
+def test_new_match_invalidates_month(logged_in_admin, admin_user, sample_team):
+    assert b'Virtus' not in _month(logged_in_admin).data
+
+    db.session.add(Match(
+        opponent='Virtus', date=date(2026, 3, 14), kick_off_time=time(15, 0),
+        team_id=sample_team.id, is_home=True, match_type='league',
+        created_by=admin_user.id
+    ))
+    db.session.commit()
+
+    assert b'Virtus' in _month(logged_in_admin).data
+
+
+def test_rollback_keeps_cache(logged_in_admin, sample_training_session):
+    _month(logged_in_admin)
+    sample_training_session.title = 'Mai salvato'
+    db.session.flush()
+    db.session.rollback()
+
+    assert any(key[:2] == (2026, 3) for key in month_cache._data)
+
+
+def test_prefetch_warms_neighbouring_months(app, logged_in_admin, sample_training_session):
+    _month(logged_in_admin, month=4)
+    assert not any(key[:2] == (2026, 3) for key in month_cache._data)
+
+    with app.test_request_context():
+        urls = event_url_templates()
+        # Disabled in testing, so nothing is started
+        assert prefetch_months([(2026, 3)], None, 'it', urls) is None
+        warm_months([(2026, 3)], None, 'it', urls)
+
+    _fingerprint, events = month_cache.get((2026, 3, None, 'it'))
+    assert [e['title'] for e in events[2]] == ['Allenamento']
+
+
+def test_write_from_another_worker_is_not_served_stale(logged_in_admin, sample_training_session):
+    _month(logged_in_admin)
+
+    # Another process commits: this worker's commit hooks never run, only the shared generation moves
+    connection = db.session.connection()
+    connection.exec_driver_sql("UPDATE training_sessions SET title = 'Altro worker'")
+    connection.exec_driver_sql("UPDATE calendar_generations SET generation = generation + 1 WHERE month = 202603")
+    db.session.commit()
+    assert any(key[:2] == (2026, 3) for key in month_cache._data)
+
+    assert b'Altro worker' in _month(logged_in_admin).data
+
+
+def test_check_in_keeps_other_months_cached(logged_in_admin, sample_training_session):
+    from app.utils.attendance import apply_roll_call_deltas
+
+    _month(logged_in_admin, month=3)
+    _month(logged_in_admin, month=4)
+
+    apply_roll_call_deltas({sample_training_session.id: {'present': 1}})
+    db.session.commit()
+
+    assert any(key[:2] == (2026, 4) for key in month_cache._data)
+    # The counter update bumped March's generation, so it is rebuilt with the turnout
+    assert b'1/1' in _month(logged_in_admin, month=3).data
+
+
+def test_cache_hit_runs_a_single_query(logged_in_admin, sample_training_session):
+    _month(logged_in_admin)
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if any(table in statement for table in ('calendar_generations', 'training_sessions', 'recurrence')):
+            statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        assert _month(logged_in_admin).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    assert len(statements) == 1
+    assert 'calendar_generations' in statements[0]
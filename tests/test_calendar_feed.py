@@ -0,0 +1,104 @@
+# ABOUTME: Tests for the date-range calendar JSON feed and its conditional GET handling
+# ABOUTME: Covers filters, compact records, ETag/Last-Modified and 304 responses, incl. edited occurrences
+
+from datetime import date, time
+
+from app import db
+from app.models import Match, RecurrenceRule
+
+
+def _feed(client, headers=None, **params):
+    query = '&'.join(f'{k}={v}' for k, v in {'start': '2026-03-01', 'end': '2026-03-31', **params}.items())
+    return client.get(f'/calendar/events.json?{query}', headers=headers or {})
+
+
+def test_feed_returns_compact_records(logged_in_admin, sample_training_session):
+    response = _feed(logged_in_admin)
+    assert response.status_code == 200
+    event = response.get_json()['events'][0]
+    assert event['id'] == f'ts-{sample_training_session.id}'
+    assert event['start'] == '2026-03-02T17:00'
+    assert event['end'] == '2026-03-02T18:30'
+    assert event['team'] == 'Under 10'
+    assert response.headers['ETag']
+    assert response.headers['Last-Modified']
+
+
+def test_feed_filters_by_team_and_range(logged_in_admin, sample_training_session):
+    assert _feed(logged_in_admin, team_id=sample_training_session.team_id + 1).get_json()['events'] == []
+    assert _feed(logged_in_admin, start='2026-04-01', end='2026-04-30').get_json()['events'] == []
+    assert _feed(logged_in_admin, start='2026-03-02T00:00:00', end='2026-03-02').get_json()['events']
+
+
+def test_feed_rejects_bad_ranges(logged_in_admin):
+    assert _feed(logged_in_admin, start='nope').status_code == 400
+    assert _feed(logged_in_admin, start='2026-03-10', end='2026-03-01').status_code == 400
+    assert _feed(logged_in_admin, start='2026-01-01', end='2028-01-01').status_code == 400
+
+
+def test_feed_answers_304_until_something_changes(logged_in_admin, admin_user, sample_training_session):
+    etag = _feed(logged_in_admin).headers['ETag']
+
+    response = _feed(logged_in_admin, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    db.session.add(Match(
+        opponent='Virtus', date=date(2026, 3, 14), kick_off_time=time(15, 0), match_type='league',
+        team_id=sample_training_session.team_id, is_home=True, created_by=admin_user.id
+    ))
+    db.session.commit()
+
+    response = _feed(logged_in_admin, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [e['type'] for e in response.get_json()['events']] == ['training', 'match']
+
+
+def test_feed_honours_if_modified_since(logged_in_admin, sample_training_session):
+    last_modified = _feed(logged_in_admin).headers['Last-Modified']
+    assert _feed(logged_in_admin, headers={'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_feed_etag_changes_on_soft_delete(logged_in_admin, sample_training_session):
+    etag = _feed(logged_in_admin).headers['ETag']
+    sample_training_session.is_active = False
+    db.session.commit()
+
+    response = _feed(logged_in_admin, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['events'] == []
+
+
+def _tuesday_rule(admin_user, team):
+    rule = RecurrenceRule(title='Allenamento', start_time=time(17, 30), end_time=time(19, 0),
+                          session_type='training', weekday=1, start_date=date(2026, 3, 1),
+                          end_date=date(2026, 3, 31), team_id=team.id, created_by=admin_user.id)
+    db.session.add(rule)
+    db.session.commit()
+    return rule
+
+
+def test_feed_etag_changes_when_an_occurrence_is_moved_again(logged_in_admin, admin_user, sample_team):
+    url = f'/training/rules/{_tuesday_rule(admin_user, sample_team).id}/2026-03-03/move'
+    logged_in_admin.post(url, data={'new_date': '2026-03-05'})
+    etag = _feed(logged_in_admin).headers['ETag']
+
+    logged_in_admin.post(url, data={'new_date': '2026-03-12'})
+
+    response = _feed(logged_in_admin, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert '2026-03-12T17:30' in [e['start'] for e in response.get_json()['events']]
+
+
+def test_feed_etag_changes_when_a_cancelled_occurrence_is_moved(logged_in_admin, admin_user, sample_team):
+    url = f'/training/rules/{_tuesday_rule(admin_user, sample_team).id}/2026-03-03'
+    logged_in_admin.post(url + '/cancel', data={'cancellation_reason': 'Pioggia'})
+    etag = _feed(logged_in_admin).headers['ETag']
+
+    logged_in_admin.post(url + '/move', data={'new_date': '2026-03-04'})
+
+    response = _feed(logged_in_admin, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    moved = [e for e in response.get_json()['events'] if e['start'].startswith('2026-03-04')]
+    assert len(moved) == 1 and not moved[0]['cancelled']
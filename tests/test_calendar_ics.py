@@ -0,0 +1,146 @@
+# ABOUTME: Tests for signed per-team and per-athlete ICS subscription feeds
+# ABOUTME: Covers token checks and rotation, UTC times, cancellations, blob reuse and strong ETags
+
+from datetime import date, datetime, time, timedelta, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import update
+
+from app import db
+from app.models import Match, RecurrenceException, RecurrenceRule, TrainingSession
+from app.utils import ics
+from app.utils.ics import _serializer, feed_token
+
+
+def _session(team, user, days, **kwargs):
+    session = TrainingSession(
+        title='Allenamento', date=date.today() + timedelta(days=days),
+        start_time=time(17, 0), end_time=time(18, 30), location='Campo A', session_type='training',
+        team_id=team.id, created_by=user.id, **kwargs
+    )
+    db.session.add(session)
+    db.session.commit()
+    return session
+
+
+def test_team_feed_lists_sessions_and_cancellations(client, admin_user, sample_team):
+    kept = _session(sample_team, admin_user, 3)
+    dropped = _session(sample_team, admin_user, 10, cancelled=True, cancellation_reason='Campo allagato')
+    db.session.add(Match(
+        opponent='Virtus', date=date.today() + timedelta(days=5), match_type='league',
+        team_id=sample_team.id, status='cancelled', created_by=admin_user.id
+    ))
+    db.session.commit()
+
+    response = client.get(f'/calendar/feeds/{feed_token("team", sample_team)}.ics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/calendar'
+    body = response.data.decode()
+    assert body.startswith('BEGIN:VCALENDAR\r\n')
+    assert f'UID:ts-{kept.id}@' in body
+    assert f'UID:ts-{dropped.id}@' in body
+    assert body.count('STATUS:CANCELLED') == 2
+    assert 'DESCRIPTION:Campo allagato' in body
+    # Match without kick-off time becomes an all-day entry
+    assert 'DTSTART;VALUE=DATE:' in body
+    assert not response.headers['ETag'].startswith('W/')
+
+
+def test_timed_events_are_written_in_utc(app, client, admin_user, sample_team):
+    session = _session(sample_team, admin_user, 3)
+
+    body = client.get(f'/calendar/feeds/{feed_token("team", sample_team)}.ics').data.decode()
+
+    start = datetime.combine(session.date, time(17, 0), ZoneInfo(app.config['CALENDAR_TIMEZONE']))
+    assert f'DTSTART:{start.astimezone(timezone.utc):%Y%m%dT%H%M%S}Z\r\n' in body
+    assert 'TZID=' not in body
+
+
+def test_athlete_feed_serves_team_schedule(client, admin_user, sample_athlete, sample_team):
+    _session(sample_team, admin_user, 3)
+    team_body = client.get(f'/calendar/feeds/{feed_token("team", sample_team)}.ics').data
+    athlete_body = client.get(f'/calendar/feeds/{feed_token("athlete", sample_athlete)}.ics').data
+    assert athlete_body == team_body
+
+
+def test_bad_or_unknown_tokens_are_404(client, sample_team):
+    token = feed_token('team', sample_team)
+    assert client.get(f'/calendar/feeds/{token[:-2]}xx.ics').status_code == 404
+    assert client.get(f'/calendar/feeds/{feed_token("team", SimpleNamespace(id=999, feed_key=None))}.ics').status_code == 404
+
+
+def test_rotating_the_feed_key_revokes_old_links(logged_in_admin, sample_athlete, sample_team):
+    # Links handed out before feed keys existed hold only kind and id
+    legacy = _serializer().dumps(['t', sample_team.id])
+    team_token = feed_token('team', sample_team)
+    athlete_token = feed_token('athlete', sample_athlete)
+    assert logged_in_admin.get(f'/calendar/feeds/{legacy}.ics').status_code == 200
+
+    logged_in_admin.post(f'/teams/{sample_team.id}/calendar-feed/reset')
+    logged_in_admin.post(f'/athletes/{sample_athlete.id}/calendar-feed/reset')
+
+    for token in (legacy, team_token, athlete_token):
+        assert logged_in_admin.get(f'/calendar/feeds/{token}.ics').status_code == 404
+    db.session.refresh(sample_team)
+    assert logged_in_admin.get(f'/calendar/feeds/{feed_token("team", sample_team)}.ics').status_code == 200
+
+
+def _event(body, uid):
+    block = body.split(f'UID:{uid}@', 1)[1].split('END:VEVENT', 1)[0]
+    return dict(line.split(':', 1) for line in block.split('\r\n')[1:] if ':' in line)
+
+
+def test_moved_occurrence_is_restamped_on_every_move(logged_in_admin, admin_user, sample_team):
+    day = date.today() + timedelta(days=7)
+    rule = RecurrenceRule(title='Allenamento', start_time=time(17, 30), end_time=time(19, 0),
+                          session_type='training', weekday=day.weekday(), start_date=date.today(),
+                          end_date=date.today() + timedelta(days=28), team_id=sample_team.id,
+                          created_by=admin_user.id)
+    db.session.add(rule)
+    db.session.commit()
+    db.session.execute(update(RecurrenceRule).values(updated_at=datetime(2020, 1, 1)))
+    db.session.commit()
+    url = f'/training/rules/{rule.id}/{day.isoformat()}/move'
+    feed = f'/calendar/feeds/{feed_token("team", sample_team)}.ics'
+    uid = f'r{rule.id}-{day.isoformat()}'
+
+    logged_in_admin.post(url, data={'new_date': (day + timedelta(days=1)).isoformat()})
+    first = _event(logged_in_admin.get(feed).data.decode(), uid)
+    exception = RecurrenceException.query.one()
+    assert first['DTSTAMP'] == f'{exception.updated_at:%Y%m%dT%H%M%S}Z'
+
+    db.session.execute(update(RecurrenceException).values(updated_at=datetime(2021, 1, 1)))
+    db.session.commit()
+    logged_in_admin.post(url, data={'new_date': (day + timedelta(days=2)).isoformat()})
+    second = _event(logged_in_admin.get(feed).data.decode(), uid)
+
+    assert second['DTSTART'] != first['DTSTART']
+    assert second['DTSTAMP'] > '20210101T000000Z'
+
+
+def test_feed_blob_is_reused_until_schedule_changes(client, admin_user, sample_team, monkeypatch):
+    session = _session(sample_team, admin_user, 3)
+    url = f'/calendar/feeds/{feed_token("team", sample_team)}.ics'
+    renders = []
+    original = ics.render_team_feed
+    monkeypatch.setattr(ics, 'render_team_feed', lambda *a: renders.append(a) or original(*a))
+
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(url).status_code == 200
+    assert len(renders) == 1
+
+    session.cancelled = True
+    db.session.commit()
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'STATUS:CANCELLED' in response.data
+    assert len(renders) == 2
+
+
+def test_long_lines_are_folded():
+    line = 'SUMMARY:' + 'è' * 80
+    folded = ics._fold(line)
+    assert all(len(part.encode()) <= 75 for part in folded.split('\r\n'))
+    assert folded.replace('\r\n ', '') == line
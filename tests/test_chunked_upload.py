@@ -0,0 +1,119 @@
+# ABOUTME: Tests for the chunked, resumable document upload protocol
+# ABOUTME: Covers init, ordered chunk PUTs, resume after interruption and atomic finalize
+
+import hashlib
+import os
+
+import pytest
+
+from app.models import Document, UploadBlob, UploadSession
+from app.utils.storage import get_storage
+
+CONTENT = bytes(range(256)) * 10  # 2560 bytes: chunks of 1000, 1000, 560
+
+
+@pytest.fixture
+def chunked(app, upload_dir, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_CHUNK_SIZE', 1000)
+    return app
+
+
+def _init(client, size=len(CONTENT), name='scan.pdf'):
+    return client.post('/documents/uploads', json={
+        'file_name': name, 'total_size': size, 'mime_type': 'application/pdf'
+    })
+
+
+def _put(client, upload_id, index, data, **headers):
+    return client.put(f'/documents/uploads/{upload_id}/chunks/{index}', data=data, headers=headers)
+
+
+def _finalize(client, upload_id, athlete):
+    return client.post(f'/documents/uploads/{upload_id}/finalize', data={
+        'title': 'Scan', 'document_type': 'medical_certificate',
+        'entity_type': 'athlete', 'entity_id': athlete.id,
+    })
+
+
+def test_chunked_upload_creates_document(chunked, logged_in_coach, sample_athlete):
+    response = _init(logged_in_coach)
+    assert response.status_code == 201
+    state = response.get_json()
+    assert state['chunk_count'] == 3 and state['next_chunk'] == 0
+
+    for index in range(3):
+        state = _put(logged_in_coach, state['upload_id'], index,
+                     CONTENT[index * 1000:(index + 1) * 1000]).get_json()
+    assert state['next_chunk'] == 3
+
+    response = _finalize(logged_in_coach, state['upload_id'], sample_athlete)
+    assert response.status_code == 201
+    document = Document.query.one()
+    assert response.get_json()['url'].endswith(f'/documents/{document.id}')
+    assert document.file_size == len(CONTENT)
+    assert UploadBlob.query.one().sha256 == hashlib.sha256(CONTENT).hexdigest()
+    with open(document.file_path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert UploadSession.query.count() == 0
+    assert not os.path.exists(get_storage().part_path(state['upload_id']))
+
+
+def test_interrupted_chunk_resumes_from_last_ack(chunked, logged_in_coach, sample_athlete):
+    upload_id = _init(logged_in_coach).get_json()['upload_id']
+    _put(logged_in_coach, upload_id, 0, CONTENT[:1000])
+
+    # Connection dropped half-way through chunk 1
+    assert _put(logged_in_coach, upload_id, 1, CONTENT[1000:1400]).status_code == 400
+    status = logged_in_coach.get(f'/documents/uploads/{upload_id}').get_json()
+    assert status['next_chunk'] == 1 and status['received_bytes'] == 1000
+
+    # Out of order and duplicate chunks are answered with the resume point
+    assert _put(logged_in_coach, upload_id, 2, CONTENT[2000:]).status_code == 409
+    assert _put(logged_in_coach, upload_id, 0, CONTENT[:1000]).get_json()['next_chunk'] == 1
+
+    _put(logged_in_coach, upload_id, 1, CONTENT[1000:2000])
+    _put(logged_in_coach, upload_id, 2, CONTENT[2000:])
+    assert _finalize(logged_in_coach, upload_id, sample_athlete).status_code == 201
+    with open(Document.query.one().file_path, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_chunk_checksum_and_size_are_enforced(chunked, logged_in_coach):
+    upload_id = _init(logged_in_coach).get_json()['upload_id']
+
+    assert _put(logged_in_coach, upload_id, 0, CONTENT[:1001]).status_code == 400
+    bad = _put(logged_in_coach, upload_id, 0, CONTENT[:1000], **{'X-Chunk-SHA256': '0' * 64})
+    assert bad.status_code == 400
+    good = _put(logged_in_coach, upload_id, 0, CONTENT[:1000],
+                **{'X-Chunk-SHA256': hashlib.sha256(CONTENT[:1000]).hexdigest()})
+    assert good.get_json()['next_chunk'] == 1
+
+
+def test_finalize_requires_all_chunks_and_valid_form(chunked, logged_in_coach, sample_athlete):
+    upload_id = _init(logged_in_coach).get_json()['upload_id']
+    _put(logged_in_coach, upload_id, 0, CONTENT[:1000])
+
+    assert _finalize(logged_in_coach, upload_id, sample_athlete).status_code == 409
+    response = logged_in_coach.post(f'/documents/uploads/{upload_id}/finalize', data={'title': ''})
+    assert response.status_code == 400
+    assert Document.query.count() == 0
+
+
+def test_init_rejects_bad_files_and_foreign_sessions(chunked, client, logged_in_coach, admin_user):
+    assert _init(logged_in_coach, name='virus.exe').status_code == 400
+    assert _init(logged_in_coach, size=chunked.config['UPLOAD_MAX_SIZE'] + 1).status_code == 400
+    upload_id = _init(logged_in_coach).get_json()['upload_id']
+
+    client.get('/auth/logout')
+    client.post('/auth/login', data={'username_or_email': 'testadmin', 'password': 'password123'})
+    assert client.get(f'/documents/uploads/{upload_id}').status_code == 404
+
+
+def test_stale_sessions_are_purged(chunked, logged_in_coach, monkeypatch):
+    upload_id = _init(logged_in_coach).get_json()['upload_id']
+    monkeypatch.setitem(chunked.config, 'UPLOAD_SESSION_HOURS', -1)
+
+    result = chunked.test_cli_runner().invoke(args=['purge-stale-uploads'])
+
+    assert 'Removed 1 stale upload(s)' in result.output
+    assert not os.path.exists(get_storage().part_path(upload_id))
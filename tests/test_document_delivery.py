@@ -0,0 +1,68 @@
+# ABOUTME: Tests for document download delivery modes and conditional requests
+# ABOUTME: Direct serving keeps Range and ETag support; offload modes only emit proxy headers
+
+import pytest
+
+from app.models import UploadBlob
+from tests.conftest import upload_document
+
+CONTENT = b'%PDF-1.4 ' + bytes(range(256)) * 8
+
+
+@pytest.fixture
+def stored(upload_dir, logged_in_admin, sample_athlete):
+    return upload_document(logged_in_admin, sample_athlete, CONTENT)
+
+
+def test_direct_download_supports_etag_and_range(logged_in_admin, stored):
+    sha = UploadBlob.query.one().sha256
+    url = f'/documents/{stored.id}/download'
+
+    response = logged_in_admin.get(url)
+    assert response.data == CONTENT
+    assert response.headers['ETag'] == f'"{sha}"'
+    assert 'private' in response.headers['Cache-Control']
+
+    assert logged_in_admin.get(url, headers={'If-None-Match': f'"{sha}"'}).status_code == 304
+    partial = logged_in_admin.get(url, headers={'Range': 'bytes=0-8'})
+    assert partial.status_code == 206
+    assert partial.data == CONTENT[:9]
+
+
+def test_x_accel_delivery(app, monkeypatch, logged_in_admin, stored):
+    monkeypatch.setitem(app.config, 'DOCUMENT_DELIVERY', 'x-accel')
+    blob = UploadBlob.query.one()
+
+    response = logged_in_admin.get(f'/documents/{stored.id}/download')
+
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == f'/protected-uploads/{blob.storage_key}'
+    assert 'certificate.pdf' in response.headers['Content-Disposition']
+    assert response.headers['ETag'] == f'"{blob.sha256}"'
+
+
+def test_x_sendfile_delivery(app, monkeypatch, logged_in_admin, stored):
+    monkeypatch.setitem(app.config, 'DOCUMENT_DELIVERY', 'x-sendfile')
+
+    response = logged_in_admin.get(f'/documents/{stored.id}/download')
+
+    assert response.headers['X-Sendfile'] == stored.file_path
+    assert response.data == b''
+
+
+def test_download_requires_staff_role(client, app, monkeypatch, stored):
+    from app import db
+    from app.models import User
+    client.get('/auth/logout')
+    user = User(username='parent', email='parent@test.com', first_name='P', last_name='U', role='parent')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    client.post('/auth/login', data={'username_or_email': 'parent', 'password': 'password123'})
+    monkeypatch.setitem(app.config, 'DOCUMENT_DELIVERY', 'x-accel')
+
+    response = client.get(f'/documents/{stored.id}/download')
+
+    assert response.status_code == 302
+    assert 'X-Accel-Redirect' not in response.headers
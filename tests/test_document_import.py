@@ -0,0 +1,138 @@
+# ABOUTME: Tests for bulk document import from a ZIP archive and a CSV manifest
+# ABOUTME: Covers owner resolution, per-row errors, batching, the process pool, the CLI and the admin page
+
+import io
+import zipfile
+
+import pytest
+
+from app.models import Document, UploadBlob
+from app.utils.document_import import import_documents, read_manifest
+
+CERTIFICATE = b'%PDF-1.4 medical certificate'
+ID_SCAN = b'%PDF-1.4 identity card'
+
+
+def _archive(path, files):
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return str(path)
+
+
+MANIFEST = (
+    'file,fiscal_code,document_type,expiry_date,title\n'
+    'certs/marco.pdf,bncmrc15c20a944y,medical_certificate,2027-09-30,Certificate 2026\n'
+    'id.pdf,RSSMRA85A15A944X,id_document,30/06/2030,\n'
+    'missing.pdf,BNCMRC15C20A944Y,medical_certificate,,\n'
+    'id.pdf,XXXXXX00X00X000X,id_document,,\n'
+    'id.pdf,BNCMRC15C20A944Y,passport,,\n'
+    'id.pdf,BNCMRC15C20A944Y,id_document,31-12-2030,\n'
+)
+
+
+def test_import_resolves_owners_and_reports_bad_rows(app, upload_dir, admin_user, sample_athlete, sample_team):
+    archive = _archive(upload_dir / 'docs.zip', {'certs/marco.pdf': CERTIFICATE, 'id.pdf': ID_SCAN})
+
+    imported, errors = import_documents(archive, io.StringIO(MANIFEST), admin_user.id)
+
+    assert imported == 2
+    assert [(e['row'], e['error']) for e in errors] == [
+        (4, 'file not found in archive'),
+        (5, "unknown fiscal code 'XXXXXX00X00X000X'"),
+        (6, "unknown document type 'passport'"),
+        (7, "invalid date '31-12-2030'"),
+    ]
+    certificate = Document.query.filter_by(entity_type='athlete').one()
+    assert certificate.entity_id == certificate.athlete_id == sample_athlete.id
+    assert certificate.title == 'Certificate 2026'
+    assert certificate.expiry_date.isoformat() == '2027-09-30'
+    assert certificate.file_name == 'marco.pdf'
+    assert certificate.mime_type == 'application/pdf'
+    assert certificate.created_by == admin_user.id
+    id_document = Document.query.filter_by(entity_type='staff').one()
+    assert id_document.title == 'id'
+    assert (id_document.staff_id, id_document.athlete_id) == (id_document.entity_id, None)
+    assert id_document.expiry_date.isoformat() == '2030-06-30'
+    with open(id_document.file_path, 'rb') as f:
+        assert f.read() == ID_SCAN
+
+
+def test_import_batches_and_shares_blobs(app, upload_dir, admin_user, sample_athlete):
+    archive = _archive(upload_dir / 'docs.zip', {'a.pdf': CERTIFICATE, 'b.pdf': CERTIFICATE})
+    manifest = 'file;fiscal_code;document_type\n' + ''.join(
+        f'{name};{sample_athlete.fiscal_code};consent_form\n' for name in ('a.pdf', 'b.pdf', 'a.pdf')
+    )
+
+    imported, errors = import_documents(archive, io.StringIO(manifest), admin_user.id, batch_size=2)
+
+    assert (imported, errors) == (3, [])
+    blob = UploadBlob.query.one()
+    assert blob.ref_count == 3
+    assert Document.query.filter_by(blob_id=blob.id).count() == 3
+
+
+def test_import_in_process_pool(app, upload_dir, admin_user, sample_athlete):
+    archive = _archive(upload_dir / 'docs.zip', {f'{i}.pdf': CERTIFICATE + bytes([i]) for i in range(4)})
+    manifest = 'file,fiscal_code,document_type\n' + ''.join(
+        f'{i}.pdf,{sample_athlete.fiscal_code},medical_certificate\n' for i in range(4)
+    )
+
+    imported, errors = import_documents(archive, io.StringIO(manifest), admin_user.id, workers=2)
+
+    assert (imported, errors) == (4, [])
+    assert UploadBlob.query.count() == 4
+
+
+def test_oversized_member_is_refused(app, monkeypatch, upload_dir, admin_user, sample_athlete):
+    monkeypatch.setitem(app.config, 'UPLOAD_MAX_SIZE', 10)
+    archive = _archive(upload_dir / 'docs.zip', {'big.pdf': CERTIFICATE})
+    manifest = f'file,fiscal_code,document_type\nbig.pdf,{sample_athlete.fiscal_code},other\n'
+
+    imported, errors = import_documents(archive, io.StringIO(manifest), admin_user.id)
+
+    assert imported == 0
+    assert errors == [{'row': 2, 'file': 'big.pdf', 'error': 'file too large'}]
+    assert not list((upload_dir / 'tmp').iterdir())
+
+
+def test_manifest_requires_columns():
+    with pytest.raises(ValueError, match='fiscal_code'):
+        read_manifest(io.StringIO('file,document_type\na.pdf,other\n'))
+
+
+def test_cli_import(app, upload_dir, admin_user, sample_athlete):
+    archive = _archive(upload_dir / 'docs.zip', {'a.pdf': CERTIFICATE})
+    manifest = upload_dir / 'manifest.csv'
+    manifest.write_text(f'file,fiscal_code,document_type\na.pdf,{sample_athlete.fiscal_code},other\n'
+                        'b.pdf,XX,other\n')
+
+    result = app.test_cli_runner().invoke(args=['import-documents', archive, str(manifest)])
+
+    assert result.exit_code == 0
+    assert 'Imported 1 document(s), 1 row(s) with errors' in result.output
+    assert 'Row 3 (b.pdf): file not found in archive' in result.output
+    assert Document.query.count() == 1
+
+
+def test_admin_import_page(logged_in_admin, upload_dir, sample_athlete):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('a.pdf', CERTIFICATE)
+    buffer.seek(0)
+    manifest = f'file,fiscal_code,document_type\na.pdf,{sample_athlete.fiscal_code},other\nc.pdf,XX,other\n'
+
+    response = logged_in_admin.post('/documents/import', data={
+        'archive': (buffer, 'docs.zip'),
+        'manifest': (io.BytesIO(manifest.encode()), 'manifest.csv'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert b'Imported 1 document(s).' in response.data
+    assert b'file not found in archive' in response.data
+    assert Document.query.count() == 1
+
+
+def test_import_page_is_admin_only(logged_in_coach):
+    response = logged_in_coach.get('/documents/import')
+    assert response.status_code == 302
@@ -0,0 +1,102 @@
+# ABOUTME: Tests for typed document owners (athlete_id/staff_id) and owner names resolved by SQL joins
+# ABOUTME: Lists, the status report and expiry reminders read owners from the document query itself
+
+import re
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db, mail
+from app.models import Document
+from app.utils.email import send_expiry_reminders
+
+OWNER_LOOKUP = re.compile(r'FROM (athletes|staff|guardians)\b')
+
+
+@pytest.fixture
+def documents(admin_user, sample_athlete, sample_staff):
+    """An athlete (Bianchi) document, a staff (Rossi) one and one whose athlete no longer exists."""
+    soon = date.today() + timedelta(days=10)
+    rows = [
+        Document(title='Rossi Licence', document_type='id_document', file_path='/tmp/a', file_name='a.pdf',
+                 entity_type='staff', entity_id=sample_staff.id, created_by=admin_user.id, expiry_date=soon),
+        Document(title='Bianchi Certificate', document_type='medical_certificate', file_path='/tmp/b',
+                 file_name='b.pdf', entity_type='athlete', entity_id=sample_athlete.id, created_by=admin_user.id,
+                 expiry_date=soon),
+        Document(title='Orphan Form', document_type='consent_form', file_path='/tmp/c', file_name='c.pdf',
+                 entity_type='athlete', entity_id=9999, created_by=admin_user.id),
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+@pytest.fixture
+def owner_queries(app):
+    """SQL statements that look athletes, staff or guardians up on their own."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if OWNER_LOOKUP.search(statement):
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        yield statements
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_owner_keys_follow_entity(documents, sample_athlete, sample_staff):
+    staff_doc, athlete_doc, _ = documents
+    assert (athlete_doc.athlete_id, athlete_doc.staff_id) == (sample_athlete.id, None)
+    assert (staff_doc.staff_id, staff_doc.athlete_id) == (sample_staff.id, None)
+    assert athlete_doc.owner is sample_athlete
+
+    staff_doc.entity_type, staff_doc.entity_id = 'athlete', sample_athlete.id
+    db.session.commit()
+
+    assert (staff_doc.athlete_id, staff_doc.staff_id) == (sample_athlete.id, None)
+    assert sample_athlete.documents.count() == 2
+
+
+def test_index_sorts_and_searches_by_owner(logged_in_admin, documents, owner_queries):
+    response = logged_in_admin.get('/documents/?sort=owner')
+    page = response.data.decode()
+
+    assert page.index('Marco Bianchi') < page.index('Mario Rossi')
+    assert page.index('Bianchi Certificate') < page.index('Rossi Licence')
+    assert owner_queries == []
+
+    response = logged_in_admin.get('/documents/?search=mario')
+    assert b'Rossi Licence' in response.data
+    assert b'Bianchi Certificate' not in response.data
+
+
+def test_view_and_expiring_use_joined_owner(logged_in_admin, documents, owner_queries):
+    staff_doc, _, orphan = documents
+
+    assert b'Mario Rossi' in logged_in_admin.get(f'/documents/{staff_doc.id}').data
+    assert logged_in_admin.get(f'/documents/{orphan.id}').status_code == 200
+    page = logged_in_admin.get('/documents/expiring').data.decode()
+    assert page.index('Marco Bianchi') < page.index('Mario Rossi')
+    assert owner_queries == []
+
+
+def test_document_status_report(logged_in_admin, documents, owner_queries):
+    response = logged_in_admin.get('/reports/document-status?format=csv')
+
+    lines = response.data.decode().splitlines()
+    assert 'Marco Bianchi' in lines[1] and 'Mario Rossi' in lines[2]
+    assert owner_queries == []
+
+
+def test_expiry_reminders_load_owners_with_the_documents(app, documents, owner_queries):
+    with mail.record_messages() as outbox:
+        assert send_expiry_reminders() == 3
+
+    assert sorted(msg.recipients[0] for msg in outbox) == ['laura@test.com', 'mario.rossi@test.com',
+                                                          'paolo@test.com']
+    assert all('Marco Bianchi' in msg.html for msg in outbox if msg.recipients[0] != 'mario.rossi@test.com')
+    # Guardians of every athlete come in one query; owners come with the documents
+    assert len(owner_queries) == 1
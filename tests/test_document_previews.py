@@ -0,0 +1,128 @@
+# ABOUTME: Tests for document preview rendering, lazy generation and caching headers
+# ABOUTME: Previews are stored beside the blob and rendered by the process pool when configured
+
+import io
+import os
+
+import pytest
+
+PIL = pytest.importorskip('PIL')
+from PIL import Image  # noqa: E402
+
+from app.models import Document, UploadBlob  # noqa: E402
+from app.utils.previews import preview_path, schedule_preview  # noqa: E402
+from app.utils.tasks import shutdown_process_pool  # noqa: E402
+from app.utils.uploads import blob_path, purge_document  # noqa: E402
+from tests.conftest import upload_document  # noqa: E402
+
+
+@pytest.fixture
+def upload_dir(upload_dir, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'PREVIEW_SIZE', 100)
+    return upload_dir
+
+
+def _image(size=(400, 200), fmt='PNG', exif=None):
+    buffer = io.BytesIO()
+    image = Image.new('RGB', size, 'red')
+    if exif is not None:
+        image.save(buffer, fmt, exif=exif)
+    else:
+        image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def test_preview_rendered_on_first_view_and_cached(logged_in_admin, upload_dir, sample_athlete):
+    upload_document(logged_in_admin, sample_athlete, _image(), name='scan.png')
+    document = Document.query.one()
+    blob = UploadBlob.query.one()
+    assert not os.path.exists(preview_path(blob.storage_key))
+
+    page = logged_in_admin.get(f'/documents/{document.id}')
+    assert f'/documents/{document.id}/preview'.encode() in page.data
+
+    response = logged_in_admin.get(f'/documents/{document.id}/preview')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'private' in response.headers['Cache-Control']
+    assert 'public' not in response.headers['Cache-Control']
+    assert Image.open(io.BytesIO(response.data)).size == (100, 50)
+    assert os.path.dirname(preview_path(blob.storage_key)) == os.path.dirname(blob_path(blob.storage_key))
+
+    etag = response.headers['ETag']
+    assert logged_in_admin.get(f'/documents/{document.id}/preview',
+                               headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_preview_respects_exif_orientation(logged_in_admin, upload_dir, sample_athlete):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees clockwise
+    upload_document(logged_in_admin, sample_athlete, _image(fmt='JPEG', exif=exif), name='photo.jpg')
+
+    response = logged_in_admin.get(f'/documents/{Document.query.one().id}/preview')
+
+    assert Image.open(io.BytesIO(response.data)).size == (50, 100)
+
+
+def test_jpeg_preview_format(app, monkeypatch, logged_in_admin, upload_dir, sample_athlete):
+    monkeypatch.setitem(app.config, 'PREVIEW_FORMAT', 'jpeg')
+    upload_document(logged_in_admin, sample_athlete, _image(), name='scan.png')
+
+    response = logged_in_admin.get(f'/documents/{Document.query.one().id}/preview')
+
+    assert response.mimetype == 'image/jpeg'
+    assert preview_path(UploadBlob.query.one().storage_key).endswith('.preview.jpeg')
+
+
+def test_no_preview_for_unsupported_content(logged_in_admin, upload_dir, sample_athlete, monkeypatch):
+    import app.utils.previews as previews
+    real_find_spec = previews.importlib.util.find_spec
+    monkeypatch.setattr(previews.importlib.util, 'find_spec',
+                        lambda name: None if name == 'pypdfium2' else real_find_spec(name))
+    upload_document(logged_in_admin, sample_athlete, b'%PDF-1.4 certificate', name='certificate.pdf')
+    document = Document.query.one()
+
+    assert b'/preview' not in logged_in_admin.get(f'/documents/{document.id}').data
+    assert logged_in_admin.get(f'/documents/{document.id}/preview').status_code == 404
+
+
+def test_preview_forbidden_for_parents(client, upload_dir, logged_in_admin, sample_athlete, db_session):
+    from app.models import User
+    upload_document(logged_in_admin, sample_athlete, _image(), name='scan.png')
+    document_id = Document.query.one().id
+    logged_in_admin.get('/auth/logout')
+    parent = User(username='parent', email='parent@test.com', first_name='P', last_name='G', role='parent')
+    parent.set_password('password123')
+    db_session.add(parent)
+    db_session.commit()
+    client.post('/auth/login', data={'username_or_email': 'parent', 'password': 'password123'})
+
+    assert client.get(f'/documents/{document_id}/preview').status_code == 403
+
+
+def test_upload_schedules_preview_on_pool(app, monkeypatch, logged_in_admin, upload_dir, sample_athlete):
+    monkeypatch.setitem(app.config, 'DOCUMENT_WORKERS', 1)
+    try:
+        upload_document(logged_in_admin, sample_athlete, _image(), name='scan.png')
+        blob = UploadBlob.query.one()
+        thread = schedule_preview(blob)
+        if thread is not None:
+            # The upload already queued one render; this waits for a second
+            thread.join(timeout=60)
+        assert os.path.exists(preview_path(blob.storage_key))
+        assert schedule_preview(blob) is None
+    finally:
+        shutdown_process_pool()
+
+
+def test_purge_removes_preview(logged_in_admin, upload_dir, sample_athlete):
+    upload_document(logged_in_admin, sample_athlete, _image(), name='scan.png')
+    document = Document.query.one()
+    logged_in_admin.get(f'/documents/{document.id}/preview')
+    path = preview_path(UploadBlob.query.one().storage_key)
+    assert os.path.exists(path)
+
+    purge_document(document)
+
+    assert not os.path.exists(path)
@@ -0,0 +1,113 @@
+# ABOUTME: Tests for PDF text extraction and full-text document search
+# ABOUTME: Text is extracted once per blob; the document list matches it and shows highlighted snippets
+
+import io
+
+import pytest
+
+from app import db
+from app.models import Document, DocumentText, UploadBlob
+from app.utils.text_search import extract_pending_texts, highlight, make_snippet, MARK_END, MARK_START
+from app.utils.uploads import purge_document
+from tests.conftest import upload_document
+
+
+def _pdf(*lines):
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    page = canvas.Canvas(buffer)
+    for i, line in enumerate(lines):
+        page.drawString(72, 720 - 20 * i, line)
+    page.save()
+    return buffer.getvalue()
+
+
+def test_upload_extracts_text_and_search_shows_snippet(logged_in_admin, upload_dir, sample_athlete):
+    pytest.importorskip('pypdf')
+    upload_document(logged_in_admin, sample_athlete, _pdf('Certificato medico agonistico',
+                                                  'Dott. Giovanni Verdi <b>cardiologo</b>'))
+    upload_document(logged_in_admin, sample_athlete, _pdf('Polizza assicurativa n. 998877'), title='Policy QX1')
+
+    text = DocumentText.query.join(UploadBlob).filter(UploadBlob.id == Document.query.first().blob_id).one()
+    assert 'Giovanni Verdi' in text.content
+    assert text.pages == 1
+
+    response = logged_in_admin.get('/documents/?search=verdi')
+    assert b'Certificate' in response.data
+    assert b'Policy QX1' not in response.data
+    assert b'<mark>Verdi</mark>' in response.data
+    # Text from the file is escaped around the highlight
+    assert b'&lt;b&gt;cardiologo&lt;/b&gt;' in response.data
+
+    response = logged_in_admin.get('/documents/?search=998877')
+    assert b'Policy QX1' in response.data
+    assert b'<mark>998877</mark>' in response.data
+
+
+def test_title_search_still_works_and_odd_queries_are_safe(logged_in_admin, upload_dir, sample_athlete):
+    upload_document(logged_in_admin, sample_athlete, b'%PDF-1.4 broken', title='Consent 2026')
+
+    assert b'Consent 2026' in logged_in_admin.get('/documents/?search=Consent').data
+    for query in ('"', 'AND OR NOT', '*', '--', 'a" OR "b'):
+        assert logged_in_admin.get('/documents/', query_string={'search': query}).status_code == 200
+
+
+def test_unreadable_pdf_is_not_retried(logged_in_admin, upload_dir, sample_athlete):
+    pytest.importorskip('pypdf')
+    upload_document(logged_in_admin, sample_athlete, b'%PDF-1.4 not really a pdf')
+
+    assert DocumentText.query.one().content == ''
+    assert extract_pending_texts() == (0, 0)
+
+
+def test_incremental_backfill(app, monkeypatch, logged_in_admin, upload_dir, sample_athlete):
+    pytest.importorskip('pypdf')
+    upload_document(logged_in_admin, sample_athlete, _pdf('first document'))
+    upload_document(logged_in_admin, sample_athlete, _pdf('second document'))
+    DocumentText.query.delete()
+    db.session.commit()
+
+    assert extract_pending_texts(batch_size=1) == (2, 0)
+    assert DocumentText.query.count() == 2
+    assert extract_pending_texts() == (0, 0)
+
+    result = app.test_cli_runner().invoke(args=['extract-document-text'])
+    assert 'Extracted text from 0 file(s)' in result.output
+
+
+def test_backfill_runs_on_process_pool(app, monkeypatch, logged_in_admin, upload_dir, sample_athlete):
+    pytest.importorskip('pypdf')
+    from app.utils.tasks import shutdown_process_pool
+
+    for i in range(3):
+        upload_document(logged_in_admin, sample_athlete, _pdf(f'pooled document {i}'))
+    DocumentText.query.delete()
+    db.session.commit()
+    monkeypatch.setitem(app.config, 'DOCUMENT_WORKERS', 2)
+    try:
+        assert extract_pending_texts() == (3, 0)
+    finally:
+        shutdown_process_pool()
+    assert sorted(t.content for t in DocumentText.query) == [f'pooled document {i}' for i in range(3)]
+
+
+def test_purge_removes_text(logged_in_admin, upload_dir, sample_athlete):
+    pytest.importorskip('pypdf')
+    document = upload_document(logged_in_admin, sample_athlete, _pdf('to be removed'))
+    assert DocumentText.query.count() == 1
+
+    purge_document(document)
+
+    assert DocumentText.query.count() == 0
+    assert db.session.execute(db.text('SELECT count(*) FROM document_text_fts')).scalar() == 0
+
+
+def test_make_snippet_marks_prefix_matches():
+    content = ' '.join(f'w{i}' for i in range(40)) + ' Verdinelli ' + ' '.join(f'x{i}' for i in range(40))
+
+    raw = make_snippet(content, ['verdi'], words=6)
+
+    assert raw == f'… w38 w39 {MARK_START}Verdinelli{MARK_END} x0 x1 x2 …'
+    assert str(highlight(raw)) == '… w38 w39 <mark>Verdinelli</mark> x0 x1 x2 …'
+    assert make_snippet(content, ['rossi']) is None
@@ -0,0 +1,162 @@
+# ABOUTME: Tests for scan-driven batch equipment handout and return
+# ABOUTME: Covers status transitions, per-code errors, validation, permissions and lost races
+
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import db
+from app.models import Equipment, EquipmentAssignment
+
+
+def _items(admin_user, *codes, status='available'):
+    items = [
+        Equipment(name=f'Jersey {code}', category='jersey', code=code, condition='good',
+                  status=status, created_by=admin_user.id)
+        for code in codes
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def _status(code):
+    db.session.expire_all()
+    return Equipment.query.filter_by(code=code).one().status
+
+
+def test_batch_assign_creates_assignments(logged_in_coach, admin_user, sample_athlete):
+    _items(admin_user, 'J1', 'J2')
+
+    response = logged_in_coach.post('/equipment/api/batch-assign', json={
+        'codes': ['J1', ' J2', 'J1', ''], 'athlete_id': sample_athlete.id,
+        'assigned_date': '2026-10-01', 'expected_return_date': '2027-06-30',
+    })
+
+    assert response.status_code == 200
+    assert response.get_json() == {'assigned': ['J1', 'J2'], 'errors': []}
+    assignments = EquipmentAssignment.query.all()
+    assert len(assignments) == 2
+    assert {a.athlete_id for a in assignments} == {sample_athlete.id}
+    assert all(a.assigned_date == date(2026, 10, 1) for a in assignments)
+    assert _status('J1') == 'assigned' and _status('J2') == 'assigned'
+
+
+def test_batch_assign_reports_unknown_and_unavailable(logged_in_coach, admin_user, sample_athlete):
+    _items(admin_user, 'J1')
+    _items(admin_user, 'J2', status='maintenance')
+
+    response = logged_in_coach.post('/equipment/api/batch-assign', json={
+        'codes': ['J1', 'J2', 'NOPE'], 'athlete_id': sample_athlete.id,
+    })
+
+    data = response.get_json()
+    assert data['assigned'] == ['J1']
+    assert [e['code'] for e in data['errors']] == ['J2', 'NOPE']
+    assert EquipmentAssignment.query.count() == 1
+
+
+def test_batch_return_closes_open_assignments(logged_in_coach, admin_user, sample_athlete):
+    _items(admin_user, 'J1', 'J2', 'J3')
+    logged_in_coach.post('/equipment/api/batch-assign', json={
+        'codes': ['J1', 'J2'], 'athlete_id': sample_athlete.id,
+    })
+
+    response = logged_in_coach.post('/equipment/api/batch-return', json={
+        'codes': ['J1', 'J2', 'J3'], 'return_date': '2026-10-18', 'condition': 'fair',
+    })
+
+    data = response.get_json()
+    assert data['returned'] == ['J1', 'J2']
+    assert data['errors'] == [{'code': 'J3', 'error': 'not assigned'}]
+    db.session.expire_all()
+    assignments = EquipmentAssignment.query.all()
+    assert all(a.is_returned and a.condition_at_return == 'fair' for a in assignments)
+    assert all(a.actual_return_date == date(2026, 10, 18) for a in assignments)
+    item = Equipment.query.filter_by(code='J1').one()
+    assert item.status == 'available' and item.condition == 'fair'
+
+
+def test_batch_payload_validation(logged_in_coach, admin_user, sample_athlete):
+    _items(admin_user, 'J1')
+    url = '/equipment/api/batch-assign'
+
+    assert logged_in_coach.post(url, json={'codes': 'J1'}).status_code == 400
+    assert logged_in_coach.post(url, json={'codes': [], 'athlete_id': sample_athlete.id}).status_code == 400
+    assert logged_in_coach.post(url, json={'codes': ['J1'], 'athlete_id': 9999}).status_code == 400
+    assert logged_in_coach.post(url, json={
+        'codes': ['J1'], 'athlete_id': sample_athlete.id, 'assigned_date': 'yesterday'
+    }).status_code == 400
+    assert logged_in_coach.post('/equipment/api/batch-return', json={
+        'codes': ['J1'], 'condition': 'shiny'
+    }).status_code == 400
+    assert _status('J1') == 'available'
+
+
+def test_batch_requires_staff_role(client, app, sample_athlete):
+    from app.models import User
+    user = User(username='parent', email='parent@test.com', first_name='P', last_name='U', role='parent')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    client.post('/auth/login', data={'username_or_email': 'parent', 'password': 'password123'})
+
+    response = client.post('/equipment/api/batch-assign', json={
+        'codes': ['J1'], 'athlete_id': sample_athlete.id,
+    })
+    assert response.status_code == 403
+
+
+def test_second_claim_of_same_item_loses(admin_user):
+    from app.utils.equipment import claim_equipment
+    item, = _items(admin_user, 'J1')
+
+    claim_equipment([item.id], 'available', 'assigned')
+    with pytest.raises(StaleDataError):
+        claim_equipment([item.id], 'available', 'assigned')
+    db.session.commit()
+
+    assert _status('J1') == 'assigned'
+    assert Equipment.query.filter_by(code='J1').one().version_id == 2
+
+
+def test_batch_conflict_rolls_back(logged_in_coach, admin_user, sample_athlete):
+    _items(admin_user, 'J1', 'J2')
+
+    with patch('app.utils.equipment.claim_equipment', side_effect=StaleDataError('taken')):
+        response = logged_in_coach.post('/equipment/api/batch-assign', json={
+            'codes': ['J1', 'J2'], 'athlete_id': sample_athlete.id,
+        })
+
+    assert response.status_code == 409
+    assert EquipmentAssignment.query.count() == 0
+    assert _status('J1') == 'available'
+
+
+def test_stale_equipment_flush_raises(admin_user):
+    item, = _items(admin_user, 'J1')
+    assert item.version_id == 1
+    db.session.execute(
+        update(Equipment).where(Equipment.id == item.id)
+        .values(version_id=Equipment.version_id + 1)
+        .execution_options(synchronize_session=False)
+    )
+    item.name = 'Renamed'
+    with pytest.raises(StaleDataError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_edit_with_outdated_version_is_refused(logged_in_coach, admin_user):
+    item, = _items(admin_user, 'J1')
+    response = logged_in_coach.post(f'/equipment/{item.id}/edit', data={
+        'name': 'Renamed', 'category': 'jersey', 'code': 'J1', 'condition': 'good',
+        'status': 'available', 'quantity': 1, 'version_id': '0',
+    })
+
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert db.session.get(Equipment, item.id).name == 'Jersey J1'
@@ -0,0 +1,116 @@
+# ABOUTME: Tests for equipment inventory rollups and the maintenance scheduler
+# ABOUTME: Rollups group in SQL; the scheduler only moves available items due in the window
+
+from datetime import date, timedelta
+
+from app import db
+from app.models import Equipment
+from app.utils.equipment import inventory_rollup, schedule_maintenance
+
+
+def _item(admin_user, code, **overrides):
+    values = dict(name=f'Item {code}', category='jersey', size='M', code=code, condition='good',
+                  status='available', location='Storeroom B', quantity=1, created_by=admin_user.id)
+    values.update(overrides)
+    item = Equipment(**values)
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+def test_rollup_sums_quantities_per_group(admin_user):
+    _item(admin_user, 'J1', quantity=3)
+    _item(admin_user, 'J2', quantity=2)
+    _item(admin_user, 'J3', size='L')
+    _item(admin_user, 'J4', status='assigned')
+    _item(admin_user, 'B1', category='ball', size=None, quantity=10)
+    _item(admin_user, 'X1', is_active=False, quantity=50)
+
+    by_category = {row.category: (row.items, row.quantity) for row in inventory_rollup(['category'])}
+    assert by_category == {'jersey': (4, 7), 'ball': (1, 10)}
+
+    rows = inventory_rollup(['size'], {'category': 'jersey', 'status': 'available', 'location': 'Storeroom B'})
+    assert {row.size: row.quantity for row in rows} == {'M': 5, 'L': 1}
+    assert inventory_rollup(['category'], {'size': None})[0].category == 'ball'
+
+
+def test_rollup_page_drills_down(logged_in_coach, admin_user):
+    _item(admin_user, 'J1', quantity=3)
+    _item(admin_user, 'B1', category='ball', quantity=10)
+
+    page = logged_in_coach.get('/reports/equipment-rollup').get_data(as_text=True)
+    assert 'size=' not in page and 'category=jersey' in page
+
+    partial = logged_in_coach.get('/reports/equipment-rollup?category=jersey',
+                                  headers={'HX-Request': 'true'}).get_data(as_text=True)
+    assert '<html' not in partial
+    assert 'size=M' in partial
+
+    leaf = logged_in_coach.get(
+        '/reports/equipment-rollup?category=jersey&size=M&condition=good&status=available&location=Storeroom+B'
+    ).get_data(as_text=True)
+    assert 'Item J1' in leaf and 'Item B1' not in leaf
+
+
+def test_rollup_exports(logged_in_coach, admin_user):
+    _item(admin_user, 'J1', quantity=3)
+
+    csv = logged_in_coach.get('/reports/equipment-rollup?format=csv')
+    assert csv.mimetype == 'text/csv'
+    assert 'Storeroom B' in csv.get_data(as_text=True)
+    pdf = logged_in_coach.get('/reports/equipment-rollup?format=pdf')
+    assert pdf.data.startswith(b'%PDF')
+
+
+def test_schedule_maintenance_moves_due_available_items(admin_user):
+    today = date.today()
+    due = _item(admin_user, 'D1', next_maintenance_date=today - timedelta(days=3))
+    _item(admin_user, 'D2', next_maintenance_date=today + timedelta(days=5))
+    _item(admin_user, 'D3', status='assigned', next_maintenance_date=today)
+    _item(admin_user, 'D4', next_maintenance_date=today + timedelta(days=60))
+
+    assert schedule_maintenance(today + timedelta(days=7), batch_size=1) == 2
+
+    db.session.expire_all()
+    statuses = {e.code: e.status for e in Equipment.query.all()}
+    assert statuses == {'D1': 'maintenance', 'D2': 'maintenance', 'D3': 'assigned', 'D4': 'available'}
+    assert db.session.get(Equipment, due.id).version_id == 2
+
+
+def test_schedule_maintenance_advances_next_date(app, monkeypatch, admin_user):
+    monkeypatch.setitem(app.config, 'EQUIPMENT_MAINTENANCE_INTERVAL_DAYS', 90)
+    today = date.today()
+    _item(admin_user, 'D1', next_maintenance_date=today - timedelta(days=3))
+    _item(admin_user, 'D2', next_maintenance_date=today + timedelta(days=5))
+
+    assert schedule_maintenance(today + timedelta(days=7)) == 2
+
+    db.session.expire_all()
+    next_dates = {e.code: e.next_maintenance_date for e in Equipment.query.all()}
+    # Overdue items count from today, items due soon from their due date
+    assert next_dates == {'D1': today + timedelta(days=90), 'D2': today + timedelta(days=95)}
+
+    # Back in service, the items are not due again until then
+    Equipment.query.update({'status': 'available'})
+    db.session.commit()
+    assert schedule_maintenance(today + timedelta(days=7)) == 0
+
+
+def test_schedule_maintenance_command(app, admin_user):
+    _item(admin_user, 'D1', next_maintenance_date=date.today())
+
+    result = app.test_cli_runner().invoke(args=['schedule-maintenance'])
+
+    assert 'Moved 1 item(s)' in result.output
+    db.session.expire_all()
+    assert Equipment.query.one().status == 'maintenance'
+
+
+def test_dashboard_lists_due_maintenance(logged_in_admin, admin_user):
+    for n in range(12):
+        _item(admin_user, f'M{n}', next_maintenance_date=date.today() - timedelta(days=n))
+
+    html = logged_in_admin.get('/dashboard').get_data(as_text=True)
+
+    assert 'Item M11' in html and 'Item M0' not in html
+    assert '2 more items due for maintenance' in html
@@ -0,0 +1,104 @@
+# ABOUTME: Tests for the overdue equipment queue, family reminder sweep and overdue view
+# ABOUTME: Siblings' overdue kit must reach each guardian address in a single email
+
+from datetime import date, datetime, timedelta
+
+from app import db, mail
+from app.models import Athlete, Equipment, EquipmentAssignment, Guardian
+from app.utils.email import send_overdue_equipment_reminders
+from app.utils.equipment import overdue_assignments
+
+
+def _sibling(sample_athlete):
+    athlete = Athlete(
+        first_name='Giulia', last_name='Bianchi',
+        birth_date=date(2016, 4, 1), birth_place='Bologna',
+        fiscal_code='BNCGLI16D41A944Z',
+        street_address='Via Test', street_number='1',
+        postal_code='40100', city='Bologna', province='BO',
+        document_number='CC2', issuing_authority='Test',
+        document_expiry=date(2030, 1, 1),
+        team_id=sample_athlete.team_id, created_by=sample_athlete.created_by,
+    )
+    db.session.add(athlete)
+    db.session.flush()
+    db.session.add(Guardian(first_name='Paolo', last_name='Bianchi', phone='+393331111111',
+                            email='Paolo@Test.com', guardian_type='father', athlete_id=athlete.id))
+    db.session.commit()
+    return athlete
+
+
+def _assign(admin_user, athlete, code, days_overdue):
+    item = Equipment(name=f'Jersey {code}', category='jersey', code=code, condition='good',
+                     status='assigned', created_by=admin_user.id)
+    db.session.add(item)
+    db.session.flush()
+    assignment = EquipmentAssignment(
+        equipment_id=item.id, athlete_id=athlete.id, assigned_by=admin_user.id,
+        assigned_date=date.today() - timedelta(days=90),
+        expected_return_date=date.today() - timedelta(days=days_overdue),
+        condition_at_assignment='good',
+    )
+    db.session.add(assignment)
+    db.session.commit()
+    return assignment
+
+
+def test_overdue_queue_is_sorted_by_due_date(admin_user, sample_athlete):
+    _assign(admin_user, sample_athlete, 'J1', 2)
+    _assign(admin_user, sample_athlete, 'J2', 10)
+    _assign(admin_user, sample_athlete, 'J3', 0)
+
+    codes = [a.equipment.code for a in overdue_assignments(date.today())]
+
+    assert codes == ['J2', 'J1']
+
+
+def test_sweep_sends_one_email_per_family(app, admin_user, sample_athlete):
+    sibling = _sibling(sample_athlete)
+    _assign(admin_user, sample_athlete, 'J1', 5)
+    _assign(admin_user, sibling, 'J2', 3)
+
+    with mail.record_messages() as outbox:
+        sent, reminded = send_overdue_equipment_reminders()
+
+    assert (sent, reminded) == (2, 2)
+    by_recipient = {msg.recipients[0]: msg.html for msg in outbox}
+    assert set(by_recipient) == {'paolo@test.com', 'laura@test.com'}
+    assert 'Jersey J1' in by_recipient['paolo@test.com'] and 'Jersey J2' in by_recipient['paolo@test.com']
+    assert 'Jersey J2' not in by_recipient['laura@test.com']
+
+
+def test_sweep_skips_recently_reminded(app, admin_user, sample_athlete):
+    recent = _assign(admin_user, sample_athlete, 'J1', 5)
+    recent.overdue_reminder_sent_at = datetime.utcnow() - timedelta(days=2)
+    old = _assign(admin_user, sample_athlete, 'J2', 30)
+    old.overdue_reminder_sent_at = datetime.utcnow() - timedelta(days=8)
+    db.session.commit()
+
+    with mail.record_messages() as outbox:
+        sent, reminded = send_overdue_equipment_reminders(resend_after_days=7)
+
+    assert (sent, reminded) == (2, 1)
+    assert all('Jersey J1' not in msg.html for msg in outbox)
+    db.session.expire_all()
+    assert db.session.get(EquipmentAssignment, old.id).overdue_reminder_sent_at.date() == date.today()
+
+
+def test_sweep_command(app, admin_user, sample_athlete):
+    _assign(admin_user, sample_athlete, 'J1', 5)
+
+    result = app.test_cli_runner().invoke(args=['sweep-overdue-equipment'])
+
+    assert 'Sent 2 reminder email(s) covering 1 assignment(s)' in result.output
+
+
+def test_overdue_page_paginates(logged_in_coach, admin_user, sample_athlete):
+    for n in range(22):
+        _assign(admin_user, sample_athlete, f'J{n:02d}', n + 1)
+
+    first = logged_in_coach.get('/equipment/overdue').get_data(as_text=True)
+    second = logged_in_coach.get('/equipment/overdue?page=2').get_data(as_text=True)
+
+    assert 'Jersey J21' in first and 'Jersey J00' not in first
+    assert 'Jersey J00' in second
@@ -0,0 +1,137 @@
+# ABOUTME: Tests for image normalization on ingest and the normalize-images backfill
+# ABOUTME: Photos are re-encoded upright, without metadata and capped in size; savings are recorded per document
+
+import io
+import os
+
+import pytest
+
+pytest.importorskip('PIL')
+from PIL import Image  # noqa: E402
+
+from app import db  # noqa: E402
+from app.models import Document, UploadBlob  # noqa: E402
+from app.utils.ingest import ingest_upload, normalize_blob  # noqa: E402
+from app.utils.tasks import shutdown_process_pool  # noqa: E402
+from app.utils.uploads import blob_path  # noqa: E402
+from tests.conftest import upload_document  # noqa: E402
+
+
+@pytest.fixture
+def upload_dir(upload_dir, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMAGE_MAX_DIMENSION', 400)
+    return upload_dir
+
+
+def _photo(size=(800, 600), fmt='PNG', exif=None):
+    """A noisy image, which compresses about as badly as a phone photo."""
+    image = Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **({'exif': exif} if exif is not None else {}))
+    return buffer.getvalue()
+
+
+def test_upload_is_normalized_and_savings_recorded(logged_in_admin, upload_dir, sample_athlete):
+    content = _photo()
+    upload_document(logged_in_admin, sample_athlete, content, name='photo.png')
+
+    document = Document.query.one()
+    blob = UploadBlob.query.one()
+    assert document.blob_id == blob.id
+    assert (document.mime_type, blob.mime_type) == ('image/jpeg', 'image/jpeg')
+    assert document.file_name == 'photo.jpg'
+    assert document.original_size == len(content)
+    assert document.file_size == blob.size < len(content)
+    assert document.storage_saved() == len(content) - blob.size
+    assert blob.ref_count == 1
+    with Image.open(blob_path(blob.storage_key)) as image:
+        assert image.size == (400, 300)
+        assert image.format == 'JPEG'
+    # Only the normalized blob is left on disk
+    stored = [f for _, _, files in os.walk(upload_dir) for f in files]
+    assert stored == [blob.sha256]
+
+    page = logged_in_admin.get(f'/documents/{document.id}')
+    assert b'% saved' in page.data
+
+
+def test_orientation_applied_and_metadata_stripped(logged_in_admin, upload_dir, sample_athlete):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees clockwise
+    exif[0x010F] = 'PhoneMaker'
+    upload_document(logged_in_admin, sample_athlete, _photo(fmt='PNG', exif=exif), name='photo.png')
+
+    with Image.open(Document.query.one().file_path) as image:
+        assert image.size == (300, 400)
+        assert not image.getexif()
+
+
+def test_small_gain_keeps_original(app, monkeypatch, logged_in_admin, upload_dir, sample_athlete):
+    monkeypatch.setitem(app.config, 'IMAGE_MIN_SAVING', 100)
+    content = _photo(size=(200, 100))
+    upload_document(logged_in_admin, sample_athlete, content, name='photo.png')
+
+    document = Document.query.one()
+    assert document.original_size is None
+    assert document.file_size == len(content)
+    assert document.mime_type == 'image/png'
+
+
+def test_convert_to_pdf(app, monkeypatch, logged_in_admin, upload_dir, sample_athlete):
+    monkeypatch.setitem(app.config, 'IMAGE_CONVERT_TO_PDF', True)
+    upload_document(logged_in_admin, sample_athlete, _photo(), name='photo.png')
+
+    document = Document.query.one()
+    assert document.mime_type == 'application/pdf'
+    assert document.file_name == 'photo.pdf'
+    with open(document.file_path, 'rb') as f:
+        assert f.read(5) == b'%PDF-'
+
+
+def test_shared_blob_moves_all_documents(app, monkeypatch, logged_in_admin, upload_dir, sample_athlete):
+    monkeypatch.setitem(app.config, 'IMAGE_NORMALIZE', False)
+    content = _photo()
+    upload_document(logged_in_admin, sample_athlete, content, name='photo.png')
+    upload_document(logged_in_admin, sample_athlete, content, name='copy.png')
+    first, second = Document.query.order_by(Document.id).all()
+    logged_in_admin.post(f'/documents/{second.id}/delete')
+    before = first.updated_at, second.updated_at
+    monkeypatch.setitem(app.config, 'IMAGE_NORMALIZE', True)
+
+    normalized = normalize_blob(first.blob_id)
+
+    assert UploadBlob.query.count() == 1
+    assert normalized.ref_count == 1
+    assert {d.blob_id for d in Document.query} == {normalized.id}
+    assert (first.updated_at, second.updated_at) == before
+
+
+def test_normalization_runs_off_the_request_thread(app, monkeypatch, logged_in_admin, upload_dir, sample_athlete):
+    monkeypatch.setitem(app.config, 'IMAGE_NORMALIZE', False)
+    upload_document(logged_in_admin, sample_athlete, _photo(), name='photo.png')
+    monkeypatch.setitem(app.config, 'IMAGE_NORMALIZE', True)
+    monkeypatch.setitem(app.config, 'DOCUMENT_WORKERS', 1)
+    try:
+        blob = UploadBlob.query.one()
+        thread = ingest_upload(blob, 'image/png', 'photo.png')
+        assert thread is not None
+        thread.join(timeout=60)
+    finally:
+        shutdown_process_pool()
+
+    db.session.expire_all()
+    assert Document.query.one().mime_type == 'image/jpeg'
+
+
+def test_cli_backfill_reports_savings(app, monkeypatch, logged_in_admin, upload_dir, sample_athlete):
+    monkeypatch.setitem(app.config, 'IMAGE_NORMALIZE', False)
+    upload_document(logged_in_admin, sample_athlete, _photo(), name='photo.png')
+    upload_document(logged_in_admin, sample_athlete, b'%PDF-1.4 certificate', name='certificate.pdf')
+    monkeypatch.setitem(app.config, 'IMAGE_NORMALIZE', True)
+
+    result = app.test_cli_runner().invoke(args=['normalize-images'])
+
+    assert result.exit_code == 0
+    document = Document.query.filter_by(mime_type='image/jpeg').one()
+    assert f'Document {document.id} (photo.jpg): {document.original_size} -> {document.file_size} bytes' in result.output
+    assert 'Normalized 1 of 1 image blob(s)' in result.output
@@ -0,0 +1,105 @@
+# ABOUTME: Tests for diff-based lineup saving and the per-row HTMX autosave
+# ABOUTME: Unchanged rows must keep their ids and created_at across saves
+
+from datetime import date
+
+from app import db
+from app.models import Athlete, MatchLineup
+
+
+def _second_athlete(sample_athlete):
+    athlete = Athlete(
+        first_name='Luca', last_name='Rossi',
+        birth_date=date(2015, 5, 1), birth_place='Bologna',
+        fiscal_code='RSSLCU15E01A944Z',
+        street_address='Via Test', street_number='1',
+        postal_code='40100', city='Bologna', province='BO',
+        document_number='CC1', issuing_authority='Test',
+        document_expiry=date(2030, 1, 1),
+        team_id=sample_athlete.team_id, created_by=sample_athlete.created_by,
+    )
+    db.session.add(athlete)
+    db.session.commit()
+    return athlete
+
+
+def _save(client, match, rows):
+    data = {'athlete_ids': [str(a) for a in rows]}
+    for athlete_id, values in rows.items():
+        for field, value in values.items():
+            data[f'{field}_{athlete_id}'] = value
+    return client.post(f'/matches/{match.id}/lineup', data=data)
+
+
+def _lineup(match):
+    db.session.expire_all()
+    return {e.athlete_id: e for e in MatchLineup.query.filter_by(match_id=match.id)}
+
+
+def test_save_inserts_updates_and_deletes_only_changes(logged_in_coach, sample_match, sample_athlete):
+    other = _second_athlete(sample_athlete)
+    _save(logged_in_coach, sample_match, {
+        sample_athlete.id: {'position': 'Prop', 'jersey': '1', 'starter': 'y'},
+        other.id: {'position': 'Hooker', 'jersey': '2'},
+    })
+    before = _lineup(sample_match)
+    assert before[sample_athlete.id].jersey_number == 1
+    assert before[other.id].is_starter is False
+
+    kept_id = before[sample_athlete.id].id
+    kept_created = before[sample_athlete.id].created_at
+
+    # Change one field of the first athlete, drop the second
+    response = _save(logged_in_coach, sample_match, {
+        sample_athlete.id: {'position': 'Prop', 'jersey': '3', 'starter': 'y'},
+    })
+    assert response.status_code == 302
+
+    after = _lineup(sample_match)
+    assert set(after) == {sample_athlete.id}
+    assert after[sample_athlete.id].id == kept_id
+    assert after[sample_athlete.id].created_at == kept_created
+    assert after[sample_athlete.id].jersey_number == 3
+
+
+def test_athletes_outside_team_are_ignored(logged_in_coach, sample_match, sample_athlete):
+    _save(logged_in_coach, sample_match, {sample_athlete.id: {}, 9999: {'position': 'Wing'}})
+    assert set(_lineup(sample_match)) == {sample_athlete.id}
+
+
+def test_row_autosave_adds_changes_and_removes(logged_in_coach, sample_match, sample_athlete):
+    url = f'/matches/{sample_match.id}/lineup/{sample_athlete.id}'
+    row = {'athlete_ids': str(sample_athlete.id), f'position_{sample_athlete.id}': 'Flanker'}
+
+    response = logged_in_coach.post(url, data=row, headers={'HX-Request': 'true'})
+    assert response.status_code == 200
+    assert b'Saved' in response.data
+    entry_id = _lineup(sample_match)[sample_athlete.id].id
+
+    row[f'captain_{sample_athlete.id}'] = 'y'
+    logged_in_coach.post(url, data=row)
+    entry = _lineup(sample_match)[sample_athlete.id]
+    assert entry.id == entry_id and entry.is_captain is True
+
+    # Re-posting the same values writes nothing
+    assert b'Saved' not in logged_in_coach.post(url, data=row).data
+
+    logged_in_coach.post(url, data={})
+    assert _lineup(sample_match) == {}
+
+
+def test_row_autosave_rejects_foreign_athlete(logged_in_coach, sample_match):
+    response = logged_in_coach.post(f'/matches/{sample_match.id}/lineup/9999', data={'athlete_ids': '9999'})
+    assert response.status_code == 400
+
+
+def test_lineup_of_deleted_match_is_not_saved(logged_in_coach, sample_match, sample_athlete):
+    sample_match.is_active = False
+    db.session.commit()
+
+    response = logged_in_coach.post(f'/matches/{sample_match.id}/lineup/{sample_athlete.id}',
+                                    data={'athlete_ids': str(sample_athlete.id)})
+    assert response.status_code == 404
+    response = _save(logged_in_coach, sample_match, {sample_athlete.id: {'position': 'Prop'}})
+    assert response.status_code == 302
+    assert _lineup(sample_match) == {}
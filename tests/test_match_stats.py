@@ -0,0 +1,113 @@
+# ABOUTME: Tests for incrementally maintained per-athlete season match statistics
+# ABOUTME: Covers lineup saves, result entry and correction, deletes, rebuild and pages
+
+from sqlalchemy import event
+
+from app import db
+from app.models import AthleteSeasonStats
+from app.utils.match_stats import apply_stats_deltas, rebuild_athlete_season_stats
+
+
+def _lineup(client, match, athlete, **flags):
+    data = {'athlete_ids': str(athlete.id)}
+    data.update({f'{flag}_{athlete.id}': 'y' for flag, on in flags.items() if on})
+    return client.post(f'/matches/{match.id}/lineup', data=data)
+
+
+def _result(client, match, result, home=20, away=10):
+    return client.post(f'/matches/{match.id}/result', data={
+        'score_home': home, 'score_away': away, 'result': result, 'notes': ''
+    })
+
+
+def _stats(athlete, season):
+    db.session.expire_all()
+    row = AthleteSeasonStats.query.filter_by(athlete_id=athlete.id, season_id=season.id).first()
+    if row is None:
+        return None
+    return {c: getattr(row, c) for c in ('appearances', 'starts', 'captaincies', 'wins', 'draws', 'losses')}
+
+
+def test_stats_follow_result_entry_and_correction(logged_in_coach, sample_match, sample_athlete, sample_season):
+    _lineup(logged_in_coach, sample_match, sample_athlete, starter=True, captain=True)
+    # A scheduled match does not count yet
+    assert _stats(sample_athlete, sample_season) is None
+
+    _result(logged_in_coach, sample_match, 'win')
+    assert _stats(sample_athlete, sample_season) == {
+        'appearances': 1, 'starts': 1, 'captaincies': 1, 'wins': 1, 'draws': 0, 'losses': 0
+    }
+
+    _result(logged_in_coach, sample_match, 'loss', home=10, away=20)
+    assert _stats(sample_athlete, sample_season)['wins'] == 0
+    assert _stats(sample_athlete, sample_season)['losses'] == 1
+    assert _stats(sample_athlete, sample_season)['appearances'] == 1
+
+
+def test_lineup_changes_after_result_adjust_stats(logged_in_coach, sample_match, sample_athlete, sample_season):
+    _lineup(logged_in_coach, sample_match, sample_athlete, starter=True)
+    _result(logged_in_coach, sample_match, 'draw')
+
+    _lineup(logged_in_coach, sample_match, sample_athlete, starter=False, captain=True)
+    assert _stats(sample_athlete, sample_season)['starts'] == 0
+    assert _stats(sample_athlete, sample_season)['captaincies'] == 1
+
+    logged_in_coach.post(f'/matches/{sample_match.id}/lineup/{sample_athlete.id}', data={})
+    assert _stats(sample_athlete, sample_season)['appearances'] == 0
+    assert _stats(sample_athlete, sample_season)['draws'] == 0
+
+
+def test_deleting_a_match_removes_its_contribution(logged_in_admin, sample_match, sample_athlete, sample_season):
+    _lineup(logged_in_admin, sample_match, sample_athlete)
+    _result(logged_in_admin, sample_match, 'win')
+    logged_in_admin.post(f'/matches/{sample_match.id}/delete')
+    assert _stats(sample_athlete, sample_season)['appearances'] == 0
+
+
+def test_concurrent_first_result_adds_to_the_other_row(sample_athlete, sample_season):
+    key = (sample_athlete.id, sample_season.id)
+
+    def other_save_first(orm_execute_state):
+        # Another request creates the row right after this one found it missing
+        if orm_execute_state.is_select and AthleteSeasonStats in {
+                d['entity'] for d in orm_execute_state.statement.column_descriptions}:
+            event.remove(db.session, 'do_orm_execute', other_save_first)
+            result = orm_execute_state.invoke_statement()
+            db.session.execute(AthleteSeasonStats.__table__.insert().values(
+                athlete_id=key[0], season_id=key[1], appearances=1))
+            return result
+
+    event.listen(db.session, 'do_orm_execute', other_save_first)
+    apply_stats_deltas({key: {'appearances': 1, 'wins': 1}})
+    db.session.commit()
+
+    assert _stats(sample_athlete, sample_season)['appearances'] == 2
+    assert _stats(sample_athlete, sample_season)['wins'] == 1
+
+
+def test_rebuild_matches_incremental_counts(app, logged_in_coach, sample_match, sample_athlete, sample_season):
+    _lineup(logged_in_coach, sample_match, sample_athlete, starter=True)
+    _result(logged_in_coach, sample_match, 'win')
+    incremental = _stats(sample_athlete, sample_season)
+
+    AthleteSeasonStats.query.delete()
+    db.session.commit()
+    assert rebuild_athlete_season_stats() == 1
+    assert _stats(sample_athlete, sample_season) == incremental
+
+    result = app.test_cli_runner().invoke(args=['rebuild-match-stats'])
+    assert 'Done. Rebuilt statistics for 1 athlete season(s) and 1 team season(s).' in result.output
+
+
+def test_detail_and_leaderboard_show_stats(logged_in_coach, sample_match, sample_athlete, sample_season):
+    _lineup(logged_in_coach, sample_match, sample_athlete, captain=True)
+    _result(logged_in_coach, sample_match, 'win')
+
+    detail = logged_in_coach.get(f'/athletes/{sample_athlete.id}')
+    assert detail.status_code == 200
+    assert b'Season Statistics' in detail.data
+    assert b'Rugby Parma' in detail.data
+
+    board = logged_in_coach.get(f'/seasons/{sample_season.id}/leaderboard?sort=captaincies')
+    assert board.status_code == 200
+    assert b'Bianchi' in board.data
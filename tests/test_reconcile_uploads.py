@@ -0,0 +1,111 @@
+# ABOUTME: Tests for the upload folder reconciliation job
+# ABOUTME: Orphans, missing files, quarantine, the grace period and purging of old soft-deleted documents
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Document, UploadBlob
+from app.utils.reconcile import _path_key, reconcile_uploads, walk_upload_folder
+from app.utils.uploads import blob_path
+from tests.conftest import upload_document
+
+PDF = b'%PDF-1.4 certificate'
+
+
+def _make_old(path, hours=48):
+    old = time.time() - hours * 3600
+    os.utime(path, (old, old))
+
+
+def test_walk_is_sorted_by_path_components(upload_dir):
+    for relative in ('a.pdf', 'a/b.pdf', 'a/c/d.pdf', 'b.pdf', 'quarantine/x.pdf'):
+        path = upload_dir / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x')
+
+    keys = [key for key, _, _ in walk_upload_folder(str(upload_dir))]
+
+    assert keys == sorted(keys)
+    assert [_path_key('/'.join(key)) for key in keys] == keys
+    assert ('quarantine', 'x.pdf') not in keys
+    assert len(keys) == 4
+
+
+def test_reports_orphans_and_missing_files(logged_in_admin, upload_dir, sample_athlete):
+    kept = upload_document(logged_in_admin, sample_athlete, PDF)
+    lost = upload_document(logged_in_admin, sample_athlete, b'%PDF-1.4 lost')
+    os.remove(lost.file_path)
+    orphan = upload_dir / 'ff' / 'ee' / 'ffee-orphan'
+    orphan.parent.mkdir(parents=True)
+    orphan.write_bytes(b'nobody')
+    _make_old(orphan)
+    fresh = upload_dir / 'tmp' / 'in-flight'
+    fresh.write_bytes(b'uploading')
+
+    report = reconcile_uploads()
+
+    assert report['orphans'] == [('ff/ee/ffee-orphan', 6)]
+    assert report['missing'] == [(lost.file_path, [lost.id])]
+    assert report['quarantined'] == 0
+    assert orphan.exists()
+    assert os.path.exists(kept.file_path)
+
+
+def test_quarantine_moves_orphans(upload_dir):
+    orphan = upload_dir / 'legacy.pdf'
+    orphan.write_bytes(PDF)
+    _make_old(orphan)
+
+    report = reconcile_uploads(quarantine=True)
+
+    assert report['quarantined'] == 1
+    assert not orphan.exists()
+    assert (upload_dir / 'quarantine' / 'legacy.pdf').read_bytes() == PDF
+    assert reconcile_uploads()['orphans'] == []
+
+
+def test_previews_and_open_upload_parts_are_not_orphans(logged_in_admin, upload_dir, sample_athlete):
+    document = upload_document(logged_in_admin, sample_athlete, PDF)
+    preview = f'{document.file_path}.preview.webp'
+    with open(preview, 'wb') as f:
+        f.write(b'preview')
+    upload_id = logged_in_admin.post('/documents/uploads', json={
+        'file_name': 'big.pdf', 'total_size': 10, 'mime_type': 'application/pdf'
+    }).get_json()['upload_id']
+    for path in (preview, upload_dir / 'tmp' / f'{upload_id}.part', document.file_path):
+        _make_old(path)
+
+    assert reconcile_uploads(grace_hours=0)['orphans'] == []
+
+
+def test_purges_old_soft_deleted_documents(logged_in_admin, upload_dir, sample_athlete):
+    old = upload_document(logged_in_admin, sample_athlete, PDF)
+    recent = upload_document(logged_in_admin, sample_athlete, b'%PDF-1.4 recent')
+    logged_in_admin.post(f'/documents/{old.id}/delete')
+    logged_in_admin.post(f'/documents/{recent.id}/delete')
+    old_path = old.file_path
+    db.session.execute(db.update(Document).where(Document.id == old.id)
+                       .values(updated_at=datetime.utcnow() - timedelta(days=100)))
+    db.session.commit()
+
+    report = reconcile_uploads(purge_deleted_days=90)
+
+    assert report['purged'] == 1
+    assert not os.path.exists(old_path)
+    assert [d.id for d in Document.query] == [recent.id]
+    assert UploadBlob.query.count() == 1
+    assert os.path.exists(blob_path(UploadBlob.query.one().storage_key))
+
+
+def test_cli_reconcile(app, upload_dir):
+    orphan = upload_dir / 'stray.jpg'
+    orphan.write_bytes(b'jpg')
+    _make_old(orphan)
+
+    result = app.test_cli_runner().invoke(args=['reconcile-uploads'])
+
+    assert result.exit_code == 0
+    assert 'Orphan: stray.jpg (3 bytes)' in result.output
+    assert 'Done. 1 orphan file(s) (3 bytes), 0 quarantined' in result.output
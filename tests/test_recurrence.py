@@ -0,0 +1,189 @@
+# ABOUTME: Tests for recurrence rules expanded at read time and their per-occurrence overrides
+# ABOUTME: Covers listings, exceptions (cancel/move), materialization and collapsing legacy rows
+
+from datetime import date, time
+
+from app import db
+from app.models import RecurrenceException, RecurrenceRule, TrainingSession
+from app.utils.recurrence import expand_occurrences
+
+
+def _rule(admin_user, team, **overrides):
+    values = dict(title='Allenamento U10', start_time=time(17, 30), end_time=time(19, 0),
+                  location='Campo A', session_type='training', weekday=0,
+                  start_date=date(2026, 3, 1), end_date=date(2026, 3, 31),
+                  team_id=team.id, created_by=admin_user.id)
+    values.update(overrides)
+    rule = RecurrenceRule(**values)
+    db.session.add(rule)
+    db.session.commit()
+    return rule
+
+
+def test_expand_only_requested_window(admin_user, sample_team):
+    rule = _rule(admin_user, sample_team)
+    db.session.add_all([
+        RecurrenceException(rule_id=rule.id, occurrence_date=date(2026, 3, 9), kind='cancelled',
+                            created_by=admin_user.id),
+        RecurrenceException(rule_id=rule.id, occurrence_date=date(2026, 3, 30), kind='moved',
+                            new_date=date(2026, 4, 1), created_by=admin_user.id),
+    ])
+    db.session.commit()
+
+    march = expand_occurrences(date(2026, 3, 1), date(2026, 3, 31))
+    assert [o.date.day for o in march] == [2, 16, 23]
+
+    with_cancelled = expand_occurrences(date(2026, 3, 1), date(2026, 3, 31), include_cancelled=True)
+    assert [o.cancelled for o in with_cancelled] == [False, True, False, False]
+
+    # The moved occurrence shows up in the window it was moved into
+    april = expand_occurrences(date(2026, 4, 1), date(2026, 4, 30))
+    assert [(o.date, o.occurrence_date) for o in april] == [(date(2026, 4, 1), date(2026, 3, 30))]
+
+
+def test_materialized_occurrence_replaces_virtual(logged_in_coach, admin_user, sample_team):
+    rule = _rule(admin_user, sample_team)
+
+    response = logged_in_coach.post(f'/training/rules/{rule.id}/2026-03-16/materialize',
+                                    data={'action': 'check_in'})
+    session = TrainingSession.query.one()
+    assert (session.recurrence_rule_id, session.occurrence_date) == (rule.id, date(2026, 3, 16))
+    assert f'/training/{session.id}/check-in' in response.headers['Location']
+
+    # Materializing twice reuses the row; the occurrence page redirects to it
+    logged_in_coach.post(f'/training/rules/{rule.id}/2026-03-16/materialize', data={'action': 'edit'})
+    assert TrainingSession.query.count() == 1
+    response = logged_in_coach.get(f'/training/rules/{rule.id}/2026-03-16')
+    assert response.headers['Location'].endswith(f'/training/{session.id}')
+
+    days = [o.date.day for o in expand_occurrences(date(2026, 3, 1), date(2026, 3, 31))]
+    assert days == [2, 9, 23, 30]
+
+
+def test_cancel_move_and_restore_occurrence(logged_in_coach, admin_user, sample_team):
+    rule = _rule(admin_user, sample_team)
+    url = f'/training/rules/{rule.id}/2026-03-09'
+
+    assert logged_in_coach.get(url).status_code == 200
+    assert logged_in_coach.get(f'/training/rules/{rule.id}/2026-03-10').status_code == 404
+
+    logged_in_coach.post(url + '/cancel', data={'cancellation_reason': 'Pioggia'})
+    exception = RecurrenceException.query.one()
+    assert (exception.kind, exception.reason) == ('cancelled', 'Pioggia')
+
+    logged_in_coach.post(url + '/move', data={'new_date': '2026-03-11', 'new_start_time': '18:00',
+                                              'new_end_time': '19:30'})
+    moved = expand_occurrences(date(2026, 3, 9), date(2026, 3, 11))
+    assert [(o.date, o.start_time) for o in moved] == [(date(2026, 3, 11), time(18, 0))]
+
+    logged_in_coach.post(url + '/restore')
+    assert RecurrenceException.query.count() == 0
+
+
+def test_move_checks_times_against_rule_defaults(logged_in_coach, admin_user, sample_team):
+    rule = _rule(admin_user, sample_team)  # 17:30-19:00
+    url = f'/training/rules/{rule.id}/2026-03-09/move'
+
+    # Only the start given: it would land after the rule's 19:00 end
+    logged_in_coach.post(url, data={'new_date': '2026-03-11', 'new_start_time': '19:30'})
+    # Only the end given: it would land before the rule's 17:30 start
+    logged_in_coach.post(url, data={'new_date': '2026-03-11', 'new_end_time': '17:00'})
+    assert RecurrenceException.query.count() == 0
+
+    logged_in_coach.post(url, data={'new_date': '2026-03-11', 'new_start_time': '18:00'})
+    moved = expand_occurrences(date(2026, 3, 11), date(2026, 3, 11))
+    assert [(o.start_time, o.end_time) for o in moved] == [(time(18, 0), time(19, 0))]
+
+
+def test_listings_merge_rows_and_occurrences(logged_in_coach, admin_user, sample_team,
+                                             sample_training_session):
+    _rule(admin_user, sample_team, weekday=2)  # Wednesdays: 4, 11, 18, 25 March
+
+    response = logged_in_coach.get('/training/?date_from=2026-03-01&date_to=2026-03-31')
+    html = response.get_data(as_text=True)
+    assert html.count('Allenamento U10') == 4
+    assert f'/training/{sample_training_session.id}"' in html
+    # Newest first: the last Wednesday comes before the stored Monday session
+    assert html.index('25/03/2026') < html.index('02/03/2026')
+
+    response = logged_in_coach.get('/calendar/?year=2026&month=3')
+    assert response.get_data(as_text=True).count('Allenamento U10') == 4
+
+
+def test_training_index_paginates_merged_list(logged_in_coach, admin_user, sample_team):
+    _rule(admin_user, sample_team, start_date=date(2025, 9, 1), end_date=date(2026, 5, 31))
+
+    first = logged_in_coach.get('/training/').get_data(as_text=True)
+    second = logged_in_coach.get('/training/?page=2').get_data(as_text=True)
+    assert first.count('Allenamento U10') == 20
+    # Mondays from September to May: 39 occurrences
+    assert second.count('Allenamento U10') == 19
+    assert '25/05/2026' in first and '25/05/2026' not in second
+
+
+def test_training_index_defaults_to_a_bounded_window(app, monkeypatch, logged_in_coach, admin_user, sample_team):
+    import app.views.training as training_views
+
+    _rule(admin_user, sample_team, title='Old Season Rule', start_date=date(2023, 9, 1), end_date=date(2024, 5, 31))
+    windows = []
+    real_expand = training_views.expand_occurrences
+
+    def spy(start, end, *criteria, **kwargs):
+        windows.append((start, end))
+        return real_expand(start, end, *criteria, **kwargs)
+
+    monkeypatch.setattr(training_views, 'expand_occurrences', spy)
+    html = logged_in_coach.get('/training/').get_data(as_text=True)
+
+    # The current season (2025-2026) bounds the list when no dates are given
+    assert windows == [(date(2025, 9, 1), date(2026, 6, 30))]
+    assert 'Old Season Rule' not in html
+    assert 'value="2025-09-01"' in html
+
+    logged_in_coach.get('/training/?date_from=2023-10-01')
+    assert windows[-1][0] == date(2023, 10, 1) and windows[-1][1] is not None
+    assert 'Old Season Rule' in logged_in_coach.get(
+        '/training/?date_from=2023-10-01&date_to=2023-10-31').get_data(as_text=True)
+
+
+def test_collapse_legacy_series(app, admin_user, sample_team, sample_athlete):
+    from app.models import Attendance
+
+    for day in (2, 9, 16, 23, 30):
+        db.session.add(TrainingSession(title='Legacy', date=date(2026, 3, day), start_time=time(17, 0),
+                                       end_time=time(18, 0), session_type='training', team_id=sample_team.id,
+                                       is_recurring=True, recurrence_day=0, recurrence_end_date=date(2026, 3, 31),
+                                       cancelled=(day == 16), created_by=admin_user.id))
+    db.session.commit()
+    kept = TrainingSession.query.filter_by(date=date(2026, 3, 9)).one()
+    db.session.add(Attendance(athlete_id=sample_athlete.id, date=kept.date, session_type='training',
+                              training_session_id=kept.id, status='present', created_by=admin_user.id))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['collapse-recurring-sessions'])
+    assert 'Created 1 rule(s), removed 4 session row(s), kept 1 override(s)' in result.output
+
+    rule = RecurrenceRule.query.one()
+    assert TrainingSession.query.one().occurrence_date == date(2026, 3, 9)
+    assert [o.date.day for o in expand_occurrences(date(2026, 3, 1), date(2026, 3, 31))] == [2, 23, 30]
+    assert RecurrenceException.query.filter_by(rule_id=rule.id).one().occurrence_date == date(2026, 3, 16)
+
+
+def test_check_in_on_occurrence_materializes_it(logged_in_coach, admin_user, sample_team, sample_athlete):
+    from datetime import timedelta
+    from app.models import Attendance
+
+    today = date.today()
+    rule = _rule(admin_user, sample_team, weekday=today.weekday(),
+                 start_date=today - timedelta(days=30), end_date=today + timedelta(days=30))
+    choice = f'r{rule.id}:{today.isoformat()}'
+    assert f'value="{choice}"' in logged_in_coach.get('/attendance/check-in').get_data(as_text=True)
+
+    logged_in_coach.post('/attendance/check-in', data={
+        'date': today.isoformat(), 'session_type': 'training', 'notes': '',
+        'training_session_id': choice, 'present': [str(sample_athlete.id)],
+    })
+    session = TrainingSession.query.one()
+    assert session.occurrence_date == today
+    assert Attendance.query.one().training_session_id == session.id
+    assert session.present_count == 1
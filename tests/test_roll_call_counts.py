@@ -0,0 +1,85 @@
+# ABOUTME: Tests for training session roll-call counters maintained by check-in
+# ABOUTME: Covers form and sync check-ins, edits, deletes and the rebuild command
+
+from app import db
+from app.models import Attendance, TrainingSession
+
+
+def _check_in(client, session, **statuses):
+    data = {
+        'date': session.date.isoformat(),
+        'session_type': 'training',
+        'training_session_id': str(session.id),
+        'notes': '',
+    }
+    data.update({status: [str(a) for a in ids] for status, ids in statuses.items()})
+    return client.post('/attendance/check-in', data=data)
+
+
+def _counts(session_id):
+    db.session.expire_all()
+    s = db.session.get(TrainingSession, session_id)
+    return s.present_count, s.absent_count, s.late_count, s.excused_count
+
+
+def test_check_in_links_records_and_counts(logged_in_coach, sample_athlete, sample_training_session):
+    _check_in(logged_in_coach, sample_training_session, present=[sample_athlete.id])
+
+    record = Attendance.query.one()
+    assert record.training_session_id == sample_training_session.id
+    assert _counts(sample_training_session.id) == (1, 0, 0, 0)
+
+    # Re-marking the same athlete moves the count instead of adding one
+    _check_in(logged_in_coach, sample_training_session, late=[sample_athlete.id])
+    assert _counts(sample_training_session.id) == (0, 0, 1, 0)
+    assert Attendance.query.count() == 1
+
+
+def test_check_in_prefills_from_session(logged_in_coach, sample_athlete, sample_training_session):
+    response = logged_in_coach.get(f'/attendance/check-in?training_session_id={sample_training_session.id}')
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert f'<option selected value="{sample_training_session.id}">' in html
+    assert 'value="2026-03-02"' in html
+
+
+def test_sync_counts_and_rejects_unknown_session(logged_in_coach, sample_athlete, sample_training_session):
+    mark = {'athlete_id': sample_athlete.id, 'status': 'absent', 'marked_at': '2026-03-02T17:00:00Z'}
+    response = logged_in_coach.post('/attendance/api/sync', json={'sessions': [
+        {'date': '2026-03-02', 'session_type': 'training',
+         'training_session_id': sample_training_session.id, 'marks': [mark]},
+        {'date': '2026-03-02', 'session_type': 'training', 'training_session_id': 9999, 'marks': [mark]},
+    ]})
+    summary = response.get_json()['summary']
+    assert summary['created'] == 1
+    assert summary['rejected'] == 1
+    assert _counts(sample_training_session.id) == (0, 1, 0, 0)
+
+
+def test_edit_and_delete_adjust_counts(logged_in_admin, sample_athlete, sample_training_session):
+    _check_in(logged_in_admin, sample_training_session, present=[sample_athlete.id])
+    record = Attendance.query.one()
+
+    logged_in_admin.post(f'/attendance/{record.id}/edit', data={
+        'athlete_id': sample_athlete.id,
+        'date': '2026-03-02',
+        'session_type': 'training',
+        'status': 'excused',
+        'notes': '',
+    })
+    assert _counts(sample_training_session.id) == (0, 0, 0, 1)
+
+    logged_in_admin.post(f'/attendance/{record.id}/delete')
+    assert _counts(sample_training_session.id) == (0, 0, 0, 0)
+
+
+def test_rebuild_command(app, admin_user, sample_athlete, sample_training_session):
+    db.session.add(Attendance(athlete_id=sample_athlete.id, date=sample_training_session.date,
+                              session_type='training', training_session_id=sample_training_session.id,
+                              status='late', created_by=admin_user.id))
+    sample_training_session.present_count = 5
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['rebuild-roll-call-counts'])
+    assert 'Rebuilt counters for 1' in result.output
+    assert _counts(sample_training_session.id) == (0, 0, 1, 0)
@@ -32,10 +32,14 @@ def test_public_routes_return_200(client, url):
     '/attendance/',
     '/attendance/check-in',
     '/attendance/report',
+    '/attendance/matrix',
     '/equipment/',
     '/equipment/new',
     '/equipment/assign',
     '/equipment/assignments',
+    '/equipment/scan',
+    '/equipment/overdue',
+    '/equipment/scan?mode=return',
     '/admin/users',
     '/admin/users/new',
     '/seasons/',
@@ -47,6 +51,7 @@ def test_public_routes_return_200(client, url):
     '/matches/new',
     '/documents/',
     '/documents/upload',
+    '/documents/import',
     '/documents/expiring',
     '/communications/',
     '/communications/new',
@@ -54,9 +59,11 @@ def test_public_routes_return_200(client, url):
     '/reports/team-roster',
     '/reports/attendance-summary',
     '/reports/equipment-inventory',
+    '/reports/equipment-rollup',
     '/reports/document-status',
     '/reports/insurance-status',
     '/calendar/',
+    '/calendar/events.json',
 ])
 def test_protected_routes_redirect_when_unauthenticated(client, url):
     response = client.get(url)
@@ -79,10 +86,14 @@ def test_protected_routes_redirect_when_unauthenticated(client, url):
     '/attendance/',
     '/attendance/check-in',
     '/attendance/report',
+    '/attendance/matrix',
     '/equipment/',
     '/equipment/new',
     '/equipment/assign',
     '/equipment/assignments',
+    '/equipment/scan',
+    '/equipment/overdue',
+    '/equipment/scan?mode=return',
     '/admin/users',
     '/admin/users/new',
     '/seasons/',
@@ -94,6 +105,7 @@ def test_protected_routes_redirect_when_unauthenticated(client, url):
     '/matches/new',
     '/documents/',
     '/documents/upload',
+    '/documents/import',
     '/documents/expiring',
     '/communications/',
     '/communications/new',
@@ -101,9 +113,11 @@ def test_protected_routes_redirect_when_unauthenticated(client, url):
     '/reports/team-roster',
     '/reports/attendance-summary',
     '/reports/equipment-inventory',
+    '/reports/equipment-rollup',
     '/reports/document-status',
     '/reports/insurance-status',
     '/calendar/',
+    '/calendar/events.json',
 ])
 def test_authenticated_routes_return_200(logged_in_admin, url):
     response = logged_in_admin.get(url)
@@ -154,6 +168,11 @@ def test_season_detail_page(logged_in_admin, sample_season):
     assert response.status_code == 200
 
 
+def test_season_leaderboard_page(logged_in_admin, sample_season):
+    response = logged_in_admin.get(f'/seasons/{sample_season.id}/leaderboard')
+    assert response.status_code == 200
+
+
 def test_season_edit_page(logged_in_admin, sample_season):
     response = logged_in_admin.get(f'/seasons/{sample_season.id}/edit')
     assert response.status_code == 200
@@ -0,0 +1,109 @@
+# ABOUTME: Tests for recurring series generation: interval index, preview conflicts, bulk writes
+# ABOUTME: Also covers editing and extending a series through its recurrence rule
+
+from datetime import date, time
+
+from app import db
+from app.models import Match, RecurrenceException, RecurrenceRule, TrainingSession
+from app.utils.scheduling import IntervalIndex
+
+
+def _series_form(team_id, **overrides):
+    data = {
+        'recurrence_day': '0',  # Mondays
+        'start_date': '2026-03-01',
+        'end_date': '2026-03-31',
+        'title': 'Allenamento U10',
+        'start_time': '17:30',
+        'end_time': '19:00',
+        'location': 'Campo A',
+        'session_type': 'training',
+        'team_id': str(team_id),
+        'season_id': '',
+        'coach_id': '',
+        'notes': '',
+        'skip_conflicts': 'y',
+    }
+    data.update(overrides)
+    return data
+
+
+def test_interval_index_overlaps():
+    index = IntervalIndex()
+    index.add('k', 60, 120, 'a')
+    index.add('k', 0, 600, 'long')
+    index.add('k', 130, 140, 'b')
+    index.add('other', 60, 120, 'c')
+
+    assert sorted(index.overlapping('k', 100, 135)) == ['a', 'b', 'long']
+    assert index.overlapping('k', 120, 130) == ['long']
+    assert index.overlapping('k', 700, 800) == []
+    assert index.overlapping('missing', 0, 10) == []
+
+
+def test_preview_reports_team_and_venue_conflicts(logged_in_coach, admin_user, sample_team,
+                                                  sample_training_session):
+    # sample_training_session: Monday 2 March 17:00-18:30 for the same team
+    db.session.add(Match(date=date(2026, 3, 9), kick_off_time=time(18, 0), opponent='Virtus',
+                         location='  campo a ', match_type='friendly', team_id=sample_team.id + 1,
+                         created_by=admin_user.id))
+    db.session.commit()
+
+    response = logged_in_coach.post('/training/generate-recurring',
+                                    data=_series_form(sample_team.id, preview='Preview'))
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert '2 dates have conflicts.' in html
+    assert 'same team' in html
+    assert 'same venue' in html
+    assert TrainingSession.query.count() == 1
+
+
+def test_generate_creates_rule_and_skips_conflicts(logged_in_coach, sample_team, sample_training_session):
+    response = logged_in_coach.post('/training/generate-recurring', data=_series_form(sample_team.id))
+    assert response.status_code == 302
+
+    rule = RecurrenceRule.query.one()
+    assert (rule.weekday, rule.start_date, rule.end_date) == (0, date(2026, 3, 1), date(2026, 3, 31))
+    # No rows per week: only the pre-existing session is stored
+    assert TrainingSession.query.count() == 1
+    # Mondays in March 2026: 2, 9, 16, 23, 30; the 2nd clashes with the existing session
+    skipped = RecurrenceException.query.one()
+    assert (skipped.occurrence_date, skipped.kind) == (date(2026, 3, 2), 'cancelled')
+
+
+def test_preview_sees_other_rules(logged_in_coach, sample_team):
+    logged_in_coach.post('/training/generate-recurring', data=_series_form(sample_team.id))
+
+    response = logged_in_coach.post('/training/generate-recurring',
+                                    data=_series_form(sample_team.id, title='Palestra', preview='Preview'))
+    assert '5 dates have conflicts.' in response.get_data(as_text=True)
+
+    # Editing the rule itself does not conflict with its own occurrences
+    rule = RecurrenceRule.query.one()
+    response = logged_in_coach.post(f'/training/rules/{rule.id}/edit',
+                                    data=_series_form(sample_team.id, preview='Preview'))
+    assert 'dates have conflicts' not in response.get_data(as_text=True)
+
+
+def test_edit_and_extend_rule_in_place(logged_in_coach, sample_team):
+    logged_in_coach.post('/training/generate-recurring', data=_series_form(sample_team.id))
+    rule = RecurrenceRule.query.one()
+
+    logged_in_coach.post(f'/training/rules/{rule.id}/edit',
+                         data=_series_form(sample_team.id, end_date='2026-04-30', recurrence_day='1',
+                                           start_time='18:00', end_time='19:30'))
+    db.session.expire_all()
+    assert RecurrenceRule.query.count() == 1
+    assert (rule.weekday, rule.end_date, rule.start_time) == (1, date(2026, 4, 30), time(18, 0))
+    assert TrainingSession.query.count() == 0
+
+
+def test_edit_rule_form_prefills(logged_in_coach, sample_team):
+    logged_in_coach.post('/training/generate-recurring', data=_series_form(sample_team.id))
+    rule = RecurrenceRule.query.one()
+
+    response = logged_in_coach.get(f'/training/rules/{rule.id}/edit')
+    assert response.status_code == 200
+    assert 'value="Allenamento U10"' in response.get_data(as_text=True)
+    assert logged_in_coach.get('/training/rules/999/edit').status_code == 404
@@ -0,0 +1,209 @@
+# ABOUTME: Tests for the storage backends behind uploads, downloads and previews
+# ABOUTME: The S3 backend runs against moto's in-process S3 stand-in; downloads must be presigned redirects
+
+import hashlib
+import io
+import os
+import shutil
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app import db
+from app.models import Document, UploadBlob
+from app.utils.storage import LocalStorage, S3Storage, Storage, get_storage
+from app.utils.uploads import blob_key, dedup_legacy_uploads, purge_document
+from tests.conftest import upload_document
+
+BUCKET = 'fortidesk-test'
+
+
+@pytest.fixture
+def s3(app, upload_dir, monkeypatch):
+    """S3 storage on a moto bucket; yields the boto3 client."""
+    pytest.importorskip('boto3')
+    moto = pytest.importorskip('moto')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    for key, value in {'STORAGE_BACKEND': 's3', 'S3_BUCKET': BUCKET, 'S3_PREFIX': 'documents',
+                       'S3_REGION': 'us-east-1', 'S3_MULTIPART_CHUNK_SIZE': 5 * 1024 * 1024}.items():
+        monkeypatch.setitem(app.config, key, value)
+    with moto.mock_aws():
+        app.extensions.pop('s3_storage', None)
+        client = get_storage().client
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+        app.extensions.pop('s3_storage', None)
+
+
+def _object(client, key):
+    return client.get_object(Bucket=BUCKET, Key=f'documents/{key}')['Body'].read()
+
+
+def test_local_storage_is_the_default(app, upload_dir):
+    storage = get_storage()
+    assert isinstance(storage, LocalStorage)
+
+    temp = upload_dir / 'temp'
+    temp.write_bytes(b'content')
+    storage.put('ab/cd/abcd', str(temp))
+
+    assert not temp.exists()
+    assert storage.exists('ab/cd/abcd')
+    assert storage.location('ab/cd/abcd') == os.path.join(str(upload_dir), 'ab', 'cd', 'abcd')
+    assert storage.download_url('ab/cd/abcd') is None
+    storage.delete('ab/cd/abcd')
+    storage.delete('ab/cd/abcd')
+    assert not storage.exists('ab/cd/abcd')
+
+
+def test_incomplete_backend_cannot_be_created():
+    class Partial(Storage):
+        def put(self, key, temp_path, mime_type=None):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_s3_put_streams_in_multipart_parts(app, s3, upload_dir):
+    storage = get_storage()
+    assert isinstance(storage, S3Storage)
+    temp = upload_dir / 'temp'
+    content = os.urandom(11 * 1024 * 1024)
+    temp.write_bytes(content)
+
+    storage.put('ab/cd/abcd', str(temp), 'application/pdf')
+
+    assert not temp.exists()
+    head = s3.head_object(Bucket=BUCKET, Key='documents/ab/cd/abcd')
+    # Multipart uploads get an ETag of '<md5 of part md5s>-<part count>'
+    assert head['ETag'].strip('"').endswith('-3')
+    assert head['ContentType'] == 'application/pdf'
+    with storage.local_path('ab/cd/abcd') as path:
+        with open(path, 'rb') as f:
+            assert f.read() == content
+    assert not os.path.exists(path)
+    storage.delete('ab/cd/abcd')
+    assert not storage.exists('ab/cd/abcd')
+
+
+def test_s3_upload_and_presigned_download(logged_in_admin, s3, upload_dir, sample_athlete):
+    document = upload_document(logged_in_admin, sample_athlete, b'%PDF-1.4 certificate')
+    blob = UploadBlob.query.one()
+
+    assert document.file_path == f's3://{BUCKET}/documents/{blob.storage_key}'
+    assert _object(s3, blob.storage_key) == b'%PDF-1.4 certificate'
+    # Nothing but scratch space is left on the local volume
+    assert [f for _, _, files in os.walk(upload_dir) for f in files] == []
+
+    response = logged_in_admin.get(f'/documents/{document.id}/download')
+    assert response.status_code == 302
+    assert 'no-store' in response.headers['Cache-Control']
+    location = urlparse(response.headers['Location'])
+    assert BUCKET in location.netloc + location.path
+    assert location.path.endswith(f'/documents/{blob.storage_key}')
+    query = parse_qs(location.query)
+    assert query['response-content-disposition'] == ['attachment; filename="certificate.pdf"']
+    assert 'X-Amz-Signature' in query or 'Signature' in query
+
+
+def test_s3_identical_uploads_share_one_object_and_purge_deletes_it(logged_in_admin, s3, upload_dir,
+                                                                   sample_athlete):
+    first = upload_document(logged_in_admin, sample_athlete, b'%PDF-1.4 same')
+    second = upload_document(logged_in_admin, sample_athlete, b'%PDF-1.4 same')
+    key = UploadBlob.query.one().storage_key
+    assert first.blob_id == second.blob_id
+
+    purge_document(first)
+    assert get_storage().exists(key)
+    purge_document(second)
+
+    assert UploadBlob.query.count() == 0
+    assert s3.list_objects_v2(Bucket=BUCKET).get('KeyCount') == 0
+
+
+def test_s3_preview_is_stored_in_bucket_and_redirected(logged_in_admin, s3, upload_dir, sample_athlete):
+    Image = pytest.importorskip('PIL.Image')
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 20), 'red').save(buffer, 'PNG')
+    document = upload_document(logged_in_admin, sample_athlete, buffer.getvalue(), name='scan.png')
+    key = UploadBlob.query.one().storage_key
+
+    response = logged_in_admin.get(f'/documents/{document.id}/preview')
+
+    assert response.status_code == 302
+    assert urlparse(response.headers['Location']).path.endswith(f'/documents/{key}.preview.webp')
+    preview = Image.open(io.BytesIO(_object(s3, f'{key}.preview.webp')))
+    assert preview.format == 'WEBP'
+
+
+def test_dedup_legacy_uploads_moves_files_to_bucket(app, s3, upload_dir, admin_user, sample_athlete):
+    paths = []
+    for name in ('a.pdf', 'b.pdf'):
+        path = upload_dir / name
+        path.write_bytes(b'%PDF-1.4 legacy')
+        paths.append(str(path))
+        db.session.add(Document(
+            title=name, document_type='other', file_path=str(path), file_name=name,
+            entity_type='athlete', entity_id=sample_athlete.id, created_by=admin_user.id,
+        ))
+    db.session.commit()
+
+    assert dedup_legacy_uploads() == (2, 1, 15, 0)
+
+    key = blob_key(hashlib.sha256(b'%PDF-1.4 legacy').hexdigest())
+    assert _object(s3, key) == b'%PDF-1.4 legacy'
+    assert not any(os.path.exists(path) for path in paths)
+    assert {d.file_path for d in Document.query} == {f's3://{BUCKET}/documents/{key}'}
+
+
+def _start_chunked(client, content):
+    return client.post('/documents/uploads', json={
+        'file_name': 'scan.pdf', 'total_size': len(content), 'mime_type': 'application/pdf'
+    }).get_json()
+
+
+def test_s3_chunked_upload_survives_a_wiped_local_volume(logged_in_coach, s3, upload_dir, sample_athlete):
+    content = os.urandom(5 * 1024 * 1024 + 1000)
+    state = _start_chunked(logged_in_coach, content)
+    # Parts below the S3 minimum are widened to it
+    assert (state['chunk_size'], state['chunk_count']) == (5 * 1024 * 1024, 2)
+
+    size = state['chunk_size']
+    for index in range(2):
+        response = logged_in_coach.put(f'/documents/uploads/{state["upload_id"]}/chunks/{index}',
+                                       data=content[index * size:(index + 1) * size])
+        assert response.get_json()['next_chunk'] == index + 1
+        # The next request may land on another container
+        shutil.rmtree(upload_dir / 'tmp', ignore_errors=True)
+
+    response = logged_in_coach.post(f'/documents/uploads/{state["upload_id"]}/finalize', data={
+        'title': 'Scan', 'document_type': 'medical_certificate',
+        'entity_type': 'athlete', 'entity_id': sample_athlete.id,
+    })
+
+    assert response.status_code == 201
+    blob = UploadBlob.query.one()
+    assert blob.sha256 == hashlib.sha256(content).hexdigest()
+    assert _object(s3, blob.storage_key) == content
+    assert s3.list_objects_v2(Bucket=BUCKET, Prefix='documents/tmp/')['KeyCount'] == 0
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+
+
+def test_s3_cancelled_upload_aborts_multipart(logged_in_coach, s3, upload_dir):
+    content = os.urandom(5 * 1024 * 1024 + 10)
+    upload_id = _start_chunked(logged_in_coach, content)['upload_id']
+    logged_in_coach.put(f'/documents/uploads/{upload_id}/chunks/0', data=content[:5 * 1024 * 1024])
+    assert len(s3.list_multipart_uploads(Bucket=BUCKET)['Uploads']) == 1
+
+    assert logged_in_coach.delete(f'/documents/uploads/{upload_id}').status_code == 204
+
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+
+
+def test_reconcile_requires_local_storage(app, s3):
+    result = app.test_cli_runner().invoke(args=['reconcile-uploads'])
+
+    assert result.exit_code != 0
+    assert 'STORAGE_BACKEND=local' in result.output
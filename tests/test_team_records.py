@@ -0,0 +1,72 @@
+# ABOUTME: Tests for incrementally maintained team season records (W/D/L, points, form)
+# ABOUTME: Covers result entry and correction, away scores, deletes, rebuild and pages
+
+from datetime import date, time
+
+from app import db
+from app.models import Match, TeamSeasonRecord
+from app.utils.match_stats import rebuild_team_season_records
+
+
+def _result(client, match, result, home, away):
+    return client.post(f'/matches/{match.id}/result', data={
+        'score_home': home, 'score_away': away, 'result': result, 'notes': ''
+    })
+
+
+def _record(team, season):
+    db.session.expire_all()
+    row = TeamSeasonRecord.query.filter_by(team_id=team.id, season_id=season.id).one()
+    return (row.played, row.wins, row.draws, row.losses, row.points_for, row.points_against, row.form)
+
+
+def _away_match(sample_match, day):
+    match = Match(
+        opponent='Rugby Modena', date=day, kick_off_time=time(15, 0), is_home=False,
+        match_type='league', team_id=sample_match.team_id, season_id=sample_match.season_id,
+        created_by=sample_match.created_by,
+    )
+    db.session.add(match)
+    db.session.commit()
+    return match
+
+
+def test_result_entry_and_correction(logged_in_coach, sample_match, sample_team, sample_season):
+    _result(logged_in_coach, sample_match, 'win', 24, 0)
+    assert _record(sample_team, sample_season) == (1, 1, 0, 0, 24, 0, 'W')
+
+    _result(logged_in_coach, sample_match, 'draw', 12, 12)
+    assert _record(sample_team, sample_season) == (1, 0, 1, 0, 12, 12, 'D')
+
+
+def test_away_scores_and_form_order(logged_in_coach, sample_match, sample_team, sample_season):
+    _result(logged_in_coach, sample_match, 'win', 20, 5)
+    # An earlier away match recorded later still sorts first in the form
+    earlier = _away_match(sample_match, date(2026, 3, 7))
+    _result(logged_in_coach, earlier, 'loss', 30, 10)
+
+    assert _record(sample_team, sample_season) == (2, 1, 0, 1, 30, 35, 'LW')
+
+
+def test_delete_removes_result(logged_in_admin, sample_match, sample_team, sample_season):
+    _result(logged_in_admin, sample_match, 'win', 20, 5)
+    logged_in_admin.post(f'/matches/{sample_match.id}/delete')
+    assert _record(sample_team, sample_season) == (0, 0, 0, 0, 0, 0, '')
+
+
+def test_rebuild_matches_incremental(logged_in_coach, sample_match, sample_team, sample_season):
+    _result(logged_in_coach, sample_match, 'win', 20, 5)
+    _result(logged_in_coach, _away_match(sample_match, date(2026, 3, 21)), 'draw', 7, 7)
+    incremental = _record(sample_team, sample_season)
+
+    assert rebuild_team_season_records() == 1
+    assert _record(sample_team, sample_season) == incremental
+
+
+def test_pages_show_records(logged_in_coach, sample_match, sample_team, sample_season):
+    _result(logged_in_coach, sample_match, 'win', 20, 5)
+
+    season_page = logged_in_coach.get(f'/seasons/{sample_season.id}')
+    assert b'Under 10' in season_page.data and b'+15' in season_page.data
+    team_page = logged_in_coach.get(f'/teams/{sample_team.id}')
+    assert b'Season Results' in team_page.data
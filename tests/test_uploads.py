@@ -0,0 +1,82 @@
+# ABOUTME: Tests for the content-addressed upload store and its reference counting
+# ABOUTME: The same file uploaded for many documents must be stored once
+
+import os
+
+from app import db
+from app.models import Document, UploadBlob
+from app.utils.uploads import blob_path, purge_document
+from tests.conftest import upload_document
+
+PDF = b'%PDF-1.4 consent form ' + b'x' * 200_000
+
+
+def _blob_files(upload_dir):
+    return [os.path.join(root, f) for root, _, files in os.walk(upload_dir)
+            for f in files if os.path.relpath(root, upload_dir) != 'tmp']
+
+
+def test_identical_uploads_share_one_blob(logged_in_admin, upload_dir, sample_athlete):
+    first = upload_document(logged_in_admin, sample_athlete, PDF, name='consent.pdf')
+    second = upload_document(logged_in_admin, sample_athlete, PDF, name='copy.pdf')
+    assert first.id != second.id
+
+    blob = UploadBlob.query.one()
+    assert blob.ref_count == 2
+    assert blob.size == len(PDF)
+    assert blob.storage_key == f'{blob.sha256[:2]}/{blob.sha256[2:4]}/{blob.sha256}'
+    assert {d.file_path for d in Document.query} == {blob_path(blob.storage_key)}
+    assert _blob_files(upload_dir) == [blob_path(blob.storage_key)]
+    assert not os.listdir(upload_dir / 'tmp')
+
+
+def test_download_serves_blob(logged_in_admin, upload_dir, sample_athlete):
+    upload_document(logged_in_admin, sample_athlete, PDF, name='consent.pdf')
+
+    response = logged_in_admin.get(f'/documents/{Document.query.one().id}/download')
+
+    assert response.status_code == 200
+    assert response.data == PDF
+    assert 'consent.pdf' in response.headers['Content-Disposition']
+
+
+def test_soft_delete_and_purge_release_references(logged_in_admin, upload_dir, sample_athlete):
+    upload_document(logged_in_admin, sample_athlete, PDF, name='consent.pdf')
+    upload_document(logged_in_admin, sample_athlete, PDF, name='consent.pdf')
+    first, second = Document.query.order_by(Document.id).all()
+    path = first.file_path
+
+    logged_in_admin.post(f'/documents/{first.id}/delete')
+    db.session.expire_all()
+    assert UploadBlob.query.one().ref_count == 1
+
+    purge_document(db.session.get(Document, first.id))
+    assert os.path.exists(path)
+
+    purge_document(db.session.get(Document, second.id))
+    assert UploadBlob.query.count() == 0
+    assert not os.path.exists(path)
+
+
+def test_dedup_migrates_legacy_files(app, upload_dir, admin_user, sample_athlete):
+    paths = []
+    for n in range(3):
+        path = upload_dir / f'legacy{n}.pdf'
+        path.write_bytes(PDF if n < 2 else b'%PDF other')
+        paths.append(str(path))
+    for n, path in enumerate(paths + [str(upload_dir / 'gone.pdf')]):
+        db.session.add(Document(
+            title=f'Doc {n}', document_type='other', file_path=path, file_name='a.pdf',
+            entity_type='athlete', entity_id=sample_athlete.id, created_by=admin_user.id,
+            is_active=n != 1,
+        ))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['dedup-uploads'])
+
+    assert 'Migrated 3 document(s), removed 1 duplicate file(s)' in result.output
+    assert '1 file(s) missing' in result.output
+    refs = {blob.size: blob.ref_count for blob in UploadBlob.query}
+    assert refs == {len(PDF): 1, len(b'%PDF other'): 1}
+    assert not any(os.path.exists(p) for p in paths)
+    assert all(os.path.exists(d.file_path) for d in Document.query.filter(Document.blob_id.isnot(None)))